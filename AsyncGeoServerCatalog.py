@@ -0,0 +1,322 @@
+import os
+import json
+import asyncio
+import base64
+from geoserver.catalog import ConflictingDataError, FailedRequestError
+from geoserver.support import prepare_upload_bundle
+
+import aiohttp
+
+try:
+    from urllib.parse import quote
+except ImportError:
+    from urllib import quote
+
+
+class AsyncGeoServerCatalog(object):
+    """
+    基于aiohttp的异步GeoServer REST客户端
+    与GeoServerCatalog提供相同的工作空间、数据存储、图层、样式及栅格存储（含"ImagePyramid"类型）操作，
+    所有连接由同一个保持长连接的连接池复用，查询类函数返回GeoServer REST接口的json字典
+    """
+
+    # 与GeoServerCatalog.create_coveragestore保持一致
+    allowed_types = [
+        'ImageMosaic',
+        'GeoTIFF',
+        'Gtopo30',
+        'WorldImage',
+        'AIG',
+        'ArcGrid',
+        'DTED',
+        'EHdr',
+        'ERDASImg',
+        'ENVIHdr',
+        'GeoPackage (mosaic)',
+        'NITF',
+        'RPFTOC',
+        'RST',
+        'VRT',
+        'ImagePyramid'
+    ]
+
+    def __init__(self, service_url, username="admin", password="geoserver", validate_ssl_certificate=True, access_token=None, retries=3, backoff_factor=0.9, pool_size=100, timeout=None):
+        self.service_url = service_url.strip("/")
+        self.username = username
+        self.password = password
+        self.validate_ssl_certificate = validate_ssl_certificate
+        self.access_token = access_token
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.client = None
+
+    async def __aenter__(self):
+        self.setup_connection()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def setup_connection(self):
+        """
+        创建连接池，同一个事件循环内的所有请求复用该连接池
+        """
+
+        if self.client is not None and not self.client.closed:
+            return self.client
+
+        connector = aiohttp.TCPConnector(limit=self.pool_size, ssl=None if self.validate_ssl_certificate else False)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        self.client = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self.client
+
+    async def close(self):
+        if self.client is not None and not self.client.closed:
+            await self.client.close()
+        self.client = None
+
+    def _headers(self, headers):
+        headers = dict(headers or {})
+        if self.access_token:
+            headers["Authorization"] = f"Bearer {self.access_token}"
+        elif self.username and self.password:
+            valid_uname_pw = base64.b64encode(f"{self.username}:{self.password}".encode("utf-8")).decode("ascii")
+            headers["Authorization"] = f"Basic {valid_uname_pw}"
+        return headers
+
+    async def http_request(self, url, data=None, method="get", headers=None, params=None):
+        """
+        发送请求，遇到502/503/504及连接错误时按backoff_factor指数退避重试
+        return (status, text)
+        """
+
+        client = self.setup_connection()
+        headers = self._headers(headers)
+        params = dict(params or {})
+        if self.access_token:
+            params["access_token"] = self.access_token
+
+        attempt = 0
+        while True:
+            # 文件类请求体在重试前需要回到起始位置
+            if hasattr(data, "seek"):
+                data.seek(0)
+            try:
+                async with client.request(method.upper(), url, data=data, headers=headers, params=params) as resp:
+                    text = await resp.text()
+                    if resp.status not in (502, 503, 504) or attempt >= self.retries:
+                        return resp.status, text
+            except aiohttp.ClientConnectionError:
+                if attempt >= self.retries:
+                    raise
+
+            attempt += 1
+            await asyncio.sleep(self.backoff_factor * (2 ** (attempt - 1)))
+
+    async def get_json(self, path):
+        """
+        获取REST资源的json
+        path：相对于service_url的路径，不带后缀
+        return dict；资源不存在时返回None
+        """
+
+        status, text = await self.http_request(f"{self.service_url}/{path}.json", headers={"Accept": "application/json"})
+        if status == 404:
+            return None
+        if status != 200:
+            raise FailedRequestError(f"Failed to get {path} : {status}, {text}")
+        return _loads(text)
+
+    async def delete(self, path, purge=None, recurse=False):
+        """
+        删除REST资源
+        path：相对于service_url的路径
+        """
+
+        params = {}
+        if purge:
+            params["purge"] = str(purge)
+        if recurse:
+            params["recurse"] = "true"
+
+        headers = {"Content-type": "application/xml", "Accept": "application/xml"}
+        status, text = await self.http_request(f"{self.service_url}/{path}", method="delete", headers=headers, params=params)
+        if status != 200:
+            raise FailedRequestError(f"Failed to make DELETE request: {status}, {text}")
+
+    async def get_workspaces(self):
+        res = await self.get_json("workspaces")
+        return _items(res, "workspaces", "workspace")
+
+    async def get_workspace(self, name):
+        res = await self.get_json(f"workspaces/{quote(name)}")
+        return None if res is None else res["workspace"]
+
+    async def create_workspace(self, name, uri):
+        xml = f"<namespace><prefix>{name}</prefix><uri>{uri}</uri></namespace>"
+        headers = {"Content-Type": "application/xml"}
+        status, text = await self.http_request(f"{self.service_url}/namespaces/", method="post", data=xml, headers=headers)
+        if status not in (200, 201, 202):
+            raise FailedRequestError(f"Failed to create workspace {name} : {status}, {text}")
+        return await self.get_workspace(name)
+
+    async def get_stores(self, workspace):
+        datastores = await self.get_json(f"workspaces/{quote(workspace)}/datastores")
+        coveragestores = await self.get_json(f"workspaces/{quote(workspace)}/coveragestores")
+        return _items(datastores, "dataStores", "dataStore") + _items(coveragestores, "coverageStores", "coverageStore")
+
+    async def get_store(self, name, workspace):
+        """
+        return (store_path, store)；store_path为删除时使用的REST路径，不存在时返回(None, None)
+        """
+
+        for kind, key in (("datastores", "dataStore"), ("coveragestores", "coverageStore")):
+            path = f"workspaces/{quote(workspace)}/{kind}/{quote(name)}"
+            res = await self.get_json(path)
+            if res is not None:
+                return path, res[key]
+        return None, None
+
+    async def get_layer(self, name):
+        """
+        name：带工作空间前缀的图层名称 workspace:layer
+        """
+
+        res = await self.get_json(f"layers/{quote(name)}")
+        return None if res is None else res["layer"]
+
+    async def get_layers(self):
+        res = await self.get_json("layers")
+        return _items(res, "layers", "layer")
+
+    async def create_featurestore(self, name, data, workspace, overwrite=False, charset=None):
+        if not overwrite:
+            path, store = await self.get_store(name, workspace)
+            if store is not None:
+                raise ConflictingDataError(f"There is already a store named {name} in workspace {workspace}")
+
+        params = {}
+        if charset:
+            params["charset"] = charset
+
+        # 打包zip会读写磁盘，放到线程中执行以免阻塞事件循环
+        loop = asyncio.get_running_loop()
+        archive = await loop.run_in_executor(None, prepare_upload_bundle, name, data) if isinstance(data, dict) else data
+
+        headers = {"Content-type": "application/zip", "Accept": "application/xml"}
+        url = f"{self.service_url}/workspaces/{quote(workspace)}/datastores/{quote(name)}/file.shp"
+        try:
+            with open(archive, "rb") as file_obj:
+                status, text = await self.http_request(url, method="put", data=file_obj, headers=headers, params=params)
+        finally:
+            if archive is not data:
+                os.remove(archive)
+
+        if status != 201:
+            raise FailedRequestError(f"Failed to create FeatureStore {name} : {status}, {text}")
+
+    async def create_coveragestore(self, name, workspace, path=None, type='GeoTIFF',
+                                   create_layer=True, layer_name=None, source_name=None, upload_data=False, contet_type="image/tiff",
+                                   overwrite=False):
+        """
+        Create a coveragestore for locally hosted rasters.
+        If create_layer is set to true, will create a coverage/layer.
+        layer_name and source_name are only used if create_layer ia enabled. If not specified, the raster name will be used for both.
+        """
+        if path is None:
+            raise Exception('You must provide a full path to the raster')
+
+        if layer_name is not None and ":" in layer_name:
+            ws_name, layer_name = layer_name.split(':')
+
+        if type is None:
+            raise Exception('Type must be declared')
+        elif type not in self.allowed_types:
+            raise Exception(f"Type must be one of {', '.join(self.allowed_types)}")
+
+        if not overwrite:
+            store_path, store = await self.get_store(name, workspace)
+            if store is not None:
+                raise ConflictingDataError(f"There is already a store named {name} in workspace {workspace}")
+
+        store_url = f"{self.service_url}/workspaces/{quote(workspace)}/coveragestores"
+        if upload_data is False:
+            url = path if path.startswith("file:") else f"file:{path}"
+            data = f"<coverageStore><name>{name}</name><type>{type}</type><enabled>true</enabled>" \
+                   f"<workspace>{workspace}</workspace><url>{url}</url></coverageStore>"
+            headers = {"Content-type": "application/xml", "Accept": "application/xml"}
+            status, text = await self.http_request(store_url, method="post", data=data, headers=headers)
+            if status not in (200, 201):
+                raise FailedRequestError(f"Failed to save to Geoserver catalog: {status}, {text}")
+
+            if create_layer:
+                if layer_name is None:
+                    layer_name = os.path.splitext(os.path.basename(path))[0]
+                if source_name is None:
+                    source_name = os.path.splitext(os.path.basename(path))[0]
+
+                data = f"<coverage><name>{layer_name}</name><nativeName>{source_name}</nativeName></coverage>"
+                headers = {"Content-type": "application/xml"}
+                status, text = await self.http_request(f"{store_url}/{quote(name)}/coverages.xml", method="post", data=data, headers=headers)
+                if status != 201:
+                    raise FailedRequestError('Failed to create coverage/layer {} for : {}, {}'.format(layer_name, name, status, text))
+        else:
+            params = {"configure": "first", "coverageName": name}
+            headers = {"Content-type": contet_type}
+            with open(path, 'rb') as data:
+                status, text = await self.http_request(f"{store_url}/{quote(name)}/file.{type.lower()}", method="put", data=data, headers=headers, params=params)
+            if status != 201:
+                raise FailedRequestError('Failed to create coverage/layer {} for : {}, {}'.format(layer_name, name, status, text))
+
+        store_path, store = await self.get_store(name, workspace)
+        return store
+
+    async def get_style(self, name, workspace=None):
+        path = f"workspaces/{quote(workspace)}/styles/{quote(name)}" if workspace else f"styles/{quote(name)}"
+        res = await self.get_json(path)
+        return None if res is None else res["style"]
+
+    async def get_styles(self, workspace=None):
+        res = await self.get_json(f"workspaces/{quote(workspace)}/styles" if workspace else "styles")
+        return _items(res, "styles", "style")
+
+    async def create_style(self, name, data, overwrite=False, workspace=None, style_format="sld10"):
+        style = await self.get_style(name, workspace)
+        if not overwrite and style is not None:
+            raise ConflictingDataError(f"There is already a style named {name}")
+
+        styles_url = f"{self.service_url}/workspaces/{quote(workspace)}/styles" if workspace else f"{self.service_url}/styles"
+        if style is None:
+            xml = "<style><name>{0}</name><filename>{0}.sld</filename></style>".format(name)
+            headers = {"Content-type": "application/xml", "Accept": "application/xml"}
+            status, text = await self.http_request(styles_url, method="post", data=xml, headers=headers)
+            if status not in (200, 201, 202):
+                raise FailedRequestError(f"Failed to create style {name} : {status}, {text}")
+
+        await self.update_style_body(name, data, workspace, style_format)
+        return await self.get_style(name, workspace)
+
+    async def update_style_body(self, name, data, workspace=None, style_format="sld10"):
+        content_type = "application/vnd.ogc.se+xml" if style_format == "sld11" else "application/vnd.ogc.sld+xml"
+        styles_url = f"{self.service_url}/workspaces/{quote(workspace)}/styles" if workspace else f"{self.service_url}/styles"
+        headers = {"Content-type": content_type, "Accept": "application/xml"}
+        status, text = await self.http_request(f"{styles_url}/{quote(name)}", method="put", data=data, headers=headers)
+        if status not in (200, 201, 202):
+            raise FailedRequestError(f"Failed to update style {name} : {status}, {text}")
+
+
+def _loads(text):
+    return json.loads(text) if text else {}
+
+
+def _items(res, collection, item):
+    """
+    GeoServer列表接口在为空时返回空字符串而不是空列表，此处统一为列表
+    """
+
+    if not res or not isinstance(res.get(collection), dict):
+        return []
+    items = res[collection].get(item, [])
+    return items if isinstance(items, list) else [items]
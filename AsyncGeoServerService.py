@@ -0,0 +1,466 @@
+import asyncio
+import geoserver.util
+from AsyncGeoServerCatalog import AsyncGeoServerCatalog
+import StyleTemplates
+
+try:
+    from urllib.parse import quote
+except ImportError:
+    from urllib import quote
+
+
+class AsyncGeoServerService(object):
+    """
+    基于AsyncGeoServerCatalog库封装的异步常用服务类
+    函数与GeoServerService一一对应，返回格式相同，其中图层、样式等对象为GeoServer REST接口的json字典
+    """
+    def __init__(self, url, username, password, poolSize=100) -> None:
+        self.__cat = AsyncGeoServerCatalog(url, username, password, pool_size=poolSize)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """
+        关闭连接池
+        """
+
+        await self.__cat.close()
+
+    async def getWorkspace(self, workspaceName):
+        """
+        通过名称获取工作空间
+        workspaceName： 工作空间的名称
+        return dict
+        """
+
+        return await self.__cat.get_workspace(workspaceName)
+
+    async def isWorkspaceExist(self, workspaceName):
+        """
+        判断工作空间是否存在
+        workspaceName： 工作空间的名称
+        return True-存在;False-不存在
+        """
+
+        res = await self.getWorkspace(workspaceName)
+        return res is not None
+
+    async def createWorkspace(self, workspaceName):
+        """
+        创建工作空间
+        workspaceName： 工作空间的名称
+        return {
+            status: 状态，success-创建成功;fail-创建失败
+            info: 信息, success-""; fail-工作空间已存在；其他信息
+            data: None
+        }
+        """
+
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+
+        try:
+            if await self.isWorkspaceExist(workspaceName):
+                res["info"] = "工作空间已存在：{0}".format(workspaceName)
+                return res
+
+            await self.__cat.create_workspace(workspaceName, "http://{0}.com".format(workspaceName))
+            res["status"] = "success"
+            return res
+        except Exception as e:
+            res["info"] = repr(e)
+            return res
+
+    async def deleteWorkspace(self, workspaceName):
+        """
+        删除工作空间（会删除工作空间下的所有内容，包括图层和样式）
+        workspaceName： 工作空间的名称
+        """
+
+        if await self.isWorkspaceExist(workspaceName):
+            await self.__cat.delete("workspaces/{0}".format(quote(workspaceName)), None, True)
+
+    async def getStore(self, workspaceName, storeName):
+        """
+        通过名称获取数据存储
+        workspaceName： 数据存储所在的工作空间的名称
+        storeName：数据存储的名称
+        return dict
+        """
+
+        path, store = await self.__cat.get_store(storeName, workspaceName)
+        return store
+
+    async def isStoreExist(self, workspaceName, storeName):
+        """
+        判断数据存储是否存在
+        workspaceName： 数据存储所在的工作空间的名称
+        storeName：数据存储的名称
+        return True-存在;False-不存在
+        """
+
+        res = await self.getStore(workspaceName, storeName)
+        return res is not None
+
+    async def deleteStore(self, workspaceName, storeName):
+        """
+        删除数据存储
+        workspaceName： 数据存储所在的工作空间的名称
+        storeName：数据存储的名称
+        """
+
+        path, store = await self.__cat.get_store(storeName, workspaceName)
+        if store is not None:
+            await self.__cat.delete(path, None, True)
+
+    async def getLayer(self, workspaceName, layerName):
+        """
+        通过名称获取图层
+        workspaceName： 图层所在的工作空间的名称
+        layerName：图层的名称
+        return dict
+        """
+
+        layerNameReg = "{0}:{1}".format(workspaceName, layerName)
+        return await self.__cat.get_layer(layerNameReg)
+
+    async def isLayerExist(self, workspaceName, layerName):
+        """
+        判断图层是否存在
+        workspaceName： 图层所在的工作空间的名称
+        layerName：图层的名称
+        return True-存在;False-不存在
+        """
+
+        res = await self.getLayer(workspaceName, layerName)
+        return res is not None
+
+    async def __getCreatedLayer(self, workspaceName, layerName, res):
+        """
+        获取创建的图层，并填充返回结果
+        """
+
+        layer = await self.getLayer(workspaceName, layerName)
+        styleType = layer.get("defaultStyle", {}).get("name")
+
+        res["status"] = "success"
+        res["data"] = {
+            "layer": layer,
+            "default_style": styleType
+        }
+        return res
+
+    async def createShapeLayer(self, workspaceName, layerName, shapePath, charset):
+        """
+        创建Shp图层
+        workspaceName： 图层所在的工作空间的名称
+        layerName：图层的名称
+        shapePath：shape文件的路径
+        charset：dbf的字符集
+        return {
+            status: 状态，success-创建成功;fail-创建失败
+            info: 信息, success-""; fail-工作空间不存在/图层已存在/其他信息
+            data: {
+                layer：生成的图层,
+                default_style: 图层的默认样式
+            }
+        }
+        """
+
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+
+        try:
+            # 判断工作空间是否存在
+            if not await self.isWorkspaceExist(workspaceName):
+                res["info"] = "工作空间不存在：{0}".format(workspaceName)
+                return res
+
+            # 判断图层是否存在
+            if await self.isLayerExist(workspaceName, layerName):
+                res["info"] = "图层已存在：{0}".format(layerName)
+                return res
+
+            # 创建图层
+            try:
+                data = geoserver.util.shapefile_and_friends(shapePath)
+                await self.__cat.create_featurestore(layerName, data, workspaceName, True, charset)
+            except Exception as e:
+                res["info"] = "文件解析错误"
+                return res
+
+            # 获取创建的图层
+            return await self.__getCreatedLayer(workspaceName, layerName, res)
+        except Exception as e:
+            res["info"] = repr(e)
+            return res
+
+    async def __createTiffLayer(self, workspaceName, layerName, tiffPath, pyramid=False):
+        """
+        创建Tiff图层
+        workspaceName： 图层所在的工作空间的名称
+        layerName：图层的名称
+        tiffPath：tiff文件/夹的路径
+        pyramid: 是否为金字塔结构,默认false
+        return 格式同createShapeLayer
+        """
+
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+
+        try:
+            # 判断工作空间是否存在
+            if not await self.isWorkspaceExist(workspaceName):
+                res["info"] = "工作空间不存在：{0}".format(workspaceName)
+                return res
+
+            # 判断图层是否存在
+            if await self.isLayerExist(workspaceName, layerName):
+                res["info"] = "图层已存在：{0}".format(layerName)
+                return res
+
+            # 创建图层
+            try:
+                tiffType = "GeoTIFF"
+                if pyramid:
+                    tiffType = "ImagePyramid"
+
+                await self.__cat.create_coveragestore(name=layerName, workspace=workspaceName, path=tiffPath, type=tiffType, layer_name=layerName)
+            except Exception as e:
+                res["info"] = "文件解析错误"
+                return res
+
+            # 获取创建的图层
+            return await self.__getCreatedLayer(workspaceName, layerName, res)
+        except Exception as e:
+            res["info"] = repr(e)
+            return res
+
+    async def createTiffLayer(self, workspaceName, layerName, tiffPath):
+        """
+        创建Tiff图层：适用于文件大小<2GB的Tiff
+        workspaceName： 图层所在的工作空间的名称
+        layerName：图层的名称
+        tiffPath：tiff文件的路径
+        return 格式同createShapeLayer
+        """
+
+        return await self.__createTiffLayer(workspaceName, layerName, tiffPath)
+
+    async def createPyramidTiff(self, tiffPath, tiffDir, levels=None, blockWidth=None, blockHeight=None, workers=None, progress=None):
+        """
+        对tiff进行金字塔切片，切片在进程池中执行，不阻塞事件循环
+        tiffPath：tiff文件的路径
+        tiffDir：生成的金字塔文件夹的路径
+        level：金字塔层级，可选，默认按影像尺寸规划，见PyramidPlanner
+        blockWidth: 金字塔切块的宽度分辨率，可选，默认按影像尺寸规划
+        blockHeight: 金字塔切块的高度分辨率，可选，默认按影像尺寸规划
+        workers：并行切片的进程数，可选，默认为cpu核数
+        progress：进度回调函数 progress(level, done, total)，可选，在切片线程中调用
+        切片失败时抛出PyramidError
+        """
+        # PyramidBuilder依赖GDAL，在使用时导入
+        from PyramidBuilder import PyramidBuilder
+        builder = PyramidBuilder(tiffPath, tiffDir, levels, blockWidth, blockHeight, workers=workers, progress=progress)
+        return await asyncio.get_running_loop().run_in_executor(None, builder.build)
+
+    async def createPyramidTiffLayer(self, workspaceName, layerName, tiffPath, tiffDir, levels=None, blockWidth=None, blockHeight=None, workers=None, progress=None):
+        """
+        创建金字塔切片后的Tiff图层：适用于文件大小>=2GB的Tiff
+        workspaceName： 图层所在的工作空间的名称
+        layerName：图层的名称
+        tiffPath：tiff文件的路径
+        tiffDir：生成的金字塔文件夹的路径
+        level：金字塔层级，可选，默认按影像尺寸规划，见PyramidPlanner
+        blockWidth: 金字塔切块的宽度分辨率，可选，默认按影像尺寸规划
+        blockHeight: 金字塔切块的高度分辨率，可选，默认按影像尺寸规划
+        workers：并行切片的进程数，可选，默认为cpu核数
+        progress：进度回调函数 progress(level, done, total)，可选
+        return 格式同createShapeLayer
+        """
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+        try:
+            # 先对tiff进行切片，生成金字塔结构目录
+            try:
+                await self.createPyramidTiff(tiffPath, tiffDir, levels, blockWidth, blockHeight, workers, progress)
+            except Exception as e:
+                res["info"] = "切片错误：{0}".format(e)
+                return res
+
+            # 再创建金字塔数据图层
+            return await self.__createTiffLayer(workspaceName, layerName, tiffDir, True)
+        except Exception as e:
+            res["info"] = repr(e)
+            return res
+
+    async def publishJob(self, job):
+        """
+        执行单个发布任务
+        job：任务参数字典，格式见GeoServerService.publishJob
+        return 格式同GeoServerService.publishJob
+        """
+
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+
+        paras = dict(job)
+        jobType = paras.pop("type", None)
+        publishers = {
+            "shp": self.createShapeLayer,
+            "tiff": self.createTiffLayer,
+            "pyramid": self.createPyramidTiffLayer
+        }
+        if jobType not in publishers:
+            res["info"] = "不支持的任务类型：{0}".format(jobType)
+            return res
+
+        try:
+            return await publishers[jobType](**paras)
+        except Exception as e:
+            res["info"] = repr(e)
+            return res
+
+    async def batchPublish(self, jobs, workers=16):
+        """
+        并发批量发布图层，所有任务共用同一个连接池
+        jobs：任务参数字典的列表，格式见publishJob
+        workers：同时执行的任务数，可选，默认为16
+        return 与jobs顺序一致的结果列表
+        """
+
+        semaphore = asyncio.Semaphore(max(1, workers))
+
+        async def run(job):
+            async with semaphore:
+                return await self.publishJob(job)
+
+        return list(await asyncio.gather(*[run(job) for job in jobs]))
+
+    async def deleteLayer(self, workspaceName, layerName):
+        """
+        删除图层
+        workspaceName： 图层所在的工作空间的名称
+        layerName：图层的名称
+        """
+
+        if await self.isLayerExist(workspaceName, layerName):
+            await self.__cat.delete("layers/{0}".format(quote("{0}:{1}".format(workspaceName, layerName))), None, True)
+
+    async def getStyle(self, workspaceName, styleName):
+        """
+        通过名称获取样式
+        workspaceName： 样式所在的工作空间的名称
+        styleName：样式的名称
+        return dict
+        """
+
+        return await self.__cat.get_style(styleName, workspaceName)
+
+    async def isStyleExist(self, workspaceName, styleName):
+        """
+        判断样式是否存在
+        workspaceName： 样式所在的工作空间的名称
+        styleName：样式的名称
+        return True-存在;False-不存在
+        """
+
+        res = await self.getStyle(workspaceName, styleName)
+        return res is not None
+
+    async def createStyle(self, workspaceName, styleName, styleType, styleParas):
+        """
+        创建样式
+        workspaceName： 样式所在的工作空间的名称
+        styleName：样式的名称
+        styleType：样式的类型 point/polyline/line/polygon
+        styleParas: 样式的参数，格式见StyleTemplates.getStyleData
+        return {
+            status: 状态，success-创建成功;fail-创建失败
+            info: 信息, success-""; fail-不支持的样式类型
+            data: dict
+        }
+        """
+
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+
+        styleData = StyleTemplates.getStyleData(styleType, styleParas)
+        if styleData is None:
+            res["info"] = "不支持的样式类型"
+            return res
+
+        style = await self.__cat.create_style(styleName, styleData, overwrite=True, workspace=workspaceName)
+        res["status"] = "success"
+        res["data"] = style
+        return res
+
+    async def deleteStyle(self, workspaceName, styleName, recurse=True):
+        """
+        删除样式
+        workspaceName： 样式所在的工作空间的名称，全局样式为None
+        styleName：样式的名称
+        recurse：是否同时从使用该样式的图层中移除该样式，为False时样式仍被使用则删除失败并抛出异常，可选，默认为True
+        """
+
+        if await self.isStyleExist(workspaceName, styleName):
+            path = "workspaces/{0}/styles/{1}".format(quote(workspaceName), quote(styleName)) if workspaceName else "styles/{0}".format(quote(styleName))
+            await self.__cat.delete(path, None, recurse)
+
+    async def updateStyle(self, workspaceName, styleName, styleType, styleParas):
+        """
+        更新样式
+        workspaceName： 样式所在的工作空间的名称
+        styleName：样式的名称
+        styleType：样式的类型 point/polyline/line/polygon
+        styleParas: 样式的参数，格式见StyleTemplates.getStyleData
+        return {
+            status: 状态，success-创建成功;fail-创建失败
+            info: 信息, success-""; fail-样式不存在/不支持的样式类型
+            data: None
+        }
+        """
+
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+
+        if not await self.isStyleExist(workspaceName, styleName):
+            res["info"] = "样式不存在：{0}".format(styleName)
+            return res
+
+        data = StyleTemplates.getStyleData(styleType, styleParas)
+        if data is None:
+            res["info"] = "不支持的样式类型"
+            return res
+
+        await self.__cat.update_style_body(styleName, data, workspaceName)
+        res["status"] = "success"
+        return res
+
+    async def getWorkSpaces(self):
+        return await self.__cat.get_workspaces()
@@ -0,0 +1,81 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class CatalogCache(object):
+    """
+    GeoServer目录对象的查询缓存，带有效期和容量上限，线程安全
+    键为元组：("workspace", 工作空间名)、("store", 工作空间名, 存储名)、("layer", 工作空间名, 图层名)、("style", 工作空间名, 样式名)
+    值可以为None，表示对象不存在（负缓存）
+    超过容量时淘汰最久未使用的键
+    """
+    def __init__(self, ttl=60, maxSize=10000):
+        """
+        ttl：缓存有效期（秒），可选，默认为60，为0时不缓存
+        maxSize：最多缓存的键数，可选，默认为10000
+        """
+        self.ttl = ttl
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self.__items = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key):
+        """
+        return (是否命中, 值)
+        """
+
+        with self.__lock:
+            item = self.__items.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self.__items[key]
+                self.misses += 1
+                return False, None
+
+            self.__items.move_to_end(key)
+            self.hits += 1
+            return True, item[1]
+
+    def put(self, key, value):
+        if self.ttl <= 0:
+            return
+
+        with self.__lock:
+            self.__items[key] = (time.monotonic() + self.ttl, value)
+            self.__items.move_to_end(key)
+            while len(self.__items) > self.maxSize:
+                self.__items.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.__lock:
+            self.__items.pop(key, None)
+
+    def invalidatePrefix(self, prefix):
+        """
+        删除以prefix开头的所有键，例如("layer", "test")会删除工作空间test下所有图层的缓存
+        """
+
+        prefix = tuple(prefix)
+        with self.__lock:
+            for key in [key for key in self.__items if key[:len(prefix)] == prefix]:
+                del self.__items[key]
+
+    def clear(self):
+        with self.__lock:
+            self.__items.clear()
+
+    def cached(self, key, loader):
+        """
+        从缓存获取值，未命中时调用loader()获取并写入缓存
+        """
+
+        hit, value = self.get(key)
+        if hit:
+            return value
+
+        value = loader()
+        self.put(key, value)
+        return value
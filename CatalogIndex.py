@@ -0,0 +1,280 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree import ElementTree
+
+from geoserver.catalog import FailedRequestError
+
+
+class CatalogIndex(object):
+    """
+    GeoServer目录的内存索引
+    通过少量列表请求一次性加载工作空间、数据存储、栅格存储、图层、样式及其关联关系：
+    全局4个请求（工作空间列表、全局样式列表、图层列表、WMS能力文档），每个工作空间3个请求（数据存储、栅格存储、样式列表），
+    每个存储1个请求（要素类型或栅格列表），各工作空间和各存储的请求并发执行，请求数为O(工作空间数+存储数)
+    图层的样式从WMS能力文档中读取，能力文档不包括禁用和不公开的图层，这些图层标记为hidden，每个图层再用1个REST请求读取其样式
+    加载后按名称查询为O(1)，并支持"哪些图层使用了样式X"、"工作空间Y下哪些存储没有图层"等反向查询
+    """
+    def __init__(self):
+        # 工作空间名称 -> {name}
+        self.workspaces = {}
+        # (工作空间, 存储名称) -> {workspace, name, kind: dataStore/coverageStore}
+        self.stores = {}
+        # (工作空间, 图层名称) -> {workspace, name, store, kind: featureType/coverage/None, defaultStyle, styles,
+        #                        hidden: 是否不在WMS能力文档中（禁用或不公开）}
+        self.layers = {}
+        # (工作空间或None, 样式名称) -> {workspace, name}，全局样式的工作空间为None
+        self.styles = {}
+
+        self.__layersByStore = {}
+        self.__layersByStyle = {}
+
+    @classmethod
+    def load(cls, catalog, workers=8, hidden=True):
+        """
+        从geoserver加载目录索引
+        catalog：GeoServerCatalog对象
+        workers：并发请求的线程数，可选，默认为8
+        hidden：是否通过REST逐个读取不在WMS能力文档中的图层的样式，可选，默认为True；
+                为False时这些图层的defaultStyle为None、styles为空，反向查询不包括它们
+        return CatalogIndex
+        """
+
+        index = cls()
+        loader = _Loader(catalog)
+
+        for item in _items(loader.getJson("workspaces"), "workspaces", "workspace"):
+            index.workspaces[item["name"]] = {"name": item["name"]}
+        for item in _items(loader.getJson("styles"), "styles", "style"):
+            index.styles[(None, item["name"])] = {"workspace": None, "name": item["name"]}
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            layerList = executor.submit(loader.getJson, "layers")
+            capabilities = executor.submit(loader.getCapabilities)
+            workspaceLists = executor.map(loader.getWorkspaceLists, list(index.workspaces))
+            for workspaceName, lists in zip(list(index.workspaces), workspaceLists):
+                index.__addWorkspaceLists(workspaceName, lists)
+            # 工作空间级的要素类型和栅格列表的链接按请求路径生成，不包含存储名称，因此按存储分别列出
+            stores = sorted(index.stores)
+            storeLists = executor.map(loader.getStoreList, [index.stores[key] for key in stores])
+            for key, res in zip(stores, storeLists):
+                index.__addStoreList(index.stores[key], res)
+            layerList = layerList.result()
+            capabilities = capabilities.result()
+
+        for item in _items(layerList, "layers", "layer"):
+            workspaceName, name = _split(item["name"])
+            if workspaceName is not None and (workspaceName, name) not in index.layers:
+                index.layers[(workspaceName, name)] = _layer(workspaceName, name, None, None)
+
+        for key, layer in index.layers.items():
+            layer["hidden"] = "{0}:{1}".format(*key) not in capabilities
+        for qualifiedName, styleNames in capabilities.items():
+            workspaceName, name = _split(qualifiedName)
+            layer = index.layers.get((workspaceName, name))
+            if layer is None:
+                continue
+            layer["styles"] = [index.__styleKey(styleName, workspaceName) for styleName in styleNames]
+            layer["defaultStyle"] = layer["styles"][0] if layer["styles"] else None
+
+        if hidden:
+            keys = sorted(key for key, layer in index.layers.items() if layer["hidden"])
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+                docs = list(executor.map(loader.getLayer, ["{0}:{1}".format(*key) for key in keys]))
+            for key, doc in zip(keys, docs):
+                if doc is not None:
+                    index.__addLayerStyles(index.layers[key], doc)
+
+        index.__buildReverse()
+        return index
+
+    def __addWorkspaceLists(self, workspaceName, lists):
+        for kind, key in (("dataStore", "dataStores"), ("coverageStore", "coverageStores")):
+            for item in _items(lists[key], key, kind):
+                self.stores[(workspaceName, item["name"])] = {"workspace": workspaceName, "name": item["name"], "kind": kind}
+
+        for item in _items(lists["styles"], "styles", "style"):
+            self.styles[(workspaceName, item["name"])] = {"workspace": workspaceName, "name": item["name"]}
+
+    def __addStoreList(self, store, res):
+        kind = "featureType" if store["kind"] == "dataStore" else "coverage"
+        for item in _items(res, kind + "s", kind):
+            self.layers[(store["workspace"], item["name"])] = _layer(store["workspace"], item["name"], store["name"], kind)
+
+    def __addLayerStyles(self, layer, doc):
+        """
+        按REST图层信息设置样式：默认样式在前，其后为可选样式
+        """
+
+        default = doc.get("defaultStyle")
+        styles = [self.__linkKey(default, layer["workspace"])] if default else []
+        for item in _items(doc, "styles", "style"):
+            key = self.__linkKey(item, layer["workspace"])
+            if key not in styles:
+                styles.append(key)
+        layer["styles"] = styles
+        layer["defaultStyle"] = self.__linkKey(default, layer["workspace"]) if default else None
+
+    def __linkKey(self, link, layerWorkspace):
+        """
+        REST的样式链接：名称可能带工作空间前缀，或在workspace中给出
+        """
+
+        if link.get("workspace") and ":" not in link["name"]:
+            return link["workspace"], link["name"]
+        return self.__styleKey(link["name"], layerWorkspace)
+
+    def __styleKey(self, styleName, layerWorkspace):
+        """
+        能力文档中的样式名称可能不带工作空间前缀，此时优先匹配图层所在工作空间的样式，否则为全局样式
+        """
+
+        workspaceName, name = _split(styleName)
+        if workspaceName is None and (layerWorkspace, name) in self.styles:
+            workspaceName = layerWorkspace
+        return workspaceName, name
+
+    def __buildReverse(self):
+        self.__layersByStore = {}
+        self.__layersByStyle = {}
+        for key, layer in self.layers.items():
+            if layer["store"] is not None:
+                self.__layersByStore.setdefault((layer["workspace"], layer["store"]), set()).add(key)
+            for style in layer["styles"]:
+                self.__layersByStyle.setdefault(style, set()).add(key)
+
+    def getWorkspace(self, workspaceName):
+        return self.workspaces.get(workspaceName)
+
+    def getStore(self, workspaceName, storeName):
+        return self.stores.get((workspaceName, storeName))
+
+    def getLayer(self, workspaceName, layerName):
+        return self.layers.get((workspaceName, layerName))
+
+    def getStyle(self, workspaceName, styleName):
+        """
+        workspaceName：样式所在的工作空间的名称，全局样式为None
+        """
+
+        return self.styles.get((workspaceName, styleName))
+
+    def layersOfStore(self, workspaceName, storeName):
+        """
+        return 数据存储下的图层列表
+        """
+
+        return [self.layers[key] for key in sorted(self.__layersByStore.get((workspaceName, storeName), ()))]
+
+    def layersUsingStyle(self, styleName, workspaceName=None):
+        """
+        使用了指定样式（默认样式或可选样式）的图层列表
+        workspaceName：样式所在的工作空间的名称，全局样式为None
+        """
+
+        return [self.layers[key] for key in sorted(self.__layersByStyle.get((workspaceName, styleName), ()))]
+
+    def emptyStores(self, workspaceName=None):
+        """
+        没有图层的数据存储列表
+        workspaceName：只查询该工作空间，可选，默认查询全部
+        """
+
+        return [store for key, store in sorted(self.stores.items())
+                if (workspaceName is None or key[0] == workspaceName) and key not in self.__layersByStore]
+
+    def unusedStyles(self, workspaceName=None):
+        """
+        没有被任何图层使用的样式列表
+        workspaceName：只查询该工作空间的样式，可选，默认查询全部
+        """
+
+        return [style for key, style in sorted(self.styles.items(), key=lambda item: (item[0][0] or "", item[0][1]))
+                if (workspaceName is None or key[0] == workspaceName) and key not in self.__layersByStyle]
+
+
+class _Loader(object):
+    """
+    加载索引时使用的请求函数
+    """
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def getJson(self, path):
+        url = "{0}/{1}.json".format(self.catalog.service_url, path)
+        resp = self.catalog.http_request(url, headers={"Accept": "application/json"})
+        if resp.status_code == 404:
+            return None
+        if resp.status_code != 200:
+            raise FailedRequestError("Failed to get {0} : {1}, {2}".format(path, resp.status_code, resp.text))
+        return json.loads(resp.text) if resp.text else None
+
+    def getWorkspaceLists(self, workspaceName):
+        prefix = "workspaces/{0}/".format(workspaceName)
+        return {key: self.getJson(prefix + key.lower()) for key in ("dataStores", "coverageStores", "styles")}
+
+    def getStoreList(self, store):
+        """
+        return 数据存储下的要素类型列表，或栅格存储下的栅格列表
+        """
+
+        if store["kind"] == "dataStore":
+            path = "workspaces/{0}/datastores/{1}/featuretypes"
+        else:
+            path = "workspaces/{0}/coveragestores/{1}/coverages"
+        return self.getJson(path.format(store["workspace"], store["name"]))
+
+    def getLayer(self, qualifiedName):
+        """
+        return REST的图层信息，图层不存在时为None
+        """
+
+        res = self.getJson("layers/{0}".format(qualifiedName))
+        return None if res is None else res["layer"]
+
+    def getCapabilities(self):
+        """
+        从WMS能力文档中读取每个图层的样式，第一个样式为默认样式
+        return {工作空间:图层名称: [样式名称]}
+        """
+
+        url = "{0}/wms?service=WMS&version=1.3.0&request=GetCapabilities".format(self.catalog.service_url.rsplit("/rest", 1)[0])
+        resp = self.catalog.http_request(url, headers={})
+        if resp.status_code != 200:
+            raise FailedRequestError("Failed to get WMS capabilities : {0}, {1}".format(resp.status_code, resp.text))
+
+        ns = {"wms": "http://www.opengis.net/wms"}
+        root = ElementTree.fromstring(resp.content)
+        styles = {}
+        for layer in root.iter("{http://www.opengis.net/wms}Layer"):
+            name = layer.find("wms:Name", ns)
+            if name is None or not name.text:
+                continue
+            styles[name.text] = [style.text for style in layer.findall("wms:Style/wms:Name", ns)]
+        return styles
+
+
+def _layer(workspaceName, name, store, kind):
+    return {"workspace": workspaceName, "name": name, "store": store, "kind": kind, "defaultStyle": None, "styles": [], "hidden": False}
+
+
+def _split(qualifiedName):
+    """
+    拆分"工作空间:名称"形式的名称
+    return (工作空间, 名称)，不带前缀时工作空间为None
+    """
+
+    if ":" in qualifiedName:
+        workspaceName, name = qualifiedName.split(":", 1)
+        return workspaceName, name
+    return None, qualifiedName
+
+
+def _items(res, collection, item):
+    """
+    GeoServer列表接口在为空时返回空字符串而不是空列表，此处统一为列表
+    """
+
+    if not res or not isinstance(res.get(collection), dict):
+        return []
+    items = res[collection].get(item, [])
+    return items if isinstance(items, list) else [items]
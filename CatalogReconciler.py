@@ -0,0 +1,410 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# 各类型图层的源文件参数，源文件变化时重新发布
+_SOURCE_KEYS = {
+    "shp": ("shapePath",),
+    "gpkg": ("shapePath",),
+    "tiff": ("tiffPath",),
+    "pyramid": ("tiffPath",),
+    "cog": ("tiffPath",),
+    "mosaic": ("mosaicDir",)
+}
+
+_SHAPE_EXTENSIONS = (".shp", ".shx", ".dbf", ".prj", ".cpg")
+
+# 镶嵌文件夹中由MosaicBuilder或geoserver生成的文件，不计入指纹；镶嵌索引和配置以"文件夹名."开头
+_MOSAIC_GENERATED = ("indexer.properties", "timeregex.properties", "datastore.properties", "sample_image", "sample_image.dat")
+
+
+class ReconcileError(Exception):
+    """
+    目标状态文件错误
+    """
+    pass
+
+
+def fileFingerprint(path):
+    """
+    文件指纹：大小和修改时间，shapefile包括其全部附属文件，文件夹为其中全部影像的摘要；文件不存在时为None
+    """
+
+    if os.path.isdir(path):
+        return _dirFingerprint(path)
+    base, ext = os.path.splitext(path)
+    paths = [base + e for e in _SHAPE_EXTENSIONS] if ext.lower() in ("", ".shp") else [path]
+    stats = []
+    for item in paths:
+        if os.path.exists(item):
+            stat = os.stat(item)
+            stats.append([os.path.basename(item), stat.st_size, stat.st_mtime_ns])
+    return stats or None
+
+
+def _dirFingerprint(path):
+    """
+    镶嵌文件夹的指纹：[[文件夹名, 文件数, 全部文件的相对路径、大小和修改时间的摘要]]，不包括生成的索引和配置
+    """
+
+    name = os.path.basename(os.path.normpath(path))
+    stats = []
+    for root, dirs, files in os.walk(path):
+        for item in files:
+            if item in _MOSAIC_GENERATED or item.startswith(name + ".") or item.endswith(".tmp"):
+                continue
+            stat = os.stat(os.path.join(root, item))
+            stats.append([os.path.relpath(os.path.join(root, item), path), stat.st_size, stat.st_mtime_ns])
+    return [[name, len(stats), _digest(sorted(stats))]] if stats else None
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class CatalogReconciler(object):
+    """
+    声明式的目录同步：按目标状态文件（工作空间、图层、样式）与geoserver当前目录对比，生成计划，只执行需要的创建、更新和删除
+    每个图层的指纹由发布参数和源文件的大小、修改时间组成，保存在状态文件中，源文件和参数都未变化的图层不会重新上传或切片
+    只有源文件变化时原位更新图层：shp、tiff重新上传并替换数据存储中的数据，金字塔按切片清单增量切片，图层的样式等配置保持不变；
+    发布参数变化、其他类型的图层或原位更新失败时先删除再重新发布，只影响发生变化的图层
+
+    目标状态文件为json：
+    {
+        "workspaces": {
+            "工作空间名称": {
+                "prune": 是否删除目标状态中没有的图层和样式，可选，默认为false,
+                "styles": {
+                    "样式名称": {"type": point/line/polygon, "paras": 样式参数, "classify": 可选，{shapePath, field, method, classes, charset}}
+                },
+                "layers": {
+                    "图层名称": {"type": shp/gpkg/tiff/pyramid/cog/mosaic, 其余为publishJob的参数, "style": 可选，默认样式名称，"工作空间:样式"或全局样式名称}
+                }
+            }
+        }
+    }
+    """
+    def __init__(self, service, statePath, workers=4, adopt=True):
+        """
+        service：GeoServerService对象
+        statePath：指纹状态文件的路径，不存在时自动创建
+        workers：并发执行的线程数，可选，默认为4
+        adopt：目标状态中的图层已存在但状态文件中没有记录时（例如首次同步），是否直接记录其指纹而不重新发布，可选，默认为True
+        """
+        self.service = service
+        self.statePath = statePath
+        self.workers = workers
+        self.adopt = adopt
+        self.__lock = threading.Lock()
+        self.state = self.__loadState()
+
+    @staticmethod
+    def loadSpec(path):
+        with open(path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+        if not isinstance(spec.get("workspaces"), dict):
+            raise ReconcileError("目标状态缺少workspaces：{0}".format(path))
+        for workspaceName, workspace in spec["workspaces"].items():
+            for layerName, layer in workspace.get("layers", {}).items():
+                if layer.get("type") not in _SOURCE_KEYS:
+                    raise ReconcileError("不支持的图层类型：{0}:{1} {2}".format(workspaceName, layerName, layer.get("type")))
+        return spec
+
+    def __loadState(self):
+        if not os.path.exists(self.statePath):
+            return {"layers": {}, "jobs": {}, "styles": {}}
+        with open(self.statePath, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        state.setdefault("layers", {})
+        # 图层发布参数（不含源文件）的指纹，用于判断是否只有源文件变化
+        state.setdefault("jobs", {})
+        state.setdefault("styles", {})
+        return state
+
+    def saveState(self):
+        # 写入和替换都在锁内，并发保存时不会替换另一个线程正在写入的临时文件
+        with self.__lock:
+            tempPath = self.statePath + ".tmp"
+            with open(tempPath, "w", encoding="utf-8") as f:
+                json.dump(self.state, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(tempPath, self.statePath)
+
+    def __record(self, kind, key, fingerprint):
+        with self.__lock:
+            if fingerprint is None:
+                self.state[kind].pop(key, None)
+            else:
+                self.state[kind][key] = fingerprint
+
+    @staticmethod
+    def layerFingerprint(layer):
+        """
+        return 图层的指纹，源文件不存在时为None
+        """
+
+        job = {key: value for key, value in layer.items() if key != "style"}
+        sources = {}
+        for key in _SOURCE_KEYS[layer["type"]]:
+            fingerprint = fileFingerprint(layer[key]) if layer.get(key) else None
+            if fingerprint is None:
+                return None
+            sources[key] = fingerprint
+        return _digest({"job": job, "sources": sources})
+
+    @staticmethod
+    def jobFingerprint(layer):
+        """
+        return 图层发布参数的指纹，不包括源文件
+        """
+
+        return _digest({key: value for key, value in layer.items() if key != "style"})
+
+    @staticmethod
+    def styleFingerprint(style):
+        spec = dict(style)
+        classify = spec.get("classify")
+        if classify and classify.get("shapePath"):
+            spec["source"] = fileFingerprint(classify["shapePath"])
+        return _digest(spec)
+
+    def plan(self, spec):
+        """
+        对比目标状态与当前目录
+        return 操作列表 [{action, kind, workspace, name, reason}]，按执行顺序排列
+               action：create/update/delete/adopt/style，kind：workspace/style/layer
+        """
+
+        index = self.service.loadCatalogIndex()
+        actions = []
+        for workspaceName in sorted(spec["workspaces"]):
+            if index.getWorkspace(workspaceName) is None:
+                actions.append(_action("create", "workspace", workspaceName, None, "工作空间不存在"))
+
+        for workspaceName, workspace in sorted(spec["workspaces"].items()):
+            for styleName, style in sorted(workspace.get("styles", {}).items()):
+                key = "{0}:{1}".format(workspaceName, styleName)
+                fingerprint = self.styleFingerprint(style)
+                if index.getStyle(workspaceName, styleName) is None:
+                    actions.append(_action("create", "style", workspaceName, styleName, "样式不存在", fingerprint))
+                elif self.state["styles"].get(key) != fingerprint:
+                    actions.append(_action("update", "style", workspaceName, styleName, "样式参数或源文件变化", fingerprint))
+
+        for workspaceName, workspace in sorted(spec["workspaces"].items()):
+            for layerName, layer in sorted(workspace.get("layers", {}).items()):
+                key = "{0}:{1}".format(workspaceName, layerName)
+                fingerprint = self.layerFingerprint(layer)
+                current = index.getLayer(workspaceName, layerName)
+                publish = None
+                if fingerprint is None:
+                    actions.append(_action("error", "layer", workspaceName, layerName, "源文件不存在"))
+                elif current is None:
+                    publish = _action("create", "layer", workspaceName, layerName, "图层不存在", fingerprint)
+                elif key not in self.state["layers"] and self.adopt:
+                    actions.append(_action("adopt", "layer", workspaceName, layerName, "记录已存在图层的指纹", fingerprint))
+                elif self.state["layers"].get(key) != fingerprint:
+                    inPlace = layer["type"] in _IN_PLACE and self.state["jobs"].get(key) == self.jobFingerprint(layer)
+                    publish = _action("update", "layer", workspaceName, layerName, "源文件变化，原位更新" if inPlace else "发布参数变化", fingerprint)
+                    publish["inPlace"] = inPlace
+                if publish is not None:
+                    actions.append(publish)
+
+                # 重新发布的图层恢复为自动生成的默认样式，需要重新设置
+                if layer.get("style") and fingerprint is not None:
+                    target = _styleKey(layer["style"], workspaceName, workspace)
+                    if publish is not None or current["defaultStyle"] != target:
+                        action = _action("style", "layer", workspaceName, layerName, "默认样式设为{0}".format(layer["style"]))
+                        action["style"] = target
+                        actions.append(action)
+
+        # 目标状态中任一图层使用的样式，包括其他工作空间的图层以"工作空间:样式"引用的样式，不会被删除
+        referenced = set()
+        for workspaceName, workspace in spec["workspaces"].items():
+            for layer in workspace.get("layers", {}).values():
+                if layer.get("style"):
+                    referenced.add(_styleKey(layer["style"], workspaceName, workspace))
+
+        for workspaceName, workspace in sorted(spec["workspaces"].items()):
+            if not workspace.get("prune"):
+                continue
+            layers = workspace.get("layers", {})
+            for (ws, layerName) in sorted(index.layers):
+                if ws == workspaceName and layerName not in layers:
+                    actions.append(_action("delete", "layer", workspaceName, layerName, "不在目标状态中"))
+            styles = workspace.get("styles", {})
+            for (ws, styleName) in sorted(key for key in index.styles if key[0] is not None):
+                if ws == workspaceName and styleName not in styles and (ws, styleName) not in referenced:
+                    actions.append(_action("delete", "style", workspaceName, styleName, "不在目标状态中"))
+        return sorted(actions, key=_phaseOf)
+
+    def apply(self, spec, actions=None, progress=None):
+        """
+        执行计划：依次创建工作空间、同步样式、同步图层、设置默认样式、删除多余的图层和样式，每个阶段内并发执行
+        actions：plan返回的操作列表，可选，默认重新生成
+        progress：每个操作完成后的回调函数 progress(action, result)，可选
+        return 操作列表，每个操作增加result键，格式为{status, info, data}
+        """
+
+        if actions is None:
+            actions = self.plan(spec)
+
+        failed = set()
+        try:
+            for phase in range(len(_PHASES)):
+                items = [a for a in actions if _phaseOf(a) == phase]
+                with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+                    for action, result in zip(items, executor.map(lambda a: self.__run(spec, a, failed), items)):
+                        action["result"] = result
+                        if result["status"] != "success":
+                            failed.add((action["workspace"], action["name"]))
+                        if progress is not None:
+                            progress(action, result)
+        finally:
+            self.saveState()
+        return actions
+
+    def __run(self, spec, action, failed):
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+
+        workspaceName, name = action["workspace"], action["name"]
+        workspace = spec["workspaces"].get(workspaceName, {})
+        key = "{0}:{1}".format(workspaceName, name)
+        try:
+            if action["kind"] == "workspace":
+                return self.service.createWorkspace(workspaceName)
+
+            if action["kind"] == "style":
+                if action["action"] == "delete":
+                    # 仍被图层使用的样式删除失败，不从图层中移除
+                    self.service.deleteStyle(workspaceName, name, recurse=False)
+                    self.__record("styles", key, None)
+                    res["status"] = "success"
+                    return res
+                res = self.__syncStyle(workspaceName, name, workspace["styles"][name])
+                if res["status"] == "success":
+                    self.__record("styles", key, action["fingerprint"])
+                return res
+
+            if action["action"] == "error":
+                res["info"] = action["reason"]
+                return res
+            if action["action"] == "adopt":
+                self.__record("layers", key, action["fingerprint"])
+                self.__record("jobs", key, self.jobFingerprint(workspace["layers"][name]))
+                res["status"] = "success"
+                return res
+            if action["action"] == "delete":
+                self.service.deleteLayer(workspaceName, name)
+                self.service.deleteStore(workspaceName, name)
+                self.__record("layers", key, None)
+                self.__record("jobs", key, None)
+                res["status"] = "success"
+                return res
+            if action["action"] == "style":
+                if (workspaceName, name) in failed:
+                    res["info"] = "图层发布失败，未设置样式"
+                    return res
+                styleWorkspaceName, styleName = action["style"]
+                return self.service.setLayerStyle(workspaceName, name, styleName, styleWorkspaceName)
+
+            # create/update
+            job = {k: v for k, v in workspace["layers"][name].items() if k != "style"}
+            job.update({"workspaceName": workspaceName, "layerName": name})
+            res = None
+            if action.get("inPlace"):
+                res = self.__update(job)
+            if action["action"] == "update" and (res is None or res["status"] != "success"):
+                self.service.deleteLayer(workspaceName, name)
+                self.service.deleteStore(workspaceName, name)
+                self.__record("layers", key, None)
+                res = None
+            if res is None:
+                res = self.service.publishJob(job)
+            if res["status"] == "success":
+                self.__record("layers", key, action["fingerprint"])
+                self.__record("jobs", key, self.jobFingerprint(workspace["layers"][name]))
+                self.saveState()
+            return res
+        except Exception as e:
+            res["info"] = repr(e)
+            return res
+
+    def __update(self, job):
+        """
+        原位更新只有源文件变化的图层，发布参数沿用job
+        return 格式见对应的更新函数
+        """
+
+        workspaceName, layerName = job["workspaceName"], job["layerName"]
+        if job["type"] == "shp":
+            return self.service.updateShapeLayer(workspaceName, layerName, job["shapePath"], job.get("charset"), job.get("streaming", True))
+        if job["type"] == "tiff":
+            return self.service.updateTiffLayer(workspaceName, layerName, job["tiffPath"], job.get("upload", False),
+                                                targetCrs=job.get("targetCrs"), warpedPath=job.get("warpedPath"))
+        options = {k: job[k] for k in ("workers", "rescale", "stretch", "scale", "sparse", "targetCrs", "warpedPath") if k in job}
+        return self.service.updatePyramidTiffLayer(workspaceName, layerName, job["tiffPath"], job["tiffDir"], **options)
+
+    def __syncStyle(self, workspaceName, styleName, style):
+        classify = style.get("classify")
+        if classify:
+            return self.service.createClassifiedStyle(workspaceName, styleName, style["type"], classify["shapePath"], classify["field"],
+                                                      classify.get("method", "quantile"), classify.get("classes", 5), style.get("paras"),
+                                                      classify.get("charset"))
+        return self.service.createStyle(workspaceName, styleName, style["type"], style.get("paras", {}))
+
+
+# 可以原位更新的图层类型，其他类型删除后重新发布
+_IN_PLACE = ("shp", "tiff", "pyramid")
+
+# 执行阶段：创建工作空间、同步样式、同步图层、设置默认样式、删除图层、删除样式
+_PHASES = [
+    lambda a: a["kind"] == "workspace",
+    lambda a: a["kind"] == "style" and a["action"] != "delete",
+    lambda a: a["kind"] == "layer" and a["action"] in ("create", "update", "adopt", "error"),
+    lambda a: a["action"] == "style",
+    lambda a: a["kind"] == "layer" and a["action"] == "delete",
+    lambda a: a["kind"] == "style" and a["action"] == "delete"
+]
+
+
+def _phaseOf(action):
+    return next(i for i, phase in enumerate(_PHASES) if phase(action))
+
+
+def _action(action, kind, workspaceName, name, reason, fingerprint=None):
+    return {"action": action, "kind": kind, "workspace": workspaceName, "name": name, "reason": reason, "fingerprint": fingerprint}
+
+
+def _styleKey(styleName, workspaceName, workspace):
+    """
+    return (样式所在的工作空间或None, 样式名)；不带工作空间前缀时，目标状态中定义的样式属于本工作空间，否则为全局样式
+    """
+
+    if ":" in styleName:
+        return tuple(styleName.split(":", 1))
+    if styleName in workspace.get("styles", {}):
+        return workspaceName, styleName
+    return None, styleName
+
+
+def formatPlan(actions):
+    """
+    return 计划的文本，每行一个操作
+    """
+
+    if not actions:
+        return "目录与目标状态一致，无需操作"
+    lines = []
+    for action in actions:
+        name = action["workspace"] if action["name"] is None else "{0}:{1}".format(action["workspace"], action["name"])
+        line = "{0:<7} {1:<9} {2:<40} {3}".format(action["action"], action["kind"], name, action["reason"])
+        if "result" in action:
+            line += "  [{0}{1}]".format(action["result"]["status"], " " + action["result"]["info"] if action["result"]["info"] else "")
+        lines.append(line)
+    return "\n".join(lines)
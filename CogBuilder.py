@@ -0,0 +1,116 @@
+import os
+
+from osgeo import gdal
+
+
+class CogError(Exception):
+    """
+    COG转换错误
+    """
+    pass
+
+
+class CogBuilder(object):
+    """
+    将TIFF转换为云优化GeoTIFF（Cloud-Optimized GeoTIFF，COG）
+    COG是内部分块并带有多级概视图的单个GeoTIFF文件，可直接用"GeoTIFF"类型的栅格存储发布，
+    不需要ImagePyramid插件，也不会生成大量切片文件
+    压缩和概视图的生成由GDAL多线程并行完成
+    """
+    def __init__(self, tiffPath, cogPath, blockSize=512, compress="DEFLATE", resampling="BILINEAR", workers=None, progress=None):
+        """
+        tiffPath：tiff文件的路径
+        cogPath：生成的COG文件的路径
+        blockSize：内部分块的分辨率，可选，默认为512
+        compress：压缩方式，可选，默认为DEFLATE
+        resampling：概视图的重采样方式，可选，默认为BILINEAR
+        workers：并行的线程数，可选，默认为cpu核数
+        progress：进度回调函数 progress(complete)，complete为0~1之间的完成比例，可选
+        """
+        self.tiffPath = tiffPath
+        self.cogPath = cogPath
+        self.blockSize = blockSize
+        self.compress = compress
+        self.resampling = resampling
+        self.workers = workers or os.cpu_count() or 1
+        self.progress = progress
+
+    def build(self):
+        """
+        生成COG文件
+        return cogPath
+        """
+
+        gdal.UseExceptions()
+        try:
+            src = gdal.Open(self.tiffPath)
+        except RuntimeError as e:
+            raise CogError("无法打开tiff文件：{0}，{1}".format(self.tiffPath, e))
+
+        callback = None
+        if self.progress is not None:
+            def callback(complete, message, data):
+                self.progress(complete)
+                return 1
+
+        folder = os.path.dirname(os.path.abspath(self.cogPath))
+        os.makedirs(folder, exist_ok=True)
+
+        try:
+            if gdal.GetDriverByName("COG") is not None:
+                self.__buildWithCogDriver(src, callback)
+            else:
+                self.__buildWithGTiffDriver(src, callback)
+        except RuntimeError as e:
+            raise CogError("COG转换失败：{0}，{1}".format(self.tiffPath, e))
+        finally:
+            src = None
+
+        return self.cogPath
+
+    def __buildWithCogDriver(self, src, callback):
+        """
+        GDAL>=3.1：使用COG驱动一次完成分块、压缩和概视图
+        """
+
+        options = [
+            "BLOCKSIZE={0}".format(self.blockSize),
+            "COMPRESS={0}".format(self.compress),
+            "OVERVIEW_RESAMPLING={0}".format(self.resampling),
+            "NUM_THREADS={0}".format(self.workers),
+            "BIGTIFF=IF_SAFER"
+        ]
+        ds = gdal.Translate(self.cogPath, src, format="COG", creationOptions=options, callback=callback)
+        ds = None
+
+    def __buildWithGTiffDriver(self, src, callback):
+        """
+        GDAL<3.1：先生成分块的GTiff，再在其中建立概视图
+        """
+
+        options = [
+            "TILED=YES",
+            "BLOCKXSIZE={0}".format(self.blockSize),
+            "BLOCKYSIZE={0}".format(self.blockSize),
+            "COMPRESS={0}".format(self.compress),
+            "NUM_THREADS={0}".format(self.workers),
+            "BIGTIFF=IF_SAFER"
+        ]
+        ds = gdal.Translate(self.cogPath, src, format="GTiff", creationOptions=options, callback=callback)
+
+        # 概视图逐级减半，直到最小一级不超过一个分块
+        factors = []
+        factor = 2
+        while max(ds.RasterXSize, ds.RasterYSize) / factor > self.blockSize / 2:
+            factors.append(factor)
+            factor *= 2
+
+        gdal.SetConfigOption("GDAL_NUM_THREADS", str(self.workers))
+        gdal.SetConfigOption("COMPRESS_OVERVIEW", self.compress)
+        try:
+            if factors:
+                ds.BuildOverviews(self.resampling, factors, callback=callback)
+        finally:
+            gdal.SetConfigOption("GDAL_NUM_THREADS", None)
+            gdal.SetConfigOption("COMPRESS_OVERVIEW", None)
+        ds = None
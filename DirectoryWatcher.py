@@ -0,0 +1,454 @@
+import os
+import re
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from CatalogReconciler import fileFingerprint
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+
+# shapefile的组成文件，任一文件变化都视为该shapefile变化
+_SHAPE_EXTENSIONS = (".shp", ".shx", ".dbf", ".prj", ".cpg")
+
+# 发布shapefile必需的文件，.prj是可选的
+_REQUIRED_EXTENSIONS = (".shp", ".shx", ".dbf")
+
+_TIFF_EXTENSIONS = (".tif", ".tiff")
+
+# 发布过程中生成的tiff，不作为新数据发布
+_GENERATED_SUFFIXES = (".warped.tif", ".tmp.tif")
+
+
+class DirectoryWatcher(object):
+    """
+    监视投放文件夹，自动发布新增和变化的shapefile和tiff
+    安装了watchdog时按文件系统事件触发，否则定期轮询文件的大小和修改时间；
+    文件在settle秒内没有再变化（写入完成）且shapefile的必需文件（shp、shx、dbf）都已到齐后才发布，
+    tiff小于pyramidSize时按普通GeoTIFF发布，否则切片后按金字塔发布；发布任务由有上限的线程池执行，同一数据不会同时发布
+    每个数据的图层名称和指纹（各文件的大小和修改时间）保存在状态文件中，重启后未变化的数据不会重新发布；
+    变化的金字塔图层按切片清单增量更新，其他图层删除后重新发布
+    图层名称为相对监视文件夹的路径（不含扩展名），见layerNameOf；名称已被另一个数据使用时不发布，按conflict回调
+    """
+    def __init__(self, service, folders, workspaceName, statePath, charset="utf-8", pyramidSize=2 * 1024 * 1024 * 1024, pyramidDir=None,
+                 settle=5.0, workers=2, pollInterval=10.0, polling=None, adopt=True, prune=False, incompleteTimeout=600, progress=None):
+        """
+        service：GeoServerService对象
+        folders：监视的文件夹列表，包括子文件夹
+        workspaceName：发布图层的工作空间的名称
+        statePath：指纹状态文件的路径，不存在时自动创建
+        charset：shapefile的dbf字符集，可选，默认为utf-8
+        pyramidSize：按金字塔发布的tiff的最小字节数，可选，默认为2GB
+        pyramidDir：金字塔文件夹的上级文件夹，每个tiff的金字塔为其中的"图层名称"文件夹，不能位于监视的文件夹内，
+                    可选，默认为状态文件旁的pyramids文件夹
+        settle：文件最后一次变化后等待的秒数，可选，默认为5
+        workers：并发发布的线程数，可选，默认为2
+        pollInterval：轮询的间隔（秒），可选，默认为10
+        polling：是否使用轮询，可选，默认在未安装watchdog时使用
+        adopt：图层已存在但状态文件中没有记录时（例如首次运行），是否直接记录其指纹而不重新发布，可选，默认为True
+        prune：数据文件被删除时是否删除对应的图层，可选，默认为False
+        incompleteTimeout：shapefile缺少必需文件超过该秒数后不再等待，按incomplete回调，可选，默认为600
+        progress：每个数据处理后的回调函数 progress(path, action, res)，可选
+                  action：create-发布;update-更新;adopt-记录已有图层;skip-未变化;delete-删除图层;
+                          conflict-图层名称已被另一个数据使用，未发布;incomplete-shapefile缺少必需文件，未发布;error-发布出错
+        """
+        self.service = service
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        self.workspaceName = workspaceName
+        self.statePath = statePath
+        self.charset = charset
+        self.pyramidSize = pyramidSize
+        self.pyramidDir = os.path.abspath(pyramidDir or os.path.join(os.path.dirname(os.path.abspath(statePath)), "pyramids"))
+        self.settle = settle
+        self.workers = workers
+        self.pollInterval = pollInterval
+        self.polling = Observer is None if polling is None else polling
+        self.adopt = adopt
+        self.prune = prune
+        self.incompleteTimeout = incompleteTimeout
+        self.progress = progress
+
+        for folder in self.folders:
+            if _isUnder(self.pyramidDir, folder):
+                raise ValueError("金字塔文件夹不能位于监视的文件夹内：{0}".format(self.pyramidDir))
+        if not self.polling and Observer is None:
+            raise ImportError("未安装watchdog，请使用轮询方式：polling=True")
+
+        self.__lock = threading.Lock()
+        # 数据路径 -> {time: 最后一次变化的时间, fingerprint: 当时的指纹}
+        self.__pending = {}
+        self.__running = set()
+        # 正在发布的图层名称 -> 数据路径，防止同名的新数据同时发布
+        self.__claims = {}
+        self.__snapshot = {}
+        self.__stopping = threading.Event()
+        self.__threads = []
+        self.__observer = None
+        self.__executor = None
+        self.state = self.__loadState()
+
+    def __loadState(self):
+        if not os.path.exists(self.statePath):
+            return {"layers": {}}
+        with open(self.statePath, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        state.setdefault("layers", {})
+        return state
+
+    def saveState(self):
+        # 写入和替换都在锁内，发布线程同时保存时不会替换另一个线程正在写入的临时文件
+        with self.__lock:
+            tempPath = self.statePath + ".tmp"
+            with open(tempPath, "w", encoding="utf-8") as f:
+                json.dump(self.state, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(tempPath, self.statePath)
+
+    # ---------- 事件 ----------
+
+    def dataPath(self, path):
+        """
+        return 文件所属的数据路径：shapefile的组成文件为其.shp路径，tiff为其自身；不需要发布的文件为None
+        """
+
+        path = os.path.abspath(path)
+        base, ext = os.path.splitext(path)
+        ext = ext.lower()
+        if _isUnder(path, self.pyramidDir) or path.lower().endswith(_GENERATED_SUFFIXES):
+            return None
+        if ext in _SHAPE_EXTENSIONS:
+            return base + ".shp"
+        if ext in _TIFF_EXTENSIONS:
+            return path
+        return None
+
+    def touch(self, path):
+        """
+        记录文件的变化，settle秒内没有再变化后发布
+        """
+
+        key = self.dataPath(path)
+        if key is None:
+            return
+        with self.__lock:
+            self.__pending[key] = {"time": time.monotonic(), "fingerprint": fileFingerprint(key)}
+
+    def scan(self):
+        """
+        扫描监视的文件夹，记录全部数据，启动时用于发布停止期间新增和变化的数据，未变化的数据按状态文件跳过
+        return 数据数
+        """
+
+        keys = set()
+        for folder in self.folders:
+            for root, dirs, files in os.walk(folder):
+                for name in files:
+                    key = self.dataPath(os.path.join(root, name))
+                    if key is not None:
+                        keys.add(key)
+        for key in keys:
+            self.touch(key)
+        # 状态文件中记录、但文件已被删除的数据
+        if self.prune:
+            with self.__lock:
+                recorded = [key for key in self.state["layers"] if not os.path.exists(key) and any(_isUnder(key, folder) for folder in self.folders)]
+            for key in recorded:
+                self.touch(key)
+        return len(keys)
+
+    def poll(self):
+        """
+        轮询一次：对比全部数据文件的大小和修改时间，记录有变化的文件
+        """
+
+        snapshot = {}
+        for folder in self.folders:
+            for root, dirs, files in os.walk(folder):
+                for name in files:
+                    path = os.path.join(root, name)
+                    if self.dataPath(path) is None:
+                        continue
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+        for path in set(snapshot) | set(self.__snapshot):
+            if snapshot.get(path) != self.__snapshot.get(path):
+                self.touch(path)
+        self.__snapshot = snapshot
+
+    # ---------- 调度 ----------
+
+    def dispatch(self):
+        """
+        提交已稳定的数据：settle秒内指纹没有变化、shapefile的必需文件已到齐，且没有正在发布
+        return 提交的数据路径列表
+        """
+
+        now = time.monotonic()
+        ready = []
+        incomplete = []
+        with self.__lock:
+            for key, item in list(self.__pending.items()):
+                if now - item["time"] < self.settle or key in self.__running:
+                    continue
+                fingerprint = fileFingerprint(key)
+                if fingerprint != item["fingerprint"]:
+                    # 仍在写入
+                    self.__pending[key] = {"time": now, "fingerprint": fingerprint}
+                    continue
+                if fingerprint is not None and key.endswith(".shp") and _missingFiles(key):
+                    # 缺少必需文件的shapefile等待其余文件到达，超时后放弃，避免一直处于等待状态
+                    if now - item["time"] >= self.incompleteTimeout:
+                        del self.__pending[key]
+                        incomplete.append(key)
+                    continue
+                del self.__pending[key]
+                self.__running.add(key)
+                ready.append(key)
+        for key in ready:
+            self.__executor.submit(self.__process, key)
+        if self.progress is not None:
+            for key in incomplete:
+                self.progress(key, "incomplete", {"status": "fail", "info": "shapefile缺少必需文件：{0}".format(", ".join(_missingFiles(key))), "data": None})
+        return ready
+
+    def __process(self, key):
+        try:
+            action, res = self.publish(key)
+        except Exception as e:
+            action, res = "error", {"status": "fail", "info": repr(e), "data": None}
+        finally:
+            with self.__lock:
+                self.__running.discard(key)
+        if self.progress is not None:
+            self.progress(key, action, res)
+
+    def publish(self, key):
+        """
+        按指纹发布、更新或删除一个数据的图层
+        return (action, res)
+        """
+
+        res = {
+            "status": "success",
+            "info": "",
+            "data": None
+        }
+
+        fingerprint = fileFingerprint(key)
+        layerName = self.layerNameOf(key)
+        with self.__lock:
+            record = self.state["layers"].get(key)
+            owner = self.__ownerOf(layerName, key)
+            if owner is None:
+                self.__claims[layerName] = key
+        if owner is not None:
+            res["status"] = "fail"
+            res["info"] = "图层名称{0}已被{1}使用".format(layerName, owner)
+            return "conflict", res
+
+        try:
+            return self.__publish(key, layerName, record, fingerprint, res)
+        finally:
+            with self.__lock:
+                self.__claims.pop(layerName, None)
+
+    def __ownerOf(self, layerName, key):
+        """
+        return 使用该图层名称的另一个数据路径，没有时为None
+        """
+
+        claimed = self.__claims.get(layerName)
+        if claimed is not None and claimed != key:
+            return claimed
+        return next((other for other, record in self.state["layers"].items() if record["layer"] == layerName and other != key), None)
+
+    def __publish(self, key, layerName, record, fingerprint, res):
+        if fingerprint is None:
+            if not self.prune or record is None:
+                return "skip", res
+            self.service.deleteLayer(self.workspaceName, layerName)
+            self.service.deleteStore(self.workspaceName, layerName)
+            self.__record(key, layerName, None)
+            return "delete", res
+
+        if record is not None and record["fingerprint"] == fingerprint:
+            return "skip", res
+
+        exists = self.service.isLayerExist(self.workspaceName, layerName)
+        if exists and record is None and self.adopt:
+            self.__record(key, layerName, fingerprint)
+            return "adopt", res
+
+        job = self.job(key)
+        if job["type"] == "pyramid":
+            # 切片清单保存在金字塔文件夹旁
+            os.makedirs(self.pyramidDir, exist_ok=True)
+        action = "update" if exists else "create"
+        res = None
+        if exists and job["type"] == "pyramid":
+            # 金字塔图层按切片清单增量更新，结构变化时删除后重新发布
+            res = self.service.updatePyramidTiffLayer(self.workspaceName, layerName, key, job["tiffDir"])
+        if exists and (res is None or res["status"] != "success"):
+            self.service.deleteLayer(self.workspaceName, layerName)
+            self.service.deleteStore(self.workspaceName, layerName)
+        if res is None or res["status"] != "success":
+            res = self.service.publishJob(job)
+        if res["status"] == "success":
+            self.__record(key, layerName, fingerprint)
+        return action, res
+
+    def layerNameOf(self, key):
+        """
+        return 数据的图层名称：已记录的数据沿用记录的名称，否则为相对所在监视文件夹的路径（不含扩展名），
+               路径分隔符和非字母数字、下划线的字符替换为下划线，例如a/roads.shp为a_roads
+        """
+
+        with self.__lock:
+            record = self.state["layers"].get(key)
+        if record is not None:
+            return record["layer"]
+        folders = [folder for folder in self.folders if _isUnder(key, folder)]
+        folder = max(folders, key=len) if folders else os.path.dirname(key)
+        return re.sub(r"\W", "_", os.path.splitext(os.path.relpath(key, folder))[0])
+
+    def job(self, key):
+        """
+        return 数据的发布任务，格式见publishJob
+        """
+
+        layerName = self.layerNameOf(key)
+        if key.endswith(".shp"):
+            return {"type": "shp", "workspaceName": self.workspaceName, "layerName": layerName, "shapePath": key, "charset": self.charset}
+        if os.path.getsize(key) < self.pyramidSize:
+            return {"type": "tiff", "workspaceName": self.workspaceName, "layerName": layerName, "tiffPath": key}
+        return {"type": "pyramid", "workspaceName": self.workspaceName, "layerName": layerName, "tiffPath": key,
+                "tiffDir": os.path.join(self.pyramidDir, layerName)}
+
+    def __record(self, key, layerName, fingerprint):
+        with self.__lock:
+            if fingerprint is None:
+                self.state["layers"].pop(key, None)
+            else:
+                self.state["layers"][key] = {"layer": layerName, "fingerprint": fingerprint}
+        self.saveState()
+
+    # ---------- 运行 ----------
+
+    def start(self):
+        """
+        扫描已有数据并开始监视，立即返回
+        """
+
+        if self.__threads:
+            return self
+        self.__stopping.clear()
+        self.__executor = ThreadPoolExecutor(max_workers=max(1, self.workers))
+        self.scan()
+        if self.polling:
+            self.poll()
+            self.__threads.append(threading.Thread(target=self.__poll, daemon=True))
+        else:
+            handler = _EventHandler(self)
+            self.__observer = Observer()
+            for folder in self.folders:
+                self.__observer.schedule(handler, folder, recursive=True)
+            self.__observer.start()
+        self.__threads.append(threading.Thread(target=self.__dispatch, daemon=True))
+        for thread in self.__threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        """
+        停止监视，等待正在发布的数据完成；未发布的变化在下次启动时由scan重新发现
+        """
+
+        self.__stopping.set()
+        if self.__observer is not None:
+            self.__observer.stop()
+            self.__observer.join()
+            self.__observer = None
+        for thread in self.__threads:
+            thread.join()
+        self.__threads = []
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=True)
+            self.__executor = None
+
+    def run(self):
+        """
+        持续监视，直到KeyboardInterrupt
+        """
+
+        self.start()
+        try:
+            while not self.__stopping.wait(1):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def idle(self):
+        """
+        return 是否没有等待发布和正在发布的数据
+        """
+
+        with self.__lock:
+            return not self.__pending and not self.__running
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __poll(self):
+        while not self.__stopping.wait(self.pollInterval):
+            try:
+                self.poll()
+            except OSError:
+                continue
+
+    def __dispatch(self):
+        while not self.__stopping.wait(max(0.1, min(self.settle, self.pollInterval) / 4.0)):
+            self.dispatch()
+
+
+class _EventHandler(FileSystemEventHandler):
+    """
+    watchdog事件：创建、修改、移动和删除的文件都记录为变化
+    """
+    def __init__(self, watcher):
+        super(_EventHandler, self).__init__()
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        self.watcher.touch(event.src_path)
+        if getattr(event, "dest_path", None):
+            self.watcher.touch(event.dest_path)
+
+
+def _missingFiles(shapePath):
+    """
+    return shapefile缺少的必需文件的扩展名列表
+    """
+
+    base = shapePath[:-4]
+    return [ext for ext in _REQUIRED_EXTENSIONS if not os.path.exists(base + ext)]
+
+
+def _isUnder(path, folder):
+    path, folder = os.path.normcase(os.path.abspath(path)), os.path.normcase(os.path.abspath(folder))
+    return path == folder or path.startswith(folder.rstrip(os.sep) + os.sep)
@@ -0,0 +1,738 @@
+import re
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, quoteattr
+
+from HttpMetrics import endpointOf
+
+
+# 新建geoserver时自带的全局样式
+_DEFAULT_STYLES = ("point", "line", "polygon", "raster", "generic")
+
+_ATOM = "http://www.w3.org/2005/Atom"
+
+
+class FakeGeoServer(object):
+    """
+    进程内的geoserver REST接口替身，用于在没有真实geoserver时测试和压测GeoServerCatalog、GeoServerService
+    在内存中维护工作空间、数据存储、栅格存储、要素类型、栅格、图层和样式，按geoserver相同的xml/json格式返回，
+    并支持WMS能力文档、GeoWebCache的seed接口，以及镶嵌数据集的影像收集、删除和数据存储重置；上传的文件和收集的影像只记录不解析
+    可配置每个请求的延迟、按比例注入502/503/504错误、按每秒请求数限流，并统计每个REST端点的请求数
+    """
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, errorRate=0.0, errorStatuses=(502, 503, 504),
+                 rateLimit=None, rateLimitStatus=429, seed=None, version="2.24.0"):
+        """
+        host、port：监听地址，port为0时自动选择空闲端口
+        latency：每个请求的固定延迟（秒），可选，默认为0
+        jitter：在固定延迟上附加的0~jitter秒的随机延迟，可选，默认为0
+        errorRate：注入错误的请求比例（0~1），注入错误的请求不修改目录，可选，默认为0
+        errorStatuses：注入错误的状态码，随机选取，可选，默认为(502, 503, 504)
+        rateLimit：每秒最多处理的请求数，可选，默认不限流
+        rateLimitStatus：超过限流时返回的状态码，为None时请求排队等待而不是被拒绝，可选，默认为429
+        seed：随机种子，可选
+        version：about/version返回的geoserver版本，可选
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.errorRate = errorRate
+        self.errorStatuses = tuple(errorStatuses)
+        self.rateLimit = rateLimit
+        self.rateLimitStatus = rateLimitStatus
+        self.version = version
+
+        self.__random = random.Random(seed)
+        self.__lock = threading.RLock()
+        self.__tokens = float(rateLimit or 0)
+        self.__refilled = time.monotonic()
+
+        self.__server = ThreadingHTTPServer((host, port), _Handler)
+        self.__server.daemon_threads = True
+        self.__server.fake = self
+        self.__thread = None
+        self.reset()
+        self.resetStats()
+
+    @property
+    def url(self):
+        """
+        geoserver rest地址，用于创建GeoServerService
+        """
+
+        host, port = self.__server.server_address[:2]
+        return "http://{0}:{1}/geoserver/rest".format(host, port)
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def reset(self):
+        """
+        清空目录，只保留默认的全局样式
+        """
+
+        with self.__lock:
+            self.workspaces = {}
+            # (工作空间, 存储名) -> {kind: dataStore/coverageStore, type, url}
+            self.stores = {}
+            # (工作空间, 资源名) -> {kind: featureType/coverage, store}
+            self.resources = {}
+            # (工作空间, 图层名) -> {defaultStyle: (工作空间或None, 样式名), styles: 可选样式列表, advertised: 是否公开}
+            self.layers = {}
+            # (工作空间或None, 样式名) -> {body, raw: 最后一次上传是否为raw}
+            self.styles = {(None, name): {"body": b""} for name in _DEFAULT_STYLES}
+            # 图层名 -> 剩余的seed任务轮询次数
+            self.seeds = {}
+            # (工作空间, 栅格存储名) -> {harvested: 收集的影像路径, removed: 删除影像的CQL条件, resets: 重置次数}
+            self.granules = {}
+            # 文件上传：[(工作空间, 存储名, update参数)]
+            self.uploads = []
+
+    def resetStats(self):
+        with self.__lock:
+            self.requests = {}
+            self.injectedErrors = 0
+            self.limited = 0
+            self.bytesReceived = 0
+
+    def stats(self):
+        """
+        return {total, injectedErrors, limited, bytesReceived, byEndpoint: {"方法 端点": 请求数}}
+        """
+
+        with self.__lock:
+            return {
+                "total": sum(self.requests.values()),
+                "injectedErrors": self.injectedErrors,
+                "limited": self.limited,
+                "bytesReceived": self.bytesReceived,
+                "byEndpoint": dict(sorted(self.requests.items(), key=lambda item: -item[1]))
+            }
+
+    def _serve(self, method, url, headers, body):
+        """
+        处理一个请求
+        return (状态码, Content-Type, 响应体, 附加响应头)
+        """
+
+        with self.__lock:
+            key = "{0} {1}".format(method, endpointOf(url))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.bytesReceived += len(body)
+            delay = self.latency + (self.__random.uniform(0, self.jitter) if self.jitter else 0)
+            injected = self.errorRate > 0 and self.__random.random() < self.errorRate
+            status = self.__random.choice(self.errorStatuses) if injected else None
+            if injected:
+                self.injectedErrors += 1
+
+        wait = self.__takeToken()
+        if wait > 0:
+            if self.rateLimitStatus is not None:
+                with self.__lock:
+                    self.limited += 1
+                return self.rateLimitStatus, "text/plain", b"Too many requests", {"Retry-After": "1"}
+            time.sleep(wait)
+
+        if delay > 0:
+            time.sleep(delay)
+        if status is not None:
+            return status, "text/plain", b"Injected error", {}
+
+        parsed = urlparse(url)
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        path = unquote(parsed.path)
+        try:
+            with self.__lock:
+                status, doc, fmt = self.__route(method, path, query, body, headers)
+        except _NotFound as e:
+            return 404, "text/plain", str(e).encode("utf-8"), {}
+        except _Conflict as e:
+            return 409, "text/plain", str(e).encode("utf-8"), {}
+        except _BadRequest as e:
+            return 400, "text/plain", str(e).encode("utf-8"), {}
+
+        if doc is None:
+            return status, "text/plain", b"", {}
+        if isinstance(doc, bytes):
+            return status, fmt, doc, {}
+        if fmt == "json":
+            return status, "application/json", json.dumps(doc).encode("utf-8"), {}
+        return status, "application/xml", _toXml(doc).encode("utf-8"), {}
+
+    def __takeToken(self):
+        """
+        令牌桶限流
+        return 需要等待的秒数，0表示不需要等待
+        """
+
+        if not self.rateLimit:
+            return 0
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(float(self.rateLimit), self.__tokens + (now - self.__refilled) * self.rateLimit)
+            self.__refilled = now
+            if self.__tokens >= 1:
+                self.__tokens -= 1
+                return 0
+            wait = (1 - self.__tokens) / self.rateLimit
+            if self.rateLimitStatus is None:
+                # 排队的请求预先消耗令牌，后到的请求等待更久；被拒绝的请求不消耗令牌
+                self.__tokens -= 1
+            return wait
+
+    def __route(self, method, path, query, body, headers):
+        if path.startswith("/geoserver/gwc/rest/seed/"):
+            return self.__seed(method, path[len("/geoserver/gwc/rest/seed/"):], body)
+        if path == "/geoserver/wms":
+            return 200, self.__capabilities(), "application/xml"
+        if not path.startswith("/geoserver/rest/"):
+            raise _NotFound("No such endpoint: {0}".format(path))
+
+        path = path[len("/geoserver/rest/"):].strip("/")
+        fmt = "json" if path.endswith(".json") or "json" in headers.get("Accept", "") and not path.endswith(".xml") else "xml"
+        # 上传文件的路径为file.shp、file.geotiff等，其余路径只去掉格式扩展名
+        match = re.match(r"^(.*/file)\.(\w+)$", path) or re.match(r"^(.*?)(?:\.(xml|json|sld|html))?$", path)
+        path, ext = match.group(1), match.group(2)
+        parts = path.split("/")
+
+        for pattern, handler in self.__routes():
+            args = _match(pattern, parts)
+            if args is not None:
+                result = handler(method, query, body, ext, *args)
+                if result is None:
+                    break
+                status, doc = result
+                return status, doc, fmt
+        raise _NotFound("No such endpoint: {0} {1}".format(method, path))
+
+    def __routes(self):
+        return [
+            ("about/version", self.__version),
+            ("workspaces", self.__workspaces),
+            ("namespaces", self.__workspaces),
+            ("workspaces/*", self.__workspace),
+            ("namespaces/*", self.__workspace),
+            ("workspaces/*/wmsstores", self.__wmsStores),
+            ("workspaces/*/datastores", lambda *a: self.__stores("dataStore", *a)),
+            ("workspaces/*/coveragestores", lambda *a: self.__stores("coverageStore", *a)),
+            ("workspaces/*/datastores/*", lambda *a: self.__store("dataStore", *a)),
+            ("workspaces/*/coveragestores/*", lambda *a: self.__store("coverageStore", *a)),
+            ("workspaces/*/datastores/*/file", lambda *a: self.__upload("dataStore", *a)),
+            ("workspaces/*/coveragestores/*/file", lambda *a: self.__upload("coverageStore", *a)),
+            ("workspaces/*/coveragestores/*/external.imagemosaic", self.__harvest),
+            ("workspaces/*/coveragestores/*/reset", self.__reset),
+            ("workspaces/*/datastores/*/featuretypes", lambda m, q, b, e, ws, st: self.__resources("featureType", m, q, b, e, ws, st)),
+            ("workspaces/*/coveragestores/*/coverages", lambda m, q, b, e, ws, st: self.__resources("coverage", m, q, b, e, ws, st)),
+            ("workspaces/*/datastores/*/featuretypes/*", lambda *a: self.__resource("featureType", *a)),
+            ("workspaces/*/coveragestores/*/coverages/*", lambda *a: self.__resource("coverage", *a)),
+            ("workspaces/*/coveragestores/*/coverages/*/index/granules", self.__granules),
+            ("workspaces/*/featuretypes", lambda m, q, b, e, ws: self.__resources("featureType", m, q, b, e, ws, None)),
+            ("workspaces/*/coverages", lambda m, q, b, e, ws: self.__resources("coverage", m, q, b, e, ws, None)),
+            ("workspaces/*/styles", self.__styles),
+            ("styles", lambda m, q, b, e: self.__styles(m, q, b, e, None)),
+            ("workspaces/*/styles/*", self.__style),
+            ("styles/*", lambda m, q, b, e, name: self.__style(m, q, b, e, None, name)),
+            ("layers", self.__layers),
+            ("workspaces/*/layers", lambda m, q, b, e, ws: self.__layers(m, q, b, e, ws)),
+            ("layers/*", lambda m, q, b, e, name: self.__layer(m, q, b, e, *_qualified(name))),
+            ("workspaces/*/layers/*", self.__layer)
+        ]
+
+    # ---------- 链接 ----------
+
+    def __href(self, path, ext="xml"):
+        return "{0}/{1}.{2}".format(self.url, path, ext)
+
+    # ---------- 版本 ----------
+
+    def __version(self, method, query, body, ext):
+        return 200, {"about": {"resource": {"@name": "GeoServer", "Version": self.version}}}
+
+    # ---------- 工作空间 ----------
+
+    def __workspaces(self, method, query, body, ext):
+        if method == "GET":
+            return 200, _list("workspaces", "workspace", [
+                {"name": name, "href": self.__href("workspaces/" + name)} for name in sorted(self.workspaces)])
+        if method == "POST":
+            root = _parse(body)
+            name = root.findtext("prefix") or root.findtext("name")
+            if not name:
+                raise _BadRequest("Workspace name is required")
+            if name in self.workspaces:
+                raise _Conflict("Workspace '{0}' already exists".format(name))
+            self.workspaces[name] = {"uri": root.findtext("uri") or ""}
+            return 201, None
+
+    def __workspace(self, method, query, body, ext, name):
+        if name not in self.workspaces:
+            raise _NotFound("No such workspace: '{0}' found".format(name))
+        if method == "GET":
+            return 200, {"workspace": {"name": name, "isolated": "false"}}
+        if method == "DELETE":
+            owned = [key for key in self.stores if key[0] == name] + [key for key in self.styles if key[0] == name]
+            if owned and query.get("recurse") != "true":
+                raise _Conflict("Workspace {0} is not empty".format(name))
+            for table in (self.stores, self.resources, self.layers, self.styles):
+                for key in [key for key in table if key[0] == name]:
+                    del table[key]
+            del self.workspaces[name]
+            return 200, None
+
+    def __requireWorkspace(self, workspace):
+        if workspace not in self.workspaces:
+            raise _NotFound("No such workspace: '{0}' found".format(workspace))
+
+    # ---------- 存储 ----------
+
+    def __wmsStores(self, method, query, body, ext, workspace):
+        self.__requireWorkspace(workspace)
+        if method == "GET":
+            return 200, _list("wmsStores", "wmsStore", [])
+
+    def __stores(self, kind, method, query, body, ext, workspace):
+        self.__requireWorkspace(workspace)
+        collection = _STORE_PATHS[kind]
+        if method == "GET":
+            names = sorted(name for (ws, name), store in self.stores.items() if ws == workspace and store["kind"] == kind)
+            return 200, _list(kind + "s", kind, [
+                {"name": name, "href": self.__href("workspaces/{0}/{1}/{2}".format(workspace, collection, name))} for name in names])
+        if method == "POST":
+            root = _parse(body)
+            name = root.findtext("name") or query.get("name")
+            if (workspace, name) in self.stores:
+                raise _Conflict("Store '{0}' already exists in workspace '{1}'".format(name, workspace))
+            url = root.findtext("url")
+            if url is None:
+                url = "".join(entry.text or "" for entry in root.iter("entry") if entry.get("key") in ("database", "url"))
+            self.stores[(workspace, name)] = {"kind": kind, "type": root.findtext("type") or "", "url": url}
+            return 201, None
+
+    def __getStore(self, kind, workspace, name):
+        self.__requireWorkspace(workspace)
+        store = self.stores.get((workspace, name))
+        if store is None or store["kind"] != kind:
+            raise _NotFound("No such {0} store: {1},{2}".format("data" if kind == "dataStore" else "coverage", workspace, name))
+        return store
+
+    def __store(self, kind, method, query, body, ext, workspace, name):
+        store = self.__getStore(kind, workspace, name)
+        collection = _STORE_PATHS[kind]
+        if method == "GET":
+            resources = "featureTypes" if kind == "dataStore" else "coverages"
+            doc = {
+                "name": name,
+                "type": store["type"],
+                "enabled": "true",
+                "workspace": {"name": workspace, "href": self.__href("workspaces/" + workspace)},
+                resources: {"href": self.__href("workspaces/{0}/{1}/{2}/{3}".format(workspace, collection, name, resources.lower()))}
+            }
+            if kind == "coverageStore":
+                doc["url"] = store["url"]
+            return 200, {kind: doc}
+        if method == "PUT":
+            url = _parse(body).findtext("url")
+            if url is not None:
+                store["url"] = url
+            return 200, None
+        if method == "DELETE":
+            owned = [key for key, res in self.resources.items() if key[0] == workspace and res["store"] == name]
+            if owned and query.get("recurse") != "true":
+                raise _Conflict("Store {0} is not empty".format(name))
+            for key in owned:
+                self.resources.pop(key, None)
+                self.layers.pop(key, None)
+            del self.stores[(workspace, name)]
+            return 200, None
+
+    def __upload(self, kind, method, query, body, ext, workspace, name):
+        """
+        PUT file.shp/file.gpkg/file.geotiff等：创建存储和同名的资源及图层，存储中已有该资源时只替换数据，记录在uploads中
+        """
+
+        if method != "PUT":
+            return None
+        self.__requireWorkspace(workspace)
+        store = self.stores.get((workspace, name))
+        if store is None:
+            store = self.stores[(workspace, name)] = {"kind": kind, "type": "upload", "url": "file:data/{0}/{1}".format(workspace, name)}
+        resourceKind = "featureType" if kind == "dataStore" else "coverage"
+        resourceName = query.get("coverageName") or name
+        existing = self.resources.get((workspace, resourceName))
+        if existing is None or existing["store"] != name:
+            self.__publish(workspace, name, resourceKind, resourceName)
+        self.uploads.append((workspace, name, query.get("update")))
+        return 201, None
+
+    def __harvest(self, method, query, body, ext, workspace, name):
+        """
+        POST external.imagemosaic：向镶嵌数据集收集影像，只记录影像路径
+        """
+
+        if method != "POST":
+            return None
+        self.__getStore("coverageStore", workspace, name)
+        path = body.decode("utf-8").strip()
+        if not path.startswith("file:"):
+            raise _BadRequest("Invalid granule path: {0}".format(path))
+        self.__granuleState(workspace, name)["harvested"].append(path[len("file://"):] if path.startswith("file://") else path[len("file:"):])
+        return 202, None
+
+    def __reset(self, method, query, body, ext, workspace, name):
+        if method not in ("POST", "PUT"):
+            return None
+        self.__getStore("coverageStore", workspace, name)
+        self.__granuleState(workspace, name)["resets"] += 1
+        return 200, None
+
+    def __granules(self, method, query, body, ext, workspace, storeName, name):
+        """
+        DELETE index/granules：按filter删除镶嵌数据集的影像，只记录条件
+        """
+
+        if method != "DELETE":
+            return None
+        self.__getStore("coverageStore", workspace, storeName)
+        if (workspace, name) not in self.resources:
+            raise _NotFound("No such coverage: {0},{1},{2}".format(workspace, storeName, name))
+        if query.get("purge", "none") not in ("none", "metadata", "all"):
+            raise _BadRequest("Invalid purge value: {0}".format(query["purge"]))
+        self.__granuleState(workspace, storeName)["removed"].append(query.get("filter"))
+        return 200, None
+
+    def __granuleState(self, workspace, storeName):
+        return self.granules.setdefault((workspace, storeName), {"harvested": [], "removed": [], "resets": 0})
+
+    # ---------- 资源 ----------
+
+    def __publish(self, workspace, storeName, kind, name):
+        if (workspace, name) in self.resources:
+            raise _Conflict("Resource named '{0}' already exists in store: '{1}'".format(name, storeName))
+        self.resources[(workspace, name)] = {"kind": kind, "store": storeName}
+        self.layers[(workspace, name)] = {"defaultStyle": _defaultStyle(kind), "styles": [], "advertised": True}
+
+    def __resources(self, kind, method, query, body, ext, workspace, storeName):
+        self.__requireWorkspace(workspace)
+        storeKind = "dataStore" if kind == "featureType" else "coverageStore"
+        if storeName is not None:
+            self.__getStore(storeKind, workspace, storeName)
+        collection = _STORE_PATHS[storeKind]
+        plural = "featuretypes" if kind == "featureType" else "coverages"
+        if method == "GET":
+            # 与geoserver一致，链接按请求路径生成，工作空间级的列表中不包含存储名称
+            prefix = "workspaces/{0}/".format(workspace) if storeName is None else "workspaces/{0}/{1}/{2}/".format(workspace, collection, storeName)
+            items = []
+            for (ws, name), res in sorted(self.resources.items()):
+                if ws == workspace and res["kind"] == kind and storeName in (None, res["store"]):
+                    items.append({"name": name, "href": self.__href(prefix + plural + "/" + name)})
+            return 200, _list(kind + "s", kind, items)
+        if method == "POST" and storeName is not None:
+            root = _parse(body)
+            name = root.findtext("name") or root.findtext("nativeName")
+            self.__publish(workspace, storeName, kind, name)
+            return 201, None
+
+    def __resource(self, kind, method, query, body, ext, workspace, storeName, name):
+        storeKind = "dataStore" if kind == "featureType" else "coverageStore"
+        self.__getStore(storeKind, workspace, storeName)
+        res = self.resources.get((workspace, name))
+        if res is None or res["store"] != storeName or res["kind"] != kind:
+            raise _NotFound("No such {0}: {1},{2},{3}".format(kind, workspace, storeName, name))
+        if method == "GET":
+            bbox = {"minx": "-180.0", "maxx": "180.0", "miny": "-90.0", "maxy": "90.0", "crs": "EPSG:4326"}
+            return 200, {kind: {
+                "name": name,
+                "nativeName": name,
+                "namespace": {"name": workspace},
+                "title": name,
+                "srs": "EPSG:4326",
+                "nativeBoundingBox": bbox,
+                "latLonBoundingBox": bbox,
+                "projectionPolicy": "FORCE_DECLARED",
+                "enabled": "true",
+                "store": {"@class": storeKind, "name": "{0}:{1}".format(workspace, storeName),
+                          "href": self.__href("workspaces/{0}/{1}/{2}".format(workspace, _STORE_PATHS[storeKind], storeName))}
+            }}
+        if method == "DELETE":
+            del self.resources[(workspace, name)]
+            self.layers.pop((workspace, name), None)
+            return 200, None
+        if method == "PUT":
+            return 200, None
+
+    # ---------- 图层 ----------
+
+    def __layers(self, method, query, body, ext, workspace=None):
+        if method == "GET":
+            if workspace is not None:
+                self.__requireWorkspace(workspace)
+            items = [{"name": "{0}:{1}".format(ws, name), "href": self.__href("layers/{0}:{1}".format(ws, name))}
+                     for ws, name in sorted(self.layers) if workspace in (None, ws)]
+            return 200, _list("layers", "layer", items)
+
+    def __layer(self, method, query, body, ext, workspace, name):
+        layer = self.layers.get((workspace, name))
+        if layer is None:
+            raise _NotFound("No such layer: {0}:{1}".format(workspace, name))
+        res = self.resources[(workspace, name)]
+        if method == "GET":
+            storeKind = "dataStore" if res["kind"] == "featureType" else "coverageStore"
+            plural = "featuretypes" if res["kind"] == "featureType" else "coverages"
+            doc = {
+                "name": name,
+                "type": "VECTOR" if res["kind"] == "featureType" else "RASTER",
+                "defaultStyle": self.__styleLink(*layer["defaultStyle"]),
+                "resource": {"@class": res["kind"], "name": "{0}:{1}".format(workspace, name),
+                             "href": self.__href("workspaces/{0}/{1}/{2}/{3}/{4}".format(
+                                 workspace, _STORE_PATHS[storeKind], res["store"], plural, name))},
+                "enabled": "true",
+                "advertised": "true" if layer.get("advertised", True) else "false"
+            }
+            if layer.get("styles"):
+                doc["styles"] = {"@class": "linked-hash-set", "style": [self.__styleLink(*key) for key in layer["styles"]]}
+            return 200, {"layer": doc}
+        if method == "PUT":
+            root = _parse(body)
+            if root.findtext("defaultStyle/name"):
+                layer["defaultStyle"] = self.__styleKey(root.find("defaultStyle"))
+            if root.find("styles") is not None:
+                layer["styles"] = [self.__styleKey(element) for element in root.findall("styles/style")]
+            if root.findtext("advertised"):
+                layer["advertised"] = root.findtext("advertised") == "true"
+            return 200, None
+        if method == "DELETE":
+            del self.layers[(workspace, name)]
+            if query.get("recurse") == "true":
+                del self.resources[(workspace, name)]
+            return 200, None
+
+    def __styleLink(self, styleWorkspace, styleName):
+        stylePath = "workspaces/{0}/styles/{1}".format(styleWorkspace, styleName) if styleWorkspace else "styles/" + styleName
+        return {"name": "{0}:{1}".format(styleWorkspace, styleName) if styleWorkspace else styleName, "href": self.__href(stylePath)}
+
+    def __styleKey(self, element):
+        styleName = element.findtext("name")
+        styleWorkspace = element.findtext("workspace")
+        if styleName and ":" in styleName:
+            styleWorkspace, styleName = styleName.split(":", 1)
+        if (styleWorkspace, styleName) not in self.styles:
+            raise _BadRequest("No such style: {0}".format(styleName))
+        return styleWorkspace, styleName
+
+    # ---------- 样式 ----------
+
+    def __styles(self, method, query, body, ext, workspace):
+        if workspace is not None:
+            self.__requireWorkspace(workspace)
+        if method == "GET":
+            prefix = "workspaces/{0}/styles/".format(workspace) if workspace else "styles/"
+            items = [{"name": name, "href": self.__href(prefix + name)} for ws, name in sorted(self.styles, key=lambda k: (k[0] or "", k[1])) if ws == workspace]
+            return 200, _list("styles", "style", items)
+        if method == "POST":
+            root = _parse(body)
+            name = root.findtext("name") or query.get("name")
+            if (workspace, name) in self.styles:
+                raise _Conflict("Style {0} already exists".format(name))
+            self.styles[(workspace, name)] = {"body": b""}
+            return 201, None
+
+    def __style(self, method, query, body, ext, workspace, name):
+        if workspace is not None:
+            self.__requireWorkspace(workspace)
+        style = self.styles.get((workspace, name))
+        if style is None:
+            raise _NotFound("No such style: {0}".format(name))
+        if method == "GET":
+            if ext == "sld":
+                return 200, style["body"]
+            doc = {"name": name, "format": "sld", "languageVersion": {"version": "1.0.0"}, "filename": name + ".sld"}
+            if workspace:
+                doc["workspace"] = {"name": workspace}
+            return 200, {"style": doc}
+        if method == "PUT":
+            # raw：是否按原样保存，否则geoserver会解析后重新编码样式
+            style["body"] = body
+            style["raw"] = query.get("raw") == "true"
+            return 200, None
+        if method == "DELETE":
+            key = (workspace, name)
+            users = [layerKey for layerKey, layer in self.layers.items() if layer["defaultStyle"] == key or key in layer.get("styles", [])]
+            if users and query.get("recurse") != "true":
+                raise _Conflict("Can't delete style referenced by existing layers.")
+            # 与geoserver一致，recurse时从图层中移除该样式，默认样式改为通用样式
+            for layerKey in users:
+                layer = self.layers[layerKey]
+                if layer["defaultStyle"] == key:
+                    layer["defaultStyle"] = _defaultStyle(self.resources[layerKey]["kind"])
+                layer["styles"] = [style for style in layer.get("styles", []) if style != key]
+            del self.styles[key]
+            return 200, None
+
+    # ---------- WMS和GeoWebCache ----------
+
+    def __capabilities(self):
+        layers = []
+        for (workspace, name), layer in sorted(self.layers.items()):
+            # 不公开的图层不出现在能力文档中
+            if not layer.get("advertised", True):
+                continue
+            styles = "".join("<Style><Name>{0}</Name></Style>".format(escape("{0}:{1}".format(*key) if key[0] else key[1]))
+                             for key in [layer["defaultStyle"]] + layer.get("styles", []))
+            layers.append("<Layer><Name>{0}:{1}</Name>{2}</Layer>".format(escape(workspace), escape(name), styles))
+        return ('<WMS_Capabilities xmlns="http://www.opengis.net/wms" version="1.3.0"><Capability><Layer>{0}</Layer></Capability>'
+                '</WMS_Capabilities>').format("".join(layers)).encode("utf-8")
+
+    def __seed(self, method, path, body):
+        """
+        seed任务在被查询两次后完成
+        """
+
+        name = re.sub(r"\.json$", "", path)
+        if method == "POST":
+            if body.startswith(b"kill_all"):
+                self.seeds.pop(name, None)
+            else:
+                self.seeds[name] = 2
+            return 200, None, "json"
+        polls = self.seeds.get(name, 0)
+        if polls <= 0:
+            self.seeds.pop(name, None)
+            return 200, {"long-array-array": []}, "json"
+        self.seeds[name] = polls - 1
+        return 200, {"long-array-array": [[2 - polls, 2, 1, 1, 1]]}, "json"
+
+
+_STORE_PATHS = {"dataStore": "datastores", "coverageStore": "coveragestores"}
+
+
+def _defaultStyle(kind):
+    return None, "raster" if kind == "coverage" else "polygon"
+
+
+class _NotFound(Exception):
+    pass
+
+
+class _Conflict(Exception):
+    pass
+
+
+class _BadRequest(Exception):
+    pass
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 响应头和响应体一次写出并关闭Nagle算法，避免keep-alive连接上的延迟确认使每个请求多等待约40毫秒
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    def log_message(self, *args):
+        pass
+
+    def __body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";", 1)[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b"".join(chunks)
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def __handle(self):
+        body = self.__body()
+        status, contentType, data, headers = self.server.fake._serve(self.command, self.path, self.headers, body)
+        self.send_response(status)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = __handle
+    do_POST = __handle
+    do_PUT = __handle
+    do_DELETE = __handle
+
+
+def _match(pattern, parts):
+    """
+    按"workspaces/*/datastores"形式的模式匹配路径，*匹配一段
+    return 匹配到的段列表，不匹配时为None
+    """
+
+    segments = pattern.split("/")
+    if len(segments) != len(parts):
+        return None
+    args = []
+    for segment, part in zip(segments, parts):
+        if segment == "*":
+            args.append(part)
+        elif segment != part:
+            return None
+    return args
+
+
+def _qualified(name):
+    if ":" not in name:
+        raise _NotFound("No such layer: {0}".format(name))
+    return name.split(":", 1)
+
+
+def _parse(body):
+    try:
+        return ElementTree.fromstring(body)
+    except ElementTree.ParseError as e:
+        raise _BadRequest("Invalid xml: {0}".format(e))
+
+
+def _list(collection, item, entries):
+    """
+    geoserver的列表在为空时json为空字符串
+    """
+
+    return {collection: {item: entries} if entries else ""}
+
+
+def _toXml(doc):
+    (name, value), = doc.items()
+    return _element(name, value)
+
+
+def _element(name, value):
+    if isinstance(value, list):
+        return "".join(_element(name, item) for item in value)
+    if not isinstance(value, dict):
+        return "<{0}>{1}</{0}>".format(name, escape(str(value)))
+
+    attributes = "".join(" {0}={1}".format(key[1:], quoteattr(str(v))) for key, v in value.items() if key.startswith("@"))
+    children = []
+    for key, v in value.items():
+        if key.startswith("@"):
+            continue
+        if key == "href":
+            children.append('<atom:link xmlns:atom="{0}" rel="alternate" href={1} type="application/xml"/>'.format(_ATOM, quoteattr(v)))
+        else:
+            children.append(_element(key, v))
+    return "<{0}{1}>{2}</{0}>".format(name, attributes, "".join(children))
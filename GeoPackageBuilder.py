@@ -0,0 +1,83 @@
+import os
+
+from osgeo import gdal
+
+
+class GeoPackageError(Exception):
+    """
+    GeoPackage转换错误
+    """
+    pass
+
+
+class GeoPackageBuilder(object):
+    """
+    将shapefile转换为带R-tree空间索引的GeoPackage
+    GeoPackage是单个sqlite文件，没有shapefile单文件2GB的限制，字段名和属性统一以UTF-8存储，
+    geoserver按范围和属性过滤时直接使用空间索引和sql查询，不需要额外的数据库
+    要素由GDAL逐条读取写入，每batchSize条要素提交一次事务，内存占用与文件大小无关
+    """
+    def __init__(self, shapePath, gpkgPath, layerName=None, charset=None, batchSize=100000, progress=None):
+        """
+        shapePath：shape文件的路径
+        gpkgPath：生成的GeoPackage文件的路径，已存在时覆盖
+        layerName：GeoPackage中的表名，可选，默认为shape文件名
+        charset：dbf的字符集，可选，默认由GDAL根据.cpg文件判断
+        batchSize：每个事务写入的要素数，可选，默认为100000
+        progress：进度回调函数 progress(complete)，complete为0~1之间的完成比例，可选
+        """
+        self.shapePath = shapePath
+        self.gpkgPath = gpkgPath
+        self.layerName = layerName or os.path.splitext(os.path.basename(shapePath))[0]
+        self.charset = charset
+        self.batchSize = batchSize
+        self.progress = progress
+
+    def build(self):
+        """
+        生成GeoPackage文件
+        return {path, layer, featureCount}
+        """
+
+        gdal.UseExceptions()
+        openOptions = ["ENCODING={0}".format(self.charset)] if self.charset else []
+        try:
+            src = gdal.OpenEx(self.shapePath, gdal.OF_VECTOR, open_options=openOptions)
+        except RuntimeError as e:
+            raise GeoPackageError("无法打开shape文件：{0}，{1}".format(self.shapePath, e))
+
+        callback = None
+        if self.progress is not None:
+            def callback(complete, message, data):
+                self.progress(complete)
+                return 1
+
+        folder = os.path.dirname(os.path.abspath(self.gpkgPath))
+        os.makedirs(folder, exist_ok=True)
+        if os.path.exists(self.gpkgPath):
+            os.remove(self.gpkgPath)
+
+        # 写入期间关闭sqlite的同步写盘，文件在转换完成后才会被使用；
+        # 只对当前线程生效，并发转换时互不影响，完成后恢复原来的值
+        synchronous = gdal.GetThreadLocalConfigOption("OGR_SQLITE_SYNCHRONOUS", None)
+        gdal.SetThreadLocalConfigOption("OGR_SQLITE_SYNCHRONOUS", "OFF")
+        try:
+            ds = gdal.VectorTranslate(
+                self.gpkgPath, src,
+                format="GPKG",
+                layerName=self.layerName,
+                # shapefile中多边形和多多边形可能混合存放，统一为多类型
+                geometryType="PROMOTE_TO_MULTI",
+                layerCreationOptions=["SPATIAL_INDEX=YES", "GEOMETRY_NAME=geom", "FID=fid"],
+                options=["-gt", str(self.batchSize)],
+                callback=callback
+            )
+            featureCount = ds.GetLayerByName(self.layerName).GetFeatureCount()
+            ds = None
+        except RuntimeError as e:
+            raise GeoPackageError("GeoPackage转换失败：{0}，{1}".format(self.shapePath, e))
+        finally:
+            gdal.SetThreadLocalConfigOption("OGR_SQLITE_SYNCHRONOUS", synchronous)
+            src = None
+
+        return {"path": self.gpkgPath, "layer": self.layerName, "featureCount": featureCount}
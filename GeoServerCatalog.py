@@ -1,11 +1,14 @@
 import os
+from xml.sax.saxutils import escape
 from geoserver.catalog import Catalog, ConflictingDataError, _name, FailedRequestError
 from geoserver.store import UnsavedCoverageStore
 from geoserver.support import build_url
 
 import requests
 from requests.packages.urllib3.util.retry import Retry
-from requests.adapters import HTTPAdapter
+
+from HttpMetrics import InstrumentedHTTPAdapter
+from StreamingUpload import FileStream, ZipStream
 
 try:
     from urllib.parse import urlparse
@@ -17,16 +20,28 @@ class GeoServerCatalog(Catalog):
     geoserver.Catalog的派生类
     用于扩展基类的create_coveragestore函数，使其支持"ImagePyramid"类型
     """
-    def __init__(self, service_url, username="admin", password="geoserver", validate_ssl_certificate=True, access_token=None, retries=3, backoff_factor=0.9):
+    def __init__(self, service_url, username="admin", password="geoserver", validate_ssl_certificate=True, access_token=None, retries=3, backoff_factor=0.9,
+                 pool_size=10, timeout=None, metrics=None):
+        """
+        pool_size：连接池的最大连接数，可选，默认为10，并发请求的线程数超过该值时多余的连接用完即关闭
+        timeout：请求超时（秒），可以是(连接超时, 读取超时)，可选，默认不超时
+        metrics：HttpMetrics对象，用于记录请求指标，可选
+        """
+        # 基类的__init__会调用setup_connection，需要先设置这些属性
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.metrics = metrics
         super().__init__(service_url, username, password, validate_ssl_certificate, access_token, retries, backoff_factor)
 
     def create_coveragestore(self, name, workspace=None, path=None, type='GeoTIFF',
                              create_layer=True, layer_name=None, source_name=None, upload_data=False, contet_type="image/tiff",
-                             overwrite=False):
+                             overwrite=False, fetch=True, progress=None):
         """
         Create a coveragestore for locally hosted rasters.
         If create_layer is set to true, will create a coverage/layer.
         layer_name and source_name are only used if create_layer ia enabled. If not specified, the raster name will be used for both.
+        If fetch is set to false, the created object is not requested again and None is returned.
+        If upload_data is set to true, the raster is streamed from disk in chunks; progress(sent, total, rate) is called for each chunk.
         """
         if path is None:
             raise Exception('You must provide a full path to the raster')
@@ -63,10 +78,7 @@ class GeoServerCatalog(Catalog):
         workspace = _name(workspace)
 
         if not overwrite:
-            stores = self.get_stores(names=name, workspaces=[workspace])
-            if len(stores) > 0:
-                msg = f"There is already a store named {name} in workspace {workspace}"
-                raise ConflictingDataError(msg)
+            self.__check_store_absent(workspace, "coveragestores", name)
 
         if upload_data is False:
             cs = UnsavedCoverageStore(self, name, workspace)
@@ -88,10 +100,12 @@ class GeoServerCatalog(Catalog):
                 if resp.status_code != 201:
                     raise FailedRequestError('Failed to create coverage/layer {} for : {}, {}'.format(layer_name, name,
                                                                                                       resp.status_code, resp.text))
-                self._cache.clear()
+                self.invalidate(workspace)
+                if not fetch:
+                    return None
                 return self.get_resources(names=layer_name, workspaces=[workspace])[0]
         else:
-            data = open(path, 'rb')
+            data = FileStream(path, progress)
             params = {"configure": "first", "coverageName": name}
             url = build_url(
                 self.service_url,
@@ -106,15 +120,138 @@ class GeoServerCatalog(Catalog):
             )
 
             headers = {"Content-type": contet_type}
-            resp = self.http_request(url, method='put', data=data, headers=headers)
-
-            if hasattr(data, "close"):
+            try:
+                resp = self.http_request(url, method='put', data=data, headers=headers)
+            finally:
                 data.close()
 
             if resp.status_code != 201:
                 raise FailedRequestError('Failed to create coverage/layer {} for : {}, {}'.format(layer_name, name, resp.status_code, resp.text))
+            self.invalidate(workspace)
 
+        if not fetch:
+            return None
         return self.get_stores(names=name, workspaces=[workspace])[0]
+
+    def create_featurestore(self, name, data, workspace=None, overwrite=False, charset=None, progress=None, update=None):
+        """
+        与基类相同，但data为{zip内文件名: 本地文件路径}时边压缩边上传，不生成临时zip文件
+        data：{zip内文件名: 本地文件路径}，见StreamingUpload.shapefileMembers；或已打包的zip文件路径
+        progress：上传进度回调函数 progress(sent, total, rate)，可选
+        update：数据存储已存在时的更新方式，overwrite-替换已有数据;append-追加，可选，默认由geoserver决定
+        """
+        if workspace is None:
+            workspace = self.get_default_workspace()
+        workspace = _name(workspace)
+
+        if not overwrite:
+            self.__check_store_absent(workspace, "datastores", name)
+
+        params = dict()
+        if charset:
+            params["charset"] = charset
+        if update:
+            params["update"] = update
+        url = build_url(self.service_url, ["workspaces", workspace, "datastores", name, "file.shp"], params)
+
+        headers = {"Content-type": "application/zip", "Accept": "application/xml"}
+        body = ZipStream(data, progress=progress) if isinstance(data, dict) else FileStream(data, progress)
+        try:
+            resp = self.http_request(url, method="put", data=body, headers=headers)
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+
+        if resp.status_code != 201:
+            raise FailedRequestError(f"Failed to create FeatureStore {name} : {resp.status_code}, {resp.text}")
+        self.invalidate(workspace)
+
+    def create_geopackage_store(self, name, path, workspace=None, layer_name=None, upload_data=False, overwrite=False, progress=None):
+        """
+        发布GeoPackage文件中的一个表
+        path：GeoPackage文件的路径
+        layer_name：GeoPackage中的表名，同时作为图层名，可选，默认为name
+        upload_data：是否上传文件，为False时geoserver直接读取path，为True时分块上传到geoserver的数据目录
+        progress：上传进度回调函数 progress(sent, total, rate)，可选
+        """
+        if workspace is None:
+            workspace = self.get_default_workspace()
+        workspace = _name(workspace)
+        layer_name = layer_name or name
+
+        if not overwrite:
+            self.__check_store_absent(workspace, "datastores", name)
+
+        if upload_data:
+            url = build_url(self.service_url, ["workspaces", workspace, "datastores", name, "file.gpkg"], {"configure": "all"})
+            headers = {"Content-type": "application/x-sqlite3", "Accept": "application/xml"}
+            body = FileStream(path, progress)
+            try:
+                resp = self.http_request(url, method="put", data=body, headers=headers)
+            finally:
+                body.close()
+            if resp.status_code != 201:
+                raise FailedRequestError(f"Failed to create GeoPackage store {name} : {resp.status_code}, {resp.text}")
+        else:
+            database = path if path.startswith("file:") else f"file:{path}"
+            data = (f"<dataStore><name>{name}</name><type>GeoPackage</type><enabled>true</enabled><connectionParameters>"
+                    f"<entry key=\"database\">{escape(database)}</entry><entry key=\"dbtype\">geopkg</entry>"
+                    f"</connectionParameters></dataStore>")
+            url = f"{self.service_url}/workspaces/{workspace}/datastores.xml"
+            headers = {"Content-type": "application/xml"}
+            resp = self.http_request(url, method="post", data=data, headers=headers)
+            if resp.status_code != 201:
+                raise FailedRequestError(f"Failed to create GeoPackage store {name} : {resp.status_code}, {resp.text}")
+
+            data = f"<featureType><name>{layer_name}</name><nativeName>{layer_name}</nativeName></featureType>"
+            url = f"{self.service_url}/workspaces/{workspace}/datastores/{name}/featuretypes.xml"
+            resp = self.http_request(url, method="post", data=data, headers=headers)
+            if resp.status_code != 201:
+                raise FailedRequestError(f"Failed to create feature type {layer_name} for : {name}, {resp.status_code}, {resp.text}")
+        self.invalidate(workspace)
+
+    def __check_store_absent(self, workspace, kind, name):
+        """
+        只请求同名的存储，而不是列出工作空间下的全部存储
+        kind：datastores/coveragestores
+        """
+        url = f"{self.service_url}/workspaces/{workspace}/{kind}/{name}.xml"
+        resp = self.http_request(url, headers={"Accept": "application/xml"})
+        if resp.status_code == 200:
+            msg = f"There is already a store named {name} in workspace {workspace}"
+            raise ConflictingDataError(msg)
+
+    def save(self, obj, content_type="application/xml"):
+        """
+        saves an object to the REST service
+        与基类相同，但对属于某个工作空间的对象只清除该工作空间相关的缓存，而不是整个缓存
+        """
+        workspace = getattr(obj, "workspace", None)
+        if workspace is None:
+            return super().save(obj, content_type)
+
+        href = urlparse(obj.href)
+        netloc = urlparse(self.service_url).netloc
+        rest_url = href._replace(netloc=netloc).geturl()
+        headers = {"Content-type": content_type, "Accept": content_type}
+
+        resp = self.http_request(rest_url, method=obj.save_method.lower(), data=obj.message(), headers=headers)
+        if resp.status_code not in (200, 201):
+            raise FailedRequestError(f"Failed to save to Geoserver catalog: {resp.status_code}, {resp.text}")
+
+        self.invalidate(_name(workspace))
+        return resp
+
+    def invalidate(self, workspace):
+        """
+        清除指定工作空间下的对象及图层列表的请求缓存
+        workspace：工作空间的名称
+        """
+        prefix = f"{self.service_url}/workspaces/{workspace}/"
+        layers = f"{self.service_url}/layers"
+        for url in list(self._cache):
+            if url.startswith(prefix) or url.startswith(layers):
+                self._cache.pop(url, None)
     
     def setup_connection(self, retries=3, backoff_factor=0.9):
         self.client = requests.session()
@@ -142,4 +279,6 @@ class GeoServerCatalog(Catalog):
                 method_whitelist = set(['HEAD', 'TRACE', 'GET', 'PUT', 'POST', 'OPTIONS', 'DELETE'])
             ) # method_whitelist : requests <= 2.22.0
 
-        self.client.mount(f"{parsed_url.scheme}://", HTTPAdapter(max_retries=retry))
+        adapter = InstrumentedHTTPAdapter(metrics=self.metrics, timeout=self.timeout, max_retries=retry,
+                                          pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self.client.mount(f"{parsed_url.scheme}://", adapter)
@@ -1,17 +1,71 @@
-import subprocess
-import geoserver.util
+from concurrent.futures import ThreadPoolExecutor
+import os
+import re
+from urllib.parse import urlencode
+from geoserver.catalog import prepare_upload_bundle
 from GeoServerCatalog import GeoServerCatalog
+from CatalogCache import CatalogCache
+from CatalogIndex import CatalogIndex
+import StyleTemplates
+from GwcSeeder import GwcSeeder
+from StreamingUpload import shapefileMembers
+import ShapefileIO
+import StyleClassifier
+from StyleRegistry import StyleRegistry, fingerprint
+
+# 金字塔、统计、COG、重投影、镶嵌和GeoPackage等依赖GDAL的模块在使用它们的方法中导入，
+# 未安装GDAL时仍可使用发布shapefile、样式和目录管理等功能
 
 
 class GeoServerService(object):
     """
     基于GeoServerCatalog库封装的常用服务类
+    工作空间、数据存储、图层和样式的查询结果会缓存cacheTtl秒，通过本类创建、删除对象时直接更新缓存
     """
-    def __init__(self, url, username, password) -> None:
-        self.__cat = GeoServerCatalog(url, username, password)
+    def __init__(self, url, username, password, cacheTtl=60, cacheSize=10000, poolSize=10, timeout=None, metrics=None) -> None:
+        """
+        url：geoserver rest地址
+        username：用户名
+        password：密码
+        cacheTtl：查询缓存和样式指纹索引的有效期（秒），可选，默认为60，为0时不缓存
+        cacheSize：查询缓存的最大条数，可选，默认为10000
+        poolSize：http连接池的最大连接数，可选，默认为10，batchPublish的workers较大时应同步调大
+        timeout：http请求超时（秒），可以是(连接超时, 读取超时)，可选，默认不超时
+        metrics：HttpMetrics对象，用于记录http请求指标，可选
+        """
+        self.__cat = GeoServerCatalog(url, username, password, pool_size=poolSize, timeout=timeout, metrics=metrics)
+        self.__cache = CatalogCache(cacheTtl, cacheSize)
+        self.__metrics = metrics
+        self.__seeder = GwcSeeder(self.__cat)
+        self.__styles = StyleRegistry(self.__cat, ttl=cacheTtl)
 
     def save(self, obj):
         self.__cat.save(obj)
+        # 无法确定保存的是哪个对象，清空查询缓存和样式指纹索引
+        self.__cache.clear()
+        self.__styles.clear()
+
+    def clearCache(self):
+        """
+        清空查询缓存和样式指纹索引，在其他程序修改了geoserver目录后调用
+        """
+
+        self.__cache.clear()
+        self.__styles.clear()
+
+    def getMetrics(self):
+        """
+        return http请求指标的字典，见HttpMetrics.snapshot，未设置metrics时为None
+        """
+
+        return self.__metrics.snapshot() if self.__metrics is not None else None
+
+    def getMetricsText(self):
+        """
+        return Prometheus文本格式的http请求指标，未设置metrics时为None
+        """
+
+        return self.__metrics.prometheus() if self.__metrics is not None else None
 
     def getWorkspace(self, workspaceName):
         """
@@ -20,7 +74,7 @@ class GeoServerService(object):
         return Workspace
         """
 
-        return self.__cat.get_workspace(workspaceName)
+        return self.__cache.cached(("workspace", workspaceName), lambda: self.__cat.get_workspace(workspaceName))
 
     def isWorkspaceExist(self, workspaceName):
         """
@@ -57,7 +111,8 @@ class GeoServerService(object):
                 res["info"] = "工作空间已存在：{0}".format(workspaceName)
                 return res
 
-            self.__cat.create_workspace(workspaceName, "http://{0}.com".format(workspaceName))
+            workspace = self.__cat.create_workspace(workspaceName, "http://{0}.com".format(workspaceName))
+            self.__cache.put(("workspace", workspaceName), workspace)
             res["status"] = "success"
             return res
         except Exception as e:
@@ -73,6 +128,10 @@ class GeoServerService(object):
         workspace = self.getWorkspace(workspaceName)
         if workspace != None:
             self.__cat.delete(workspace, None, True)
+            self.__cache.put(("workspace", workspaceName), None)
+            for kind in ("store", "layer", "style"):
+                self.__cache.invalidatePrefix((kind, workspaceName))
+            self.__styles.clear()
 
     def getStore(self, workspaceName, storeName):
         """
@@ -82,7 +141,7 @@ class GeoServerService(object):
         return Store
         """
 
-        return self.__cat.get_store(storeName, workspaceName)
+        return self.__cache.cached(("store", workspaceName, storeName), lambda: self.__cat.get_store(storeName, workspaceName))
     
     def isStoreExist(self, workspaceName, storeName):
         """
@@ -108,6 +167,9 @@ class GeoServerService(object):
         store = self.getStore(workspaceName, storeName)
         if store != None:
             self.__cat.delete(store, None, True)
+            self.__cache.put(("store", workspaceName, storeName), None)
+            # 会同时删除数据存储下的图层
+            self.__cache.invalidatePrefix(("layer", workspaceName))
 
     def getLayer(self, workspaceName, layerName):
         """
@@ -118,7 +180,7 @@ class GeoServerService(object):
         """
 
         layerNameReg = "{0}:{1}".format(workspaceName, layerName)
-        return self.__cat.get_layer(layerNameReg)
+        return self.__cache.cached(("layer", workspaceName, layerName), lambda: self.__cat.get_layer(layerNameReg))
 
     def isLayerExist(self, workspaceName, layerName):
         """
@@ -134,13 +196,39 @@ class GeoServerService(object):
         else:
             return True
 
-    def createShapeLayer(self, workspaceName, layerName, shapePath, charset):
+    def createShapeIndex(self, shapePath, charset=None, maxDepth=None):
+        """
+        在shp文件旁生成.qix四叉树空间索引，geoserver据此按范围读取要素，而不是每次GetMap都扫描整个文件
+        shapePath：shape文件的路径
+        charset：dbf的字符集，可选
+        maxDepth：四叉树的最大深度，可选，默认按要素数计算
+        return {path, geometryType, featureCount, extent, charset, fields, index, depth}
+        读取失败时抛出ShapefileError
+        """
+
+        return ShapefileIO.buildIndex(shapePath, maxDepth, charset)
+
+    def createShapeIndexes(self, shapePaths, charset=None, maxDepth=None, workers=None):
+        """
+        多进程并行生成多个shapefile的.qix空间索引
+        shapePaths：shape文件路径的列表，或包含shape文件的文件夹路径
+        workers：并行的进程数，可选，默认为cpu核数
+        return 与shapePaths顺序一致的结果列表 [{status, info, data}]，data见createShapeIndex
+        """
+
+        return ShapefileIO.buildIndexes(shapePaths, maxDepth, charset, workers)
+
+    def createShapeLayer(self, workspaceName, layerName, shapePath, charset, streaming=True, progress=None, buildIndex=False, seed=None):
         """
         创建Shp图层
         workspaceName： 图层所在的工作空间的名称
         layerName：图层的名称
         shapePath：shape文件的路径
         charset：dbf的字符集
+        streaming：是否边压缩边上传，可选，默认为True；为False时先生成临时zip文件再上传，适用于不支持分块传输的代理
+        progress：上传进度回调函数 progress(sent, total, rate)，total在边压缩边上传时为None，可选
+        buildIndex：是否在发布前生成.qix空间索引并随shapefile一起上传，可选，默认为False
+        seed：发布成功后的切片缓存参数，可选，格式见seedLayer的参数，例如{zoomStart:0, zoomStop:12, threads:4, wait:True}
         styleParas：图层的样式参数, 
                    point-{type:circle/rectangle/star, color:"#000000", transparency:0.5, size:10}
                    polyline/line-{color:"#000000", width:1}
@@ -169,14 +257,30 @@ class GeoServerService(object):
                 res["info"] = "图层已存在：{0}".format(layerName)
                 return res
 
+            # 生成空间索引
+            shapefile = None
+            if buildIndex:
+                try:
+                    shapefile = self.createShapeIndex(shapePath, charset)
+                except ShapefileIO.ShapefileError as e:
+                    res["info"] = "文件解析错误：{0}".format(e)
+                    return res
+
             # 创建图层
             workspace = self.getWorkspace(workspaceName)
+            archive = None
             try:
-                data = geoserver.util.shapefile_and_friends(shapePath)
-                self.__cat.create_featurestore(layerName, data, workspace, True, charset)
+                data = shapefileMembers(layerName, shapePath)
+                if not streaming:
+                    archive = data = prepare_upload_bundle(layerName, {os.path.splitext(k)[1][1:]: v for k, v in data.items()})
+                self.__cat.create_featurestore(layerName, data, workspace, True, charset, progress)
             except Exception as e:
-                res["info"] = "文件解析错误"
+                res["info"] = "文件解析错误：{0}".format(e)
                 return res
+            finally:
+                if archive is not None:
+                    os.remove(archive)
+                self.__invalidateCreated(workspaceName, layerName)
 
             # 获取创建的图层
             layer = self.getLayer(workspaceName, layerName)
@@ -185,20 +289,156 @@ class GeoServerService(object):
             res["status"] = "success"
             res["data"] = {
                 "layer": layer,
-                "default_style": styleType
+                "default_style": styleType,
+                "shapefile": shapefile
+            }
+            return self.__seedCreated(res, workspaceName, layerName, seed)
+        except Exception as e:
+            res["info"] = repr(e)
+            return res
+
+    def updateShapeLayer(self, workspaceName, layerName, shapePath, charset, streaming=True, progress=None):
+        """
+        原位更新已发布的Shp图层：重新上传shapefile并替换数据存储中的数据，不删除和重建图层，图层的样式等配置保持不变
+        workspaceName： 图层所在的工作空间的名称
+        layerName：图层的名称，数据存储的名称与图层相同
+        shapePath：更新后的shape文件的路径，字段结构应与已发布的数据一致
+        charset、streaming、progress：见createShapeLayer
+        return {
+            status: 状态，success-更新成功;fail-更新失败
+            info: 信息, success-""; fail-图层不存在/文件解析错误/其他信息
+            data: None
+        }
+        """
+
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+
+        try:
+            if not self.isLayerExist(workspaceName, layerName):
+                res["info"] = "图层不存在：{0}".format(layerName)
+                return res
+
+            archive = None
+            try:
+                data = shapefileMembers(layerName, shapePath)
+                if not streaming:
+                    archive = data = prepare_upload_bundle(layerName, {os.path.splitext(k)[1][1:]: v for k, v in data.items()})
+                self.__cat.create_featurestore(layerName, data, workspaceName, True, charset, progress, update="overwrite")
+            except Exception as e:
+                res["info"] = "文件解析错误：{0}".format(e)
+                return res
+            finally:
+                if archive is not None:
+                    os.remove(archive)
+                self.__invalidateCreated(workspaceName, layerName)
+
+            res["status"] = "success"
+            return res
+        except Exception as e:
+            res["info"] = repr(e)
+            return res
+
+    def createGeoPackage(self, shapePath, gpkgPath, layerName=None, charset=None, batchSize=100000, progress=None):
+        """
+        将shapefile转换为带R-tree空间索引的GeoPackage
+        shapePath：shape文件的路径
+        gpkgPath：生成的GeoPackage文件的路径
+        layerName：GeoPackage中的表名，可选，默认为shape文件名
+        charset：dbf的字符集，可选，默认根据.cpg文件判断
+        batchSize：每个事务写入的要素数，可选，默认为100000
+        progress：进度回调函数 progress(complete)，可选
+        return {path, layer, featureCount}
+        转换失败时抛出GeoPackageError
+        """
+        from GeoPackageBuilder import GeoPackageBuilder
+        builder = GeoPackageBuilder(shapePath, gpkgPath, layerName, charset, batchSize, progress)
+        return builder.build()
+
+    def createGeoPackageLayer(self, workspaceName, layerName, shapePath, gpkgPath, charset=None, batchSize=100000, progress=None,
+                              upload=False, uploadProgress=None):
+        """
+        创建GeoPackage图层：先将shapefile转换为GeoPackage，再以GeoPackage数据存储发布，适用于大型shapefile
+        workspaceName： 图层所在的工作空间的名称
+        layerName：图层的名称
+        shapePath：shape文件的路径
+        gpkgPath：生成的GeoPackage文件的路径
+        charset：dbf的字符集，可选
+        batchSize：每个事务写入的要素数，可选，默认为100000
+        progress：转换进度回调函数 progress(complete)，可选
+        upload：是否将GeoPackage文件上传到geoserver，可选，默认为False，即geoserver直接读取gpkgPath
+        uploadProgress：上传进度回调函数 progress(sent, total, rate)，可选
+        return {
+            status: 状态，success-创建成功;fail-创建失败
+            info: 信息, success-""; fail-转换错误/工作空间不存在/图层已存在/其他信息
+            data: {
+                layer：生成的图层对象,
+                default_style: 图层的默认样式,
+                geopackage: {path, layer, featureCount}
+            }
+        }
+        """
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+
+        try:
+            # 判断工作空间是否存在
+            if not self.isWorkspaceExist(workspaceName):
+                res["info"] = "工作空间不存在：{0}".format(workspaceName)
+                return res
+
+            # 判断图层是否存在
+            if self.isLayerExist(workspaceName, layerName):
+                res["info"] = "图层已存在：{0}".format(layerName)
+                return res
+
+            # 先将shapefile转换为GeoPackage
+            try:
+                geopackage = self.createGeoPackage(shapePath, gpkgPath, layerName, charset, batchSize, progress)
+            except Exception as e:
+                res["info"] = "转换错误：{0}".format(e)
+                return res
+
+            # 创建图层
+            workspace = self.getWorkspace(workspaceName)
+            try:
+                self.__cat.create_geopackage_store(layerName, gpkgPath, workspace, layerName, upload, progress=uploadProgress)
+            except Exception as e:
+                res["info"] = "文件解析错误：{0}".format(e)
+                return res
+            finally:
+                self.__invalidateCreated(workspaceName, layerName)
+
+            # 获取创建的图层
+            layer = self.getLayer(workspaceName, layerName)
+            styleType = layer.default_style.name
+
+            res["status"] = "success"
+            res["data"] = {
+                "layer": layer,
+                "default_style": styleType,
+                "geopackage": geopackage
             }
             return res
         except Exception as e:
             res["info"] = repr(e)
             return res
 
-    def __createTiffLayer(self, workspaceName, layerName, tiffPath, pyramid=False):
+    def __createTiffLayer(self, workspaceName, layerName, tiffPath, storeType="GeoTIFF", upload=False, progress=None):
         """
         创建Tiff图层
         workspaceName： 图层所在的工作空间的名称
         layerName：图层的名称
         tiffPath：tiff文件/夹的路径
-        pyramid: 是否为金字塔结构,默认false
+        storeType: 栅格存储类型，GeoTIFF/ImagePyramid-金字塔结构/ImageMosaic-镶嵌数据集，默认GeoTIFF
+        upload：是否将tiff文件上传到geoserver的数据目录，默认false，即geoserver直接读取tiffPath
+        progress：上传进度回调函数 progress(sent, total, rate)，可选
         return {
             status: 状态，success-创建成功;fail-创建失败
             info: 信息, success-""; fail-工作空间不存在/图层已存在/其他信息
@@ -229,14 +469,13 @@ class GeoServerService(object):
             # 创建图层
             workspace = self.getWorkspace(workspaceName)
             try:
-                tiffType = "GeoTIFF"
-                if pyramid:
-                    tiffType = "ImagePyramid"
-
-                self.__cat.create_coveragestore(name=layerName, workspace=workspace, path=tiffPath, type=tiffType, layer_name=layerName)
+                self.__cat.create_coveragestore(name=layerName, workspace=workspace, path=tiffPath, type=storeType, layer_name=layerName,
+                                                upload_data=upload, fetch=False, progress=progress)
             except Exception as e:
-                res["info"] = "文件解析错误"
+                res["info"] = "文件解析错误：{0}".format(e)
                 return res
+            finally:
+                self.__invalidateCreated(workspaceName, layerName)
 
             # 获取创建的图层
             layer = self.getLayer(workspaceName, layerName)
@@ -252,47 +491,220 @@ class GeoServerService(object):
             res["info"] = repr(e)
             return res
 
-    def createTiffLayer(self, workspaceName, layerName, tiffPath):
+    def __seedCreated(self, res, workspaceName, layerName, seed):
+        """
+        图层发布成功后按seed参数提交切片缓存任务，结果记录在res["data"]["seed"]中，切片缓存失败不影响发布结果
+        """
+
+        if seed and res["status"] == "success":
+            res["data"]["seed"] = self.seedLayer(workspaceName, layerName, **seed)
+        return res
+
+    def __invalidateCreated(self, workspaceName, layerName):
+        """
+        创建图层后清除同名数据存储和图层的缓存（包括不存在的负缓存）
+        """
+
+        self.__cache.invalidate(("store", workspaceName, layerName))
+        self.__cache.invalidate(("layer", workspaceName, layerName))
+
+    def createTiffLayer(self, workspaceName, layerName, tiffPath, upload=False, progress=None, seed=None, targetCrs=None, warpedPath=None):
         """
         创建Tiff图层：适用于文件大小<2GB的Tiff
         workspaceName： 图层所在的工作空间的名称
         layerName：图层的名称
         tiffPath：tiff文件的路径
+        upload：是否将tiff文件上传到geoserver，可选，默认为False，即geoserver与本程序共享文件路径；
+                为True时分块读取文件上传，内存占用与文件大小无关，适用于geoserver在其他机器上的情况
+        progress：上传进度回调函数 progress(sent, total, rate)，可选
+        seed：发布成功后的切片缓存参数，可选，格式见seedLayer的参数，例如{zoomStart:0, zoomStop:12, threads:4, wait:True}
+        targetCrs：发布前重投影到的坐标系，例如"EPSG:3857"，可选，默认不重投影，见warpTiff
+        warpedPath：重投影后的tiff文件的路径，可选，默认为tiff文件旁的"文件名.warped.tif"
         return {
             status: 状态，success-创建成功;fail-创建失败
-            info: 信息, success-""; fail-工作空间不存在/图层已存在/其他信息
+            info: 信息, success-""; fail-重投影错误/工作空间不存在/图层已存在/其他信息
             data: Layer
         }
         """
 
-        return self.__createTiffLayer(workspaceName, layerName, tiffPath)
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+        try:
+            tiffPath = self.__warpSource(tiffPath, targetCrs, warpedPath)
+        except Exception as e:
+            res["info"] = "重投影错误：{0}".format(e)
+            return res
+
+        res = self.__createTiffLayer(workspaceName, layerName, tiffPath, upload=upload, progress=progress)
+        return self.__seedCreated(res, workspaceName, layerName, seed)
+
+    def updateTiffLayer(self, workspaceName, layerName, tiffPath, upload=False, progress=None, targetCrs=None, warpedPath=None):
+        """
+        原位更新已发布的Tiff图层：upload时重新上传tiff并替换数据存储中的文件，否则将数据存储指向tiffPath，
+        再重置数据存储并重新计算范围，不删除和重建图层，图层的样式等配置保持不变
+        workspaceName： 图层所在的工作空间的名称
+        layerName：图层的名称，数据存储和覆盖的名称与图层相同
+        tiffPath：更新后的tiff文件的路径，波段结构应与已发布的数据一致
+        upload、progress、targetCrs、warpedPath：见createTiffLayer
+        return {
+            status: 状态，success-更新成功;fail-更新失败
+            info: 信息, success-""; fail-重投影错误/图层不存在/文件解析错误/其他信息
+            data: None
+        }
+        """
+
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+
+        try:
+            if not self.isLayerExist(workspaceName, layerName):
+                res["info"] = "图层不存在：{0}".format(layerName)
+                return res
+
+            try:
+                tiffPath = self.__warpSource(tiffPath, targetCrs, warpedPath)
+            except Exception as e:
+                res["info"] = "重投影错误：{0}".format(e)
+                return res
+
+            try:
+                if upload:
+                    self.__cat.create_coveragestore(name=layerName, workspace=workspaceName, path=tiffPath, layer_name=layerName, upload_data=True,
+                                                    overwrite=True, fetch=False, progress=progress)
+                else:
+                    store = self.getStore(workspaceName, layerName)
+                    store.url = tiffPath if tiffPath.startswith("file:") else "file:" + tiffPath
+                    self.__cat.save(store)
+            except Exception as e:
+                res["info"] = "文件解析错误：{0}".format(e)
+                return res
+            finally:
+                self.__invalidateCreated(workspaceName, layerName)
+
+            # geoserver缓存了文件的读取器和范围，重置后读取新文件
+            self.__resetStore(workspaceName, layerName)
+            self.__recalculateBounds(workspaceName, layerName, layerName)
+            res["status"] = "success"
+            return res
+        except Exception as e:
+            res["info"] = repr(e)
+            return res
+
+    def warpTiff(self, tiffPath, warpedPath, targetCrs="EPSG:3857", resampling="bilinear", workers=None, progress=None, resume=True):
+        """
+        将tiff重投影到服务的坐标系，按窗口由进程池并行处理，内存占用只与窗口大小有关
+        客户端主要请求某一坐标系（例如EPSG:3857）的切片时，发布前重投影一次，geoserver不必在每次GetMap时重投影
+        tiffPath：tiff文件的路径
+        warpedPath：重投影后的tiff文件的路径
+        targetCrs：目标坐标系，可选，默认为EPSG:3857
+        resampling：重采样方式，可选，默认为bilinear
+        workers：并行的进程数，可选，默认为cpu核数
+        progress：进度回调函数 progress(done, total)，可选
+        resume：源影像和参数未变化时是否跳过，可选，默认为True
+        return 重投影结果，格式见WarpBuilder.build
+        重投影失败时抛出WarpError
+        """
+        from WarpBuilder import WarpBuilder
+        builder = WarpBuilder(tiffPath, warpedPath, targetCrs, resampling, workers=workers, progress=progress, resume=resume)
+        return builder.build()
+
+    def __warpSource(self, tiffPath, targetCrs, warpedPath, workers=None):
+        """
+        return 用于发布的tiff路径：未指定targetCrs或坐标系已一致时为tiffPath，否则为重投影后的文件
+        """
+
+        if targetCrs is None:
+            return tiffPath
+        from WarpBuilder import WarpBuilder
+        warpedPath = warpedPath or os.path.splitext(tiffPath)[0] + ".warped.tif"
+        builder = WarpBuilder(tiffPath, warpedPath, targetCrs, workers=workers)
+        if not builder.needsWarp():
+            return tiffPath
+        return builder.build()["path"]
+
+    def getRasterStatistics(self, tiffPath, approx=False, bins=256, workers=None):
+        """
+        统计tiff每个波段的最值、均值、标准差、直方图和百分位数，按条带分块读取，各波段并行统计
+        tiffPath：tiff文件的路径
+        approx：是否使用overview近似统计，可选，默认为False，即全分辨率统计
+        bins：返回的直方图分箱数，可选，默认为256
+        workers：并行的进程数，可选，默认为cpu核数
+        return 统计结果，格式见RasterStatistics.compute
+        统计失败时抛出StatisticsError
+        """
+        from RasterStatistics import RasterStatistics
+        return RasterStatistics(tiffPath, approx=approx, bins=bins, workers=workers).compute()
+
+    def planPyramidTiff(self, tiffPath, tiffDir=None, creationOptions=None, workers=None, calibrate=False):
+        """
+        规划金字塔切片的层级和切块分辨率，并估算切片数量、磁盘占用和耗时，不生成任何文件
+        tiffPath：tiff文件的路径
+        tiffDir：生成的金字塔文件夹的路径，可选，指定时检查所在磁盘的剩余空间和inode
+        creationOptions：切片的GTiff创建参数，可选，默认为["ALPHA=YES"]
+        workers：并行切片的进程数，可选，默认为cpu核数
+        calibrate：是否写出一个样本切片实测处理速度和压缩比，可选，默认为False
+        return 规划结果，格式见PyramidPlanner.plan
+        规划失败时抛出PlanError
+        """
+        from PyramidPlanner import PyramidPlanner
+        options = {} if creationOptions is None else {"creationOptions": creationOptions}
+        return PyramidPlanner(tiffPath, workers=workers, **options).plan(tiffDir, calibrate)
 
-    def createPyramidTiff(self, tiffPath, tiffDir, levels=4, blockWidth=2048, blockHeight=2048):
+    def createPyramidTiff(self, tiffPath, tiffDir, levels=None, blockWidth=None, blockHeight=None, workers=None, progress=None, resume=True,
+                          creationOptions=None, rescale="percentile", stretch=(2, 98), scale=None, sparse=True):
         """
         对tiff进行金字塔切片
         tiffPath：tiff文件的路径
         tiffDir：生成的金字塔文件夹的路径
-        level：金字塔层级，可选，默认为4
-        blockWidth: 金字塔切块的宽度分辨率，可选，默认为2048
-        blockHeight: 金字塔切块的高度分辨率，可选，默认为2048
+        level：金字塔层级，可选，默认按影像尺寸规划，见planPyramidTiff
+        blockWidth: 金字塔切块的宽度分辨率，可选，默认按影像尺寸规划
+        blockHeight: 金字塔切块的高度分辨率，可选，默认按影像尺寸规划
+        workers：并行切片的进程数，可选，默认为cpu核数
+        progress：进度回调函数 progress(level, done, total)，可选
+        resume：是否根据切片清单增量切片，跳过已完成且源数据未变化的切片，可选，默认为True
+        creationOptions：切片的GTiff创建参数，例如["ALPHA=YES", "TILED=YES", "COMPRESS=DEFLATE"]，可选，默认为["ALPHA=YES"]
+        rescale：非Byte影像拉伸到Byte的方式，可选，默认为percentile
+                 percentile-按stretch百分位数拉伸;minmax-按最值拉伸;None-直接截断
+        stretch：percentile拉伸的(低, 高)百分位数，可选，默认为(2, 98)
+        scale：每个波段的拉伸范围 [(最小值, 最大值)]，可选，指定时不再统计
+        sparse：是否跳过没有有效像素（全为nodata或alpha全为0）的切片，可选，默认为True
+        切片失败时抛出PyramidError
         """
-        exeStr = 'python gdal_retile.py -v -r bilinear -ot BYTE -levels {0} -ps {1} {2} -co "ALPHA=YES" -targetDir {3} {4}'.format(levels, blockWidth, blockHeight, tiffDir, tiffPath)
-        process = subprocess.Popen(exeStr, shell=True)
-        process.wait()
-
-    def createPyramidTiffLayer(self, workspaceName, layerName, tiffPath, tiffDir, levels=4, blockWidth=2048, blockHeight=2048):
+        from PyramidBuilder import PyramidBuilder
+        options = {} if creationOptions is None else {"creationOptions": creationOptions}
+        builder = PyramidBuilder(tiffPath, tiffDir, levels, blockWidth, blockHeight, workers=workers, progress=progress, resume=resume,
+                                 rescale=rescale, stretch=stretch, scale=scale, sparse=sparse, **options)
+        return builder.build()
+
+    def createPyramidTiffLayer(self, workspaceName, layerName, tiffPath, tiffDir, levels=None, blockWidth=None, blockHeight=None, workers=None, progress=None, resume=True,
+                               seed=None, creationOptions=None, rescale="percentile", stretch=(2, 98), scale=None, sparse=True, targetCrs=None, warpedPath=None):
         """
         创建金字塔切片后的Tiff图层：适用于文件大小>=2GB的Tiff
         workspaceName： 图层所在的工作空间的名称
         layerName：图层的名称
         tiffPath：tiff文件的路径
         tiffDir：生成的金字塔文件夹的路径
-        level：金字塔层级，可选，默认为4
-        blockWidth: 金字塔切块的宽度分辨率，可选，默认为2048
-        blockHeight: 金字塔切块的高度分辨率，可选，默认为2048
+        level：金字塔层级，可选，默认按影像尺寸规划，见planPyramidTiff
+        blockWidth: 金字塔切块的宽度分辨率，可选，默认按影像尺寸规划
+        blockHeight: 金字塔切块的高度分辨率，可选，默认按影像尺寸规划
+        workers：并行切片的进程数，可选，默认为cpu核数
+        progress：进度回调函数 progress(level, done, total)，可选
+        resume：是否根据切片清单增量切片，可选，默认为True
+        creationOptions：切片的GTiff创建参数，可选，默认为["ALPHA=YES"]
+        rescale、stretch、scale：非Byte影像的拉伸参数，见createPyramidTiff
+        sparse：是否跳过没有有效像素的切片，可选，默认为True
+        seed：发布成功后的切片缓存参数，可选，格式见seedLayer的参数，例如{zoomStart:0, zoomStop:12, threads:4, wait:True}
+        targetCrs：切片前重投影到的坐标系，例如"EPSG:3857"，可选，默认不重投影，见warpTiff
+        warpedPath：重投影后的tiff文件的路径，可选，默认为tiff文件旁的"文件名.warped.tif"
         return {
             status: 状态，success-创建成功;fail-创建失败
-            info: 信息, success-""; fail-工作空间不存在/图层已存在/其他信息
+            info: 信息, success-""; fail-重投影错误/切片错误/工作空间不存在/图层已存在/其他信息
             data: {
                 layer：生成的图层对象,
                 default_style: 图层的默认样式
@@ -305,248 +717,701 @@ class GeoServerService(object):
             "data": None
         }
         try:
-            # 先对tiff进行切片，生成金字塔结构目录
+            # 需要时先重投影，切片读取重投影后的文件
+            try:
+                tiffPath = self.__warpSource(tiffPath, targetCrs, warpedPath, workers)
+            except Exception as e:
+                res["info"] = "重投影错误：{0}".format(e)
+                return res
+
+            # 再对tiff进行切片，生成金字塔结构目录
             try:
-                self.createPyramidTiff(tiffPath, tiffDir, levels, blockWidth, blockHeight)
+                self.createPyramidTiff(tiffPath, tiffDir, levels, blockWidth, blockHeight, workers, progress, resume, creationOptions,
+                                       rescale, stretch, scale, sparse)
             except Exception as e:
-                res["info"] = "切片错误"
+                res["info"] = "切片错误：{0}".format(e)
                 return res
 
-            # 再创建金字塔数据图层
-            return self.__createTiffLayer(workspaceName, layerName, tiffDir, True)
+            # 最后创建金字塔数据图层
+            res = self.__createTiffLayer(workspaceName, layerName, tiffDir, "ImagePyramid")
+            return self.__seedCreated(res, workspaceName, layerName, seed)
         except Exception as e:
             res["info"] = repr(e)
             return res
 
-    def deleteLayer(self, workspaceName, layerName):
+    def updatePyramidTiffLayer(self, workspaceName, layerName, tiffPath, tiffDir, workers=None, progress=None, rescale="percentile",
+                               stretch=(2, 98), scale=None, sparse=True, targetCrs=None, warpedPath=None):
         """
-        删除图层
+        增量更新已发布的金字塔图层：源影像局部更新后，按切片清单只重新生成数据变化的切片及其上层切片，
+        只重建切片文件有增删的层级的镶嵌索引，再重置数据存储，不删除和重建图层
+        层级数、切块分辨率和创建参数沿用已有的金字塔；源影像尺寸或金字塔结构变化时不更新，需要删除后重新发布
         workspaceName： 图层所在的工作空间的名称
         layerName：图层的名称
+        tiffPath：更新后的tiff文件的路径
+        tiffDir：已发布的金字塔文件夹的路径
+        workers、progress、rescale、stretch、scale、sparse：切片参数，见createPyramidTiff；未指定scale时沿用已有金字塔的拉伸范围
+        targetCrs、warpedPath：发布时的重投影参数，见createPyramidTiffLayer
+        return {
+            status: 状态，success-更新成功;fail-切片清单不存在/金字塔结构变化/重投影错误/切片错误/图层不存在/其他信息
+            info: 信息
+            data: {
+                levels：[{level, built：重新生成的切片数, empty：没有有效像素的切片数, indexed：是否重建了该级的镶嵌索引}]，只包括有变化的层级,
+                reset：是否重置了数据存储
+            }
+        }
         """
 
-        layer = self.getLayer(workspaceName, layerName)
-        if layer != None:
-            self.__cat.delete(layer, None, True)
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
 
-    def __getPointStyle(self, styleParas):
-        """
-        生成点类型的样式xml
-        styleParas：样式参数 {type:circle/rectangle/star, color:"#000000", transparency:0.5, size:10}
-        return xml
-        """
-        
-        type = "circle"
-        if "type" in styleParas:
-            type = styleParas["type"]
-
-        color = "#000000"
-        if "color" in styleParas:
-            color = styleParas["color"]
-
-        transparency = 0
-        if "transparency" in styleParas:
-            transparency = styleParas["transparency"]
-
-        size = 1
-        if "size" in styleParas:
-            size = styleParas["size"]
-
-        style = '<?xml version="1.0" encoding="UTF-8"?>\r\n \
-            <StyledLayerDescriptor version="1.0.0" \r\n \
-                xsi:schemaLocation="http://www.opengis.net/sld StyledLayerDescriptor.xsd" \r\n \
-                xmlns="http://www.opengis.net/sld" \r\n \
-                xmlns:ogc="http://www.opengis.net/ogc" \r\n \
-                xmlns:xlink="http://www.w3.org/1999/xlink" \r\n \
-                xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\r\n \
-                <NamedLayer>\r\n \
-                    <Name>default_point</Name>\r\n \
-                    <UserStyle>\r\n \
-                        <FeatureTypeStyle>\r\n \
-                            <Rule>\r\n \
-                                <PointSymbolizer>\r\n \
-                                    <Graphic>\r\n \
-                                        <Mark>\r\n \
-                                            <WellKnownName>{0}</WellKnownName>\r\n \
-                                            <Fill>\r\n \
-                                              <CssParameter name="fill">{1}</CssParameter>\r\n \
-                                              <CssParameter name="fill-opacity">{2}</CssParameter>\r\n \
-                                            </Fill>\r\n \
-                                        </Mark>\r\n \
-                                        <Size>{3}</Size>\r\n \
-                                    </Graphic>\r\n \
-                                </PointSymbolizer>\r\n \
-                            </Rule>\r\n \
-                        </FeatureTypeStyle>\r\n \
-                    </UserStyle>\r\n \
-                </NamedLayer>\r\n\
-            </StyledLayerDescriptor>'.format(type, color, 1.0-transparency, size)
-        return style
-    
-    def __getPolylineStyle(self, styleParas):
-        """
-        生成线类型的样式xml
-        styleParas：样式参数 {color:"#000000", width:1}
-        return xml
-        """
-
-        color = "#000000"
-        if "color" in styleParas:
-            color = styleParas["color"]
-
-        width = 1
-        if "width" in styleParas:
-            width = styleParas["width"]
-
-        style = '<?xml version="1.0" encoding="UTF-8"?>\r\n \
-            <StyledLayerDescriptor version="1.0.0" \r\n \
-                xsi:schemaLocation="http://www.opengis.net/sld StyledLayerDescriptor.xsd" \r\n \
-                xmlns="http://www.opengis.net/sld" \r\n \
-                xmlns:ogc="http://www.opengis.net/ogc" \r\n \
-                xmlns:xlink="http://www.w3.org/1999/xlink" \r\n \
-                xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\r\n \
-                <NamedLayer>\r\n \
-                    <Name>default_line</Name>\r\n \
-                    <UserStyle>\r\n \
-                        <FeatureTypeStyle>\r\n \
-                            <Rule>\r\n \
-                                <LineSymbolizer>\r\n \
-                                    <Stroke>\r\n \
-                                        <CssParameter name="stroke">{0}</CssParameter>\r\n \
-                                        <CssParameter name="stroke-width">{1}</CssParameter>\r\n \
-                                    </Stroke>\r\n \
-                                </LineSymbolizer>\r\n \
-                            </Rule>\r\n \
-                        </FeatureTypeStyle>\r\n \
-                    </UserStyle>\r\n \
-                </NamedLayer>\r\n\
-            </StyledLayerDescriptor>'.format(color, width)
-        return style
+        try:
+            if not self.isLayerExist(workspaceName, layerName):
+                res["info"] = "图层不存在：{0}".format(layerName)
+                return res
 
-    def __getPolygonStyle(self, styleParas):
-        """
-        生成多边形类型的样式xml
-        styleParas：样式参数 {fill_color:"#AAAAAA", outline_color:"#000000", outline_width:1}
-        return xml
-        """
-
-        fill_color = "#AAAAAA"
-        if "fill_color" in styleParas:
-            fill_color = styleParas["fill_color"]
-
-        outline_color = "#000000"
-        if "outline_color" in styleParas:
-            outline_color = styleParas["outline_color"]
-
-        outline_width = 1
-        if "outline_width" in styleParas:
-            outline_width = styleParas["outline_width"]
-
-        style = '<?xml version="1.0" encoding="UTF-8"?>\r\n \
-            <StyledLayerDescriptor version="1.0.0" \r\n \
-                xsi:schemaLocation="http://www.opengis.net/sld StyledLayerDescriptor.xsd" \r\n \
-                xmlns="http://www.opengis.net/sld" \r\n \
-                xmlns:ogc="http://www.opengis.net/ogc" \r\n \
-                xmlns:xlink="http://www.w3.org/1999/xlink" \r\n \
-                xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\r\n \
-                <NamedLayer>\r\n \
-                    <Name>default_polygon</Name>\r\n \
-                    <UserStyle>\r\n \
-                        <FeatureTypeStyle>\r\n \
-                            <Rule>\r\n \
-                                <PolygonSymbolizer>\r\n \
-                                    <Fill>\r\n \
-                                        <CssParameter name="fill">{0}</CssParameter>\r\n \
-                                    </Fill>\r\n \
-                                    <Stroke>\r\n \
-                                        <CssParameter name="stroke">{1}</CssParameter>\r\n \
-                                        <CssParameter name="stroke-width">{2}</CssParameter>\r\n \
-                                    </Stroke>\r\n \
-                                </PolygonSymbolizer>\r\n \
-                            </Rule>\r\n \
-                        </FeatureTypeStyle>\r\n \
-                    </UserStyle>\r\n \
-                </NamedLayer>\r\n\
-            </StyledLayerDescriptor>'.format(fill_color, outline_color, outline_width)
-        return style
+            try:
+                tiffPath = self.__warpSource(tiffPath, targetCrs, warpedPath, workers)
+            except Exception as e:
+                res["info"] = "重投影错误：{0}".format(e)
+                return res
 
-    def getStyle(self, workspaceName, styleName):
-        """
-        通过名称获取样式
-        workspaceName： 样式所在的工作空间的名称
-        styleName：样式的名称
-        return Style
-        """
+            from PyramidBuilder import PyramidBuilder, PyramidManifest
+            manifestPath = PyramidBuilder(tiffPath, tiffDir).manifestPath
+            header = PyramidManifest.header(manifestPath)
+            levelDirs = [int(name) for name in os.listdir(tiffDir) if name.isdigit() and os.path.isdir(os.path.join(tiffDir, name))] if os.path.isdir(tiffDir) else []
+            if header is None or not levelDirs:
+                res["info"] = "切片清单或金字塔文件夹不存在：{0}".format(tiffDir)
+                return res
 
-        return self.__cat.get_style(styleName, workspaceName)
+            # 沿用已有金字塔的切片参数和拉伸范围，清单不会作废；源影像变化后重新统计的拉伸范围会不同，使全部切片失效
+            settings = header["settings"]
+            if scale is None:
+                scale = settings.get("scale")
+            builder = PyramidBuilder(tiffPath, tiffDir, max(levelDirs), settings["blockWidth"], settings["blockHeight"], settings["outputType"],
+                                     settings["creationOptions"], workers, progress, True, manifestPath, rescale, stretch, scale, sparse=sparse)
 
-    def isStyleExist(self, workspaceName, styleName):
+            try:
+                levels = builder.plan()
+                if (levels[0]["width"], levels[0]["height"]) != (settings["width"], settings["height"]):
+                    res["info"] = "金字塔结构变化：源影像尺寸由{0}x{1}变为{2}x{3}，需要删除后重新发布".format(
+                        settings["width"], settings["height"], levels[0]["width"], levels[0]["height"])
+                    return res
+                before = [_tileFiles(info["dir"]) for info in levels]
+                levels = builder.build()
+            except Exception as e:
+                res["info"] = "切片错误：{0}".format(e)
+                return res
+
+            from MosaicBuilder import MosaicBuilder
+            changed = []
+            for info, tiles in zip(levels, before):
+                reindex = _tileFiles(info["dir"]) != tiles
+                if not info["built"] and not reindex:
+                    continue
+                # geoserver首次配置金字塔时为每一级生成"级别.shp"镶嵌索引，切片有增删时重建，未配置的层级由geoserver生成
+                mosaic = MosaicBuilder(info["dir"], "*.tif", recursive=False)
+                indexed = reindex and os.path.exists(mosaic.indexPath)
+                if indexed:
+                    mosaic.build()
+                changed.append({"level": info["level"], "built": len(info["built"]), "empty": len(info["empty"]), "indexed": indexed})
+
+            if changed:
+                self.__resetStore(workspaceName, layerName)
+            res["status"] = "success"
+            res["data"] = {
+                "levels": changed,
+                "reset": bool(changed)
+            }
+            return res
+        except Exception as e:
+            res["info"] = repr(e)
+            return res
+
+    def createCogTiff(self, tiffPath, cogPath, blockSize=512, compress="DEFLATE", workers=None, progress=None):
         """
-        判断样式是否存在
-        workspaceName： 样式所在的工作空间的名称
-        styleName：样式的名称
-        return True-存在;False-不存在
+        将tiff转换为云优化GeoTIFF（COG）：内部分块并带有多级概视图的单个文件
+        tiffPath：tiff文件的路径
+        cogPath：生成的COG文件的路径
+        blockSize：内部分块的分辨率，可选，默认为512
+        compress：压缩方式，可选，默认为DEFLATE
+        workers：并行的线程数，可选，默认为cpu核数
+        progress：进度回调函数 progress(complete)，可选
+        转换失败时抛出CogError
         """
+        from CogBuilder import CogBuilder
+        builder = CogBuilder(tiffPath, cogPath, blockSize, compress, workers=workers, progress=progress)
+        return builder.build()
 
-        res = self.getStyle(workspaceName, styleName)
-        if res == None:
-            return False
-        else:
-            return True
-
-    def createStyle(self, workspaceName, styleName, styleType, styleParas):
+    def createCogLayer(self, workspaceName, layerName, tiffPath, cogPath, blockSize=512, compress="DEFLATE", workers=None, progress=None):
         """
-        创建样式
-        workspaceName： 样式所在的工作空间的名称
-        styleName：样式的名称
-        styleType：样式的类型 point/polyline/line/polygon
-        styleParas: 样式的参数, 
-                   point-{type:circle/rectangle/star, color:"#000000", transparency:0.5, size:10}
-                   polyline/line-{color:"#000000", width:1}
-                   polygon-{fill_color:"#AAAAAA", outline_color:"#000000", outline_width:1}
+        创建COG图层：先将tiff转换为COG，再以GeoTIFF类型发布，适用于文件大小>=2GB且未安装ImagePyramid插件的Tiff
+        workspaceName： 图层所在的工作空间的名称
+        layerName：图层的名称
+        tiffPath：tiff文件的路径
+        cogPath：生成的COG文件的路径
+        blockSize：内部分块的分辨率，可选，默认为512
+        compress：压缩方式，可选，默认为DEFLATE
+        workers：并行的线程数，可选，默认为cpu核数
+        progress：进度回调函数 progress(complete)，可选
         return {
             status: 状态，success-创建成功;fail-创建失败
-            info: 信息, success-""; fail-不支持的样式类型
-            data: Style
+            info: 信息, success-""; fail-转换错误/工作空间不存在/图层已存在/其他信息
+            data: {
+                layer：生成的图层对象,
+                default_style: 图层的默认样式
+            }
         }
         """
-
         res = {
             "status": "fail",
             "info": "",
             "data": None
         }
+        try:
+            # 先将tiff转换为COG
+            try:
+                self.createCogTiff(tiffPath, cogPath, blockSize, compress, workers, progress)
+            except Exception as e:
+                res["info"] = "转换错误：{0}".format(e)
+                return res
 
-        styleData = None
-        if styleType == "point":
-            styleData = self.__getPointStyle(styleParas)
-        elif styleType == "polyline" or styleType == "line":
-            styleData = self.__getPolylineStyle(styleParas)
-        elif styleType == "polygon":
-            styleData = self.__getPolygonStyle(styleParas)
-        else:
-            res["info"] = "不支持的样式类型"
+            # 再以GeoTIFF类型创建图层
+            return self.__createTiffLayer(workspaceName, layerName, cogPath)
+        except Exception as e:
+            res["info"] = repr(e)
+            return res
+
+    def createMosaicIndex(self, mosaicDir, pattern="*.tif", recursive=True, timeRegex=None, timeFormat=None, workers=None):
+        """
+        在本地为一个文件夹的tiff生成ImageMosaic的镶嵌索引和配置，只读取每个影像的文件头
+        mosaicDir：影像所在的文件夹，镶嵌名称为文件夹名
+        pattern：影像文件名的通配符，可选，默认为*.tif
+        recursive：是否包括子文件夹中的影像，可选，默认为True
+        timeRegex：从文件名提取时间的正则表达式，例如"[0-9]{8}"，可选，指定时启用时间维度
+        timeFormat：时间字符串的格式，例如"%Y%m%d"，可选，默认自动识别
+        workers：读取文件头的并发线程数，可选
+        return 索引信息，格式见MosaicBuilder.build
+        生成失败时抛出MosaicError
+        """
+        from MosaicBuilder import MosaicBuilder
+        builder = MosaicBuilder(mosaicDir, pattern, recursive, timeRegex, timeFormat, workers)
+        return builder.build()
+
+    def createMosaicLayer(self, workspaceName, layerName, mosaicDir, pattern="*.tif", recursive=True, timeRegex=None, timeFormat=None, workers=None,
+                          seed=None):
+        """
+        创建镶嵌数据集（ImageMosaic）图层：将一个文件夹的tiff作为一个图层发布，适用于按日期的卫星影像、分块的正射影像等
+        先在本地生成镶嵌索引和配置，geoserver创建数据存储时直接使用，不再扫描和读取全部影像
+        workspaceName： 图层所在的工作空间的名称
+        layerName：图层的名称
+        mosaicDir：影像所在的文件夹，geoserver需要能以相同路径访问
+        pattern、recursive、timeRegex、timeFormat、workers：生成镶嵌索引的参数，见createMosaicIndex
+        seed：发布成功后的切片缓存参数，可选，格式见seedLayer的参数
+        return {
+            status: 状态，success-创建成功;fail-创建失败
+            info: 信息, success-""; fail-索引错误/工作空间不存在/图层已存在/其他信息
+            data: {
+                layer：生成的图层对象,
+                default_style: 图层的默认样式,
+                mosaic：镶嵌索引信息，见MosaicBuilder.build
+            }
+        }
+        """
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+        try:
+            # 先在本地生成镶嵌索引
+            try:
+                mosaic = self.createMosaicIndex(mosaicDir, pattern, recursive, timeRegex, timeFormat, workers)
+            except Exception as e:
+                res["info"] = "索引错误：{0}".format(e)
+                return res
+
+            # 再创建镶嵌数据图层，覆盖的名称为镶嵌名称
+            res = self.__createTiffLayer(workspaceName, layerName, mosaic["dir"], "ImageMosaic")
+            if res["status"] != "success":
+                return res
+            res["data"]["mosaic"] = mosaic
+
+            # 有时间属性时启用时间维度
+            if mosaic["time"] is not None:
+                self.__enableTimeDimension(workspaceName, layerName, layerName)
+            return self.__seedCreated(res, workspaceName, layerName, seed)
+        except Exception as e:
+            res["info"] = repr(e)
+            return res
+
+    def __enableTimeDimension(self, workspaceName, storeName, coverageName):
+        """
+        启用镶嵌图层的时间维度，默认显示最新时间的影像
+        """
+
+        from MosaicBuilder import TIME_ATTRIBUTE
+        data = ("<coverage><enabled>true</enabled><metadata><entry key=\"time\"><dimensionInfo><enabled>true</enabled>"
+                "<attribute>{0}</attribute><presentation>LIST</presentation><units>ISO8601</units>"
+                "<defaultValue><strategy>MAXIMUM</strategy></defaultValue></dimensionInfo></entry></metadata></coverage>").format(TIME_ATTRIBUTE)
+        url = "{0}/workspaces/{1}/coveragestores/{2}/coverages/{3}.xml".format(self.__cat.service_url, workspaceName, storeName, coverageName)
+        resp = self.__cat.http_request(url, method="put", data=data, headers={"Content-type": "application/xml"})
+        if resp.status_code != 200:
+            raise Exception("启用时间维度失败：{0}, {1}".format(resp.status_code, resp.text))
+
+    def harvestMosaicGranules(self, workspaceName, layerName, paths):
+        """
+        向已发布的镶嵌数据集增量收集（harvest）影像，geoserver只读取新影像并追加到镶嵌索引，不重建数据存储，图层不中断
+        workspaceName： 图层所在的工作空间的名称
+        layerName：图层的名称，与createMosaicLayer一致，数据存储和覆盖的名称与图层相同
+        paths：新影像的路径列表，需位于镶嵌文件夹内，geoserver需要能以相同路径访问
+        return {
+            status: 状态，success-全部收集成功;fail-工作空间或图层不存在/部分影像收集失败/其他信息
+            info: 信息
+            data: {
+                harvested：收集成功的影像路径,
+                errors：[{path, info}]
+            }
+        }
+        """
+
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+
+        try:
+            if not self.isLayerExist(workspaceName, layerName):
+                res["info"] = "图层不存在：{0}".format(layerName)
+                return res
+
+            # geoserver按indexer.properties逐个读取影像并写入索引，同一数据存储的收集依次提交
+            url = "{0}/workspaces/{1}/coveragestores/{2}/external.imagemosaic".format(self.__cat.service_url, workspaceName, layerName)
+            harvested, errors = [], []
+            for path in paths:
+                data = "file://" + os.path.abspath(path).replace(os.sep, "/")
+                resp = self.__cat.http_request(url, method="post", data=data, headers={"Content-type": "text/plain"})
+                if resp.status_code in (200, 201, 202):
+                    harvested.append(path)
+                else:
+                    errors.append({"path": path, "info": "{0}, {1}".format(resp.status_code, resp.text)})
+            if harvested:
+                self.__recalculateBounds(workspaceName, layerName, layerName)
+
+            res["status"] = "fail" if errors else "success"
+            res["info"] = "{0}个影像收集失败".format(len(errors)) if errors else ""
+            res["data"] = {
+                "harvested": harvested,
+                "errors": errors
+            }
+            return res
+        except Exception as e:
+            res["info"] = repr(e)
+            return res
+
+    def removeMosaicGranules(self, workspaceName, layerName, filter=None, locations=None, purge="none", chunkSize=50):
+        """
+        从已发布的镶嵌数据集中删除影像，不重建数据存储
+        workspaceName： 图层所在的工作空间的名称
+        layerName：图层的名称，数据存储和覆盖的名称与图层相同
+        filter：按索引属性选择影像的CQL条件，例如"ingestion < 2024-01-01"，可选
+        locations：按镶嵌索引中的相对路径选择影像，可选
+        purge：none-只从索引中删除;metadata-同时删除影像的辅助文件;all-同时删除影像文件，可选，默认为none
+        chunkSize：按locations删除时每个请求的影像数，避免url过长，可选，默认为50
+        return {
+            status: 状态，success-删除成功;fail-图层不存在/参数错误/其他信息
+            info: 信息
+            data: {
+                filters：提交的CQL条件列表
+            }
+        }
+        """
+
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+
+        try:
+            if filter is None and not locations:
+                res["info"] = "未指定要删除的影像"
+                return res
+            if purge not in ("none", "metadata", "all"):
+                res["info"] = "不支持的删除方式：{0}".format(purge)
+                return res
+            if not self.isLayerExist(workspaceName, layerName):
+                res["info"] = "图层不存在：{0}".format(layerName)
+                return res
+
+            from MosaicBuilder import LOCATION_ATTRIBUTE
+            filters = [filter] if filter is not None else []
+            locations = list(locations or [])
+            for i in range(0, len(locations), chunkSize):
+                quoted = ", ".join("'{0}'".format(location.replace("'", "''")) for location in locations[i:i + chunkSize])
+                filters.append("{0} IN ({1})".format(LOCATION_ATTRIBUTE, quoted))
+
+            url = "{0}/workspaces/{1}/coveragestores/{2}/coverages/{2}/index/granules".format(self.__cat.service_url, workspaceName, layerName)
+            for item in filters:
+                resp = self.__cat.http_request(url + "?" + urlencode({"filter": item, "purge": purge}), method="delete")
+                if resp.status_code != 200:
+                    res["info"] = "删除影像失败：{0}, {1}".format(resp.status_code, resp.text)
+                    return res
+            self.__recalculateBounds(workspaceName, layerName, layerName)
+
+            res["status"] = "success"
+            res["data"] = {
+                "filters": filters
+            }
+            return res
+        except Exception as e:
+            res["info"] = repr(e)
+            return res
+
+    def updateMosaicLayer(self, workspaceName, layerName, mosaicDir, prune=True, filter=None, purge="none", timeFormat=None, workers=None):
+        """
+        增量更新已发布的镶嵌数据集图层：对比镶嵌文件夹与镶嵌索引，只收集新增的影像，删除文件已不存在的影像，
+        不删除和重建数据存储，图层在更新期间保持可用；适用于每天新增影像的镶嵌数据集
+        workspaceName： 图层所在的工作空间的名称
+        layerName：图层的名称，数据存储和覆盖的名称与图层相同
+        mosaicDir：已发布的镶嵌文件夹，通配符、是否包括子文件夹和时间正则表达式读取发布时生成的indexer.properties和timeregex.properties
+        prune：是否从索引中删除文件已不存在的影像，可选，默认为True
+        filter：额外删除的影像的CQL条件，例如只保留最近一年的影像，可选
+        purge：按filter删除影像的方式，见removeMosaicGranules，可选，默认为none
+        timeFormat：时间字符串的格式，可选，默认自动识别
+        workers：读取新影像文件头的并发线程数，可选
+        return {
+            status: 状态，success-更新成功;fail-索引错误/图层不存在/部分影像收集失败/其他信息
+            info: 信息
+            data: {
+                added：收集的新影像的相对路径,
+                removed：从索引删除的相对路径（文件已不存在的影像）,
+                filter：按条件删除时的CQL条件,
+                errors：[{path, info}]，坐标系、波段数或数据类型与镶嵌不一致，或收集失败的影像
+            }
+        }
+        """
+
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+
+        try:
+            # 对比文件夹与索引，新影像只读取文件头，检查是否与已有影像一致
+            try:
+                from MosaicBuilder import MosaicBuilder
+                builder = MosaicBuilder.load(mosaicDir, timeFormat, workers)
+                added, missing = builder.diff()
+                granules, errors = builder.scan(added)
+                # 以索引中仍存在的第一个影像为参照
+                gone = set(missing)
+                kept = [location for location in builder.indexed() if location not in gone]
+                reference = builder.scan([os.path.join(builder.mosaicDir, kept[0])])[0] if granules and kept else []
+                if reference:
+                    granules, invalid = builder.validate(reference + granules)
+                    granules = granules[1:]
+                    errors += invalid
+            except Exception as e:
+                res["info"] = "索引错误：{0}".format(e)
+                return res
+
+            if not self.isLayerExist(workspaceName, layerName):
+                res["info"] = "图层不存在：{0}".format(layerName)
+                return res
+
+            data = {
+                "added": [],
+                "removed": [],
+                "filter": filter,
+                "errors": errors
+            }
+            res["data"] = data
+
+            if granules:
+                harvest = self.harvestMosaicGranules(workspaceName, layerName, [granule["path"] for granule in granules])
+                if harvest["data"] is None:
+                    res["info"] = harvest["info"]
+                    return res
+                harvested = set(harvest["data"]["harvested"])
+                data["added"] = [granule["location"] for granule in granules if granule["path"] in harvested]
+                data["errors"] += harvest["data"]["errors"]
+
+            if prune and missing:
+                remove = self.removeMosaicGranules(workspaceName, layerName, locations=missing)
+                if remove["status"] != "success":
+                    res["info"] = remove["info"]
+                    return res
+                data["removed"] = missing
+
+            if filter is not None:
+                remove = self.removeMosaicGranules(workspaceName, layerName, filter=filter, purge=purge)
+                if remove["status"] != "success":
+                    res["info"] = remove["info"]
+                    return res
+
+            res["status"] = "success"
+            return res
+        except Exception as e:
+            res["info"] = repr(e)
+            return res
+
+    def __recalculateBounds(self, workspaceName, storeName, coverageName):
+        """
+        收集或删除影像后按镶嵌索引重新计算覆盖的范围
+        """
+
+        url = "{0}/workspaces/{1}/coveragestores/{2}/coverages/{3}.xml?calculate=nativebbox,latlonbbox".format(
+            self.__cat.service_url, workspaceName, storeName, coverageName)
+        resp = self.__cat.http_request(url, method="put", data="<coverage><enabled>true</enabled></coverage>", headers={"Content-type": "application/xml"})
+        if resp.status_code != 200:
+            raise Exception("更新图层范围失败：{0}, {1}".format(resp.status_code, resp.text))
+
+    def __resetStore(self, workspaceName, storeName):
+        """
+        清除geoserver中数据存储的读取器缓存，使其重新读取更新后的文件
+        """
+
+        url = "{0}/workspaces/{1}/coveragestores/{2}/reset".format(self.__cat.service_url, workspaceName, storeName)
+        resp = self.__cat.http_request(url, method="post")
+        if resp.status_code != 200:
+            raise Exception("重置数据存储失败：{0}, {1}".format(resp.status_code, resp.text))
+
+    def publishJob(self, job):
+        """
+        执行单个发布任务
+        job：任务参数字典，type指定任务类型，其余键为对应发布函数的参数
+             shp-{type:"shp", workspaceName, layerName, shapePath, charset, streaming, buildIndex}
+             gpkg-{type:"gpkg", workspaceName, layerName, shapePath, gpkgPath, charset, upload}
+             tiff-{type:"tiff", workspaceName, layerName, tiffPath, upload, targetCrs}
+             pyramid-{type:"pyramid", workspaceName, layerName, tiffPath, tiffDir, levels, blockWidth, blockHeight, creationOptions, targetCrs}
+             cog-{type:"cog", workspaceName, layerName, tiffPath, cogPath}
+             mosaic-{type:"mosaic", workspaceName, layerName, mosaicDir, pattern, timeRegex}
+             shp、tiff、pyramid、mosaic类型可以带seed参数，发布成功后生成切片缓存，格式见seedLayer
+        return {
+            status: 状态，success-创建成功;fail-创建失败
+            info: 信息, success-""; fail-不支持的任务类型/对应发布函数的失败信息
+            data: 对应发布函数的返回数据
+        }
+        """
+
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+
+        paras = dict(job)
+        jobType = paras.pop("type", None)
+        publishers = {
+            "shp": self.createShapeLayer,
+            "gpkg": self.createGeoPackageLayer,
+            "tiff": self.createTiffLayer,
+            "pyramid": self.createPyramidTiffLayer,
+            "cog": self.createCogLayer,
+            "mosaic": self.createMosaicLayer
+        }
+        if jobType not in publishers:
+            res["info"] = "不支持的任务类型：{0}".format(jobType)
+            return res
+
+        try:
+            return publishers[jobType](**paras)
+        except Exception as e:
+            res["info"] = repr(e)
+            return res
+
+    def batchPublish(self, jobs, workers=4):
+        """
+        并发批量发布图层，所有任务共用同一个GeoServerCatalog会话
+        jobs：任务参数字典的列表，格式见publishJob
+        workers：并发的线程数，可选，默认为4
+        return 与jobs顺序一致的结果列表，每个结果的格式与publishJob的返回值相同
+        """
+
+        jobs = list(jobs)
+        if len(jobs) == 0:
+            return []
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(jobs)))) as executor:
+            return list(executor.map(self.publishJob, jobs))
+
+    def seedLayer(self, workspaceName, layerName, zoomStart=0, zoomStop=10, gridSet="EPSG:4326", bbox=None, srs=None, format="image/png",
+                  threads=2, seedType="seed", wait=False, interval=2, timeout=None, progress=None, cancel=None):
+        """
+        通过GeoWebCache为图层生成切片缓存，避免新图层的第一批用户承担冷切片的渲染耗时
+        workspaceName：图层所在的工作空间的名称
+        layerName：图层的名称
+        zoomStart、zoomStop：切片级别范围，可选，默认为0~10
+        gridSet：切片方案的名称，可选，默认为EPSG:4326
+        bbox：范围 (minx, miny, maxx, maxy)，可选，默认为图层的全部范围
+        srs：bbox的坐标系编号，可选，默认从gridSet解析
+        format：切片格式，可选，默认为image/png
+        threads：geoserver执行任务的线程数，可选，默认为2
+        seedType：seed-生成缺少的切片;reseed-重新生成全部切片;truncate-清除切片，可选，默认为seed
+        wait：是否等待任务完成，可选，默认为False
+        interval：轮询进度的间隔（秒），可选，默认为2
+        timeout：最长等待时间（秒），超时后中止任务，可选
+        progress：进度回调函数 progress(tasks)，tasks格式见getSeedStatus，可选
+        cancel：threading.Event，等待期间被设置时中止任务，可选
+        return {
+            status: 状态，success-提交成功或已完成;fail-失败
+            info: 信息, success-""; fail-图层不存在/其他信息
+            data: 任务列表，等待完成时为最后一次查询到的任务列表
+        }
+        """
+
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+
+        try:
+            if not self.isLayerExist(workspaceName, layerName):
+                res["info"] = "图层不存在：{0}".format(layerName)
+                return res
+
+            qualifiedName = "{0}:{1}".format(workspaceName, layerName)
+            self.__seeder.seed(qualifiedName, zoomStart, zoomStop, gridSet, bbox, srs, format, threads, seedType)
+            if wait:
+                res["data"] = self.__seeder.wait(qualifiedName, interval, timeout, progress, cancel)
+            else:
+                res["data"] = self.__seeder.status(qualifiedName)
+            res["status"] = "success"
+            return res
+        except Exception as e:
+            res["info"] = repr(e)
+            return res
+
+    def getSeedStatus(self, workspaceName, layerName):
+        """
+        查询图层的切片缓存任务
+        return [{id, status: pending/running/done/aborted, done: 已完成切片数, total: 切片总数, remaining: 预计剩余秒数}]，没有任务时为空列表
+        """
+
+        return self.__seeder.status("{0}:{1}".format(workspaceName, layerName))
+
+    def cancelSeed(self, workspaceName, layerName, kill="all"):
+        """
+        中止图层的切片缓存任务
+        kill：running-运行中的任务;pending-等待中的任务;all-全部任务，可选，默认为all
+        """
+
+        self.__seeder.cancel("{0}:{1}".format(workspaceName, layerName), kill)
+
+    def deleteLayer(self, workspaceName, layerName):
+        """
+        删除图层
+        workspaceName： 图层所在的工作空间的名称
+        layerName：图层的名称
+        """
+
+        layer = self.getLayer(workspaceName, layerName)
+        if layer != None:
+            self.__cat.delete(layer, None, True)
+            self.__cache.put(("layer", workspaceName, layerName), None)
+
+    def getStyle(self, workspaceName, styleName):
+        """
+        通过名称获取样式
+        workspaceName： 样式所在的工作空间的名称
+        styleName：样式的名称
+        return Style
+        """
+
+        return self.__cache.cached(("style", workspaceName, styleName), lambda: self.__cat.get_style(styleName, workspaceName))
+
+    def isStyleExist(self, workspaceName, styleName):
+        """
+        判断样式是否存在
+        workspaceName： 样式所在的工作空间的名称
+        styleName：样式的名称
+        return True-存在;False-不存在
+        """
+
+        res = self.getStyle(workspaceName, styleName)
+        if res == None:
+            return False
+        else:
+            return True
+
+    def createStyle(self, workspaceName, styleName, styleType, styleParas, dedupe=False):
+        """
+        创建样式，已存在的同名样式内容相同时不重新上传，内容不同时覆盖
+        workspaceName： 样式所在的工作空间的名称
+        styleName：样式的名称
+        styleType：样式的类型 point/polyline/line/polygon
+        styleParas: 样式的参数, 
+                   point-{type:circle/rectangle/star, color:"#000000", transparency:0.5, size:10}
+                   polyline/line-{color:"#000000", width:1}
+                   polygon-{fill_color:"#AAAAAA", outline_color:"#000000", outline_width:1}
+        dedupe：工作空间中已有内容相同（只有名称不同）的样式时，不创建新样式而是返回该样式，可选，默认为False；
+                为True时返回的样式名称可能与styleName不同，图层应使用返回的样式
+        return {
+            status: 状态，success-创建成功;fail-创建失败
+            info: 信息, success-""; fail-不支持的样式类型
+            data: Style
+        }
+        """
+
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+
+        styleData = StyleTemplates.getStyleData(styleType, styleParas)
+        if styleData is None:
+            res["info"] = "不支持的样式类型"
             return res
 
-        style = self.__cat.create_style(styleName, styleData, overwrite=True, workspace=workspaceName)
         res["status"] = "success"
-        res["data"] = style
+        res["data"] = self.__putStyle(workspaceName, styleName, styleData, dedupe)
         return res
 
-    def deleteStyle(self, workspaceName, styleName):
+    def __putStyle(self, workspaceName, styleName, styleData, dedupe):
+        """
+        按内容指纹上传样式：dedupe时复用内容相同的已有样式，同名样式内容相同时跳过上传
+        return Style
+        """
+
+        digest = fingerprint(styleData)
+        if dedupe:
+            shared = self.__styles.lookup(workspaceName, digest)
+            if shared is not None:
+                return self.getStyle(workspaceName, shared)
+
+        if self.__styles.digestOf(workspaceName, styleName) == digest:
+            return self.getStyle(workspaceName, styleName)
+
+        # raw上传，geoserver按原样保存，下载的内容与上传的一致，指纹才能对应
+        style = self.__cat.create_style(styleName, styleData, overwrite=True, workspace=workspaceName, raw=True)
+        self.__cache.put(("style", workspaceName, styleName), style)
+        self.__styles.put(workspaceName, styleName, digest)
+        return style
+
+    def deleteStyle(self, workspaceName, styleName, recurse=True):
         """
         删除样式
         workspaceName： 样式所在的工作空间的名称
         styleName：样式的名称
+        recurse：是否同时从使用该样式的图层中移除该样式，为False时样式仍被使用则删除失败并抛出异常，可选，默认为True
         """
 
         style = self.getStyle(workspaceName, styleName)
         if style != None:
-            self.__cat.delete(style, None, True)
+            self.__cat.delete(style, None, recurse)
+            self.__cache.put(("style", workspaceName, styleName), None)
+            self.__styles.remove(workspaceName, styleName)
 
     def updateStyle(self, workspaceName, styleName, styleType, styleParas):
         """
-        更新样式
+        更新样式，服务器上的样式内容相同时不重新上传
         workspaceName： 样式所在的工作空间的名称
         styleName：样式的名称
         styleType：样式的类型 point/polyline/line/polygon
@@ -571,22 +1436,242 @@ class GeoServerService(object):
             res["info"] = "样式不存在：{0}".format(styleName)
             return res
 
-        # 获取样式
-        style = self.getStyle(workspaceName, styleName)
-        
-        if styleType == "point":
-            data = self.__getPointStyle(styleParas)
-        elif styleType == "polyline" or styleType == "line":
-            data = self.__getPolylineStyle(styleParas)
-        elif styleType == "polygon":
-            data = self.__getPolygonStyle(styleParas)
-        else:
+        data = StyleTemplates.getStyleData(styleType, styleParas)
+        if data is None:
             res["info"] = "不支持的样式类型"
             return res
-        
-        style.update_body(data)
+
         res["status"] = "success"
+        res["data"] = self.__putStyle(workspaceName, styleName, data, False)
         return res
-    
+
+    def createClassifiedStyle(self, workspaceName, styleName, styleType, shapePath, fieldName, method="quantile", classes=5, styleParas=None,
+                              charset=None, maxCategories=20, dedupe=False):
+        """
+        按shapefile的属性字段创建分级或分类样式，已存在的同名样式会被覆盖
+        workspaceName： 样式所在的工作空间的名称
+        styleName：样式的名称
+        styleType：样式的类型 point/polyline/line/polygon
+        shapePath：shape文件的路径，读取其dbf计算分级
+        fieldName：分级/分类的字段名称
+        method：quantile-分位数;equal-等间距;jenks-自然断点;categorized-唯一值分类，可选，默认为quantile
+        classes：分级数，可选，默认为5
+        styleParas：样式参数，见StyleTemplates.getGraduatedStyle和getCategorizedStyle，
+                    例如{start_color:"#FFFFCC", end_color:"#BD0026", outline_width:0, maxScale:5000000}，可选
+        charset：dbf的字符集，可选，默认读取.cpg文件
+        maxCategories：唯一值分类的最多类别数，其余类别使用同一条规则，可选，默认为20
+        dedupe：复用内容相同的已有样式，见createStyle，可选，默认为False
+        return {
+            status: 状态，success-创建成功;fail-创建失败
+            info: 信息, success-""; fail-不支持的样式类型/不支持的分级方法/文件解析错误/其他信息
+            data: {
+                style：Style,
+                classes：分级[{min, max, count}]或类别[{value, count}]
+            }
+        }
+        """
+
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+
+        if method not in StyleClassifier.METHODS:
+            res["info"] = "不支持的分级方法：{0}".format(method)
+            return res
+
+        styleParas = styleParas or {}
+        try:
+            with StyleClassifier.StyleClassifier(shapePath, fieldName, charset) as classifier:
+                if method == "categorized":
+                    items, others = classifier.categories(maxCategories)
+                    styleData = StyleTemplates.getCategorizedStyle(styleType, fieldName, items, styleParas, others > 0)
+                else:
+                    items = classifier.classify(method, classes)
+                    styleData = StyleTemplates.getGraduatedStyle(styleType, fieldName, items, styleParas)
+        except (StyleClassifier.ClassifyError, ShapefileIO.ShapefileError) as e:
+            res["info"] = "文件解析错误：{0}".format(e)
+            return res
+
+        if styleData is None:
+            res["info"] = "不支持的样式类型"
+            return res
+
+        try:
+            style = self.__putStyle(workspaceName, styleName, styleData, dedupe)
+        except Exception as e:
+            res["info"] = repr(e)
+            return res
+
+        res["status"] = "success"
+        res["data"] = {
+            "style": style,
+            "classes": items
+        }
+        return res
+
+    def setLayerStyle(self, workspaceName, layerName, styleName, styleWorkspaceName=None):
+        """
+        设置图层的默认样式
+        workspaceName： 图层所在的工作空间的名称
+        layerName：图层的名称
+        styleName：样式的名称
+        styleWorkspaceName：样式所在的工作空间的名称，可选，默认为None即全局样式
+        return {
+            status: 状态，success-设置成功;fail-设置失败
+            info: 信息, success-""; fail-图层不存在/样式不存在/其他信息
+            data: None
+        }
+        """
+
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+
+        try:
+            layer = self.getLayer(workspaceName, layerName)
+            if layer is None:
+                res["info"] = "图层不存在：{0}".format(layerName)
+                return res
+            style = self.getStyle(styleWorkspaceName, styleName)
+            if style is None:
+                res["info"] = "样式不存在：{0}".format(styleName)
+                return res
+
+            layer.default_style = style
+            self.__cat.save(layer)
+            self.__cache.invalidate(("layer", workspaceName, layerName))
+            res["status"] = "success"
+            return res
+        except Exception as e:
+            res["info"] = repr(e)
+            return res
+
+    def mergeDuplicateStyles(self, workspaceName, dryRun=False):
+        """
+        合并工作空间中内容相同（只有名称不同）的样式：每组保留名称排序最小的样式，
+        把使用其他样式的图层（默认样式和可选样式）改为使用保留的样式，然后删除其他样式
+        workspaceName：工作空间的名称
+        dryRun：只返回合并计划，不修改geoserver，可选，默认为False
+        return {
+            status: 状态，success-合并成功;fail-合并失败
+            info: 信息, success-""; fail-其他信息
+            data: {
+                styles：{被合并的样式名: 保留的样式名},
+                layers：改为使用保留样式的图层名称列表
+            }
+        }
+        """
+
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+
+        try:
+            merged = {}
+            for names in self.__styles.duplicates(workspaceName).values():
+                for name in names[1:]:
+                    merged[name] = names[0]
+
+            # WMS能力文档不包括禁用、不公开的图层，因此通过REST逐个读取工作空间中全部图层的默认样式和可选样式
+            layerNames = set()
+            if merged:
+                index = self.loadCatalogIndex()
+                candidates = sorted(key for key in index.layers if key[0] == workspaceName)
+                targets = set((workspaceName, name) for name in merged)
+                with ThreadPoolExecutor(max_workers=8) as executor:
+                    layers = list(executor.map(lambda key: self.__cat.get_layer("{0}:{1}".format(*key)), candidates))
+                for key, layer in zip(candidates, layers):
+                    if layer is not None and targets.intersection(_layerStyles(layer)):
+                        layerNames.add(key)
+            res["data"] = {
+                "styles": merged,
+                "layers": ["{0}:{1}".format(*key) for key in sorted(layerNames)]
+            }
+            if dryRun:
+                res["status"] = "success"
+                return res
+
+            # 修改图层前确认保留的样式都存在
+            kept = {}
+            for name in set(merged.values()):
+                kept[name] = self.getStyle(workspaceName, name)
+                if kept[name] is None:
+                    raise Exception("保留的样式不存在：{0}".format(name))
+
+            for layerWorkspace, layerName in sorted(layerNames):
+                layer = self.__cat.get_layer("{0}:{1}".format(layerWorkspace, layerName))
+                style = layer.default_style
+                if style is not None and style.workspace == workspaceName and style.name in merged:
+                    layer.default_style = kept[merged[style.name]]
+                styles = layer.styles
+                if any(s is not None and s.workspace == workspaceName and s.name in merged for s in styles):
+                    keep = []
+                    for s in styles:
+                        if s is None:
+                            continue
+                        if s.workspace == workspaceName and s.name in merged:
+                            s = kept[merged[s.name]]
+                        if s.fqn not in [k.fqn for k in keep]:
+                            keep.append(s)
+                    layer.styles = keep
+                self.__cat.save(layer)
+                self.__cache.invalidate(("layer", layerWorkspace, layerName))
+
+            # 不级联删除：仍有图层使用被合并的样式时geoserver拒绝删除，不会从图层中静默移除样式
+            for name in merged:
+                self.deleteStyle(workspaceName, name, recurse=False)
+            res["status"] = "success"
+            return res
+        except Exception as e:
+            res["info"] = repr(e)
+            return res
+
     def getWorkSpaces(self):
-        return self.__cat.get_workspaces()
\ No newline at end of file
+        return self.__cat.get_workspaces()
+
+    def loadCatalogIndex(self, workers=8):
+        """
+        一次性加载整个目录的内存索引，用于大量图层的查询和审计
+        workers：并发请求的线程数，可选，默认为8
+        return CatalogIndex
+        """
+
+        return CatalogIndex.load(self.__cat, workers)
+
+
+def _layerStyles(layer):
+    """
+    从图层的REST文档中读取默认样式和可选样式，不逐个请求样式
+    return [(工作空间或None, 样式名称)]
+    """
+
+    keys = []
+    for element in [layer.dom.find("defaultStyle")] + layer.dom.findall("styles/style"):
+        if element is None or not element.findtext("name"):
+            continue
+        name = element.findtext("name")
+        workspaceName = element.findtext("workspace")
+        if ":" in name:
+            workspaceName, name = name.split(":", 1)
+        elif workspaceName is None:
+            link = next((child.get("href") for child in element if "href" in child.attrib), "")
+            match = re.search("/workspaces/([^/]+)/styles/", link)
+            workspaceName = match.group(1) if match else None
+        keys.append((workspaceName, name))
+    return keys
+
+
+def _tileFiles(levelDir):
+    """
+    return 金字塔一级文件夹中的切片文件名集合
+    """
+
+    if not os.path.isdir(levelDir):
+        return set()
+    return set(name for name in os.listdir(levelDir) if name.lower().endswith(".tif"))
@@ -0,0 +1,154 @@
+import json
+import time
+
+from geoserver.catalog import FailedRequestError
+
+
+class SeedError(Exception):
+    """
+    GeoWebCache切片缓存任务错误
+    """
+    pass
+
+
+# GeoWebCache任务状态编号
+TASK_STATUS = {
+    -1: "aborted",
+    0: "pending",
+    1: "running",
+    2: "done"
+}
+
+
+class GwcSeeder(object):
+    """
+    通过GeoWebCache REST接口为图层生成（seed）、重新生成（reseed）或清除（truncate）切片缓存
+    任务提交后由geoserver后台执行，可轮询进度直到完成，也可以中止图层的全部任务
+    """
+    def __init__(self, catalog):
+        """
+        catalog：GeoServerCatalog对象，复用其会话和认证
+        """
+        self.catalog = catalog
+        self.gwcUrl = catalog.service_url.rsplit("/rest", 1)[0] + "/gwc/rest"
+
+    def seed(self, layerName, zoomStart=0, zoomStop=10, gridSet="EPSG:4326", bbox=None, srs=None, format="image/png", threads=1, seedType="seed"):
+        """
+        提交切片缓存任务
+        layerName：图层的名称，格式为"工作空间:图层"
+        zoomStart、zoomStop：切片级别范围
+        gridSet：切片方案的名称，可选，默认为EPSG:4326
+        bbox：范围 (minx, miny, maxx, maxy)，可选，默认为图层的全部范围
+        srs：bbox的坐标系编号，可选，默认从"EPSG:xxxx"形式的gridSet中解析
+        format：切片格式，可选，默认为image/png
+        threads：geoserver执行任务的线程数，可选，默认为1
+        seedType：seed-生成缺少的切片;reseed-重新生成全部切片;truncate-清除切片
+        """
+
+        request = {
+            "name": layerName,
+            "gridSetId": gridSet,
+            "zoomStart": zoomStart,
+            "zoomStop": zoomStop,
+            "format": format,
+            "type": seedType,
+            "threadCount": threads
+        }
+        if bbox is not None:
+            if srs is None:
+                if not gridSet.upper().startswith("EPSG:"):
+                    raise SeedError("无法从切片方案确定范围的坐标系：{0}".format(gridSet))
+                srs = int(gridSet.split(":", 1)[1])
+            request["bounds"] = {"coords": {"double": [float(v) for v in bbox]}}
+            request["srs"] = {"number": int(srs)}
+
+        url = "{0}/seed/{1}.json".format(self.gwcUrl, layerName)
+        headers = {"Content-type": "application/json"}
+        resp = self.catalog.http_request(url, method="post", data=json.dumps({"seedRequest": request}), headers=headers)
+        if resp.status_code != 200:
+            raise FailedRequestError("Failed to {0} layer {1} : {2}, {3}".format(seedType, layerName, resp.status_code, resp.text))
+
+    def status(self, layerName):
+        """
+        查询图层的切片缓存任务
+        return [{id, status, done, total, remaining}]，remaining为预计剩余秒数，未知时为-1
+        """
+
+        url = "{0}/seed/{1}.json".format(self.gwcUrl, layerName)
+        resp = self.catalog.http_request(url, headers={"Accept": "application/json"})
+        if resp.status_code != 200:
+            raise FailedRequestError("Failed to get seed status of {0} : {1}, {2}".format(layerName, resp.status_code, resp.text))
+
+        tasks = []
+        for done, total, remaining, taskId, status in json.loads(resp.text).get("long-array-array", []):
+            tasks.append({
+                "id": taskId,
+                "status": TASK_STATUS.get(status, str(status)),
+                "done": done,
+                "total": total,
+                "remaining": remaining
+            })
+        return tasks
+
+    def cancel(self, layerName, kill="all"):
+        """
+        中止图层的切片缓存任务
+        kill：running-运行中的任务;pending-等待中的任务;all-全部任务
+        """
+
+        url = "{0}/seed/{1}".format(self.gwcUrl, layerName)
+        headers = {"Content-type": "application/x-www-form-urlencoded"}
+        resp = self.catalog.http_request(url, method="post", data="kill_all={0}".format(kill), headers=headers)
+        if resp.status_code != 200:
+            raise FailedRequestError("Failed to cancel seed tasks of {0} : {1}, {2}".format(layerName, resp.status_code, resp.text))
+
+    def wait(self, layerName, interval=2, timeout=None, progress=None, cancel=None):
+        """
+        轮询进度直到图层没有等待中或运行中的任务
+        interval：轮询间隔（秒），可选，默认为2
+        timeout：最长等待时间（秒），可选，超时后中止任务并抛出SeedError
+        progress：进度回调函数 progress(tasks)，tasks格式见status，可选
+        cancel：threading.Event，被设置时中止任务并返回，可选
+        return 等待期间出现过的任务列表，格式见status
+        """
+
+        start = time.monotonic()
+        tasks = {}
+        while True:
+            current = self.status(layerName)
+            for task in current:
+                tasks[task["id"]] = task
+            if progress is not None:
+                progress(current)
+            if not any(task["status"] in ("pending", "running") for task in current):
+                # 完成的任务会从列表中移除
+                return _finish(tasks, "done")
+
+            if cancel is not None and cancel.is_set():
+                self.cancel(layerName)
+                return _finish(tasks, "aborted")
+            if timeout is not None and time.monotonic() - start > timeout:
+                self.cancel(layerName)
+                raise SeedError("切片缓存任务超时：{0}".format(layerName))
+
+            if cancel is not None:
+                cancel.wait(interval)
+            else:
+                time.sleep(interval)
+
+
+def _finish(tasks, status):
+    """
+    return 任务列表，未结束的任务标记为status，完成的任务已完成切片数为切片总数
+    """
+
+    result = []
+    for task in tasks.values():
+        task = dict(task)
+        if task["status"] in ("pending", "running"):
+            task["status"] = status
+        if task["status"] == "done":
+            task["done"] = task["total"]
+            task["remaining"] = 0
+        result.append(task)
+    return result
@@ -0,0 +1,258 @@
+import re
+import time
+import threading
+
+from requests.adapters import HTTPAdapter
+
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+
+# REST路径中名称段的占位符：关键字之后的一段为对象名称
+_PLACEHOLDERS = {
+    "workspaces": "{workspace}",
+    "namespaces": "{workspace}",
+    "datastores": "{store}",
+    "coveragestores": "{store}",
+    "wmsstores": "{store}",
+    "featuretypes": "{resource}",
+    "coverages": "{resource}",
+    "layers": "{layer}",
+    "layergroups": "{layergroup}",
+    "styles": "{style}",
+    "granules": "{granule}",
+    "seed": "{layer}",
+    "layer": "{layer}"
+}
+
+
+def endpointOf(url):
+    """
+    将请求地址归一化为REST端点，例如/geoserver/rest/workspaces/test/coveragestores/a.xml归一化为
+    /geoserver/rest/workspaces/{workspace}/coveragestores/{store}
+    """
+
+    segments = [re.sub(r"\.(xml|json|html|sld|zip)$", "", s) for s in urlparse(url).path.split("/") if s]
+    for i in range(1, len(segments)):
+        placeholder = _PLACEHOLDERS.get(segments[i - 1])
+        if placeholder is not None and not segments[i - 1].startswith("{"):
+            segments[i] = placeholder
+    return "/" + "/".join(segments)
+
+
+class HttpMetrics(object):
+    """
+    GeoServerCatalog会话的请求指标，线程安全
+    按REST端点和请求方法统计延迟直方图，统计重试次数及触发重试的状态码、发送和接收的字节数、连接池的新建和复用连接数
+    可通过snapshot获取字典，或通过prometheus获取Prometheus文本格式
+    """
+
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, buckets=None):
+        """
+        buckets：延迟直方图的上界（秒），可选
+        """
+        if buckets is not None:
+            self.buckets = tuple(sorted(buckets))
+        self.__lock = threading.Lock()
+        self.__adapters = []
+        self.reset()
+
+    def reset(self):
+        with self.__lock:
+            # (method, endpoint) -> {count, sum, buckets}
+            self.__latency = {}
+            # (method, endpoint, status) -> count
+            self.__requests = {}
+            # status -> count
+            self.__retries = {}
+            self.__bytesSent = 0
+            self.__bytesReceived = 0
+
+    def attach(self, adapter):
+        """
+        登记连接适配器，用于统计连接池的新建和复用连接数
+        """
+
+        with self.__lock:
+            self.__adapters.append(adapter)
+
+    def record(self, method, url, status, seconds, sent=0, received=0, retryStatuses=()):
+        """
+        记录一次请求
+        status：最终的响应状态码，请求异常时为"error"
+        retryStatuses：每次重试的触发原因，状态码或"error"
+        """
+
+        endpoint = endpointOf(url)
+        with self.__lock:
+            latency = self.__latency.get((method, endpoint))
+            if latency is None:
+                latency = self.__latency[(method, endpoint)] = {"count": 0, "sum": 0.0, "buckets": [0] * len(self.buckets)}
+            latency["count"] += 1
+            latency["sum"] += seconds
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    latency["buckets"][i] += 1
+
+            key = (method, endpoint, str(status))
+            self.__requests[key] = self.__requests.get(key, 0) + 1
+            for retryStatus in retryStatuses:
+                self.__retries[str(retryStatus)] = self.__retries.get(str(retryStatus), 0) + 1
+            self.__bytesSent += sent
+            self.__bytesReceived += received
+
+    def __connections(self):
+        """
+        从各连接池汇总请求数和新建连接数，复用连接数为两者之差
+        """
+
+        requests = 0
+        created = 0
+        for adapter in self.__adapters:
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                requests += pool.num_requests
+                created += pool.num_connections
+        return {"requests": requests, "new": created, "reused": max(0, requests - created)}
+
+    def snapshot(self):
+        """
+        return {
+            latency: [{method, endpoint, count, sum, buckets: {上界: 累计次数}}],
+            requests: [{method, endpoint, status, count}],
+            retries: {total, byStatus: {状态码: 次数}},
+            bytes: {sent, received},
+            connections: {requests, new, reused}
+        }
+        """
+
+        with self.__lock:
+            latency = []
+            for (method, endpoint), item in sorted(self.__latency.items()):
+                latency.append({
+                    "method": method,
+                    "endpoint": endpoint,
+                    "count": item["count"],
+                    "sum": item["sum"],
+                    "buckets": dict(zip(self.buckets, item["buckets"]))
+                })
+            requests = [{"method": m, "endpoint": e, "status": s, "count": c} for (m, e, s), c in sorted(self.__requests.items())]
+            retries = {"total": sum(self.__retries.values()), "byStatus": dict(self.__retries)}
+            bytesInfo = {"sent": self.__bytesSent, "received": self.__bytesReceived}
+            connections = self.__connections()
+
+        return {
+            "latency": latency,
+            "requests": requests,
+            "retries": retries,
+            "bytes": bytesInfo,
+            "connections": connections
+        }
+
+    def prometheus(self, prefix="geoserver_client"):
+        """
+        return Prometheus文本格式的指标
+        """
+
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP {0}_request_duration_seconds REST request latency.".format(prefix),
+            "# TYPE {0}_request_duration_seconds histogram".format(prefix)
+        ]
+        for item in snapshot["latency"]:
+            labels = 'method="{0}",endpoint="{1}"'.format(item["method"], _escape(item["endpoint"]))
+            for bound, count in item["buckets"].items():
+                lines.append('{0}_request_duration_seconds_bucket{{{1},le="{2}"}} {3}'.format(prefix, labels, bound, count))
+            lines.append('{0}_request_duration_seconds_bucket{{{1},le="+Inf"}} {2}'.format(prefix, labels, item["count"]))
+            lines.append("{0}_request_duration_seconds_sum{{{1}}} {2}".format(prefix, labels, item["sum"]))
+            lines.append("{0}_request_duration_seconds_count{{{1}}} {2}".format(prefix, labels, item["count"]))
+
+        lines.append("# HELP {0}_requests_total REST requests by final status.".format(prefix))
+        lines.append("# TYPE {0}_requests_total counter".format(prefix))
+        for item in snapshot["requests"]:
+            lines.append('{0}_requests_total{{method="{1}",endpoint="{2}",status="{3}"}} {4}'.format(
+                prefix, item["method"], _escape(item["endpoint"]), item["status"], item["count"]))
+
+        lines.append("# HELP {0}_retries_total Retries by triggering status.".format(prefix))
+        lines.append("# TYPE {0}_retries_total counter".format(prefix))
+        for status, count in sorted(snapshot["retries"]["byStatus"].items()):
+            lines.append('{0}_retries_total{{status="{1}"}} {2}'.format(prefix, status, count))
+
+        lines.append("# HELP {0}_bytes_total Bytes sent and received.".format(prefix))
+        lines.append("# TYPE {0}_bytes_total counter".format(prefix))
+        lines.append('{0}_bytes_total{{direction="sent"}} {1}'.format(prefix, snapshot["bytes"]["sent"]))
+        lines.append('{0}_bytes_total{{direction="received"}} {1}'.format(prefix, snapshot["bytes"]["received"]))
+
+        lines.append("# HELP {0}_connections_total Pooled connections by new or reused.".format(prefix))
+        lines.append("# TYPE {0}_connections_total counter".format(prefix))
+        lines.append('{0}_connections_total{{state="new"}} {1}'.format(prefix, snapshot["connections"]["new"]))
+        lines.append('{0}_connections_total{{state="reused"}} {1}'.format(prefix, snapshot["connections"]["reused"]))
+        return "\n".join(lines) + "\n"
+
+
+class InstrumentedHTTPAdapter(HTTPAdapter):
+    """
+    记录请求指标并设置默认超时的连接适配器
+    """
+    def __init__(self, metrics=None, timeout=None, **kwargs):
+        """
+        metrics：HttpMetrics对象，可选，为None时不记录指标
+        timeout：默认超时（秒），可以是(连接超时, 读取超时)，可选
+        其余参数同HTTPAdapter，如max_retries、pool_connections、pool_maxsize
+        """
+        self.metrics = metrics
+        self.timeout = timeout
+        super().__init__(**kwargs)
+        if metrics is not None:
+            metrics.attach(self)
+
+    def send(self, request, stream=False, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = self.timeout
+        if self.metrics is None:
+            return super().send(request, stream=stream, timeout=timeout, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            resp = super().send(request, stream=stream, timeout=timeout, **kwargs)
+        except Exception:
+            self.metrics.record(request.method, request.url, "error", time.perf_counter() - start, _sent(request))
+            raise
+
+        if stream:
+            received = int(resp.headers.get("Content-Length") or 0)
+        else:
+            received = len(resp.content)
+
+        retryStatuses = []
+        retries = getattr(resp.raw, "retries", None)
+        for history in getattr(retries, "history", ()):
+            if history.redirect_location is None:
+                retryStatuses.append(history.status if history.status is not None else "error")
+
+        self.metrics.record(request.method, request.url, resp.status_code, time.perf_counter() - start, _sent(request), received, retryStatuses)
+        return resp
+
+
+def _sent(request):
+    length = request.headers.get("Content-Length")
+    if length is not None:
+        return int(length)
+    if isinstance(request.body, (bytes, str)):
+        return len(request.body)
+    # 分块传输的请求体（如ZipStream）没有Content-Length，发送后从其上传统计中读取已发送的字节数
+    stats = getattr(request.body, "stats", None)
+    if stats is not None:
+        return stats.sent
+    return 0
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
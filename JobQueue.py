@@ -0,0 +1,440 @@
+import os
+import json
+import time
+import uuid
+import random
+import socket
+import sqlite3
+import threading
+
+
+class QueueError(Exception):
+    """
+    任务队列错误
+    """
+    pass
+
+
+# publishJob支持的发布任务类型
+PUBLISH_TYPES = ("shp", "gpkg", "tiff", "pyramid", "cog", "mosaic")
+
+# 重试也不会成功的失败信息前缀，出现时直接标记为失败
+_PERMANENT_ERRORS = ("不支持的任务类型", "工作空间不存在", "图层已存在", "图层不存在")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job TEXT NOT NULL,
+    type TEXT NOT NULL,
+    workspace TEXT,
+    name TEXT,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    maxAttempts INTEGER NOT NULL,
+    runAt REAL NOT NULL,
+    leaseUntil REAL,
+    owner TEXT,
+    created INTEGER NOT NULL DEFAULT 0,
+    info TEXT,
+    result TEXT,
+    createdAt REAL NOT NULL,
+    updatedAt REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority, runAt);
+"""
+
+_COLUMNS = ("id", "job", "type", "workspace", "name", "priority", "status", "attempts", "maxAttempts", "runAt", "leaseUntil",
+            "owner", "created", "info", "result", "createdAt", "updatedAt")
+
+
+class JobQueue(object):
+    """
+    基于本地sqlite文件的持久化发布任务队列，任务在GeoServerService上执行
+    任务按优先级（大者优先）和提交顺序由线程池执行，同一工作空间同时执行的任务数不超过workspaceLimit；
+    失败的任务按指数退避（backoff * 2^(次数-1)，带随机抖动，不超过maxBackoff）重新排队，达到maxAttempts后标记为失败
+    执行中的任务持有租约并由心跳线程定期续期，进程崩溃后租约过期，任务由任一进程重新领取；
+    发布任务在同名的数据存储和图层都不存在时记录为由本任务创建（created），重试前只删除本任务上次执行留下的数据存储和图层，
+    不会删除其他程序已有的同名图层；金字塔切片按切片清单继续，已完成的切片不会重新生成
+    多个进程可以共用同一个队列文件，领取任务在sqlite的写事务中完成，同一任务不会被重复领取
+
+    任务为字典，type指定任务类型：
+        shp/gpkg/tiff/pyramid/cog/mosaic：发布图层，其余键为publishJob的参数
+        style：{type:"style", workspaceName, styleName, styleType, styleParas}，样式存在时更新，否则创建
+        layerStyle：{type:"layerStyle", workspaceName, layerName, styleName, styleWorkspaceName}，设置图层的默认样式
+        updateMosaic：{type:"updateMosaic", workspaceName, layerName, mosaicDir, ...}，参数见updateMosaicLayer
+        updatePyramid：{type:"updatePyramid", workspaceName, layerName, tiffPath, tiffDir, ...}，参数见updatePyramidTiffLayer
+    任务状态：pending-等待执行（包括等待重试）;running-执行中;success-成功;failed-失败;cancelled-已取消
+    """
+    def __init__(self, dbPath, service, workers=4, workspaceLimit=2, maxAttempts=3, backoff=30, maxBackoff=3600, lease=300,
+                 pollInterval=1.0, progress=None):
+        """
+        dbPath：队列文件的路径，不存在时自动创建
+        service：GeoServerService对象
+        workers：执行任务的线程数，可选，默认为4
+        workspaceLimit：同一工作空间同时执行的最多任务数，可选，默认为2
+        maxAttempts：每个任务的默认最多执行次数，可选，默认为3
+        backoff：第一次重试前等待的秒数，之后每次加倍，可选，默认为30
+        maxBackoff：重试前等待的最长秒数，可选，默认为3600
+        lease：任务租约的秒数，心跳每lease/3秒续期一次，进程崩溃后最多lease秒任务被重新领取，可选，默认为300
+        pollInterval：没有可执行的任务时的轮询间隔（秒），可选，默认为1
+        progress：每个任务执行一次后的回调函数 progress(job, res)，job为get返回的任务记录，可选
+        """
+        self.dbPath = dbPath
+        self.service = service
+        self.workers = workers
+        self.workspaceLimit = workspaceLimit
+        self.maxAttempts = maxAttempts
+        self.backoff = backoff
+        self.maxBackoff = maxBackoff
+        self.lease = lease
+        self.pollInterval = pollInterval
+        self.progress = progress
+        self.owner = "{0}:{1}:{2}".format(socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+
+        self.handlers = {jobType: service.publishJob for jobType in PUBLISH_TYPES}
+        self.handlers.update({
+            "style": self.__style,
+            "layerStyle": lambda job: service.setLayerStyle(**job),
+            "updateMosaic": lambda job: service.updateMosaicLayer(**job),
+            "updatePyramid": lambda job: service.updatePyramidTiffLayer(**job)
+        })
+
+        self.__lock = threading.Lock()
+        self.__active = set()
+        self.__stopping = threading.Event()
+        self.__threads = []
+
+        with self.__connect() as conn:
+            conn.executescript(_SCHEMA)
+            # 旧版本创建的队列文件没有created列
+            if "created" not in [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]:
+                conn.execute("ALTER TABLE jobs ADD COLUMN created INTEGER NOT NULL DEFAULT 0")
+
+    def __connect(self):
+        conn = sqlite3.connect(self.dbPath, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return _Connection(conn)
+
+    # ---------- 提交和查询 ----------
+
+    def submit(self, job, priority=0, maxAttempts=None, delay=0):
+        """
+        提交任务
+        job：任务字典，格式见类说明
+        priority：优先级，大者优先，可选，默认为0
+        maxAttempts：最多执行次数，可选，默认为队列的maxAttempts
+        delay：延迟执行的秒数，可用于把大批量任务分散到空闲时段，可选，默认为0
+        return 任务id
+        """
+
+        jobType = job.get("type")
+        if jobType not in self.handlers:
+            raise QueueError("不支持的任务类型：{0}".format(jobType))
+        now = time.time()
+        data = json.dumps(job, ensure_ascii=False)
+        name = job.get("layerName") or job.get("styleName")
+        with self.__connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (job, type, workspace, name, priority, status, maxAttempts, runAt, createdAt, updatedAt) "
+                "VALUES (?, ?, ?, ?, ?, 'pending', ?, ?, ?, ?)",
+                (data, jobType, job.get("workspaceName"), name, priority, maxAttempts or self.maxAttempts, now + delay, now, now))
+            return cursor.lastrowid
+
+    def get(self, jobId):
+        """
+        return 任务记录 {id, job, type, workspace, name, priority, status, attempts, maxAttempts, runAt, leaseUntil, owner, created, info, result, createdAt, updatedAt}，
+               job和result为字典，created为发布任务是否已开始创建同名的数据存储和图层；任务不存在时为None
+        """
+
+        with self.__connect() as conn:
+            row = conn.execute("SELECT {0} FROM jobs WHERE id = ?".format(", ".join(_COLUMNS)), (jobId,)).fetchone()
+        return _record(row) if row is not None else None
+
+    def jobs(self, status=None, limit=100):
+        """
+        return 任务记录列表，按优先级和提交顺序排列
+        status：只返回该状态的任务，可选
+        """
+
+        sql = "SELECT {0} FROM jobs".format(", ".join(_COLUMNS))
+        args = []
+        if status is not None:
+            sql += " WHERE status = ?"
+            args.append(status)
+        sql += " ORDER BY priority DESC, id LIMIT ?"
+        args.append(limit)
+        with self.__connect() as conn:
+            return [_record(row) for row in conn.execute(sql, args)]
+
+    def counts(self):
+        """
+        return 每种状态的任务数 {pending, running, success, failed, cancelled}
+        """
+
+        counts = dict.fromkeys(("pending", "running", "success", "failed", "cancelled"), 0)
+        with self.__connect() as conn:
+            for status, count in conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+                counts[status] = count
+        return counts
+
+    def cancel(self, jobId):
+        """
+        取消等待执行的任务，执行中的任务不能取消
+        return 是否取消
+        """
+
+        with self.__connect() as conn:
+            cursor = conn.execute("UPDATE jobs SET status = 'cancelled', updatedAt = ? WHERE id = ? AND status = 'pending'", (time.time(), jobId))
+            return cursor.rowcount > 0
+
+    def retry(self, jobId):
+        """
+        将失败或已取消的任务重新排队，执行次数清零
+        return 是否重新排队
+        """
+
+        now = time.time()
+        with self.__connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'pending', attempts = 0, runAt = ?, updatedAt = ? WHERE id = ? AND status IN ('failed', 'cancelled')",
+                (now, now, jobId))
+            return cursor.rowcount > 0
+
+    def purge(self, age=7 * 24 * 3600):
+        """
+        删除完成（成功、失败或已取消）超过age秒的任务记录
+        return 删除的任务数
+        """
+
+        with self.__connect() as conn:
+            cursor = conn.execute("DELETE FROM jobs WHERE status IN ('success', 'failed', 'cancelled') AND updatedAt < ?", (time.time() - age,))
+            return cursor.rowcount
+
+    # ---------- 领取和完成 ----------
+
+    def recover(self):
+        """
+        将租约已过期的执行中任务（执行进程已崩溃）重新排队，达到最多执行次数的标记为失败
+        return 重新排队的任务数
+        """
+
+        with self.__connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            return self.__recover(conn, time.time())
+
+    def __recover(self, conn, now):
+        conn.execute("UPDATE jobs SET status = 'failed', info = '任务执行中断，已达到最多执行次数', owner = NULL, updatedAt = ? "
+                     "WHERE status = 'running' AND leaseUntil < ? AND attempts >= maxAttempts", (now, now))
+        cursor = conn.execute("UPDATE jobs SET status = 'pending', runAt = ?, info = '任务执行中断，重新排队', owner = NULL, updatedAt = ? "
+                              "WHERE status = 'running' AND leaseUntil < ?", (now, now, now))
+        return cursor.rowcount
+
+    def claim(self):
+        """
+        领取一个可执行的任务：等待时间已到、优先级最高，且所在工作空间执行中的任务数未达到上限
+        return 任务记录，没有可执行的任务时为None
+        """
+
+        now = time.time()
+        with self.__connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self.__recover(conn, now)
+            running = dict(conn.execute("SELECT workspace, COUNT(*) FROM jobs WHERE status = 'running' GROUP BY workspace").fetchall())
+            candidates = conn.execute("SELECT id, workspace FROM jobs WHERE status = 'pending' AND runAt <= ? ORDER BY priority DESC, runAt, id", (now,))
+            for jobId, workspace in candidates:
+                if workspace is not None and running.get(workspace, 0) >= self.workspaceLimit:
+                    continue
+                conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, owner = ?, leaseUntil = ?, updatedAt = ? WHERE id = ?",
+                             (self.owner, now + self.lease, now, jobId))
+                row = conn.execute("SELECT {0} FROM jobs WHERE id = ?".format(", ".join(_COLUMNS)), (jobId,)).fetchone()
+                with self.__lock:
+                    self.__active.add(jobId)
+                return _record(row)
+        return None
+
+    def complete(self, job, res):
+        """
+        记录任务的执行结果：成功时标记为成功；失败时未达到最多执行次数且可重试的按退避时间重新排队，否则标记为失败
+        job：claim返回的任务记录
+        res：执行结果 {status, info, data}
+        return 任务的新状态，任务已被其他进程重新领取（租约过期）时为None
+        """
+
+        now = time.time()
+        if res["status"] == "success":
+            status, runAt = "success", job["runAt"]
+        elif job["attempts"] < job["maxAttempts"] and not str(res["info"]).startswith(_PERMANENT_ERRORS):
+            delay = min(self.maxBackoff, self.backoff * 2 ** (job["attempts"] - 1))
+            status, runAt = "pending", now + delay * random.uniform(0.5, 1.0)
+        else:
+            status, runAt = "failed", job["runAt"]
+
+        with self.__lock:
+            self.__active.discard(job["id"])
+        with self.__connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, runAt = ?, info = ?, result = ?, owner = NULL, leaseUntil = NULL, updatedAt = ? "
+                "WHERE id = ? AND status = 'running' AND owner = ?",
+                (status, runAt, res["info"], json.dumps(res, ensure_ascii=False, default=str), now, job["id"], self.owner))
+            return status if cursor.rowcount > 0 else None
+
+    def heartbeat(self):
+        """
+        为本队列执行中的任务续期租约
+        """
+
+        with self.__lock:
+            active = list(self.__active)
+        if not active:
+            return
+        with self.__connect() as conn:
+            conn.executemany("UPDATE jobs SET leaseUntil = ? WHERE id = ? AND status = 'running' AND owner = ?",
+                             [(time.time() + self.lease, jobId, self.owner) for jobId in active])
+
+    # ---------- 执行 ----------
+
+    def execute(self, job):
+        """
+        执行一个领取的任务
+        return {status, info, data}
+        """
+
+        res = {
+            "status": "fail",
+            "info": "",
+            "data": None
+        }
+
+        paras = dict(job["job"])
+        jobType = paras["type"]
+        try:
+            if jobType in PUBLISH_TYPES:
+                workspaceName, layerName = paras["workspaceName"], paras["layerName"]
+                exists = self.service.isLayerExist(workspaceName, layerName) or self.service.isStoreExist(workspaceName, layerName)
+                if exists and job["created"]:
+                    # 本任务上次执行留下的数据存储或图层
+                    self.service.deleteLayer(workspaceName, layerName)
+                    self.service.deleteStore(workspaceName, layerName)
+                elif not exists and not job["created"]:
+                    # 名称未被占用，之后创建的数据存储和图层属于本任务；已有的同名图层不删除，由发布函数报告已存在
+                    self.__markCreated(job)
+            if jobType not in PUBLISH_TYPES:
+                paras.pop("type")
+            return self.handlers[jobType](paras)
+        except Exception as e:
+            res["info"] = repr(e)
+            return res
+
+    def __markCreated(self, job):
+        with self.__connect() as conn:
+            conn.execute("UPDATE jobs SET created = 1 WHERE id = ? AND owner = ?", (job["id"], self.owner))
+        job["created"] = 1
+
+    def runOnce(self):
+        """
+        领取并执行一个任务
+        return 执行后的任务记录，没有可执行的任务时为None
+        """
+
+        job = self.claim()
+        if job is None:
+            return None
+        res = self.execute(job)
+        self.complete(job, res)
+        if self.progress is not None:
+            self.progress(self.get(job["id"]), res)
+        return job
+
+    def start(self):
+        """
+        启动执行线程和心跳线程，立即返回
+        """
+
+        if self.__threads:
+            return self
+        self.__stopping.clear()
+        self.recover()
+        self.__threads = [threading.Thread(target=self.__work, daemon=True) for _ in range(max(1, self.workers))]
+        self.__threads.append(threading.Thread(target=self.__beat, daemon=True))
+        for thread in self.__threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        """
+        停止领取新任务，等待执行中的任务完成
+        """
+
+        self.__stopping.set()
+        for thread in self.__threads:
+            thread.join()
+        self.__threads = []
+
+    def wait(self, timeout=None):
+        """
+        等待队列中没有等待执行（包括等待重试）和执行中的任务
+        return 是否在timeout秒内完成
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            counts = self.counts()
+            if counts["pending"] == 0 and counts["running"] == 0:
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(self.pollInterval)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __work(self):
+        while not self.__stopping.is_set():
+            try:
+                job = self.runOnce()
+            except sqlite3.Error:
+                job = None
+            if job is None:
+                self.__stopping.wait(self.pollInterval)
+
+    def __beat(self):
+        while not self.__stopping.wait(max(0.1, self.lease / 3.0)):
+            try:
+                self.heartbeat()
+            except sqlite3.Error:
+                continue
+
+    def __style(self, job):
+        if self.service.isStyleExist(job["workspaceName"], job["styleName"]):
+            return self.service.updateStyle(**job)
+        return self.service.createStyle(**job)
+
+
+class _Connection(object):
+    """
+    sqlite连接的上下文：正常退出时提交未结束的事务，异常时回滚，最后关闭连接
+    """
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, excType, exc, tb):
+        try:
+            if self.conn.in_transaction:
+                self.conn.execute("ROLLBACK" if excType is not None else "COMMIT")
+        finally:
+            self.conn.close()
+
+
+def _record(row):
+    record = dict(zip(_COLUMNS, row))
+    record["job"] = json.loads(record["job"])
+    record["result"] = json.loads(record["result"]) if record["result"] else None
+    return record
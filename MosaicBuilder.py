@@ -0,0 +1,342 @@
+import os
+import re
+import fnmatch
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from osgeo import gdal
+
+import ShapefileIO
+
+
+class MosaicError(Exception):
+    """
+    镶嵌数据集错误
+    """
+    pass
+
+
+# 未指定timeFormat时依次尝试的时间格式
+TIME_FORMATS = ("%Y%m%dT%H%M%S", "%Y%m%d%H%M%S", "%Y-%m-%dT%H:%M:%S", "%Y%m%d", "%Y-%m-%d", "%Y_%m_%d", "%Y%m", "%Y")
+
+# 索引shapefile的字段
+LOCATION_ATTRIBUTE = "location"
+TIME_ATTRIBUTE = "ingestion"
+_LOCATION_LENGTH = 254
+
+
+def readGranule(path):
+    """
+    只读取tiff的文件头，不读取像素
+    return {path, width, height, bandCount, dataType, geoTransform, projection, resolution, extent, ring, overviews}
+    ring为范围的外环（顺时针），overviews为每级overview的(宽度, 高度)
+    """
+
+    gdal.UseExceptions()
+    try:
+        ds = gdal.Open(path)
+    except RuntimeError as e:
+        raise MosaicError("无法打开tiff文件：{0}，{1}".format(path, e))
+
+    gt = ds.GetGeoTransform()
+    if gt[2] != 0 or gt[4] != 0:
+        raise MosaicError("不支持旋转的影像：{0}".format(path))
+    band = ds.GetRasterBand(1)
+    width, height = ds.RasterXSize, ds.RasterYSize
+    minx, maxx = sorted((gt[0], gt[0] + width * gt[1]))
+    miny, maxy = sorted((gt[3], gt[3] + height * gt[5]))
+    granule = {
+        "path": path,
+        "width": width,
+        "height": height,
+        "bandCount": ds.RasterCount,
+        "dataType": gdal.GetDataTypeName(band.DataType),
+        "geoTransform": gt,
+        "projection": ds.GetProjection(),
+        "resolution": (abs(gt[1]), abs(gt[5])),
+        "extent": (minx, miny, maxx, maxy),
+        "ring": [(minx, maxy), (maxx, maxy), (maxx, miny), (minx, miny), (minx, maxy)],
+        "overviews": [(band.GetOverview(k).XSize, band.GetOverview(k).YSize) for k in range(band.GetOverviewCount())]
+    }
+    ds = None
+    return granule
+
+
+def parseTime(text, timeFormat=None):
+    """
+    return 文件名中匹配的时间字符串转换的datetime，无法转换时为None
+    """
+
+    for fmt in (timeFormat,) if timeFormat else TIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+class MosaicBuilder(object):
+    """
+    在本地为一个文件夹的tiff生成ImageMosaic的镶嵌索引和配置，代替geoserver创建数据存储时扫描和读取全部影像
+    多线程并行读取每个影像的文件头（不读取像素），写出：
+        文件夹名.shp：每个影像的范围多边形，location字段为相对路径，指定timeRegex时ingestion字段为文件名中的时间
+        文件夹名.properties：镶嵌配置（分辨率层级、属性名等），geoserver发现该文件和索引后直接使用，不再扫描
+        indexer.properties、timeregex.properties：geoserver之后增量收集（harvest）影像时使用的配置
+    坐标系、波段数或数据类型与第一个影像不一致的影像不加入索引，记录在errors中
+    """
+    def __init__(self, mosaicDir, pattern="*.tif", recursive=True, timeRegex=None, timeFormat=None, workers=None):
+        """
+        mosaicDir：影像所在的文件夹，镶嵌名称为文件夹名
+        pattern：影像文件名的通配符，可选，默认为*.tif
+        recursive：是否包括子文件夹中的影像，可选，默认为True
+        timeRegex：从文件名提取时间的正则表达式，例如"[0-9]{8}"，可选，指定时启用时间维度
+        timeFormat：时间字符串的格式，例如"%Y%m%d"，可选，默认依次尝试TIME_FORMATS
+        workers：读取文件头的并发线程数，可选，默认为cpu核数的4倍
+        """
+        self.mosaicDir = os.path.abspath(mosaicDir)
+        self.name = os.path.basename(os.path.normpath(self.mosaicDir))
+        self.pattern = pattern
+        self.recursive = recursive
+        self.timeRegex = timeRegex
+        self.timeFormat = timeFormat
+        self.workers = workers or 4 * (os.cpu_count() or 1)
+
+    @classmethod
+    def load(cls, mosaicDir, timeFormat=None, workers=None):
+        """
+        按已有镶嵌文件夹中的indexer.properties和timeregex.properties创建，用于增量更新已发布的镶嵌数据集
+        """
+
+        mosaicDir = os.path.abspath(mosaicDir)
+        indexer = readProperties(os.path.join(mosaicDir, "indexer.properties"))
+        timeRegex = None
+        if indexer.get("TimeAttribute"):
+            timeRegex = readProperties(os.path.join(mosaicDir, "timeregex.properties")).get("regex")
+        return cls(mosaicDir, indexer.get("Wildcard", "*.tif"), indexer.get("Recursive", "true").lower() == "true",
+                   timeRegex, timeFormat, workers)
+
+    @property
+    def indexPath(self):
+        return os.path.join(self.mosaicDir, self.name + ".shp")
+
+    def indexed(self):
+        """
+        return 镶嵌索引中已有影像的相对路径列表，索引不存在时抛出MosaicError
+        """
+
+        if not os.path.exists(self.indexPath):
+            raise MosaicError("镶嵌索引不存在：{0}".format(self.indexPath))
+        reader = ShapefileIO.ShapefileReader(self.indexPath)
+        locations = []
+        for values in reader.readField(LOCATION_ATTRIBUTE):
+            locations.extend(value.decode(reader.charset, "replace").replace("\\", "/") for value in values)
+        return locations
+
+    def diff(self):
+        """
+        对比文件夹与镶嵌索引
+        return (新增影像的路径列表, 索引中文件已不存在的相对路径列表)
+        """
+
+        indexed = set(self.indexed())
+        paths = self.files()
+        current = set(os.path.relpath(path, self.mosaicDir).replace(os.sep, "/") for path in paths)
+        added = [path for path in paths if os.path.relpath(path, self.mosaicDir).replace(os.sep, "/") not in indexed]
+        return added, sorted(indexed - current)
+
+    def files(self):
+        """
+        return 文件夹中的影像路径，按路径排序
+        """
+
+        if not os.path.isdir(self.mosaicDir):
+            raise MosaicError("文件夹不存在：{0}".format(self.mosaicDir))
+        paths = []
+        for root, dirs, names in os.walk(self.mosaicDir):
+            paths.extend(os.path.join(root, name) for name in names if fnmatch.fnmatch(name.lower(), self.pattern.lower()))
+            if not self.recursive:
+                break
+        return sorted(paths)
+
+    def scan(self, paths=None):
+        """
+        并行读取影像的文件头
+        paths：影像路径，可选，默认为files()
+        return (granules, errors)，errors为[{path, info}]
+        """
+
+        paths = self.files() if paths is None else paths
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            results = list(executor.map(self.__read, paths))
+
+        granules, errors = [], []
+        for path, result in zip(paths, results):
+            if isinstance(result, Exception):
+                errors.append({"path": path, "info": str(result)})
+            else:
+                granules.append(result)
+        return granules, errors
+
+    def __read(self, path):
+        try:
+            granule = readGranule(path)
+        except Exception as e:
+            return e
+        granule["location"] = os.path.relpath(path, self.mosaicDir).replace(os.sep, "/")
+        if len(granule["location"].encode("utf-8")) > _LOCATION_LENGTH:
+            return MosaicError("相对路径过长：{0}".format(granule["location"]))
+        if self.timeRegex:
+            match = re.search(self.timeRegex, os.path.basename(path))
+            granule["time"] = parseTime(match.group(0), self.timeFormat) if match else None
+            if granule["time"] is None:
+                return MosaicError("无法从文件名中提取时间：{0}".format(os.path.basename(path)))
+        return granule
+
+    def validate(self, granules):
+        """
+        检查影像的坐标系、波段数和数据类型是否与第一个影像一致
+        return (一致的影像, errors)
+        """
+
+        if not granules:
+            return [], []
+        reference = granules[0]
+        valid, errors = [], []
+        for granule in granules:
+            for key, name in (("projection", "坐标系"), ("bandCount", "波段数"), ("dataType", "数据类型")):
+                if granule[key] != reference[key]:
+                    errors.append({"path": granule["path"], "info": "{0}与{1}不一致".format(name, reference["location"])})
+                    break
+            else:
+                valid.append(granule)
+        return valid, errors
+
+    def build(self, granules=None):
+        """
+        生成镶嵌索引和配置
+        granules：已读取的影像，可选，默认扫描文件夹
+        return {name, dir, indexPath, granules：影像数, extent, resolution, heterogeneous, time：(最早时间, 最晚时间)或None, errors：[{path, info}]}
+        没有可用的影像时抛出MosaicError
+        """
+
+        errors = []
+        if granules is None:
+            granules, errors = self.scan()
+        granules, invalid = self.validate(granules)
+        errors += invalid
+        if not granules:
+            raise MosaicError("文件夹中没有可用的影像：{0}".format(self.mosaicDir))
+
+        fields = [{"name": LOCATION_ATTRIBUTE, "type": "C", "length": _LOCATION_LENGTH}]
+        if self.timeRegex:
+            fields.append({"name": TIME_ATTRIBUTE, "type": "D", "length": 8})
+        records = [[granule["location"]] + ([granule["time"]] if self.timeRegex else []) for granule in granules]
+        ShapefileIO.writePolygons(self.indexPath, [granule["ring"] for granule in granules], fields, records, granules[0]["projection"])
+        ShapefileIO.buildIndex(self.indexPath)
+
+        resolutions = set(granule["resolution"] for granule in granules)
+        finest = min(granules, key=lambda granule: (granule["resolution"][0], -len(granule["overviews"])))
+        self.__writeProperties(finest, len(resolutions) > 1)
+
+        extents = [granule["extent"] for granule in granules]
+        times = [granule["time"] for granule in granules] if self.timeRegex else None
+        return {
+            "name": self.name,
+            "dir": self.mosaicDir,
+            "indexPath": self.indexPath,
+            "granules": len(granules),
+            "extent": (min(e[0] for e in extents), min(e[1] for e in extents), max(e[2] for e in extents), max(e[3] for e in extents)),
+            "resolution": finest["resolution"],
+            "heterogeneous": len(resolutions) > 1,
+            "time": (min(times), max(times)) if times else None,
+            "errors": errors
+        }
+
+    def __writeProperties(self, finest, heterogeneous):
+        """
+        写出镶嵌配置、indexer.properties和timeregex.properties
+        分辨率层级按最高分辨率（其中overview最多）影像的overview计算
+        """
+
+        resX, resY = finest["resolution"]
+        # overview的宽高按各自取整，X、Y方向的缩放比例可能不同
+        levels = [(resX, resY)] + [(resX * finest["width"] / float(width), resY * finest["height"] / float(height)) for width, height in finest["overviews"]]
+        mosaic = [
+            ("Name", self.name),
+            ("TypeName", self.name),
+            ("Levels", " ".join("{0!r},{1!r}".format(x, y) for x, y in levels)),
+            ("LevelsNum", len(levels)),
+            ("LocationAttribute", LOCATION_ATTRIBUTE),
+            ("AbsolutePath", "false"),
+            ("Heterogeneous", "true" if heterogeneous else "false"),
+            ("Caching", "false"),
+            ("ExpandToRGB", "false"),
+            ("CheckAuxiliaryMetadata", "false")
+        ]
+        indexer = [
+            ("Name", self.name),
+            ("LocationAttribute", LOCATION_ATTRIBUTE),
+            ("AbsolutePath", "false"),
+            ("Caching", "false"),
+            ("Recursive", "true" if self.recursive else "false"),
+            ("Wildcard", self.pattern)
+        ]
+        schema = "*the_geom:Polygon,{0}:String".format(LOCATION_ATTRIBUTE)
+        if self.timeRegex:
+            mosaic.append(("TimeAttribute", TIME_ATTRIBUTE))
+            indexer.append(("TimeAttribute", TIME_ATTRIBUTE))
+            indexer.append(("PropertyCollectors", "TimestampFileNameExtractorSPI[timeregex]({0})".format(TIME_ATTRIBUTE)))
+            schema += ",{0}:java.util.Date".format(TIME_ATTRIBUTE)
+            _writeProperties(os.path.join(self.mosaicDir, "timeregex.properties"), [("regex", self.timeRegex)])
+        indexer.append(("Schema", schema))
+
+        _writeProperties(os.path.join(self.mosaicDir, self.name + ".properties"), mosaic)
+        _writeProperties(os.path.join(self.mosaicDir, "indexer.properties"), indexer)
+
+
+def readProperties(path):
+    """
+    return java properties文件的键值字典，文件不存在时为空字典
+    """
+
+    items = {}
+    if not os.path.exists(path):
+        return items
+    # 与java的Properties.load(InputStream)一致按ISO-8859-1读取，非ASCII字符为\uXXXX转义
+    with open(path, "r", encoding="latin-1") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line[0] in "#!":
+                continue
+            # 键以第一个未转义的=或:结束
+            key, value = re.match(r"((?:\\.|[^\\=:])*)[=:]?(.*)", line).groups()
+            items[_unescape(key.strip())] = _unescape(value.strip())
+    return items
+
+
+def _unescape(text):
+    text = re.sub(r"\\(u[0-9a-fA-F]{4}|.)", lambda m: chr(int(m.group(1)[1:], 16)) if len(m.group(1)) == 5 else m.group(1), text)
+    # 基本平面以外的字符转义为两个\uXXXX（UTF-16代理对），合并为一个字符
+    return text.encode("utf-16", "surrogatepass").decode("utf-16")
+
+
+def _writeProperties(path, items):
+    """
+    写出java properties文件，反斜杠、冒号、等号按properties格式转义；
+    geotools按ISO-8859-1读取，非ASCII字符（例如中文文件夹名）写为\\uXXXX转义，文件只包含ASCII字符
+    """
+
+    def escape(value):
+        value = str(value).replace("\\", "\\\\").replace(":", "\\:").replace("=", "\\=")
+        if value.isascii():
+            return value
+        units = value.encode("utf-16-be")
+        return "".join(
+            "\\u{0:04x}".format(int.from_bytes(units[i:i + 2], "big")) if units[i] or units[i + 1] > 0x7e else chr(units[i + 1])
+            for i in range(0, len(units), 2))
+
+    tmpPath = path + ".tmp"
+    with open(tmpPath, "w", encoding="ascii") as f:
+        for key, value in items:
+            f.write("{0}={1}\n".format(key, escape(value)))
+    os.replace(tmpPath, path)
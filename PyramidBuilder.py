@@ -0,0 +1,645 @@
+import os
+import json
+import math
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_EXCEPTION
+
+import numpy
+from osgeo import gdal, gdal_array
+
+from RasterStatistics import RasterStatistics, stretchRange
+from PyramidPlanner import PyramidPlanner
+
+
+class PyramidError(Exception):
+    """
+    金字塔切片错误
+    """
+    pass
+
+
+class PyramidManifest(object):
+    """
+    金字塔切片清单，记录源影像指纹和每个已完成切片的级别、块行列号和校验值
+    每完成一个切片追加一行json，进程中断后重新切片时可据此跳过已完成的切片
+    第0级切片的校验值为对应源影像块数据的哈希，第n级切片的校验值为其下一级2x2个切片校验值的哈希，
+    源影像局部更新后，只有校验值发生变化的块及其上层切片会被重新生成
+    """
+    def __init__(self, path, settings, source):
+        """
+        path：清单文件的路径
+        settings：切片参数，与清单中记录的不一致时清单作废
+        source：源影像指纹 {path, size, mtime}
+        """
+        self.path = path
+        self.settings = settings
+        self.source = source
+        self.entries = {}
+        self.sourceUnchanged = False
+        self.__file = None
+
+        header = None
+        for item in self.__read(path):
+            if header is None:
+                header = item
+            else:
+                self.entries[(item["level"], item["row"], item["col"])] = item
+
+        if header is None or header.get("settings") != settings:
+            self.entries = {}
+        else:
+            self.sourceUnchanged = header.get("source") == source
+        self.__rewrite()
+
+    @staticmethod
+    def __read(path):
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    # 进程中断时最后一行可能不完整
+                    return
+                yield item
+
+    @staticmethod
+    def header(path):
+        """
+        return 清单的头部 {settings, source}，清单不存在时为None
+        """
+
+        return next(PyramidManifest.__read(path), None)
+
+    def get(self, level, row, col):
+        return self.entries.get((level, row, col))
+
+    def put(self, level, row, col, checksum, tile):
+        item = {"level": level, "row": row, "col": col, "checksum": checksum, "tile": tile}
+        self.entries[(level, row, col)] = item
+        self.__file.write(json.dumps(item) + "\n")
+        self.__file.flush()
+
+    def close(self):
+        """
+        压缩清单，只保留每个切片的最新记录
+        """
+
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+        self.__rewrite(False)
+
+    def __rewrite(self, reopen=True):
+        tmpPath = self.path + ".tmp"
+        with open(tmpPath, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"settings": self.settings, "source": self.source}) + "\n")
+            for key in sorted(self.entries):
+                f.write(json.dumps(self.entries[key]) + "\n")
+        os.replace(tmpPath, self.path)
+        if reopen:
+            self.__file = open(self.path, "a", encoding="utf-8")
+
+
+def sourceFingerprint(path):
+    """
+    源影像指纹：路径、大小和修改时间
+    """
+
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+class PyramidBuilder(object):
+    """
+    进程内并行的TIFF金字塔切片器，用于替代gdal_retile.py
+    生成与gdal_retile.py相同的目录结构：第0级切片位于目标文件夹下，第n级切片位于目标文件夹的n子文件夹下，供"ImagePyramid"类型的栅格存储使用
+    源影像的每个块只读取一次，第n级由第n-1级的切片2倍降采样生成，同一级的切片由进程池并行生成
+    resume为True时根据切片清单跳过已完成且未变化的切片，可在中断后或源影像局部更新后增量切片
+    源影像与输出的数据类型不同时，先用RasterStatistics统计每个波段的拉伸范围，再线性拉伸到输出类型的取值范围，
+    而不是直接截断；源影像有nodata时，输出类型的最小值作为nodata，有效值拉伸到其余取值
+    sparse为True时不写出没有有效像素（全为nodata或alpha全为0）的切片，只在清单中记录；
+    每一级左上角和右下角的切片总会写出，使GeoServer按每级文件夹建立的镶嵌索引覆盖完整范围
+    """
+    def __init__(self, tiffPath, tiffDir, levels=4, blockWidth=2048, blockHeight=2048, outputType="Byte",
+                 creationOptions=("ALPHA=YES",), workers=None, progress=None, resume=True, manifestPath=None,
+                 rescale="percentile", stretch=(2, 98), scale=None, approxStats=True, sparse=True):
+        """
+        tiffPath：tiff文件的路径
+        tiffDir：生成的金字塔文件夹的路径
+        levels：金字塔层级，可选，默认为4，为None时由PyramidPlanner按影像尺寸规划
+        blockWidth: 金字塔切块的宽度分辨率，可选，默认为2048，为None时由PyramidPlanner规划
+        blockHeight: 金字塔切块的高度分辨率，可选，默认为2048，为None时由PyramidPlanner规划
+        outputType：切片的数据类型，可选，默认为Byte
+        creationOptions：切片的GTiff创建参数，可选，默认为ALPHA=YES
+        workers：并行的进程数，可选，默认为cpu核数
+        progress：进度回调函数 progress(level, done, total)，可选
+        resume：是否根据切片清单增量切片，可选，默认为True
+        manifestPath：切片清单的路径，可选，默认为金字塔文件夹旁的"文件夹名.manifest.jsonl"，
+                      清单不放在金字塔文件夹内，以免被ImagePyramid当作数据读取
+        rescale：源影像与输出的数据类型不同时的转换方式，可选，默认为percentile
+                 percentile-按stretch百分位数拉伸;minmax-按最值拉伸;None-直接截断到输出类型的取值范围
+        stretch：percentile拉伸的(低, 高)百分位数，可选，默认为(2, 98)
+        scale：每个波段的拉伸范围 [(最小值, 最大值)]，可选，指定时不再统计，例如用getRasterStatistics的结果统一多幅影像的拉伸
+        approxStats：统计时是否使用源影像的overview近似统计，可选，默认为True
+        sparse：是否跳过没有有效像素的切片，可选，默认为True
+        """
+        self.tiffPath = tiffPath
+        self.tiffDir = tiffDir
+        self.levels = levels
+        self.blockWidth = blockWidth
+        self.blockHeight = blockHeight
+        self.outputType = outputType
+        self.creationOptions = list(creationOptions or [])
+        self.workers = workers or os.cpu_count() or 1
+        self.progress = progress
+        self.resume = resume
+        self.manifestPath = manifestPath or os.path.normpath(tiffDir) + ".manifest.jsonl"
+        self.rescale = rescale
+        self.stretch = stretch
+        self.scale = scale
+        self.approxStats = approxStats
+        self.sparse = sparse
+
+        if rescale not in (None, "percentile", "minmax"):
+            raise PyramidError("不支持的拉伸方式：{0}".format(rescale))
+
+    def plan(self):
+        """
+        计算每一级的尺寸、分辨率和切片数量
+        return [{level, dir, width, height, geoTransform, tilesX, tilesY}]
+        """
+
+        if self.levels is None or self.blockWidth is None or self.blockHeight is None:
+            planned = PyramidPlanner(self.tiffPath, self.outputType, self.creationOptions, workers=self.workers).plan()
+            self.levels = planned["levels"] if self.levels is None else self.levels
+            self.blockWidth = self.blockWidth or planned["blockWidth"]
+            self.blockHeight = self.blockHeight or planned["blockHeight"]
+
+        gdal.UseExceptions()
+        try:
+            ds = gdal.Open(self.tiffPath)
+        except RuntimeError as e:
+            raise PyramidError("无法打开tiff文件：{0}，{1}".format(self.tiffPath, e))
+
+        if self.levels < 0 or self.blockWidth <= 0 or self.blockHeight <= 0:
+            raise PyramidError("金字塔层级和切块分辨率必须为正数")
+
+        gt = ds.GetGeoTransform()
+        width, height = ds.RasterXSize, ds.RasterYSize
+        ds = None
+
+        # GeoServer首次配置金字塔时会把第0级切片移到0子文件夹下
+        baseDir = os.path.join(self.tiffDir, "0")
+        if not os.path.isdir(baseDir):
+            baseDir = self.tiffDir
+
+        levels = []
+        for level in range(self.levels + 1):
+            scale = 2 ** level
+            levelWidth = int(math.ceil(width / float(scale)))
+            levelHeight = int(math.ceil(height / float(scale)))
+            levels.append({
+                "level": level,
+                "dir": baseDir if level == 0 else os.path.join(self.tiffDir, str(level)),
+                "width": levelWidth,
+                "height": levelHeight,
+                "geoTransform": (gt[0], gt[1] * scale, gt[2] * scale, gt[3], gt[4] * scale, gt[5] * scale),
+                "tilesX": int(math.ceil(levelWidth / float(self.blockWidth))),
+                "tilesY": int(math.ceil(levelHeight / float(self.blockHeight)))
+            })
+        return levels
+
+    def build(self):
+        """
+        生成金字塔切片
+        return [{level, dir, width, height, geoTransform, tilesX, tilesY, built, skipped, empty}]，
+               即plan的结果，built和skipped为该级重新生成和跳过的切片，empty为没有有效像素、未写出的切片
+        """
+
+        levels = self.plan()
+        spec = self._spec()
+        spec["scale"] = self._scale(spec)
+        if spec["scale"] is not None:
+            spec["noData"] = _outputNoData(spec)
+
+        manifest = None
+        if self.resume:
+            settings = {
+                "width": levels[0]["width"],
+                "height": levels[0]["height"],
+                "blockWidth": self.blockWidth,
+                "blockHeight": self.blockHeight,
+                "outputType": self.outputType,
+                "creationOptions": self.creationOptions
+            }
+            if spec["scale"] is not None:
+                settings["scale"] = spec["scale"]
+            manifest = PyramidManifest(self.manifestPath, settings, sourceFingerprint(self.tiffPath))
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                for info in levels:
+                    self._buildLevel(executor, spec, info, levels[info["level"] - 1] if info["level"] > 0 else None, manifest)
+        finally:
+            if manifest is not None:
+                manifest.close()
+
+        return levels
+
+    def _buildLevel(self, executor, spec, info, below, manifest):
+        """
+        生成一级切片，跳过清单中已完成且未变化的切片
+        """
+
+        level = info["level"]
+        os.makedirs(info["dir"], exist_ok=True)
+        info["built"] = []
+        info["skipped"] = []
+        info["empty"] = []
+        belowEmpty = set(below["empty"]) if below is not None else set()
+        # 清单中记录为空、未写出的切片
+        wasEmpty = set()
+
+        futures = {}
+        for row in range(info["tilesY"]):
+            for col in range(info["tilesX"]):
+                entry = manifest.get(level, row, col) if manifest is not None else None
+                empty = self.sparse and entry is not None and entry["tile"] is None
+                if empty:
+                    wasEmpty.add((row, col))
+                exists = entry is not None and (empty or os.path.exists(os.path.join(info["dir"], tileName(spec, info, row, col))))
+                expected = entry["checksum"] if exists else None
+                keep = not self.sparse or _isCorner(info, row, col)
+
+                if level == 0:
+                    # 源影像未变化时直接跳过；变化时由子进程读取块数据比较校验值
+                    if expected is not None and manifest.sourceUnchanged:
+                        (info["empty"] if empty else info["skipped"]).append((row, col))
+                        continue
+                    future = executor.submit(_buildBaseTile, spec, info, below, row, col, expected, keep)
+                else:
+                    checksum = _childChecksum(below, manifest, row, col)
+                    if expected is not None and expected == checksum:
+                        (info["empty"] if empty else info["skipped"]).append((row, col))
+                        continue
+                    if not keep and all(child in belowEmpty or not _inLevel(below, *child) for child in _children(row, col)):
+                        # 下一级对应的切片都为空时不必读取
+                        _removeTile(spec, info, row, col)
+                        info["empty"].append((row, col))
+                        if manifest is not None:
+                            manifest.put(level, row, col, checksum, None)
+                        continue
+                    future = executor.submit(_buildLevelTile, spec, info, below, row, col, checksum, keep)
+                futures[future] = (row, col)
+
+        def onDone(row, col, result):
+            checksum, written, empty = result
+            if empty is None:
+                empty = (row, col) in wasEmpty
+            if written:
+                info["built"].append((row, col))
+            else:
+                (info["empty"] if empty else info["skipped"]).append((row, col))
+            if manifest is not None:
+                manifest.put(level, row, col, checksum, None if empty else tileName(spec, info, row, col))
+
+        self._wait(level, futures, len(info["skipped"]) + len(info["empty"]), info["tilesX"] * info["tilesY"], onDone)
+
+    def _spec(self):
+        """
+        传给子进程的切片参数，只包含可序列化的数据
+        """
+
+        gdal.UseExceptions()
+        ds = gdal.Open(self.tiffPath)
+        band = ds.GetRasterBand(1)
+        spec = {
+            "tiffPath": self.tiffPath,
+            "baseName": os.path.splitext(os.path.basename(self.tiffPath))[0],
+            "blockWidth": self.blockWidth,
+            "blockHeight": self.blockHeight,
+            "bandCount": ds.RasterCount,
+            "sourceType": band.DataType,
+            "outputType": gdal.GetDataTypeByName(self.outputType),
+            "sourceNoData": band.GetNoDataValue(),
+            "noData": band.GetNoDataValue(),
+            "projection": ds.GetProjection(),
+            "creationOptions": self.creationOptions,
+            "alpha": _hasAlpha(self.creationOptions, ds.RasterCount)
+        }
+        ds = None
+        if spec["outputType"] == gdal.GDT_Unknown:
+            raise PyramidError("不支持的数据类型：{0}".format(self.outputType))
+        return spec
+
+    def _scale(self, spec):
+        """
+        return 每个波段的拉伸范围 [[最小值, 最大值]]，不需要拉伸时为None
+        源影像未变化时沿用切片清单中记录的拉伸范围，增量切片不必重新统计
+        """
+
+        if self.scale is not None:
+            scale = self.scale
+        elif self.rescale is None or spec["sourceType"] == spec["outputType"]:
+            return None
+        else:
+            header = PyramidManifest.header(self.manifestPath) if self.resume else None
+            if header is not None and header.get("source") == sourceFingerprint(self.tiffPath) \
+                    and header["settings"].get("scale") is not None and len(header["settings"]["scale"]) == spec["bandCount"]:
+                return header["settings"]["scale"]
+            statistics = RasterStatistics(self.tiffPath, approx=self.approxStats, workers=self.workers).compute()
+            scale = stretchRange(statistics, *((0, 100) if self.rescale == "minmax" else self.stretch))
+
+        if len(scale) != spec["bandCount"]:
+            raise PyramidError("拉伸范围的数量与波段数不一致：{0}/{1}".format(len(scale), spec["bandCount"]))
+        dtype = numpy.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(spec["outputType"]))
+        if not numpy.issubdtype(dtype, numpy.integer):
+            raise PyramidError("只能拉伸到整型输出：{0}".format(self.outputType))
+        # 与清单中记录的json一致，便于比较
+        return [[float(low), float(high)] if low is not None else None for low, high in ((r or (None, None)) for r in scale)]
+
+    def _wait(self, level, futures, done, total, onDone):
+        """
+        等待一级切片完成并回调进度，任一切片失败时取消剩余任务并抛出PyramidError
+        """
+
+        if self.progress is not None:
+            self.progress(level, done, total)
+
+        pending = set(futures)
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_EXCEPTION)
+            for future in finished:
+                row, col = futures[future]
+                error = future.exception()
+                if error is not None:
+                    for other in pending:
+                        other.cancel()
+                    raise PyramidError("第{0}级切片({1}, {2})生成失败：{3!r}".format(level, row, col, error))
+                onDone(row, col, future.result())
+                done += 1
+            if self.progress is not None:
+                self.progress(level, done, total)
+
+
+def _children(row, col):
+    return [(childRow, childCol) for childRow in (2 * row, 2 * row + 1) for childCol in (2 * col, 2 * col + 1)]
+
+
+def _inLevel(info, row, col):
+    return row < info["tilesY"] and col < info["tilesX"]
+
+
+def _childChecksum(below, manifest, row, col):
+    """
+    第n级切片的校验值：下一级对应的2x2个切片校验值的哈希
+    """
+
+    digest = hashlib.sha1()
+    for childRow, childCol in _children(row, col):
+        entry = manifest.get(below["level"], childRow, childCol) if manifest is not None else None
+        digest.update((entry["checksum"] if entry is not None else "-").encode("ascii"))
+    return digest.hexdigest()
+
+
+def _isCorner(info, row, col):
+    return (row, col) in ((0, 0), (info["tilesY"] - 1, info["tilesX"] - 1))
+
+
+def _hasAlpha(creationOptions, bandCount):
+    """
+    切片是否带alpha波段：ALPHA创建参数只对灰度+alpha（2波段）和RGBA（4波段）生效
+    """
+
+    for option in creationOptions:
+        key, _, value = option.partition("=")
+        if key.upper() == "ALPHA":
+            return value.upper() not in ("NO", "UNSPECIFIED") and bandCount in (2, 4)
+    return False
+
+
+def isEmpty(data, noData=None, alpha=False):
+    """
+    判断(波段, 行, 列)数组是否没有有效像素：带alpha波段时alpha全为0，否则所有像素都等于nodata或为nan
+    """
+
+    if alpha:
+        return not data[-1].any()
+    if data.dtype.kind == "f":
+        invalid = numpy.isnan(data)
+        if noData is not None:
+            invalid |= data == noData
+        return bool(invalid.all())
+    if noData is None:
+        return False
+    return bool((data == noData).all())
+
+
+# 子进程内缓存已打开的源影像，避免每个切片重复打开
+_datasets = {}
+
+
+def _openSource(path):
+    if path not in _datasets:
+        gdal.UseExceptions()
+        _datasets[path] = gdal.Open(path)
+    return _datasets[path]
+
+
+def tileName(spec, info, row, col):
+    """
+    与gdal_retile.py一致的切片文件名：源文件名_行号_列号.tif，行列号从1开始并按该级最大切片数补零
+    """
+
+    digits = len(str(max(info["tilesX"], info["tilesY"])))
+    return "{0}_{1:0{3}d}_{2:0{3}d}.tif".format(spec["baseName"], row + 1, col + 1, digits)
+
+
+def _window(spec, info, row, col):
+    xoff = col * spec["blockWidth"]
+    yoff = row * spec["blockHeight"]
+    return xoff, yoff, min(spec["blockWidth"], info["width"] - xoff), min(spec["blockHeight"], info["height"] - yoff)
+
+
+def _castTo(data, gdalType):
+    """
+    将数据转换为输出类型，整型输出会先四舍五入并截断到类型的取值范围
+    """
+
+    dtype = numpy.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(gdalType))
+    if data.dtype == dtype:
+        return data
+    if numpy.issubdtype(dtype, numpy.integer):
+        limits = numpy.iinfo(dtype)
+        if not numpy.issubdtype(data.dtype, numpy.integer):
+            data = numpy.rint(data)
+        data = numpy.clip(data, limits.min, limits.max)
+    return data.astype(dtype)
+
+
+def _outputNoData(spec):
+    """
+    拉伸输出的nodata：源影像有nodata时为输出类型的最小值，否则不设置
+    """
+
+    if spec["sourceNoData"] is None:
+        return None
+    return int(numpy.iinfo(gdal_array.GDALTypeCodeToNumericTypeCode(spec["outputType"])).min)
+
+
+def _rescale(data, spec):
+    """
+    将每个波段从拉伸范围线性映射到输出类型的取值范围，超出范围的值截断，源影像的nodata和nan映射为输出的nodata
+    """
+
+    dtype = numpy.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(spec["outputType"]))
+    limits = numpy.iinfo(dtype)
+    low = limits.min + (1 if spec["noData"] is not None else 0)
+    high = limits.max
+    fill = spec["noData"] if spec["noData"] is not None else low
+
+    result = numpy.empty(data.shape, dtype=dtype)
+    for i, band in enumerate(data):
+        invalid = numpy.zeros(band.shape, dtype=bool)
+        if spec["sourceNoData"] is not None:
+            invalid |= band == spec["sourceNoData"]
+        if band.dtype.kind == "f":
+            invalid |= numpy.isnan(band)
+
+        if spec["scale"][i] is None:
+            result[i] = fill
+            continue
+        srcMin, srcMax = spec["scale"][i]
+        factor = (high - low) / float(srcMax - srcMin) if srcMax > srcMin else 0.0
+        with numpy.errstate(invalid="ignore"):
+            scaled = numpy.rint((band.astype(numpy.float64) - srcMin) * factor + low)
+        scaled = numpy.clip(numpy.nan_to_num(scaled, nan=low), low, high)
+        scaled[invalid] = fill
+        result[i] = scaled
+    return result
+
+
+def _writeTile(spec, info, row, col, data):
+    xoff, yoff, w, h = _window(spec, info, row, col)
+    gt = info["geoTransform"]
+    path = os.path.join(info["dir"], tileName(spec, info, row, col))
+
+    driver = gdal.GetDriverByName("GTiff")
+    ds = driver.Create(path, w, h, spec["bandCount"], spec["outputType"], spec["creationOptions"])
+    ds.SetGeoTransform((gt[0] + xoff * gt[1] + yoff * gt[2], gt[1], gt[2], gt[3] + xoff * gt[4] + yoff * gt[5], gt[4], gt[5]))
+    ds.SetProjection(spec["projection"])
+    for i in range(spec["bandCount"]):
+        band = ds.GetRasterBand(i + 1)
+        if spec["noData"] is not None:
+            band.SetNoDataValue(spec["noData"])
+        band.WriteArray(data[i])
+    ds.FlushCache()
+    ds = None
+    return path
+
+
+def _removeTile(spec, info, row, col):
+    """
+    删除变为空的切片之前写出的文件
+    """
+
+    path = os.path.join(info["dir"], tileName(spec, info, row, col))
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _buildBaseTile(spec, info, below, row, col, expected=None, keep=True):
+    """
+    从源影像读取一个块，生成第0级切片
+    expected：清单中记录的校验值，与块数据的校验值一致时不重新写入
+    keep：没有有效像素时是否仍然写出
+    return (校验值, 是否写入, 是否为空)，未变化时是否为空为None
+    """
+
+    xoff, yoff, w, h = _window(spec, info, row, col)
+    data = _openSource(spec["tiffPath"]).ReadAsArray(xoff, yoff, w, h)
+    if data.ndim == 2:
+        data = data[numpy.newaxis, :, :]
+
+    checksum = hashlib.sha1(numpy.ascontiguousarray(data).tobytes()).hexdigest()
+    if checksum == expected:
+        return checksum, False, None
+
+    if not keep and isEmpty(data, spec["sourceNoData"], spec["alpha"]):
+        _removeTile(spec, info, row, col)
+        return checksum, False, True
+
+    if spec["scale"] is not None:
+        data = _rescale(data, spec)
+    else:
+        data = _castTo(data, spec["outputType"])
+    _writeTile(spec, info, row, col, data)
+    return checksum, True, False
+
+
+def _readBelow(spec, below, row, col):
+    """
+    读取下一级中与当前切片对应的2x2个切片，拼接为一个数组
+    """
+
+    xoff = 2 * col * spec["blockWidth"]
+    yoff = 2 * row * spec["blockHeight"]
+    w = min(2 * spec["blockWidth"], below["width"] - xoff)
+    h = min(2 * spec["blockHeight"], below["height"] - yoff)
+    dtype = gdal_array.GDALTypeCodeToNumericTypeCode(spec["outputType"])
+    # 未写出的空切片按nodata（带alpha时为全透明）填充
+    fill = 0 if spec["noData"] is None or spec["alpha"] else _castTo(numpy.array([spec["noData"]]), spec["outputType"])[0]
+    data = numpy.full((spec["bandCount"], h, w), fill, dtype=dtype)
+
+    gdal.UseExceptions()
+    for childRow in (2 * row, 2 * row + 1):
+        for childCol in (2 * col, 2 * col + 1):
+            path = os.path.join(below["dir"], tileName(spec, below, childRow, childCol))
+            if not _inLevel(below, childRow, childCol) or not os.path.exists(path):
+                continue
+            ds = gdal.Open(path)
+            child = ds.ReadAsArray()
+            ds = None
+            if child.ndim == 2:
+                child = child[numpy.newaxis, :, :]
+            y = (childRow - 2 * row) * spec["blockHeight"]
+            x = (childCol - 2 * col) * spec["blockWidth"]
+            data[:, y:y + child.shape[1], x:x + child.shape[2]] = child
+    return data
+
+
+def downsample(data, noData=None):
+    """
+    对(波段, 行, 列)数组做2倍均值降采样，奇数边缘复制最后一行/列，nodata像素不参与平均
+    """
+
+    bands, h, w = data.shape
+    if h % 2 or w % 2:
+        data = numpy.pad(data, ((0, 0), (0, h % 2), (0, w % 2)), mode="edge")
+    blocks = data.reshape(bands, data.shape[1] // 2, 2, data.shape[2] // 2, 2).astype(numpy.float32)
+
+    if noData is None:
+        return blocks.mean(axis=(2, 4))
+
+    valid = blocks != noData
+    count = valid.sum(axis=(2, 4))
+    total = numpy.where(valid, blocks, 0).sum(axis=(2, 4))
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        return numpy.where(count > 0, total / numpy.maximum(count, 1), noData)
+
+
+def _buildLevelTile(spec, info, below, row, col, checksum=None, keep=True):
+    """
+    由下一级的切片降采样生成第n级切片
+    keep：没有有效像素时是否仍然写出
+    return (校验值, 是否写入, 是否为空)
+    """
+
+    data = downsample(_readBelow(spec, below, row, col), spec["noData"])
+    if not keep and isEmpty(data, spec["noData"], spec["alpha"]):
+        _removeTile(spec, info, row, col)
+        return checksum, False, True
+    _writeTile(spec, info, row, col, _castTo(data, spec["outputType"]))
+    return checksum, True, False
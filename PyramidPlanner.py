@@ -0,0 +1,267 @@
+import os
+import math
+import time
+import shutil
+import tempfile
+
+import numpy
+from osgeo import gdal, gdal_array
+
+
+class PlanError(Exception):
+    """
+    金字塔规划错误
+    """
+    pass
+
+
+# 候选的切块分辨率
+BLOCK_SIZES = (256, 512, 1024, 2048, 4096)
+
+# 常见压缩方式的压缩比估计，calibrate时以实际写出的样本切片为准
+COMPRESSION_RATIOS = {
+    "NONE": 1.0,
+    "PACKBITS": 0.8,
+    "LZW": 0.6,
+    "DEFLATE": 0.5,
+    "ZSTD": 0.45,
+    "LERC": 0.5,
+    "JPEG": 0.1,
+    "WEBP": 0.1
+}
+
+# 每个切片文件的头部和目录开销（字节）
+_TILE_OVERHEAD = 4096
+
+
+class PyramidPlanner(object):
+    """
+    金字塔切片规划：根据影像的尺寸、数据类型和波段数选择金字塔层级和切块分辨率，并在切片前估算切片数量、磁盘占用和耗时
+    切块分辨率取未压缩切片不超过tileBytes的最大候选值，第0级切片数超过maxTiles时逐级增大切块；
+    层级数取最顶级切片数不超过topTiles的最小值（至少为1），使缩小显示时只需读取少量切片
+    """
+    def __init__(self, tiffPath, outputType="Byte", creationOptions=("ALPHA=YES",), topTiles=4, maxTiles=100000,
+                 tileBytes=12 * 1024 * 1024, workers=None, throughput=50 * 1024 * 1024):
+        """
+        tiffPath：tiff文件的路径
+        outputType：切片的数据类型，可选，默认为Byte
+        creationOptions：切片的GTiff创建参数，用于估算压缩后的磁盘占用，可选，默认为ALPHA=YES
+        topTiles：最顶级的最多切片数，可选，默认为4
+        maxTiles：第0级的最多切片数，可选，默认为100000
+        tileBytes：未压缩切片的最大字节数，可选，默认为12MB
+        workers：并行切片的进程数，用于估算耗时，可选，默认为cpu核数
+        throughput：每个进程每秒处理的源数据字节数，用于估算耗时，可选，默认为50MB，calibrate时以实测为准
+        """
+        self.tiffPath = tiffPath
+        self.outputType = outputType
+        self.creationOptions = list(creationOptions or [])
+        self.topTiles = topTiles
+        self.maxTiles = maxTiles
+        self.tileBytes = tileBytes
+        self.workers = workers or os.cpu_count() or 1
+        self.throughput = throughput
+
+    def describe(self):
+        """
+        return 影像信息 {width, height, bandCount, dataType, sourcePixelBytes, outputPixelBytes}，PixelBytes为所有波段每个像素的字节数
+        """
+
+        gdal.UseExceptions()
+        try:
+            ds = gdal.Open(self.tiffPath)
+        except RuntimeError as e:
+            raise PlanError("无法打开tiff文件：{0}，{1}".format(self.tiffPath, e))
+
+        outputType = gdal.GetDataTypeByName(self.outputType)
+        if outputType == gdal.GDT_Unknown:
+            raise PlanError("不支持的数据类型：{0}".format(self.outputType))
+        sourceType = ds.GetRasterBand(1).DataType
+        info = {
+            "width": ds.RasterXSize,
+            "height": ds.RasterYSize,
+            "bandCount": ds.RasterCount,
+            "dataType": gdal.GetDataTypeName(sourceType),
+            "sourcePixelBytes": ds.RasterCount * gdal.GetDataTypeSize(sourceType) // 8,
+            "outputPixelBytes": ds.RasterCount * gdal.GetDataTypeSize(outputType) // 8
+        }
+        ds = None
+        return info
+
+    def blockSize(self, info):
+        """
+        return 切块分辨率
+        """
+
+        candidates = [size for size in BLOCK_SIZES if size * size * info["outputPixelBytes"] <= self.tileBytes] or [BLOCK_SIZES[0]]
+        block = candidates[-1]
+        # 小影像不使用超过影像尺寸的切块
+        longest = max(info["width"], info["height"])
+        fitting = [size for size in BLOCK_SIZES if size >= longest]
+        if fitting and fitting[0] < block:
+            block = fitting[0]
+        # 第0级切片过多时增大切块，避免耗尽inode
+        for size in BLOCK_SIZES:
+            if size > block and _tiles(info["width"], info["height"], block) > self.maxTiles:
+                block = size
+        return block
+
+    def levelCount(self, info, block):
+        """
+        return 最顶级切片数不超过topTiles的最小层级数，至少为1
+        """
+
+        maxLevel = max(1, int(math.ceil(math.log(max(info["width"], info["height"], 1), 2))))
+        for level in range(1, maxLevel + 1):
+            scale = 2 ** level
+            if _tiles(math.ceil(info["width"] / float(scale)), math.ceil(info["height"] / float(scale)), block) <= self.topTiles:
+                return level
+        return maxLevel
+
+    def compressionRatio(self):
+        """
+        return 按创建参数估计的压缩比
+        """
+
+        for option in self.creationOptions:
+            key, _, value = option.partition("=")
+            if key.upper() == "COMPRESS":
+                return COMPRESSION_RATIOS.get(value.upper(), 0.5)
+        return 1.0
+
+    def calibrate(self, block):
+        """
+        从影像中心读取一个切块并按创建参数写出，实测处理速度和压缩比
+        return (每秒处理的源数据字节数, 压缩比)
+        """
+
+        info = self.describe()
+        gdal.UseExceptions()
+        ds = gdal.Open(self.tiffPath)
+        w, h = min(block, info["width"]), min(block, info["height"])
+        xoff, yoff = (info["width"] - w) // 2, (info["height"] - h) // 2
+        outputType = gdal.GetDataTypeByName(self.outputType)
+        dtype = numpy.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(outputType))
+
+        tmpDir = tempfile.mkdtemp()
+        try:
+            start = time.perf_counter()
+            data = ds.ReadAsArray(xoff, yoff, w, h)
+            if data.ndim == 2:
+                data = data[numpy.newaxis, :, :]
+            if numpy.issubdtype(dtype, numpy.integer):
+                limits = numpy.iinfo(dtype)
+                data = numpy.clip(data, limits.min, limits.max)
+            data = data.astype(dtype)
+            path = os.path.join(tmpDir, "sample.tif")
+            out = gdal.GetDriverByName("GTiff").Create(path, w, h, info["bandCount"], outputType, self.creationOptions)
+            for i in range(info["bandCount"]):
+                out.GetRasterBand(i + 1).WriteArray(data[i])
+            out.FlushCache()
+            out = None
+            seconds = max(time.perf_counter() - start, 1e-6)
+            ratio = max(os.path.getsize(path) - _TILE_OVERHEAD, 1) / float(w * h * info["outputPixelBytes"])
+        finally:
+            ds = None
+            shutil.rmtree(tmpDir, ignore_errors=True)
+        return w * h * info["sourcePixelBytes"] / seconds, min(ratio, 1.0)
+
+    def plan(self, tiffDir=None, calibrate=False):
+        """
+        规划金字塔切片
+        tiffDir：生成的金字塔文件夹的路径，可选，指定时检查所在磁盘的剩余空间和inode
+        calibrate：是否写出一个样本切片实测处理速度和压缩比，可选，默认为False
+        return {
+            levels, blockWidth, blockHeight：规划的层级数和切块分辨率，可直接传给PyramidBuilder,
+            width, height, bandCount, dataType, outputType,
+            perLevel：[{level, width, height, tilesX, tilesY, bytes}],
+            tiles：切片总数, bytes：估计的磁盘占用, seconds：估计的切片耗时（不包括拉伸统计）,
+            freeBytes, freeInodes：金字塔文件夹所在磁盘的剩余空间和inode，未指定tiffDir或无法获取时为None,
+            warnings：[警告信息]
+        }
+        """
+
+        info = self.describe()
+        block = self.blockSize(info)
+        levelCount = self.levelCount(info, block)
+        throughput, ratio = self.calibrate(block) if calibrate else (self.throughput, self.compressionRatio())
+
+        perLevel = []
+        for level in range(levelCount + 1):
+            scale = 2 ** level
+            width = int(math.ceil(info["width"] / float(scale)))
+            height = int(math.ceil(info["height"] / float(scale)))
+            tilesX = int(math.ceil(width / float(block)))
+            tilesY = int(math.ceil(height / float(block)))
+            perLevel.append({
+                "level": level,
+                "width": width,
+                "height": height,
+                "tilesX": tilesX,
+                "tilesY": tilesY,
+                "bytes": int(width * height * info["outputPixelBytes"] * ratio) + tilesX * tilesY * _TILE_OVERHEAD
+            })
+
+        tiles = sum(item["tilesX"] * item["tilesY"] for item in perLevel)
+        # 第0级读取源影像，其上每一级读取下一级的切片
+        work = info["width"] * info["height"] * info["sourcePixelBytes"]
+        work += sum(perLevel[i - 1]["width"] * perLevel[i - 1]["height"] * info["outputPixelBytes"] for i in range(1, len(perLevel)))
+        result = dict(info)
+        result.update({
+            "outputType": self.outputType,
+            "levels": levelCount,
+            "blockWidth": block,
+            "blockHeight": block,
+            "perLevel": perLevel,
+            "tiles": tiles,
+            "bytes": sum(item["bytes"] for item in perLevel),
+            "seconds": work / float(throughput * self.workers),
+            "freeBytes": None,
+            "freeInodes": None,
+            "warnings": []
+        })
+
+        if perLevel[0]["tilesX"] * perLevel[0]["tilesY"] > self.maxTiles:
+            result["warnings"].append("第0级切片数{0}超过{1}".format(perLevel[0]["tilesX"] * perLevel[0]["tilesY"], self.maxTiles))
+        if tiffDir is not None:
+            self.__checkDisk(tiffDir, result)
+        return result
+
+    def __checkDisk(self, tiffDir, result):
+        path = os.path.abspath(tiffDir)
+        while not os.path.exists(path) and os.path.dirname(path) != path:
+            path = os.path.dirname(path)
+        try:
+            result["freeBytes"] = shutil.disk_usage(path).free
+        except OSError:
+            return
+        if hasattr(os, "statvfs"):
+            stat = os.statvfs(path)
+            # 不支持inode统计的文件系统返回0
+            if stat.f_files > 0:
+                result["freeInodes"] = stat.f_favail
+        if result["bytes"] > result["freeBytes"]:
+            result["warnings"].append("磁盘空间不足：需要{0}字节，剩余{1}字节".format(result["bytes"], result["freeBytes"]))
+        if result["freeInodes"] is not None and result["tiles"] > result["freeInodes"]:
+            result["warnings"].append("inode不足：需要{0}个，剩余{1}个".format(result["tiles"], result["freeInodes"]))
+
+
+def _tiles(width, height, block):
+    return int(math.ceil(width / float(block))) * int(math.ceil(height / float(block)))
+
+
+def formatPlan(plan):
+    """
+    return 规划结果的文本表格
+    """
+
+    lines = ["{0}x{1} {2}波段 {3} -> {4}，{5}级，切块{6}x{7}".format(
+        plan["width"], plan["height"], plan["bandCount"], plan["dataType"], plan["outputType"],
+        plan["levels"], plan["blockWidth"], plan["blockHeight"])]
+    lines.append("{0:>5} {1:>10} {2:>10} {3:>8} {4:>12}".format("level", "width", "height", "tiles", "MB"))
+    for item in plan["perLevel"]:
+        lines.append("{0:>5} {1:>10} {2:>10} {3:>8} {4:>12.1f}".format(
+            item["level"], item["width"], item["height"], item["tilesX"] * item["tilesY"], item["bytes"] / 1048576.0))
+    lines.append("共{0}个切片，约{1:.1f}MB，约{2:.0f}秒".format(plan["tiles"], plan["bytes"] / 1048576.0, plan["seconds"]))
+    for warning in plan["warnings"]:
+        lines.append("警告：" + warning)
+    return "\n".join(lines)
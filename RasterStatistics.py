@@ -0,0 +1,272 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy
+from osgeo import gdal, gdal_array
+
+
+class StatisticsError(Exception):
+    """
+    栅格统计错误
+    """
+    pass
+
+
+# 取值范围不超过该数量的整型按值精确计数，一遍读取即可得到精确的直方图和百分位数
+_EXACT_RANGE = 65536
+
+# 浮点和大范围整型的直方图分箱数，决定百分位数的精度
+_FINE_BINS = 65536
+
+
+class RasterStatistics(object):
+    """
+    栅格预检统计：按块读取影像，用numpy计算每个波段的最值、均值、标准差、直方图和百分位数，内存占用只与条带大小有关
+    影像按行条带拆分为任务，所有波段的条带由进程池并行统计后合并
+    8/16位整型一遍读取按值精确计数；其他类型先统计最值，再在最值范围内统计直方图
+    approx为True且影像有金字塔（overview）时，读取像素数不少于minPixels的最小一级overview，大影像可在数秒内得到近似统计
+    """
+    def __init__(self, tiffPath, approx=False, minPixels=4000000, bins=256, stripBytes=64 * 1024 * 1024, workers=None):
+        """
+        tiffPath：tiff文件的路径
+        approx：是否使用overview近似统计，可选，默认为False
+        minPixels：近似统计时overview的最少像素数，可选，默认为4000000
+        bins：返回的直方图分箱数，可选，默认为256
+        stripBytes：每个任务读取的条带大小（字节），可选，默认为64MB
+        workers：并行的进程数，可选，默认为cpu核数
+        """
+        self.tiffPath = tiffPath
+        self.approx = approx
+        self.minPixels = minPixels
+        self.bins = bins
+        self.stripBytes = stripBytes
+        self.workers = workers or os.cpu_count() or 1
+
+    def __open(self):
+        gdal.UseExceptions()
+        try:
+            return gdal.Open(self.tiffPath)
+        except RuntimeError as e:
+            raise StatisticsError("无法打开tiff文件：{0}，{1}".format(self.tiffPath, e))
+
+    def overview(self, band):
+        """
+        return 用于统计的overview序号，None表示全分辨率
+        """
+
+        if not self.approx:
+            return None
+        best = None
+        for k in range(band.GetOverviewCount()):
+            ov = band.GetOverview(k)
+            pixels = ov.XSize * ov.YSize
+            if pixels >= self.minPixels and (best is None or pixels < best[1]):
+                best = (k, pixels)
+        return best[0] if best is not None else None
+
+    def compute(self):
+        """
+        return {
+            path, width, height, dataType,
+            overview：统计所用overview的尺寸 (宽, 高)，全分辨率时为None,
+            bands：[{band, min, max, mean, std, count, noData, histogram: {min, max, counts}, percentiles: {百分比: 值}}]
+        }
+        count为有效像素数，nodata和nan不计入；percentiles包括1、2、5、95、98、99，其他百分比可用percentile计算
+        """
+
+        ds = self.__open()
+        bandCount, width, height = ds.RasterCount, ds.RasterXSize, ds.RasterYSize
+        first = ds.GetRasterBand(1)
+        dtype = numpy.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(first.DataType))
+        overview = self.overview(first)
+        size = (width, height)
+        if overview is not None:
+            ov = first.GetOverview(overview)
+            size = (ov.XSize, ov.YSize)
+        noData = [ds.GetRasterBand(i + 1).GetNoDataValue() for i in range(bandCount)]
+        ds = None
+
+        exact = numpy.issubdtype(dtype, numpy.integer) and dtype.itemsize <= 2
+        offset = int(numpy.iinfo(dtype).min) if exact else 0
+        rows = max(1, self.stripBytes // max(1, size[0] * dtype.itemsize))
+        strips = [(y, min(rows, size[1] - y)) for y in range(0, size[1], rows)]
+
+        def run(mode, limits=None):
+            results = [None] * bandCount
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = {}
+                for b in range(bandCount):
+                    for y, h in strips:
+                        lo, hi = limits[b] if limits is not None else (None, None)
+                        future = executor.submit(_scanStrip, self.tiffPath, b + 1, overview, y, h, noData[b], mode, offset, lo, hi)
+                        futures[future] = b
+                for future in as_completed(futures):
+                    b = futures[future]
+                    results[b] = _merge(results[b], future.result())
+            return results
+
+        if exact:
+            partials = run("exact")
+        else:
+            partials = run("range")
+            limits = [(p["min"], p["max"]) if p["count"] else (0.0, 0.0) for p in partials]
+            hists = run("histogram", limits)
+            for p, h in zip(partials, hists):
+                p["counts"] = h["counts"]
+                p["lo"], p["hi"] = h["lo"], h["hi"]
+
+        bands = []
+        for b, p in enumerate(partials):
+            bands.append(self.__summary(b + 1, p, noData[b], exact, offset))
+        return {
+            "path": self.tiffPath,
+            "width": width,
+            "height": height,
+            "dataType": dtype.name,
+            "overview": size if overview is not None else None,
+            "bands": bands
+        }
+
+    def __summary(self, bandIndex, p, noData, exact, offset):
+        stats = {
+            "band": bandIndex,
+            "min": None,
+            "max": None,
+            "mean": None,
+            "std": None,
+            "count": int(p["count"]),
+            "noData": noData,
+            "histogram": None,
+            "percentiles": {}
+        }
+        if p["count"] == 0:
+            return stats
+
+        stats["min"] = float(p["min"])
+        stats["max"] = float(p["max"])
+        stats["mean"] = float(p["mean"])
+        stats["std"] = float(numpy.sqrt(p["m2"] / p["count"]))
+
+        counts = p["counts"]
+        if exact:
+            lo, hi = offset, offset + len(counts)
+        else:
+            lo, hi = p["lo"], p["hi"]
+        edges = numpy.linspace(lo, hi, len(counts) + 1)
+        cumulative = numpy.concatenate([[0], numpy.cumsum(counts)]) / float(p["count"])
+        for q in (1, 2, 5, 95, 98, 99):
+            stats["percentiles"][q] = _percentile(cumulative, edges, q, stats["min"], stats["max"])
+
+        # 返回在最值范围内重新分箱的直方图
+        centers = numpy.clip((edges[:-1] + edges[1:]) / 2, stats["min"], stats["max"])
+        used = counts > 0
+        stats["histogram"] = {
+            "min": stats["min"],
+            "max": stats["max"],
+            "counts": numpy.histogram(centers[used], self.bins, (stats["min"], stats["max"]), weights=counts[used])[0].astype(numpy.int64).tolist()
+        }
+        return stats
+
+
+def _percentile(cumulative, edges, q, low, high):
+    value = float(numpy.interp(q / 100.0, cumulative, edges))
+    return min(max(value, low), high)
+
+
+def percentile(bandStats, q):
+    """
+    由compute返回的波段直方图计算任意百分位数，精度为直方图的分箱宽度
+    """
+
+    histogram = bandStats["histogram"]
+    if histogram is None:
+        return None
+    counts = numpy.array(histogram["counts"], dtype=numpy.float64)
+    edges = numpy.linspace(histogram["min"], histogram["max"], len(counts) + 1)
+    cumulative = numpy.concatenate([[0], numpy.cumsum(counts)]) / counts.sum()
+    return _percentile(cumulative, edges, q, histogram["min"], histogram["max"])
+
+
+def stretchRange(statistics, low=2, high=98):
+    """
+    return 每个波段的拉伸范围 [(最小值, 最大值)]，low、high为百分位数；为0和100时即最值
+    """
+
+    ranges = []
+    for band in statistics["bands"]:
+        if band["count"] == 0:
+            ranges.append(None)
+            continue
+        lo = band["min"] if low <= 0 else band["percentiles"].get(low, percentile(band, low))
+        hi = band["max"] if high >= 100 else band["percentiles"].get(high, percentile(band, high))
+        ranges.append((lo, hi))
+    return ranges
+
+
+def _merge(total, part):
+    """
+    合并两个条带的统计，均值和方差按Chan的并行算法合并
+    """
+
+    if total is None:
+        return part
+    if part["count"] == 0:
+        return total
+    if total["count"] == 0:
+        merged = dict(part)
+    else:
+        n = total["count"] + part["count"]
+        delta = part["mean"] - total["mean"]
+        merged = {
+            "count": n,
+            "mean": total["mean"] + delta * part["count"] / n,
+            "m2": total["m2"] + part["m2"] + delta * delta * total["count"] * part["count"] / n,
+            "min": min(total["min"], part["min"]),
+            "max": max(total["max"], part["max"])
+        }
+    if "counts" in total:
+        merged["counts"] = total["counts"] + part["counts"]
+        merged["lo"], merged["hi"] = total.get("lo"), total.get("hi")
+    return merged
+
+
+# 子进程内缓存已打开的影像
+_datasets = {}
+
+
+def _readStrip(path, bandIndex, overview, y, h):
+    if path not in _datasets:
+        gdal.UseExceptions()
+        _datasets[path] = gdal.Open(path)
+    band = _datasets[path].GetRasterBand(bandIndex)
+    if overview is not None:
+        band = band.GetOverview(overview)
+    return band.ReadAsArray(0, y, band.XSize, h)
+
+
+def _scanStrip(path, bandIndex, overview, y, h, noData, mode, offset, lo, hi):
+    """
+    统计一个条带
+    mode：exact-按值精确计数;range-最值、均值和方差;histogram-在[lo, hi]范围内统计直方图
+    """
+
+    data = _readStrip(path, bandIndex, overview, y, h).ravel()
+    valid = numpy.ones(data.shape, dtype=bool)
+    if noData is not None:
+        valid &= data != noData
+    if data.dtype.kind == "f":
+        valid &= ~numpy.isnan(data)
+    values = data[valid]
+
+    if mode == "histogram":
+        counts = numpy.histogram(values, _FINE_BINS, (lo, hi if hi > lo else lo + 1))[0]
+        return {"count": len(values), "mean": 0.0, "m2": 0.0, "min": lo, "max": hi, "counts": counts, "lo": lo, "hi": hi if hi > lo else lo + 1}
+
+    result = {"count": len(values), "mean": 0.0, "m2": 0.0, "min": numpy.inf, "max": -numpy.inf}
+    if len(values):
+        values64 = values.astype(numpy.float64)
+        mean = values64.mean()
+        result.update({"mean": mean, "m2": float(((values64 - mean) ** 2).sum()), "min": values64.min(), "max": values64.max()})
+    if mode == "exact":
+        result["counts"] = numpy.bincount((values.astype(numpy.int64) - offset), minlength=_EXACT_RANGE if data.dtype.itemsize == 2 else 256)
+    return result
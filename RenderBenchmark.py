@@ -0,0 +1,255 @@
+import csv
+import math
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# GeoWebCache内置切片方案第0级的行列数和范围
+_GRIDSETS = {
+    "EPSG:4326": {"cols": 2, "rows": 1, "extent": (-180.0, -90.0, 180.0, 90.0)},
+    "EPSG:900913": {"cols": 1, "rows": 1, "extent": (-20037508.34, -20037508.34, 20037508.34, 20037508.34)}
+}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return float("nan")
+    k = (len(values) - 1) * p / 100.0
+    f = int(k)
+    c = min(f + 1, len(values) - 1)
+    return values[f] + (values[c] - values[f]) * (k - f)
+
+
+class RenderBenchmark(object):
+    """
+    图层渲染延迟测试：对多个图层重放相同的WMS GetMap或WMTS GetTile请求，统计p50/p95/p99延迟和吞吐量
+    请求范围由随机种子生成，同一组参数下每个图层、每次运行的请求完全相同，可用于对比同一数据的不同发布方式
+    WMTS请求经过GeoWebCache缓存，第一次请求为渲染耗时，重复请求为缓存命中耗时；
+    因此每个级别的切片不重复抽取，且默认在每个图层、级别、并发数的测试前清除该级别的切片缓存，每次测试都是冷缓存的渲染耗时
+    """
+    def __init__(self, service, url, username, password, workspaceName, requestsPerZoom=50, concurrency=(4,), tileSize=256,
+                 format="image/png", seed=1):
+        """
+        service：GeoServerService对象，用于获取图层范围
+        url：geoserver rest地址
+        username、password：用户名和密码
+        workspaceName：图层所在的工作空间的名称
+        requestsPerZoom：每个缩放级别的请求数，可选，默认为50
+        concurrency：并发请求数的列表，每个并发数分别测试一次，可选，默认为(4,)
+        tileSize：GetMap请求的图片宽高，可选，默认为256
+        format：图片格式，可选，默认为image/png
+        seed：随机种子，可选，默认为1
+        """
+        self.service = service
+        self.workspaceName = workspaceName
+        self.requestsPerZoom = requestsPerZoom
+        self.concurrency = list(concurrency)
+        self.tileSize = tileSize
+        self.format = format
+        self.seed = seed
+        # 附加到每个GetMap请求的参数，例如{"CQL_FILTER": "VAL > 100"}
+        self.params = {}
+
+        baseUrl = url.rsplit("/rest", 1)[0]
+        self.wmsUrl = baseUrl + "/wms"
+        self.wmtsUrl = baseUrl + "/gwc/service/wmts"
+        self.session = requests.Session()
+        self.session.auth = (username, password)
+        poolSize = max(self.concurrency + [1])
+        adapter = HTTPAdapter(pool_connections=poolSize, pool_maxsize=poolSize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def extent(self, layerName):
+        """
+        return 图层的经纬度范围 (minx, miny, maxx, maxy)
+        """
+
+        minx, maxx, miny, maxy, crs = self.service.getLayer(self.workspaceName, layerName).resource.latlon_bbox
+        return float(minx), float(miny), float(maxx), float(maxy)
+
+    def bboxes(self, extent, zoom):
+        """
+        在范围内生成随机的GetMap请求范围，第zoom级的请求范围为全图范围的1/2^zoom
+        """
+
+        minx, miny, maxx, maxy = extent
+        w = (maxx - minx) / 2 ** zoom
+        h = (maxy - miny) / 2 ** zoom
+        rnd = random.Random(self.seed + zoom)
+        boxes = []
+        for i in range(self.requestsPerZoom):
+            x = minx + rnd.random() * (maxx - minx - w)
+            y = miny + rnd.random() * (maxy - miny - h)
+            boxes.append((x, y, x + w, y + h))
+        return boxes
+
+    def tiles(self, extent, zoom, gridSet="EPSG:4326"):
+        """
+        在范围覆盖的切片中随机选取WMTS请求的切片，切片不重复，范围内的切片少于requestsPerZoom时为全部切片
+        zoom：切片方案的级别
+        gridSet：切片方案，支持EPSG:4326和EPSG:900913，可选，默认为EPSG:4326
+        return [(tileRow, tileCol)]
+        """
+
+        grid = _GRIDSETS.get(gridSet)
+        if grid is None:
+            raise ValueError("不支持的切片方案：{0}".format(gridSet))
+
+        minx, miny, maxx, maxy = extent
+        if gridSet == "EPSG:900913":
+            minx, miny = _toMercator(minx, miny)
+            maxx, maxy = _toMercator(maxx, maxy)
+
+        gx0, gy0, gx1, gy1 = grid["extent"]
+        cols = grid["cols"] * 2 ** zoom
+        rows = grid["rows"] * 2 ** zoom
+        spanX = (gx1 - gx0) / cols
+        spanY = (gy1 - gy0) / rows
+        # 行号从上往下计数
+        col0 = max(0, int(math.floor((minx - gx0) / spanX)))
+        col1 = min(cols - 1, int(math.floor((maxx - gx0) / spanX)))
+        row0 = max(0, int(math.floor((gy1 - maxy) / spanY)))
+        row1 = min(rows - 1, int(math.floor((gy1 - miny) / spanY)))
+
+        rnd = random.Random(self.seed + zoom)
+        width = col1 - col0 + 1
+        count = width * (row1 - row0 + 1)
+        # 无放回抽样，重复的切片会命中缓存
+        return [(row0 + i // width, col0 + i % width) for i in rnd.sample(range(count), min(self.requestsPerZoom, count))]
+
+    def getMap(self, layerName, bbox):
+        """
+        return (延迟秒数, 是否成功)
+        """
+
+        params = {
+            "service": "WMS",
+            "version": "1.1.1",
+            "request": "GetMap",
+            "layers": "{0}:{1}".format(self.workspaceName, layerName),
+            "styles": "",
+            "srs": "EPSG:4326",
+            "bbox": ",".join(str(v) for v in bbox),
+            "width": self.tileSize,
+            "height": self.tileSize,
+            "format": self.format
+        }
+        params.update(self.params)
+        return self.__timed(self.wmsUrl, params)
+
+    def getTile(self, layerName, gridSet, zoom, tile):
+        """
+        return (延迟秒数, 是否成功)
+        """
+
+        params = {
+            "service": "WMTS",
+            "version": "1.0.0",
+            "request": "GetTile",
+            "layer": "{0}:{1}".format(self.workspaceName, layerName),
+            "style": "",
+            "format": self.format,
+            "tilematrixset": gridSet,
+            "tilematrix": "{0}:{1}".format(gridSet, zoom),
+            "tilerow": tile[0],
+            "tilecol": tile[1]
+        }
+        return self.__timed(self.wmtsUrl, params)
+
+    def __truncate(self, layerName, zoom, gridSet):
+        res = self.service.seedLayer(self.workspaceName, layerName, zoom, zoom, gridSet, format=self.format, seedType="truncate", wait=True)
+        if res["status"] != "success":
+            raise RuntimeError("清除切片缓存失败：{0}，{1}".format(layerName, res["info"]))
+
+    def __timed(self, url, params):
+        start = time.perf_counter()
+        try:
+            resp = self.session.get(url, params=params)
+            # geoserver出错时可能返回200的xml异常报告
+            ok = resp.status_code == 200 and resp.headers.get("Content-Type", "").startswith("image/")
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    def run(self, layerNames, zooms=(0, 2, 4, 6), mode="WMS", gridSet="EPSG:4326", extentLayer=None, truncate=True):
+        """
+        依次测试每个图层、每个缩放级别、每个并发数
+        layerNames：图层名称的列表
+        zooms：缩放级别的列表，WMS为范围缩小的倍数级别，WMTS为切片方案的级别
+        mode：WMS或WMTS，可选，默认为WMS
+        gridSet：WMTS的切片方案，可选，默认为EPSG:4326
+        extentLayer：生成请求所用范围的图层，可选，默认为各图层自身的范围；同一数据的不同发布方式应使用同一个图层的范围
+        truncate：WMTS测试前是否清除该图层该级别的切片缓存，可选，默认为True；为False时测试的是缓存命中耗时
+        return [{layer, mode, zoom, concurrency, requests, errors, p50, p95, p99, mean, throughput}]，延迟单位为毫秒，吞吐量单位为请求/秒
+        """
+
+        results = []
+        for layerName in layerNames:
+            extent = self.extent(extentLayer or layerName)
+            for zoom in zooms:
+                if mode == "WMTS":
+                    items = self.tiles(extent, zoom, gridSet)
+                    request = lambda tile: self.getTile(layerName, gridSet, zoom, tile)
+                else:
+                    items = self.bboxes(extent, zoom)
+                    request = lambda bbox: self.getMap(layerName, bbox)
+
+                for concurrency in self.concurrency:
+                    if mode == "WMTS" and truncate:
+                        self.__truncate(layerName, zoom, gridSet)
+                    start = time.perf_counter()
+                    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                        samples = list(executor.map(request, items))
+                    elapsed = time.perf_counter() - start
+                    latencies = [latency * 1000 for latency, ok in samples if ok]
+                    results.append({
+                        "layer": layerName,
+                        "mode": mode,
+                        "zoom": zoom,
+                        "concurrency": concurrency,
+                        "requests": len(samples),
+                        "errors": len(samples) - len(latencies),
+                        "p50": percentile(latencies, 50),
+                        "p95": percentile(latencies, 95),
+                        "p99": percentile(latencies, 99),
+                        "mean": sum(latencies) / len(latencies) if latencies else float("nan"),
+                        "throughput": len(samples) / elapsed if elapsed > 0 else float("nan")
+                    })
+        return results
+
+
+_COLUMNS = ["layer", "mode", "zoom", "concurrency", "requests", "errors", "p50", "p95", "p99", "mean", "throughput"]
+
+
+def formatResults(results):
+    """
+    return 测试结果的文本表格
+    """
+
+    lines = ["{0:<32} {1:<5} {2:>4} {3:>4} {4:>5} {5:>6} {6:>9} {7:>9} {8:>9} {9:>9} {10:>10}".format(
+        "layer", "mode", "zoom", "conc", "reqs", "errors", "p50(ms)", "p95(ms)", "p99(ms)", "mean(ms)", "req/s")]
+    for r in results:
+        lines.append("{0:<32} {1:<5} {2:>4} {3:>4} {4:>5} {5:>6} {6:>9.1f} {7:>9.1f} {8:>9.1f} {9:>9.1f} {10:>10.1f}".format(
+            r["layer"], r["mode"], r["zoom"], r["concurrency"], r["requests"], r["errors"],
+            r["p50"], r["p95"], r["p99"], r["mean"], r["throughput"]))
+    return "\n".join(lines)
+
+
+def saveCsv(results, path):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def _toMercator(lon, lat):
+    lat = max(-85.0511287798, min(85.0511287798, lat))
+    x = lon * 20037508.34 / 180.0
+    y = math.log(math.tan((90.0 + lat) * math.pi / 360.0)) * 20037508.34 / math.pi
+    return x, y
@@ -0,0 +1,460 @@
+import os
+import struct
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+
+class ShapefileError(Exception):
+    """
+    shapefile读写错误
+    """
+    pass
+
+
+# shp文件头中的几何类型编号
+SHAPE_TYPES = {
+    0: "Null",
+    1: "Point",
+    3: "PolyLine",
+    5: "Polygon",
+    8: "MultiPoint",
+    11: "PointZ",
+    13: "PolyLineZ",
+    15: "PolygonZ",
+    18: "MultiPointZ",
+    21: "PointM",
+    23: "PolyLineM",
+    25: "PolygonM",
+    28: "MultiPointM",
+    31: "MultiPatch"
+}
+
+# 点类型的记录没有外包矩形，坐标即为范围
+_POINT_TYPES = (1, 11, 21)
+
+# 四叉树节点的分割比例，与MapServer的shptree相同，相邻子节点有重叠，跨越分割线的小要素仍可下沉
+SPLIT_RATIO = 0.55
+
+
+class ShapefileReader(object):
+    """
+    shapefile的文件头和记录范围读取
+    只读取shp、shx、dbf的文件头和每条记录的外包矩形，不解析几何坐标，大文件也只需很少的内存
+    """
+    def __init__(self, shapePath, charset=None):
+        """
+        shapePath：shape文件的路径，可带或不带.shp扩展名
+        charset：dbf字段名的字符集，可选，默认读取.cpg文件，没有时为latin-1
+        """
+        self.base = shapePath[:-4] if shapePath.lower().endswith(".shp") else shapePath
+        self.shpPath = self.base + ".shp"
+        self.shxPath = self.base + ".shx"
+        self.dbfPath = self.base + ".dbf"
+        for path in (self.shpPath, self.shxPath):
+            if not os.path.exists(path):
+                raise ShapefileError("shapefile缺少文件：{0}".format(path))
+
+        self.charset = charset or self.__readCpg() or "latin-1"
+        self.__offsets = {}
+        self.shapeType, self.extent = self.__readShpHeader()
+        self.featureCount = (os.path.getsize(self.shxPath) - 100) // 8
+        self.fields = self.__readDbfFields() if os.path.exists(self.dbfPath) else []
+
+    @property
+    def geometryType(self):
+        return SHAPE_TYPES.get(self.shapeType, "Unknown")
+
+    def __readCpg(self):
+        path = self.base + ".cpg"
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="ascii", errors="ignore") as f:
+            return f.read().strip() or None
+
+    def __readShpHeader(self):
+        with open(self.shpPath, "rb") as f:
+            header = f.read(100)
+        if len(header) < 100 or struct.unpack(">i", header[0:4])[0] != 9994:
+            raise ShapefileError("不是有效的shp文件：{0}".format(self.shpPath))
+        shapeType = struct.unpack("<i", header[32:36])[0]
+        minx, miny, maxx, maxy = struct.unpack("<4d", header[36:68])
+        return shapeType, (minx, miny, maxx, maxy)
+
+    def __readDbfFields(self):
+        """
+        return [{name, type, length, decimals}]
+        """
+
+        with open(self.dbfPath, "rb") as f:
+            header = f.read(32)
+            if len(header) < 32:
+                raise ShapefileError("不是有效的dbf文件：{0}".format(self.dbfPath))
+            self.dbfRecordCount, self.dbfHeaderLength, self.dbfRecordLength = struct.unpack("<IHH", header[4:12])
+            descriptors = f.read(self.dbfHeaderLength - 32)
+
+        fields = []
+        # 每条记录第一个字节是删除标记
+        offset = 1
+        for i in range(0, len(descriptors) - 31, 32):
+            descriptor = descriptors[i:i + 32]
+            if descriptor[0] == 0x0D:
+                break
+            fields.append({
+                "name": descriptor[:11].split(b"\0", 1)[0].decode(self.charset, errors="replace"),
+                "type": chr(descriptor[11]),
+                "length": descriptor[16],
+                "decimals": descriptor[17]
+            })
+            self.__offsets[fields[-1]["name"]] = offset
+            offset += descriptor[16]
+        return fields
+
+    def recordBounds(self):
+        """
+        通过shx中的记录偏移量直接读取shp中每条记录的外包矩形
+        return (ids, bounds)，ids为记录序号（从0开始），bounds为n×4的数组 [minx, miny, maxx, maxy]，不包括空几何
+        """
+
+        count = self.featureCount
+        if count == 0:
+            return numpy.zeros(0, dtype=numpy.int32), numpy.zeros((0, 4))
+
+        # shx记录：大端序的偏移量和长度，单位为16位字
+        index = numpy.fromfile(self.shxPath, dtype=">i4", offset=100, count=count * 2).reshape(count, 2)
+        offsets = index[:, 0].astype(numpy.int64) * 2
+
+        shp = numpy.memmap(self.shpPath, dtype=numpy.uint8, mode="r")
+        if len(offsets) and offsets.max() + 12 > len(shp):
+            raise ShapefileError("shx与shp不一致：{0}".format(self.shpPath))
+
+        # 记录头8字节之后是小端序的几何类型
+        types = _gather(shp, offsets + 8, 4).view("<i4").ravel()
+        valid = types != 0
+        ids = numpy.nonzero(valid)[0].astype(numpy.int32)
+        offsets = offsets[valid]
+        types = types[valid]
+
+        bounds = numpy.empty((len(ids), 4))
+        points = numpy.isin(types, _POINT_TYPES)
+        if points.any():
+            xy = _gather(shp, offsets[points] + 12, 16).view("<f8")
+            bounds[points] = numpy.hstack([xy, xy])
+        if (~points).any():
+            bounds[~points] = _gather(shp, offsets[~points] + 12, 32).view("<f8")
+        del shp
+        return ids, bounds
+
+    def readField(self, fieldName, chunkSize=1000000):
+        """
+        按块读取dbf中一个字段的全部值，每次只映射chunkSize条记录，内存占用与记录数无关
+        fieldName：字段名称
+        chunkSize：每块的记录数，可选，默认为1000000
+        return 生成器，每块为一个数组：数值字段(N/F)为float64，空值为nan；其他字段为去掉首尾空格的bytes数组；已删除的记录不返回
+        """
+
+        field = next((f for f in self.fields if f["name"] == fieldName), None)
+        if field is None:
+            raise ShapefileError("字段不存在：{0}".format(fieldName))
+        start = self.__offsets[fieldName]
+        length = field["length"]
+        numeric = field["type"] in ("N", "F")
+
+        dbf = numpy.memmap(self.dbfPath, dtype=numpy.uint8, mode="r", offset=self.dbfHeaderLength)
+        count = min(self.dbfRecordCount, len(dbf) // self.dbfRecordLength)
+        records = dbf[:count * self.dbfRecordLength].reshape(count, self.dbfRecordLength)
+        try:
+            for i in range(0, count, chunkSize):
+                chunk = records[i:i + chunkSize]
+                values = numpy.ascontiguousarray(chunk[chunk[:, 0] != ord("*"), start:start + length]).view("S{0}".format(length)).ravel()
+                values = numpy.char.strip(values)
+                yield _toFloat(values) if numeric else values
+        finally:
+            del records, dbf
+
+    def info(self):
+        """
+        return {path, geometryType, featureCount, extent, charset, fields}
+        """
+
+        return {
+            "path": self.shpPath,
+            "geometryType": self.geometryType,
+            "featureCount": self.featureCount,
+            "extent": self.extent,
+            "charset": self.charset,
+            "fields": self.fields
+        }
+
+
+def writePolygons(shapePath, rings, fields, records, prj=None, charset="UTF-8"):
+    """
+    写出多边形shapefile（.shp、.shx、.dbf，以及.prj、.cpg），每个要素为一个外环
+    shapePath：shape文件的路径
+    rings：每个要素的外环 [[(x, y)]]，首尾点相同，按顺时针排列
+    fields：[{name, type, length, decimals}]，type为C-字符;N-数值;D-日期
+    records：每个要素的字段值 [[值]]，与fields一一对应，日期字段为date/datetime或"YYYYMMDD"，空值为None
+    prj：坐标系的wkt，可选
+    charset：dbf的字符集，写入.cpg文件，可选，默认为UTF-8
+    """
+
+    base = shapePath[:-4] if shapePath.lower().endswith(".shp") else shapePath
+    if len(rings) != len(records):
+        raise ShapefileError("要素数与记录数不一致：{0}/{1}".format(len(rings), len(records)))
+
+    contents = []
+    for ring in rings:
+        points = numpy.asarray(ring, dtype="<f8")
+        bbox = (points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max())
+        contents.append((bbox, struct.pack("<i4d3i", 5, *bbox, 1, len(points), 0) + points.tobytes()))
+    if contents:
+        extent = tuple(func(item[0][i] for item in contents) for i, func in enumerate((min, min, max, max)))
+    else:
+        extent = (0.0, 0.0, 0.0, 0.0)
+
+    def header(words):
+        return struct.pack(">7i", 9994, 0, 0, 0, 0, 0, words) + struct.pack("<2i8d", 1000, 5, *extent, 0, 0, 0, 0)
+
+    with open(base + ".shp", "wb") as shp, open(base + ".shx", "wb") as shx:
+        shp.write(header(50 + sum(4 + len(content) // 2 for bbox, content in contents)))
+        shx.write(header(50 + 4 * len(contents)))
+        offset = 50
+        for i, (bbox, content) in enumerate(contents):
+            shp.write(struct.pack(">2i", i + 1, len(content) // 2) + content)
+            shx.write(struct.pack(">2i", offset, len(content) // 2))
+            offset += 4 + len(content) // 2
+
+    recordLength = 1 + sum(field["length"] for field in fields)
+    with open(base + ".dbf", "wb") as dbf:
+        today = datetime.date.today()
+        dbf.write(struct.pack("<4BIHH20x", 3, today.year - 1900, today.month, today.day, len(records), 32 + 32 * len(fields) + 1, recordLength))
+        for field in fields:
+            name = field["name"].encode("ascii")[:10]
+            dbf.write(struct.pack("<11sc4xBB14x", name, field["type"].encode("ascii"), field["length"], field.get("decimals", 0)))
+        dbf.write(b"\x0D")
+        for record in records:
+            dbf.write(b" ")
+            for field, value in zip(fields, record):
+                dbf.write(_dbfValue(field, value, charset))
+        dbf.write(b"\x1A")
+
+    if prj:
+        with open(base + ".prj", "w", encoding="ascii", errors="ignore") as f:
+            f.write(prj)
+    with open(base + ".cpg", "w", encoding="ascii") as f:
+        f.write(charset)
+
+
+def _dbfValue(field, value, charset):
+    length = field["length"]
+    if value is None:
+        return b" " * length
+    if field["type"] == "D":
+        text = value if isinstance(value, str) else value.strftime("%Y%m%d")
+        return text.encode("ascii")[:8].ljust(length)
+    if field["type"] in ("N", "F"):
+        text = "{0:.{1}f}".format(value, field.get("decimals", 0)).encode("ascii")
+        if len(text) > length:
+            raise ShapefileError("数值超出字段长度：{0}={1}".format(field["name"], value))
+        return text.rjust(length)
+    text = str(value).encode(charset)
+    if len(text) > length:
+        raise ShapefileError("字符超出字段长度：{0}={1}".format(field["name"], value))
+    return text.ljust(length)
+
+
+def _toFloat(values):
+    """
+    dbf数值字段的bytes数组转换为float64，空值和溢出标记"****"转换为nan
+    """
+
+    values = numpy.where((values == b"") | (numpy.char.find(values, b"*") >= 0), b"nan", values)
+    try:
+        return values.astype(numpy.float64)
+    except ValueError:
+        # 个别不规范的值逐个转换
+        result = numpy.empty(len(values))
+        for i, value in enumerate(values):
+            try:
+                result[i] = float(value)
+            except ValueError:
+                result[i] = numpy.nan
+        return result
+
+
+def _gather(data, starts, size):
+    """
+    从字节数组中按起始位置取出等长的字节串
+    return n×size的uint8数组，可用view转换为数值
+    """
+
+    positions = starts[:, None] + numpy.arange(size)
+    return numpy.ascontiguousarray(data[positions])
+
+
+class _Node(object):
+    __slots__ = ("rect", "ids", "children", "offset")
+
+    def __init__(self, rect):
+        self.rect = rect
+        self.ids = []
+        self.children = []
+        # 所有子孙节点写出后的字节数，读取时据此跳过整棵子树
+        self.offset = 0
+
+
+class QuadTree(object):
+    """
+    shapefile的四叉树空间索引，按MapServer shptree的算法构建，写出的.qix文件可被GeoServer（GeoTools）和MapServer读取
+    每个要素放入能完全包含其外包矩形的最深节点
+    """
+    def __init__(self, extent, numShapes, maxDepth=None):
+        """
+        extent：根节点范围 (minx, miny, maxx, maxy)
+        numShapes：shapefile的记录数
+        maxDepth：最大深度，可选，默认按记录数计算，与MapServer相同，使叶节点平均约有4个要素
+        """
+        self.numShapes = numShapes
+        if not maxDepth:
+            maxDepth = 0
+            nodes = 1
+            while nodes * 4 < numShapes:
+                maxDepth += 1
+                nodes *= 2
+        self.maxDepth = maxDepth
+        self.root = _Node(tuple(extent))
+
+    def insert(self, shapeId, rect):
+        node = self.root
+        depth = self.maxDepth
+        while depth > 1:
+            if not node.children:
+                quads = _splitQuads(node.rect)
+                if not any(_contains(quad, rect) for quad in quads):
+                    break
+                node.children = [_Node(quad) for quad in quads]
+
+            for child in node.children:
+                if _contains(child.rect, rect):
+                    node = child
+                    depth -= 1
+                    break
+            else:
+                break
+        node.ids.append(shapeId)
+
+    def trim(self):
+        """
+        删除没有要素的子树
+        """
+
+        _trim(self.root)
+
+    def write(self, path):
+        """
+        写出.qix文件：8字节文件头（"SQT"、字节序、版本、3字节保留）、记录数、最大深度，之后按先序写出各节点
+        节点：到下一个兄弟节点的偏移量、外包矩形、要素数、要素序号、子节点数
+        """
+
+        _measure(self.root)
+        with open(path, "wb") as f:
+            f.write(b"SQT" + bytes([1, 1, 0, 0, 0]))
+            f.write(struct.pack("<ii", self.numShapes, self.maxDepth))
+            _writeNode(f, self.root)
+
+
+def _splitBounds(rect):
+    minx, miny, maxx, maxy = rect
+    if maxx - minx > maxy - miny:
+        size = (maxx - minx) * SPLIT_RATIO
+        return (minx, miny, minx + size, maxy), (maxx - size, miny, maxx, maxy)
+    size = (maxy - miny) * SPLIT_RATIO
+    return (minx, miny, maxx, miny + size), (minx, maxy - size, maxx, maxy)
+
+
+def _splitQuads(rect):
+    half1, half2 = _splitBounds(rect)
+    return _splitBounds(half1) + _splitBounds(half2)
+
+
+def _contains(outer, inner):
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and inner[2] <= outer[2] and inner[3] <= outer[3]
+
+
+def _trim(node):
+    node.children = [child for child in node.children if not _trim(child)]
+    return not node.children and not node.ids
+
+
+def _measure(node):
+    """
+    return 节点及其子孙节点写出后的字节数
+    """
+
+    node.offset = sum(_measure(child) for child in node.children)
+    return 44 + 4 * len(node.ids) + node.offset
+
+
+def _writeNode(f, node):
+    f.write(struct.pack("<i4di", node.offset, *node.rect, len(node.ids)))
+    if node.ids:
+        f.write(numpy.asarray(node.ids, dtype="<i4").tobytes())
+    f.write(struct.pack("<i", len(node.children)))
+    for child in node.children:
+        _writeNode(f, child)
+
+
+def buildIndex(shapePath, maxDepth=None, charset=None):
+    """
+    在shp文件旁生成.qix空间索引，并读取shapefile的基本信息
+    shapePath：shape文件的路径
+    maxDepth：四叉树的最大深度，可选，默认按记录数计算
+    charset：dbf字段名的字符集，可选
+    return {path, geometryType, featureCount, extent, charset, fields, index, depth}
+    """
+
+    reader = ShapefileReader(shapePath, charset)
+    ids, bounds = reader.recordBounds()
+
+    tree = QuadTree(reader.extent, reader.featureCount, maxDepth)
+    for shapeId, rect in zip(ids.tolist(), bounds.tolist()):
+        tree.insert(shapeId, rect)
+    tree.trim()
+
+    indexPath = reader.base + ".qix"
+    tmpPath = indexPath + ".tmp"
+    tree.write(tmpPath)
+    os.replace(tmpPath, indexPath)
+
+    info = reader.info()
+    info["index"] = indexPath
+    info["depth"] = tree.maxDepth
+    return info
+
+
+def _buildIndexSafe(shapePath, maxDepth, charset):
+    try:
+        return {"status": "success", "info": "", "data": buildIndex(shapePath, maxDepth, charset)}
+    except Exception as e:
+        return {"status": "fail", "info": repr(e), "data": {"path": shapePath}}
+
+
+def buildIndexes(shapePaths, maxDepth=None, charset=None, workers=None):
+    """
+    多进程并行生成多个shapefile的.qix空间索引
+    shapePaths：shape文件路径的列表，或包含shape文件的文件夹路径（不递归子文件夹）
+    workers：并行的进程数，可选，默认为cpu核数
+    return 与shapePaths顺序一致的结果列表 [{status, info, data}]，data见buildIndex
+    """
+
+    if isinstance(shapePaths, str):
+        folder = shapePaths
+        shapePaths = [os.path.join(folder, name) for name in sorted(os.listdir(folder)) if name.lower().endswith(".shp")]
+    shapePaths = list(shapePaths)
+    if len(shapePaths) == 0:
+        return []
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(shapePaths)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_buildIndexSafe, shapePaths, [maxDepth] * len(shapePaths), [charset] * len(shapePaths)))
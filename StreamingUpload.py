@@ -0,0 +1,165 @@
+import os
+import time
+import zipfile
+
+
+class UploadProgress(object):
+    """
+    上传进度统计，每发送一个数据块回调一次 progress(sent, total, rate)
+    sent：已发送的字节数
+    total：总字节数，边压缩边上传时未知，为None
+    rate：平均上传速度（字节/秒）
+    """
+    def __init__(self, total=None, progress=None):
+        self.total = total
+        self.progress = progress
+        self.reset()
+
+    def reset(self):
+        """
+        请求重试时从头开始统计
+        """
+
+        self.sent = 0
+        self.start = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    @property
+    def rate(self):
+        elapsed = self.elapsed
+        return self.sent / elapsed if elapsed > 0 else 0.0
+
+    def update(self, size):
+        self.sent += size
+        if self.progress is not None:
+            self.progress(self.sent, self.total, self.rate)
+
+
+class FileStream(object):
+    """
+    分块读取的文件请求体，用于上传大型栅格文件
+    requests按块读取文件对象并发送，内存占用与文件大小无关；提供长度以使用Content-Length而不是分块传输
+    """
+    def __init__(self, path, progress=None):
+        """
+        path：文件路径
+        progress：进度回调函数 progress(sent, total, rate)，可选
+        """
+        self.path = path
+        self.len = os.path.getsize(path)
+        self.stats = UploadProgress(self.len, progress)
+        self.__file = open(path, "rb")
+
+    def __len__(self):
+        return self.len
+
+    def read(self, size=-1):
+        chunk = self.__file.read(size)
+        self.stats.update(len(chunk))
+        return chunk
+
+    def tell(self):
+        return self.__file.tell()
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        # 请求重试时urllib3会回到请求体开头重新发送
+        position = self.__file.seek(offset, whence)
+        if position == 0:
+            self.stats.reset()
+        return position
+
+    def close(self):
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class _Sink(object):
+    """
+    ZipFile的输出，只缓存当前数据块；没有seek和tell，ZipFile会按不可定位的流写入
+    """
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ZipStream(object):
+    """
+    边压缩边上传的zip请求体，用于上传shapefile
+    不生成临时zip文件，内存中只保留一个数据块；长度未知，requests以分块传输编码（chunked）发送
+    每次迭代都从头重新生成，请求重试时可以重新发送
+    """
+    def __init__(self, files, chunkSize=1024 * 1024, compression=zipfile.ZIP_DEFLATED, progress=None):
+        """
+        files：{zip内文件名: 本地文件路径}
+        chunkSize：读取文件的块大小（字节），可选，默认为1MB
+        compression：压缩方式，可选，默认为ZIP_DEFLATED，ZIP_STORED不压缩，速度更快
+        progress：进度回调函数 progress(sent, None, rate)，可选
+        """
+        self.files = files
+        self.chunkSize = chunkSize
+        self.compression = compression
+        self.stats = UploadProgress(None, progress)
+
+    def __iter__(self):
+        self.stats.reset()
+        sink = _Sink()
+        with zipfile.ZipFile(sink, "w", compression=self.compression, allowZip64=True) as zf:
+            for arcname, path in self.files.items():
+                info = zipfile.ZipInfo.from_file(path, arcname)
+                info.compress_type = self.compression
+                with open(path, "rb") as src, zf.open(info, "w") as dst:
+                    while True:
+                        chunk = src.read(self.chunkSize)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+                        data = sink.drain()
+                        if data:
+                            self.stats.update(len(data))
+                            yield data
+                data = sink.drain()
+                if data:
+                    self.stats.update(len(data))
+                    yield data
+        data = sink.drain()
+        if data:
+            self.stats.update(len(data))
+            yield data
+
+
+def shapefileMembers(name, shapePath):
+    """
+    shapefile的组成文件，shp、shx、dbf必须存在，prj、cpg和qix空间索引存在时一并上传
+    name：zip内的文件名（不含扩展名），geoserver要求各文件同名
+    shapePath：shape文件的路径，可带或不带.shp扩展名
+    return {zip内文件名: 本地文件路径}
+    """
+
+    base = shapePath[:-4] if shapePath.lower().endswith(".shp") else shapePath
+    files = {}
+    for ext in ("shp", "shx", "dbf", "prj", "cpg", "qix"):
+        path = "{0}.{1}".format(base, ext)
+        if os.path.exists(path):
+            files["{0}.{1}".format(name, ext)] = path
+        elif ext in ("shp", "shx", "dbf"):
+            raise FileNotFoundError("shapefile缺少文件：{0}".format(path))
+    return files
@@ -0,0 +1,245 @@
+import os
+import tempfile
+
+import numpy
+
+from ShapefileIO import ShapefileReader
+
+
+class ClassifyError(Exception):
+    """
+    属性分级/分类错误
+    """
+    pass
+
+
+# 支持的分级方法
+METHODS = ("quantile", "equal", "jenks", "categorized")
+
+
+class StyleClassifier(object):
+    """
+    按dbf属性字段计算分级（分位数、等间距、自然断点）或分类（唯一值），用于生成数据驱动的样式
+    字段按块读取并用numpy向量化统计，分位数和自然断点都在直方图上计算，内存占用只与块大小和直方图分箱数有关
+    数值字段第一次读取时解析为float64写入临时文件，之后的统计直接按块映射该文件，不再重复解析dbf文本；用完后调用close删除临时文件
+    """
+    def __init__(self, shapePath, fieldName, charset=None, bins=4096, chunkSize=1000000):
+        """
+        shapePath：shape文件的路径
+        fieldName：分级/分类的字段名称
+        charset：dbf的字符集，可选，默认读取.cpg文件
+        bins：直方图的分箱数，分位数和自然断点的精度为值域的1/bins，可选，默认为4096
+        chunkSize：每块读取的记录数，可选，默认为1000000
+        """
+        self.reader = ShapefileReader(shapePath, charset)
+        self.fieldName = fieldName
+        self.bins = bins
+        self.chunkSize = chunkSize
+
+        self.field = next((f for f in self.reader.fields if f["name"] == fieldName), None)
+        if self.field is None:
+            raise ClassifyError("字段不存在：{0}".format(fieldName))
+        self.__valuesPath = None
+        self.__range = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.__valuesPath is not None:
+            os.remove(self.__valuesPath)
+            self.__valuesPath = None
+
+    @property
+    def numeric(self):
+        return self.field["type"] in ("N", "F")
+
+    def __load(self):
+        """
+        解析数值字段，去掉空值后写入临时文件，同时统计最值
+        """
+
+        if not self.numeric:
+            raise ClassifyError("分级需要数值字段：{0}({1})".format(self.fieldName, self.field["type"]))
+
+        low, high, count = numpy.inf, -numpy.inf, 0
+        fd, path = tempfile.mkstemp(suffix=".f8")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for values in self.reader.readField(self.fieldName, self.chunkSize):
+                    values = values[~numpy.isnan(values)]
+                    if len(values):
+                        low = min(low, values.min())
+                        high = max(high, values.max())
+                        count += len(values)
+                        f.write(values.tobytes())
+        except BaseException:
+            os.remove(path)
+            raise
+        self.__valuesPath = path
+        self.__range = (float(low), float(high), count)
+
+    def __chunks(self):
+        """
+        return 生成器，每块为去掉空值的float64数组
+        """
+
+        if self.__valuesPath is None:
+            self.__load()
+        count = self.__range[2]
+        if count == 0:
+            return
+        values = numpy.memmap(self.__valuesPath, dtype=numpy.float64, mode="r", shape=(count,))
+        try:
+            for i in range(0, count, self.chunkSize):
+                yield numpy.array(values[i:i + self.chunkSize])
+        finally:
+            del values
+
+    def range(self):
+        """
+        return (最小值, 最大值, 有效值个数)，空值不计入
+        """
+
+        if self.__valuesPath is None:
+            self.__load()
+        if self.__range[2] == 0:
+            raise ClassifyError("字段没有有效值：{0}".format(self.fieldName))
+        return self.__range
+
+    def histogram(self, low, high):
+        """
+        return (counts, edges)，与numpy.histogram相同
+        """
+
+        edges = numpy.linspace(low, high, self.bins + 1)
+        counts = numpy.zeros(self.bins, dtype=numpy.int64)
+        for values in self.__chunks():
+            counts += numpy.histogram(values, edges)[0]
+        return counts, edges
+
+    def breaks(self, method="quantile", classes=5):
+        """
+        计算分级的断点
+        method：quantile-分位数;equal-等间距;jenks-自然断点
+        classes：分级数
+        return 长度为classes+1的断点列表，首尾为最小值和最大值；数据的不同取值较少时分级数可能减少
+        """
+
+        if method not in ("quantile", "equal", "jenks"):
+            raise ClassifyError("不支持的分级方法：{0}".format(method))
+        if classes < 1:
+            raise ClassifyError("分级数至少为1")
+
+        low, high, count = self.range()
+        if low == high:
+            return [low, high]
+        if method == "equal":
+            return [float(v) for v in numpy.linspace(low, high, classes + 1)]
+
+        counts, edges = self.histogram(low, high)
+        if method == "quantile":
+            cumulative = numpy.concatenate([[0], numpy.cumsum(counts)]) / float(count)
+            inner = numpy.interp(numpy.arange(1, classes) / float(classes), cumulative, edges)
+        else:
+            centers = (edges[:-1] + edges[1:]) / 2
+            used = counts > 0
+            inner = _jenks(centers[used], counts[used].astype(numpy.float64), classes)
+        return _unique([low] + [float(v) for v in inner] + [high])
+
+    def classify(self, method="quantile", classes=5):
+        """
+        统计每个分级的要素数
+        return [{min, max, count}]，最后一级包含最大值，其他级为左闭右开区间
+        """
+
+        edges = self.breaks(method, classes)
+        counts = numpy.zeros(len(edges) - 1, dtype=numpy.int64)
+        inner = numpy.array(edges[1:-1])
+        for values in self.__chunks():
+            counts += numpy.bincount(numpy.searchsorted(inner, values, side="right"), minlength=len(counts))[:len(counts)]
+        return [{"min": edges[i], "max": edges[i + 1], "count": int(counts[i])} for i in range(len(counts))]
+
+    def categories(self, maxCategories=20, maxDistinct=10000):
+        """
+        统计字段的唯一值
+        maxCategories：最多返回的类别数，按要素数从多到少保留，可选，默认为20
+        maxDistinct：最多统计的唯一值个数，超过时字段不适合分类（例如连续数值），抛出ClassifyError，内存占用不超过该个数，可选，默认为10000
+        return ([{value, count}], 其余类别的要素数)，字符字段的value为按charset解码的字符串
+        """
+
+        totals = {}
+        chunks = self.__chunks() if self.numeric else self.reader.readField(self.fieldName, self.chunkSize)
+        for values in chunks:
+            unique, counts = numpy.unique(values, return_counts=True)
+            for value, count in zip(unique.tolist(), counts.tolist()):
+                totals[value] = totals.get(value, 0) + count
+            if len(totals) > maxDistinct:
+                raise ClassifyError("字段的唯一值超过{0}个，不适合分类，请使用分级方法：{1}".format(maxDistinct, self.fieldName))
+
+        items = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+        result = []
+        for value, count in items[:maxCategories]:
+            if isinstance(value, bytes):
+                value = value.decode(self.reader.charset, errors="replace")
+            elif self.numeric and float(value).is_integer():
+                value = int(value)
+            result.append({"value": value, "count": count})
+        return result, sum(count for value, count in items[maxCategories:])
+
+
+def _unique(edges):
+    result = []
+    for edge in edges:
+        if not result or edge > result[-1]:
+            result.append(edge)
+    if len(result) == 1:
+        result.append(result[0])
+    return result
+
+
+def _jenks(values, weights, classes):
+    """
+    加权的Jenks自然断点（Fisher最优分割），values为升序的直方图分箱中心，weights为每个分箱的要素数
+    动态规划的内层循环用numpy向量化，复杂度为O(classes×n²)次浮点运算、O(classes×n)次numpy调用
+    return 内部断点列表（classes-1个），取相邻两级之间的分箱中点
+    """
+
+    n = len(values)
+    classes = min(classes, n)
+    if classes <= 1:
+        return []
+
+    # 前缀和，用于O(1)计算任意区间的加权平方差和
+    w = numpy.concatenate([[0], numpy.cumsum(weights)])
+    wx = numpy.concatenate([[0], numpy.cumsum(weights * values)])
+    wxx = numpy.concatenate([[0], numpy.cumsum(weights * values * values)])
+
+    def ssd(i, j):
+        # 分箱i..j-1的加权平方差和，i可以是数组
+        count = w[j] - w[i]
+        total = wx[j] - wx[i]
+        return wxx[j] - wxx[i] - total * total / numpy.maximum(count, 1e-12)
+
+    # cost[k][j]：前j个分箱分为k+1级的最小代价；start[k][j]：最后一级的起始分箱
+    cost = numpy.full((classes, n + 1), numpy.inf)
+    start = numpy.zeros((classes, n + 1), dtype=numpy.int64)
+    cost[0, 1:] = ssd(0, numpy.arange(1, n + 1))
+    for k in range(1, classes):
+        for j in range(k + 1, n + 1):
+            i = numpy.arange(k, j)
+            total = cost[k - 1, i] + ssd(i, j)
+            best = int(numpy.argmin(total))
+            cost[k, j] = total[best]
+            start[k, j] = i[best]
+
+    breaks = []
+    j = n
+    for k in range(classes - 1, 0, -1):
+        i = start[k, j]
+        breaks.append((values[i - 1] + values[i]) / 2)
+        j = i
+    return breaks[::-1]
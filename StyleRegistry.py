@@ -0,0 +1,192 @@
+import hashlib
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree import ElementTree
+
+from geoserver.catalog import FailedRequestError
+
+# 只影响样式名称、不影响渲染结果的元素，计算指纹时去掉
+_NAME_PARENTS = ("NamedLayer", "UserLayer", "UserStyle")
+_NAME_TAGS = ("Name", "Title", "Abstract")
+
+
+def fingerprint(styleData):
+    """
+    计算样式内容的指纹：解析SLD，去掉图层和样式的名称、标题、摘要以及空白，按C14N规范化后取sha256
+    只有名称不同的样式指纹相同；无法解析的内容按去掉空白后的文本计算
+    styleData：样式xml，str或bytes
+    return 十六进制的指纹
+    """
+
+    if isinstance(styleData, str):
+        styleData = styleData.encode("utf-8")
+    try:
+        root = ElementTree.fromstring(styleData)
+    except ElementTree.ParseError:
+        return hashlib.sha256(re.sub(rb"\s+", b"", styleData)).hexdigest()
+
+    for parent in root.iter():
+        if _local(parent.tag) in _NAME_PARENTS:
+            for child in list(parent):
+                if _local(child.tag) in _NAME_TAGS:
+                    parent.remove(child)
+    # schemaLocation等属性不影响渲染
+    for element in root.iter():
+        for key in [key for key in element.attrib if key.endswith("schemaLocation")]:
+            del element.attrib[key]
+
+    canonical = ElementTree.canonicalize(ElementTree.tostring(root), strip_text=True, rewrite_prefixes=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1] if isinstance(tag, str) else ""
+
+
+class StyleRegistry(object):
+    """
+    按内容指纹索引样式，用于判断相同内容的样式是否已存在、服务器上的样式是否需要更新
+    单个样式的指纹在第一次查询时下载其内容计算；按指纹查找样式时才下载整个工作空间的样式，之后通过本类上传、删除样式时同步更新索引
+    索引与查询缓存一样有有效期，过期后整体清空重新下载，其他程序修改的样式最迟在ttl秒后生效；需要立即生效时调用clear
+    """
+    def __init__(self, catalog, workers=8, ttl=60):
+        """
+        catalog：GeoServerCatalog对象
+        workers：下载工作空间样式内容的并发线程数，可选，默认为8
+        ttl：索引的有效期（秒），可选，默认为60，为0时每次查询都重新下载
+        """
+        self.catalog = catalog
+        self.workers = workers
+        self.ttl = ttl
+        self.__lock = threading.RLock()
+        self.__expires = None
+        # (工作空间, 样式名) -> 指纹，样式不存在时为None
+        self.__digests = {}
+        # (工作空间, 指纹) -> {样式名}，只包括已加载的工作空间
+        self.__names = {}
+        self.__loaded = set()
+
+    def clear(self):
+        with self.__lock:
+            self.__digests.clear()
+            self.__names.clear()
+            self.__loaded.clear()
+            self.__expires = None
+
+    def __expire(self):
+        """
+        索引过期时清空，从第一次查询开始计算有效期
+        """
+
+        with self.__lock:
+            now = time.monotonic()
+            if self.__expires is not None and now >= self.__expires:
+                self.clear()
+            if self.__expires is None:
+                self.__expires = now + self.ttl
+
+    def download(self, workspaceName, styleName):
+        """
+        return 样式的内容bytes，样式不存在（404）时为None
+        workspaceName：样式所在的工作空间的名称，全局样式为None
+        其他错误时抛出FailedRequestError，不能当作样式不存在，否则会重复上传或创建重复的样式
+        """
+
+        path = "workspaces/{0}/styles/{1}.sld".format(workspaceName, styleName) if workspaceName else "styles/{0}.sld".format(styleName)
+        resp = self.catalog.http_request("{0}/{1}".format(self.catalog.service_url, path))
+        if resp.status_code == 404:
+            return None
+        if resp.status_code != 200:
+            raise FailedRequestError("Failed to get style {0} : {1}, {2}".format(path, resp.status_code, resp.text))
+        return resp.content
+
+    def __load(self, workspaceName):
+        """
+        下载工作空间中尚未计算指纹的全部样式
+        """
+
+        self.__expire()
+        if workspaceName in self.__loaded:
+            return
+        if workspaceName:
+            names = [style.name for style in self.catalog.get_styles(workspaces=[workspaceName])]
+        else:
+            names = [style.name for style in self.catalog.get_styles() if not style.workspace]
+        with self.__lock:
+            missing = [name for name in names if (workspaceName, name) not in self.__digests]
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            bodies = list(executor.map(lambda name: self.download(workspaceName, name), missing))
+
+        with self.__lock:
+            if workspaceName in self.__loaded:
+                return
+            for name, body in zip(missing, bodies):
+                self.__digests.setdefault((workspaceName, name), fingerprint(body) if body is not None else None)
+            for (ws, name), digest in self.__digests.items():
+                if ws == workspaceName and digest is not None:
+                    self.__names.setdefault((ws, digest), set()).add(name)
+            self.__loaded.add(workspaceName)
+
+    def digestOf(self, workspaceName, styleName):
+        """
+        return 服务器上样式的指纹，样式不存在时为None
+        workspaceName：样式所在的工作空间的名称，全局样式为None
+        """
+
+        self.__expire()
+        with self.__lock:
+            if (workspaceName, styleName) in self.__digests:
+                return self.__digests[(workspaceName, styleName)]
+        body = self.download(workspaceName, styleName)
+        digest = fingerprint(body) if body is not None else None
+        with self.__lock:
+            return self.__digests.setdefault((workspaceName, styleName), digest)
+
+    def lookup(self, workspaceName, digest):
+        """
+        return 工作空间中指纹相同的样式名称，没有时为None；有多个时为名称排序最小的一个
+        """
+
+        self.__load(workspaceName)
+        with self.__lock:
+            names = self.__names.get((workspaceName, digest))
+            return min(names) if names else None
+
+    def duplicates(self, workspaceName):
+        """
+        return 工作空间中内容相同的样式分组 {指纹: [样式名]}，只包括有两个及以上样式的分组，组内按名称排序
+        """
+
+        self.__load(workspaceName)
+        with self.__lock:
+            return {digest: sorted(names) for (ws, digest), names in self.__names.items() if ws == workspaceName and len(names) > 1}
+
+    def put(self, workspaceName, styleName, digest):
+        """
+        记录上传的样式
+        """
+
+        with self.__lock:
+            self.__remove(workspaceName, styleName)
+            self.__digests[(workspaceName, styleName)] = digest
+            if workspaceName in self.__loaded:
+                self.__names.setdefault((workspaceName, digest), set()).add(styleName)
+
+    def remove(self, workspaceName, styleName):
+        """
+        记录删除的样式
+        """
+
+        with self.__lock:
+            self.__remove(workspaceName, styleName)
+            self.__digests[(workspaceName, styleName)] = None
+
+    def __remove(self, workspaceName, styleName):
+        digest = self.__digests.pop((workspaceName, styleName), None)
+        names = self.__names.get((workspaceName, digest))
+        if names is not None:
+            names.discard(styleName)
+            if not names:
+                del self.__names[(workspaceName, digest)]
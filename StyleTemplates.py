@@ -0,0 +1,304 @@
+"""
+常用样式的SLD模板
+用于根据样式参数生成点、线、多边形类型的样式xml
+"""
+
+from xml.sax.saxutils import escape
+
+
+def getPointStyle(styleParas):
+    """
+    生成点类型的样式xml
+    styleParas：样式参数 {type:circle/rectangle/star, color:"#000000", transparency:0.5, size:10}
+    return xml
+    """
+    
+    type = "circle"
+    if "type" in styleParas:
+        type = styleParas["type"]
+
+    color = "#000000"
+    if "color" in styleParas:
+        color = styleParas["color"]
+
+    transparency = 0
+    if "transparency" in styleParas:
+        transparency = styleParas["transparency"]
+
+    size = 1
+    if "size" in styleParas:
+        size = styleParas["size"]
+
+    style = '<?xml version="1.0" encoding="UTF-8"?>\r\n \
+        <StyledLayerDescriptor version="1.0.0" \r\n \
+            xsi:schemaLocation="http://www.opengis.net/sld StyledLayerDescriptor.xsd" \r\n \
+            xmlns="http://www.opengis.net/sld" \r\n \
+            xmlns:ogc="http://www.opengis.net/ogc" \r\n \
+            xmlns:xlink="http://www.w3.org/1999/xlink" \r\n \
+            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\r\n \
+            <NamedLayer>\r\n \
+                <Name>default_point</Name>\r\n \
+                <UserStyle>\r\n \
+                    <FeatureTypeStyle>\r\n \
+                        <Rule>\r\n \
+                            <PointSymbolizer>\r\n \
+                                <Graphic>\r\n \
+                                    <Mark>\r\n \
+                                        <WellKnownName>{0}</WellKnownName>\r\n \
+                                        <Fill>\r\n \
+                                          <CssParameter name="fill">{1}</CssParameter>\r\n \
+                                          <CssParameter name="fill-opacity">{2}</CssParameter>\r\n \
+                                        </Fill>\r\n \
+                                    </Mark>\r\n \
+                                    <Size>{3}</Size>\r\n \
+                                </Graphic>\r\n \
+                            </PointSymbolizer>\r\n \
+                        </Rule>\r\n \
+                    </FeatureTypeStyle>\r\n \
+                </UserStyle>\r\n \
+            </NamedLayer>\r\n\
+        </StyledLayerDescriptor>'.format(type, color, 1.0-transparency, size)
+    return style
+
+
+def getPolylineStyle(styleParas):
+    """
+    生成线类型的样式xml
+    styleParas：样式参数 {color:"#000000", width:1}
+    return xml
+    """
+
+    color = "#000000"
+    if "color" in styleParas:
+        color = styleParas["color"]
+
+    width = 1
+    if "width" in styleParas:
+        width = styleParas["width"]
+
+    style = '<?xml version="1.0" encoding="UTF-8"?>\r\n \
+        <StyledLayerDescriptor version="1.0.0" \r\n \
+            xsi:schemaLocation="http://www.opengis.net/sld StyledLayerDescriptor.xsd" \r\n \
+            xmlns="http://www.opengis.net/sld" \r\n \
+            xmlns:ogc="http://www.opengis.net/ogc" \r\n \
+            xmlns:xlink="http://www.w3.org/1999/xlink" \r\n \
+            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\r\n \
+            <NamedLayer>\r\n \
+                <Name>default_line</Name>\r\n \
+                <UserStyle>\r\n \
+                    <FeatureTypeStyle>\r\n \
+                        <Rule>\r\n \
+                            <LineSymbolizer>\r\n \
+                                <Stroke>\r\n \
+                                    <CssParameter name="stroke">{0}</CssParameter>\r\n \
+                                    <CssParameter name="stroke-width">{1}</CssParameter>\r\n \
+                                </Stroke>\r\n \
+                            </LineSymbolizer>\r\n \
+                        </Rule>\r\n \
+                    </FeatureTypeStyle>\r\n \
+                </UserStyle>\r\n \
+            </NamedLayer>\r\n\
+        </StyledLayerDescriptor>'.format(color, width)
+    return style
+
+
+def getPolygonStyle(styleParas):
+    """
+    生成多边形类型的样式xml
+    styleParas：样式参数 {fill_color:"#AAAAAA", outline_color:"#000000", outline_width:1}
+    return xml
+    """
+
+    fill_color = "#AAAAAA"
+    if "fill_color" in styleParas:
+        fill_color = styleParas["fill_color"]
+
+    outline_color = "#000000"
+    if "outline_color" in styleParas:
+        outline_color = styleParas["outline_color"]
+
+    outline_width = 1
+    if "outline_width" in styleParas:
+        outline_width = styleParas["outline_width"]
+
+    style = '<?xml version="1.0" encoding="UTF-8"?>\r\n \
+        <StyledLayerDescriptor version="1.0.0" \r\n \
+            xsi:schemaLocation="http://www.opengis.net/sld StyledLayerDescriptor.xsd" \r\n \
+            xmlns="http://www.opengis.net/sld" \r\n \
+            xmlns:ogc="http://www.opengis.net/ogc" \r\n \
+            xmlns:xlink="http://www.w3.org/1999/xlink" \r\n \
+            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\r\n \
+            <NamedLayer>\r\n \
+                <Name>default_polygon</Name>\r\n \
+                <UserStyle>\r\n \
+                    <FeatureTypeStyle>\r\n \
+                        <Rule>\r\n \
+                            <PolygonSymbolizer>\r\n \
+                                <Fill>\r\n \
+                                    <CssParameter name="fill">{0}</CssParameter>\r\n \
+                                </Fill>\r\n \
+                                <Stroke>\r\n \
+                                    <CssParameter name="stroke">{1}</CssParameter>\r\n \
+                                    <CssParameter name="stroke-width">{2}</CssParameter>\r\n \
+                                </Stroke>\r\n \
+                            </PolygonSymbolizer>\r\n \
+                        </Rule>\r\n \
+                    </FeatureTypeStyle>\r\n \
+                </UserStyle>\r\n \
+            </NamedLayer>\r\n\
+        </StyledLayerDescriptor>'.format(fill_color, outline_color, outline_width)
+    return style
+
+
+def getStyleData(styleType, styleParas):
+    """
+    根据样式类型生成样式xml
+    styleType：样式的类型 point/polyline/line/polygon
+    styleParas: 样式的参数, 
+               point-{type:circle/rectangle/star, color:"#000000", transparency:0.5, size:10}
+               polyline/line-{color:"#000000", width:1}
+               polygon-{fill_color:"#AAAAAA", outline_color:"#000000", outline_width:1}
+    return xml；不支持的样式类型返回None
+    """
+
+    if styleType == "point":
+        return getPointStyle(styleParas)
+    elif styleType == "polyline" or styleType == "line":
+        return getPolylineStyle(styleParas)
+    elif styleType == "polygon":
+        return getPolygonStyle(styleParas)
+    return None
+
+
+def colorRamp(startColor, endColor, count):
+    """
+    在两个颜色之间线性插值
+    startColor、endColor：起止颜色，格式为"#RRGGBB"
+    count：颜色个数
+    return 颜色列表
+    """
+
+    start = [int(startColor[i:i + 2], 16) for i in (1, 3, 5)]
+    end = [int(endColor[i:i + 2], 16) for i in (1, 3, 5)]
+    colors = []
+    for k in range(count):
+        t = k / float(count - 1) if count > 1 else 0
+        colors.append("#{0:02X}{1:02X}{2:02X}".format(*[int(round(s + (e - s) * t)) for s, e in zip(start, end)]))
+    return colors
+
+
+# 分类样式的默认配色
+CATEGORY_COLORS = ["#1F77B4", "#FF7F0E", "#2CA02C", "#D62728", "#9467BD", "#8C564B", "#E377C2", "#7F7F7F", "#BCBD22", "#17BECF",
+                   "#AEC7E8", "#FFBB78", "#98DF8A", "#FF9896", "#C5B0D5", "#C49C94", "#F7B6D2", "#C7C7C7", "#DBDB8D", "#9EDAE5"]
+
+
+def _getSymbolizer(styleType, color, styleParas):
+    """
+    生成单个颜色的点、线、多边形符号
+    """
+
+    if styleType == "point":
+        return '<PointSymbolizer><Graphic><Mark><WellKnownName>{0}</WellKnownName><Fill>' \
+               '<CssParameter name="fill">{1}</CssParameter><CssParameter name="fill-opacity">{2}</CssParameter>' \
+               '</Fill></Mark><Size>{3}</Size></Graphic></PointSymbolizer>'.format(
+                   styleParas.get("type", "circle"), color, 1.0 - styleParas.get("transparency", 0), styleParas.get("size", 6))
+    elif styleType == "polyline" or styleType == "line":
+        return '<LineSymbolizer><Stroke><CssParameter name="stroke">{0}</CssParameter>' \
+               '<CssParameter name="stroke-width">{1}</CssParameter></Stroke></LineSymbolizer>'.format(color, styleParas.get("width", 1))
+    elif styleType == "polygon":
+        # 线宽为0时不绘制边线，要素密集时可明显减少渲染耗时
+        stroke = ""
+        if styleParas.get("outline_width", 1) > 0:
+            stroke = '<Stroke><CssParameter name="stroke">{0}</CssParameter><CssParameter name="stroke-width">{1}</CssParameter>' \
+                     '</Stroke>'.format(styleParas.get("outline_color", "#000000"), styleParas.get("outline_width", 1))
+        return '<PolygonSymbolizer><Fill><CssParameter name="fill">{0}</CssParameter></Fill>{1}</PolygonSymbolizer>'.format(color, stroke)
+    return None
+
+
+def _getRules(styleType, rules, styleParas):
+    """
+    rules：[(标题, 过滤条件xml, 颜色)]，过滤条件为"<ElseFilter/>"时匹配其他规则之外的要素
+    styleParas中的minScale、maxScale为每条规则的比例尺分母范围，超出范围时不绘制
+    """
+
+    scale = ""
+    if styleParas.get("minScale") is not None:
+        scale += "<MinScaleDenominator>{0}</MinScaleDenominator>".format(styleParas["minScale"])
+    if styleParas.get("maxScale") is not None:
+        scale += "<MaxScaleDenominator>{0}</MaxScaleDenominator>".format(styleParas["maxScale"])
+
+    xml = []
+    for title, filter, color in rules:
+        symbolizer = _getSymbolizer(styleType, color, styleParas)
+        if symbolizer is None:
+            return None
+        xml.append("<Rule><Name>{0}</Name><Title>{0}</Title>{1}{2}{3}</Rule>".format(escape(title), filter, scale, symbolizer))
+    return "\n".join(xml)
+
+
+def _getStyledLayer(name, rules):
+    return '<?xml version="1.0" encoding="UTF-8"?>\n' \
+           '<StyledLayerDescriptor version="1.0.0" xsi:schemaLocation="http://www.opengis.net/sld StyledLayerDescriptor.xsd" ' \
+           'xmlns="http://www.opengis.net/sld" xmlns:ogc="http://www.opengis.net/ogc" xmlns:xlink="http://www.w3.org/1999/xlink" ' \
+           'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\n' \
+           '<NamedLayer><Name>{0}</Name><UserStyle><FeatureTypeStyle>\n{1}\n</FeatureTypeStyle></UserStyle></NamedLayer>\n' \
+           '</StyledLayerDescriptor>'.format(escape(name), rules)
+
+
+def _getColors(styleParas, count):
+    if "colors" in styleParas:
+        colors = list(styleParas["colors"])
+        return [colors[i % len(colors)] for i in range(count)]
+    return colorRamp(styleParas.get("start_color", "#FFFFCC"), styleParas.get("end_color", "#BD0026"), count)
+
+
+def getGraduatedStyle(styleType, fieldName, classes, styleParas):
+    """
+    生成分级样式xml，每个分级一条规则
+    styleType：样式的类型 point/polyline/line/polygon
+    fieldName：分级的字段名称
+    classes：分级列表 [{min, max}]，见StyleClassifier.classify；最后一级包含最大值，其他级为左闭右开区间
+    styleParas：样式参数，在对应单一样式参数的基础上增加
+               colors-每个分级的颜色列表，或start_color、end_color-颜色渐变的起止颜色，默认为黄到红
+               minScale、maxScale-显示的比例尺分母范围，可选；要素密集的图层设置maxScale后，缩小到全图时不再渲染
+    return xml；不支持的样式类型返回None
+    """
+
+    colors = _getColors(styleParas, len(classes))
+    rules = []
+    for i, item in enumerate(classes):
+        upper = "PropertyIsLessThanOrEqualTo" if i == len(classes) - 1 else "PropertyIsLessThan"
+        filter = '<ogc:Filter><ogc:And>' \
+                 '<ogc:PropertyIsGreaterThanOrEqualTo><ogc:PropertyName>{0}</ogc:PropertyName><ogc:Literal>{1!r}</ogc:Literal></ogc:PropertyIsGreaterThanOrEqualTo>' \
+                 '<ogc:{3}><ogc:PropertyName>{0}</ogc:PropertyName><ogc:Literal>{2!r}</ogc:Literal></ogc:{3}>' \
+                 '</ogc:And></ogc:Filter>'.format(escape(fieldName), float(item["min"]), float(item["max"]), upper)
+        rules.append(("{0:g} - {1:g}".format(item["min"], item["max"]), filter, colors[i]))
+
+    rules = _getRules(styleType, rules, styleParas)
+    return None if rules is None else _getStyledLayer("graduated_{0}".format(fieldName), rules)
+
+
+def getCategorizedStyle(styleType, fieldName, categories, styleParas, others=True):
+    """
+    生成分类样式xml，每个类别一条规则
+    styleType：样式的类型 point/polyline/line/polygon
+    fieldName：分类的字段名称
+    categories：类别列表 [{value}]，见StyleClassifier.categories
+    styleParas：样式参数，在对应单一样式参数的基础上增加
+               colors-每个类别的颜色列表，默认为CATEGORY_COLORS；other_color-其他类别的颜色，默认为#CCCCCC
+               minScale、maxScale-显示的比例尺分母范围，可选
+    others：是否为其他类别的要素增加一条规则，可选，默认为True
+    return xml；不支持的样式类型返回None
+    """
+
+    colors = list(styleParas.get("colors", CATEGORY_COLORS))
+    rules = []
+    for i, item in enumerate(categories):
+        filter = '<ogc:Filter><ogc:PropertyIsEqualTo><ogc:PropertyName>{0}</ogc:PropertyName><ogc:Literal>{1}</ogc:Literal>' \
+                 '</ogc:PropertyIsEqualTo></ogc:Filter>'.format(escape(fieldName), escape(str(item["value"])))
+        rules.append((str(item["value"]), filter, colors[i % len(colors)]))
+    if others:
+        rules.append(("other", "<ElseFilter/>", styleParas.get("other_color", "#CCCCCC")))
+
+    rules = _getRules(styleType, rules, styleParas)
+    return None if rules is None else _getStyledLayer("categorized_{0}".format(fieldName), rules)
@@ -0,0 +1,307 @@
+import os
+import json
+import math
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy
+from osgeo import gdal, osr
+
+from PyramidBuilder import isEmpty, sourceFingerprint
+
+
+class WarpError(Exception):
+    """
+    重投影错误
+    """
+    pass
+
+
+# 输出文件中记录源影像指纹和重投影参数的元数据项
+_METADATA_KEY = "WARP_SOURCE"
+
+RESAMPLINGS = ("near", "bilinear", "cubic", "cubicspline", "lanczos", "average", "mode")
+
+
+class WarpBuilder(object):
+    """
+    发布前将栅格重投影到服务的坐标系（默认EPSG:3857），geoserver不必在每次GetMap时重投影
+    输出网格由GDAL按源影像的范围和分辨率计算，与gdalwarp的默认结果一致；输出按分块对齐的窗口拆分为任务，
+    由进程池并行重投影，每个任务只读取窗口对应的源影像范围，主进程按完成顺序写入分块的GTiff；
+    同时进行的任务数不超过进程数的2倍，内存占用只与窗口大小有关
+    源影像有nodata时沿用，否则增加alpha波段标记有效范围；没有有效像素的窗口不写入，输出为稀疏文件
+    输出文件的元数据记录源影像指纹和重投影参数，resume为True且未变化时不重复重投影
+    """
+    def __init__(self, tiffPath, warpedPath, targetCrs="EPSG:3857", resampling="bilinear", blockSize=512,
+                 creationOptions=("COMPRESS=DEFLATE",), windowBytes=64 * 1024 * 1024, workers=None, progress=None, resume=True):
+        """
+        tiffPath：tiff文件的路径
+        warpedPath：重投影后的tiff文件的路径
+        targetCrs：目标坐标系，EPSG代码、proj字符串或wkt，可选，默认为EPSG:3857
+        resampling：重采样方式，见RESAMPLINGS，可选，默认为bilinear
+        blockSize：输出文件内部分块的分辨率，可选，默认为512
+        creationOptions：输出的GTiff创建参数，分块、BIGTIFF和稀疏文件的参数自动添加，可选，默认为COMPRESS=DEFLATE
+        windowBytes：每个任务的输出窗口的最大字节数，可选，默认为64MB
+        workers：并行的进程数，可选，默认为cpu核数
+        progress：进度回调函数 progress(done, total)，可选
+        resume：输出文件记录的源影像和参数未变化时是否跳过，可选，默认为True
+        """
+        self.tiffPath = tiffPath
+        self.warpedPath = warpedPath
+        self.targetCrs = targetCrs
+        self.resampling = resampling
+        self.blockSize = blockSize
+        self.creationOptions = list(creationOptions or [])
+        self.windowBytes = windowBytes
+        self.workers = workers or os.cpu_count() or 1
+        self.progress = progress
+        self.resume = resume
+
+        if resampling not in RESAMPLINGS:
+            raise WarpError("不支持的重采样方式：{0}".format(resampling))
+
+    def __open(self):
+        gdal.UseExceptions()
+        try:
+            return gdal.Open(self.tiffPath)
+        except RuntimeError as e:
+            raise WarpError("无法打开tiff文件：{0}，{1}".format(self.tiffPath, e))
+
+    def __target(self):
+        target = osr.SpatialReference()
+        try:
+            error = target.SetFromUserInput(self.targetCrs)
+        except RuntimeError as e:
+            raise WarpError("无法识别的坐标系：{0}，{1}".format(self.targetCrs, e))
+        if error != 0:
+            raise WarpError("无法识别的坐标系：{0}".format(self.targetCrs))
+        return target
+
+    def needsWarp(self):
+        """
+        return 源影像的坐标系是否与目标坐标系不同
+        """
+
+        src = self.__open()
+        projection = src.GetProjection()
+        src = None
+        if not projection:
+            raise WarpError("源影像没有坐标系：{0}".format(self.tiffPath))
+        return not osr.SpatialReference(projection).IsSame(self.__target())
+
+    def plan(self):
+        """
+        计算输出网格
+        return {width, height, geoTransform, projection, bandCount, dataType, noData, alpha, blockSize, windowSize, windows}
+        """
+
+        src = self.__open()
+        projection = self.__target().ExportToWkt()
+        try:
+            vrt = gdal.Warp("", src, format="VRT", dstSRS=projection, resampleAlg=self.resampling)
+        except RuntimeError as e:
+            raise WarpError("无法计算重投影范围：{0}，{1}".format(self.tiffPath, e))
+        band = src.GetRasterBand(1)
+        info = {
+            "width": vrt.RasterXSize,
+            "height": vrt.RasterYSize,
+            "geoTransform": tuple(vrt.GetGeoTransform()),
+            "projection": projection,
+            "bandCount": src.RasterCount,
+            "dataType": band.DataType,
+            "noData": band.GetNoDataValue(),
+            "blockSize": self.blockSize
+        }
+        vrt = None
+        src = None
+
+        # 没有nodata时增加alpha波段
+        info["alpha"] = info["noData"] is None
+        outputBands = info["bandCount"] + (1 if info["alpha"] else 0)
+        # 窗口为分块的整数倍，重投影时源数据、输出和中间缓冲约占输出窗口的3倍
+        pixelBytes = outputBands * gdal.GetDataTypeSize(info["dataType"]) // 8
+        side = int(math.sqrt(self.windowBytes / float(3 * pixelBytes)))
+        info["windowSize"] = max(1, side // self.blockSize) * self.blockSize
+        info["windows"] = _windows(info["width"], info["height"], info["windowSize"])
+        return info
+
+    def fingerprint(self):
+        """
+        return 源影像指纹和重投影参数，记录在输出文件中
+        """
+
+        return {"source": sourceFingerprint(self.tiffPath), "targetCrs": self.targetCrs, "resampling": self.resampling}
+
+    def isCurrent(self):
+        """
+        return 输出文件是否存在且由相同的源影像和参数生成
+        """
+
+        if not os.path.exists(self.warpedPath):
+            return False
+        gdal.UseExceptions()
+        try:
+            ds = gdal.Open(self.warpedPath)
+            recorded = ds.GetMetadataItem(_METADATA_KEY)
+            ds = None
+        except RuntimeError:
+            return False
+        return recorded is not None and json.loads(recorded) == self.fingerprint()
+
+    def build(self):
+        """
+        重投影
+        return {path, width, height, geoTransform, projection, bandCount, alpha, windows：窗口数, written：写入的窗口数, empty：没有有效像素的窗口数, skipped}
+               skipped为True表示输出文件未变化，未重新生成
+        重投影失败时抛出WarpError
+        """
+
+        if self.resume and self.isCurrent():
+            ds = gdal.Open(self.warpedPath)
+            result = {
+                "path": self.warpedPath,
+                "width": ds.RasterXSize,
+                "height": ds.RasterYSize,
+                "geoTransform": tuple(ds.GetGeoTransform()),
+                "projection": ds.GetProjection(),
+                "bandCount": ds.RasterCount,
+                "alpha": ds.GetRasterBand(1).GetNoDataValue() is None,
+                "windows": 0,
+                "written": 0,
+                "empty": 0,
+                "skipped": True
+            }
+            ds = None
+            return result
+
+        info = self.plan()
+        outputBands = info["bandCount"] + (1 if info["alpha"] else 0)
+        options = [o for o in self.creationOptions if o.split("=", 1)[0].upper() not in ("TILED", "BLOCKXSIZE", "BLOCKYSIZE", "SPARSE_OK", "BIGTIFF")]
+        options += ["TILED=YES", "BLOCKXSIZE={0}".format(self.blockSize), "BLOCKYSIZE={0}".format(self.blockSize), "SPARSE_OK=TRUE", "BIGTIFF=IF_SAFER"]
+        if info["alpha"]:
+            options.append("ALPHA=YES")
+
+        folder = os.path.dirname(os.path.abspath(self.warpedPath))
+        os.makedirs(folder, exist_ok=True)
+        # 先写到临时文件，完成后替换，中断时不会留下不完整的输出
+        tmpPath = self.warpedPath + ".tmp.tif"
+        try:
+            out = gdal.GetDriverByName("GTiff").Create(tmpPath, info["width"], info["height"], outputBands, info["dataType"], options)
+            out.SetGeoTransform(info["geoTransform"])
+            out.SetProjection(info["projection"])
+            if info["noData"] is not None:
+                for i in range(outputBands):
+                    out.GetRasterBand(i + 1).SetNoDataValue(info["noData"])
+            written, empty = self.__run(info, out)
+            out.SetMetadataItem(_METADATA_KEY, json.dumps(self.fingerprint()))
+            out.FlushCache()
+            out = None
+            os.replace(tmpPath, self.warpedPath)
+        except RuntimeError as e:
+            raise WarpError("重投影失败：{0}，{1}".format(self.tiffPath, e))
+        finally:
+            out = None
+            if os.path.exists(tmpPath):
+                os.remove(tmpPath)
+
+        result = {key: info[key] for key in ("width", "height", "geoTransform", "projection", "bandCount", "alpha")}
+        result.update({
+            "path": self.warpedPath,
+            "bandCount": outputBands,
+            "windows": len(info["windows"]),
+            "written": written,
+            "empty": empty,
+            "skipped": False
+        })
+        return result
+
+    def __run(self, info, out):
+        """
+        并行重投影所有窗口并写入输出文件，同时进行的任务数不超过进程数的2倍
+        return (写入的窗口数, 没有有效像素的窗口数)
+        """
+
+        spec = {key: info[key] for key in ("geoTransform", "projection", "noData", "alpha")}
+        spec["resampling"] = self.resampling
+        spec["warpMemory"] = self.windowBytes
+
+        windows = iter(info["windows"])
+        total = len(info["windows"])
+        written, empty = 0, 0
+        if self.progress is not None:
+            self.progress(0, total)
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = {}
+            while True:
+                for window in windows:
+                    pending[executor.submit(_warpWindow, self.tiffPath, spec, *window)] = window
+                    if len(pending) >= 2 * self.workers:
+                        break
+                if not pending:
+                    break
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    xoff, yoff, w, h = pending.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        for other in pending:
+                            other.cancel()
+                        raise WarpError("窗口({0}, {1})重投影失败：{2!r}".format(xoff, yoff, error))
+                    data = future.result()
+                    if data is None:
+                        empty += 1
+                    else:
+                        for i in range(data.shape[0]):
+                            out.GetRasterBand(i + 1).WriteArray(data[i], xoff, yoff)
+                        written += 1
+                if self.progress is not None:
+                    self.progress(written + empty, total)
+        return written, empty
+
+
+def _windows(width, height, size):
+    """
+    return 按size拆分的窗口 [(xoff, yoff, w, h)]
+    """
+
+    return [(x, y, min(size, width - x), min(size, height - y)) for y in range(0, height, size) for x in range(0, width, size)]
+
+
+# 子进程内缓存已打开的源影像
+_datasets = {}
+
+
+def _warpWindow(path, spec, xoff, yoff, w, h):
+    """
+    将一个输出窗口重投影到内存
+    return (波段, 行, 列)数组，没有有效像素时为None
+    """
+
+    if path not in _datasets:
+        gdal.UseExceptions()
+        _datasets[path] = gdal.Open(path)
+    gt = spec["geoTransform"]
+    minx, maxy = gt[0] + xoff * gt[1], gt[3] + yoff * gt[5]
+    maxx, miny = minx + w * gt[1], maxy + h * gt[5]
+
+    options = {
+        "format": "MEM",
+        "outputBounds": (minx, miny, maxx, maxy),
+        "width": w,
+        "height": h,
+        "dstSRS": spec["projection"],
+        "resampleAlg": spec["resampling"],
+        "dstAlpha": spec["alpha"],
+        "warpMemoryLimit": spec["warpMemory"],
+        "multithread": False
+    }
+    if spec["noData"] is not None:
+        options["dstNodata"] = spec["noData"]
+    ds = gdal.Warp("", _datasets[path], **options)
+    data = ds.ReadAsArray()
+    ds = None
+    if data.ndim == 2:
+        data = data[numpy.newaxis, :, :]
+    if isEmpty(data, spec["noData"], spec["alpha"]):
+        return None
+    return data
@@ -0,0 +1,37 @@
+# 性能测试：对比同一个TIFF以COG方式和ImagePyramid方式发布后的WMS渲染延迟
+
+from GeoServerService import GeoServerService
+from RenderBenchmark import RenderBenchmark, formatResults
+
+# 初始化服务
+url = "http://localhost:8080/geoserver/rest" # geoserver url
+username = "admin" # geoserver username
+password = "geoserver" # geoserver password
+
+service = GeoServerService(url, username, password)
+
+# 准备参数
+workspaceName = "test" # geoserver 工作空间名称
+tiffPath = "" # 用于测试的TIFF文件路径
+cogPath = "" # 生成的COG文件路径
+tiffDir = "" # 切片后生成的TIFF金字塔文件夹路径
+cogLayerName = "bench_cog_layer" # COG图层名称
+pyramidLayerName = "bench_pyramid_layer" # 金字塔图层名称
+zooms = [0, 2, 4, 6] # 测试的缩放级别，第z级的请求范围为全图范围的1/2^z
+requestsPerZoom = 50 # 每个缩放级别的请求数
+concurrency = 4 # 并发请求数
+tileSize = 256 # GetMap请求的图片宽高
+
+# 检查工作空间是否存在，如果不存在，则创建
+if not service.isWorkspaceExist(workspaceName):
+    service.createWorkspace(workspaceName)
+
+# 发布两种图层，已存在的图层直接复用
+if not service.isLayerExist(workspaceName, cogLayerName):
+    print(service.createCogLayer(workspaceName, cogLayerName, tiffPath, cogPath))
+if not service.isLayerExist(workspaceName, pyramidLayerName):
+    print(service.createPyramidTiffLayer(workspaceName, pyramidLayerName, tiffPath, tiffDir))
+
+bench = RenderBenchmark(service, url, username, password, workspaceName, requestsPerZoom, [concurrency], tileSize)
+results = bench.run([cogLayerName, pyramidLayerName], zooms, extentLayer=cogLayerName)
+print(formatResults(results))
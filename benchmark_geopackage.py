@@ -0,0 +1,47 @@
+# 性能测试：对比同一个shapefile以shapefile方式和GeoPackage方式发布后的WMS渲染延迟
+
+import time
+
+from GeoServerService import GeoServerService
+from RenderBenchmark import RenderBenchmark, formatResults
+
+# 初始化服务
+url = "http://localhost:8080/geoserver/rest" # geoserver url
+username = "admin" # geoserver username
+password = "geoserver" # geoserver password
+
+service = GeoServerService(url, username, password)
+
+# 准备参数
+workspaceName = "test" # geoserver 工作空间名称
+shapePath = "" # 用于测试的shape文件路径
+gpkgPath = "" # 生成的GeoPackage文件路径
+charset = "UTF-8" # dbf的字符集
+shapeLayerName = "bench_shape_layer" # shapefile图层名称
+gpkgLayerName = "bench_gpkg_layer" # GeoPackage图层名称
+cqlFilter = "" # 属性过滤条件，例如"VAL > 100"，为空时只测试范围查询
+zooms = [0, 2, 4, 6] # 测试的缩放级别，第z级的请求范围为全图范围的1/2^z
+requestsPerZoom = 50 # 每个缩放级别的请求数
+concurrency = 4 # 并发请求数
+tileSize = 256 # GetMap请求的图片宽高
+
+# 检查工作空间是否存在，如果不存在，则创建
+if not service.isWorkspaceExist(workspaceName):
+    service.createWorkspace(workspaceName)
+
+# 发布两种图层，已存在的图层直接复用
+if not service.isLayerExist(workspaceName, shapeLayerName):
+    start = time.perf_counter()
+    print(service.createShapeLayer(workspaceName, shapeLayerName, shapePath, charset, buildIndex=True))
+    print("shapefile publish: {0:.1f}s".format(time.perf_counter() - start))
+if not service.isLayerExist(workspaceName, gpkgLayerName):
+    start = time.perf_counter()
+    print(service.createGeoPackageLayer(workspaceName, gpkgLayerName, shapePath, gpkgPath, charset))
+    print("geopackage convert + publish: {0:.1f}s".format(time.perf_counter() - start))
+
+# 两个图层使用相同的shapefile，请求范围以shapefile图层为准
+bench = RenderBenchmark(service, url, username, password, workspaceName, requestsPerZoom, [concurrency], tileSize)
+if cqlFilter:
+    bench.params["CQL_FILTER"] = cqlFilter
+results = bench.run([shapeLayerName, gpkgLayerName], zooms, extentLayer=shapeLayerName)
+print(formatResults(results))
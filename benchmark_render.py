@@ -0,0 +1,69 @@
+# 性能测试：将同一个TIFF以多种方式发布（普通GeoTIFF、不同层级和切块大小的金字塔、不同压缩方式的切片、COG），
+# 重放相同的WMS GetMap和WMTS GetTile请求，对比各发布方式在不同缩放级别和并发数下的延迟和吞吐量
+
+import os
+
+from GeoServerService import GeoServerService
+from RenderBenchmark import RenderBenchmark, formatResults, saveCsv
+
+# 初始化服务
+url = "http://localhost:8080/geoserver/rest" # geoserver url
+username = "admin" # geoserver username
+password = "geoserver" # geoserver password
+
+service = GeoServerService(url, username, password)
+
+# 准备参数
+workspaceName = "test" # geoserver 工作空间名称
+tiffPath = "" # 用于测试的TIFF文件路径
+workDir = "" # 生成金字塔和COG的文件夹路径
+wmsZooms = [0, 2, 4, 6] # WMS测试的缩放级别，第z级的请求范围为全图范围的1/2^z
+wmtsZooms = [4, 8, 12] # WMTS测试的切片级别
+gridSet = "EPSG:4326" # WMTS的切片方案
+concurrency = [1, 4, 16] # 测试的并发请求数
+requestsPerZoom = 50 # 每个缩放级别的请求数
+csvPath = "benchmark_render.csv" # 测试结果的保存路径，为空时不保存
+
+# 发布方式，name为图层名称，其余键为publishJob的参数
+variants = [
+    {"name": "bench_geotiff", "type": "tiff"},
+    {"name": "bench_pyramid_l4_b2048", "type": "pyramid", "levels": 4, "blockWidth": 2048, "blockHeight": 2048},
+    {"name": "bench_pyramid_auto", "type": "pyramid"},
+    {"name": "bench_pyramid_l6_b1024", "type": "pyramid", "levels": 6, "blockWidth": 1024, "blockHeight": 1024},
+    {"name": "bench_pyramid_l4_b512_deflate", "type": "pyramid", "levels": 4, "blockWidth": 512, "blockHeight": 512,
+     "creationOptions": ["ALPHA=YES", "TILED=YES", "COMPRESS=DEFLATE"]},
+    {"name": "bench_pyramid_l4_b512_jpeg", "type": "pyramid", "levels": 4, "blockWidth": 512, "blockHeight": 512,
+     "creationOptions": ["TILED=YES", "COMPRESS=JPEG", "PHOTOMETRIC=YCBCR"]},
+    {"name": "bench_cog_deflate", "type": "cog", "compress": "DEFLATE"}
+]
+
+# 检查工作空间是否存在，如果不存在，则创建
+if not service.isWorkspaceExist(workspaceName):
+    service.createWorkspace(workspaceName)
+
+# 发布各种方式的图层，已存在的图层直接复用
+for variant in variants:
+    job = dict(variant)
+    layerName = job.pop("name")
+    if service.isLayerExist(workspaceName, layerName):
+        continue
+    job.update({"workspaceName": workspaceName, "layerName": layerName, "tiffPath": tiffPath})
+    if job["type"] == "pyramid":
+        job["tiffDir"] = os.path.join(workDir, layerName)
+    elif job["type"] == "cog":
+        job["cogPath"] = os.path.join(workDir, layerName + ".tif")
+    res = service.publishJob(job)
+    print(layerName, res["status"], res["info"])
+
+layerNames = [variant["name"] for variant in variants]
+bench = RenderBenchmark(service, url, username, password, workspaceName, requestsPerZoom, concurrency)
+
+# WMS：所有图层使用第一个图层的范围，保证请求完全相同
+results = bench.run(layerNames, wmsZooms, "WMS", extentLayer=layerNames[0])
+
+# WMTS：每个图层、级别、并发数的测试前清除该级别的切片缓存，每次都是冷缓存的渲染耗时
+results += bench.run(layerNames, wmtsZooms, "WMTS", gridSet, extentLayer=layerNames[0])
+
+print(formatResults(results))
+if csvPath:
+    saveCsv(results, csvPath)
@@ -0,0 +1,90 @@
+# 性能测试：在进程内启动FakeGeoServer替身，测试GeoServerService创建和删除图层的吞吐量（操作/秒）和每个逻辑操作的REST请求数，
+# 并对比不同并发数、不同服务端延迟和错误率下的表现，用于在没有真实geoserver时衡量客户端的优化效果
+# 替身不解析上传的文件，tiff图层只发送路径，测试结果只反映客户端和REST交互的开销
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from FakeGeoServer import FakeGeoServer
+from GeoServerService import GeoServerService
+from HttpMetrics import HttpMetrics
+
+# 准备参数
+workspaceName = "bench" # geoserver 工作空间名称
+tiffPath = "/data/bench.tif" # tiff路径，替身不读取该文件
+shapePath = "" # shape文件路径，为空时不测试shp图层；shp图层会读取并上传文件
+charset = "UTF-8" # dbf的字符集
+layerCount = 200 # 每个场景发布的图层数
+workers = [1, 4, 16] # 测试的并发线程数
+showEndpoints = True # 是否打印第一个场景每个REST端点的请求数
+
+# 测试场景，server为FakeGeoServer的参数
+scenarios = [
+    {"name": "baseline", "server": {}},
+    {"name": "latency-5ms", "server": {"latency": 0.005, "jitter": 0.005}},
+    {"name": "errors-5%", "server": {"latency": 0.005, "errorRate": 0.05, "seed": 1}},
+    {"name": "ratelimit-200/s", "server": {"latency": 0.005, "rateLimit": 200, "rateLimitStatus": None}}
+]
+
+
+def buildJobs(prefix):
+    jobs = [{"type": "tiff", "workspaceName": workspaceName, "layerName": "{0}_tiff_{1}".format(prefix, i), "tiffPath": tiffPath}
+            for i in range(layerCount)]
+    if shapePath:
+        jobs += [{"type": "shp", "workspaceName": workspaceName, "layerName": "{0}_shp_{1}".format(prefix, i), "shapePath": shapePath,
+                  "charset": charset} for i in range(layerCount)]
+    return jobs
+
+
+def deleteJob(service, job):
+    # 删除图层和同名的数据存储为一个逻辑操作
+    service.deleteLayer(job["workspaceName"], job["layerName"])
+    service.deleteStore(job["workspaceName"], job["layerName"])
+
+
+def measure(fake, metrics, action):
+    """
+    return (耗时秒数, REST请求数, 重试次数)
+    """
+
+    fake.resetStats()
+    metrics.reset()
+    start = time.perf_counter()
+    action()
+    elapsed = time.perf_counter() - start
+    return elapsed, fake.stats()["total"], metrics.snapshot()["retries"]["total"]
+
+
+rows = []
+for scenario in scenarios:
+    for count in workers:
+        with FakeGeoServer(**scenario["server"]) as fake:
+            metrics = HttpMetrics()
+            service = GeoServerService(fake.url, "admin", "geoserver", poolSize=count, metrics=metrics)
+            service.createWorkspace(workspaceName)
+            jobs = buildJobs("w{0}".format(count))
+
+            results = []
+            elapsed, calls, retries = measure(fake, metrics, lambda: results.extend(service.batchPublish(jobs, count)))
+            failures = sum(1 for res in results if res["status"] != "success")
+            rows.append((scenario["name"], "create", count, len(jobs), failures, elapsed, calls, retries))
+            if showEndpoints and len(rows) == 1:
+                endpoints = fake.stats()["byEndpoint"]
+
+            # 删除前清空查询缓存，与其他程序删除图层时的情况一致
+            service.clearCache()
+            with ThreadPoolExecutor(max_workers=count) as executor:
+                elapsed, calls, retries = measure(fake, metrics, lambda: list(executor.map(lambda job: deleteJob(service, job), jobs)))
+            failures = len(fake.layers)
+            rows.append((scenario["name"], "delete", count, len(jobs), failures, elapsed, calls, retries))
+
+print("{0:<18} {1:<7} {2:>7} {3:>5} {4:>6} {5:>9} {6:>10} {7:>8}".format(
+    "scenario", "action", "workers", "ops", "failed", "ops/s", "calls/op", "retries"))
+for name, action, count, ops, failures, elapsed, calls, retries in rows:
+    print("{0:<18} {1:<7} {2:>7} {3:>5} {4:>6} {5:>9.1f} {6:>10.2f} {7:>8}".format(
+        name, action, count, ops, failures, ops / elapsed, calls / ops, retries))
+
+if showEndpoints:
+    print("\nREST calls of {0} create ({1} workers):".format(scenarios[0]["name"], workers[0]))
+    for endpoint, count in endpoints.items():
+        print("{0:>8}  {1}".format(count, endpoint))
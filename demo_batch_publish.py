@@ -0,0 +1,27 @@
+# 演示案例：使用GeoServerService并发批量发布SHP和TIFF服务
+
+from GeoServerService import GeoServerService
+
+# 初始化服务
+url = "http://localhost:8080/geoserver/rest" # geoserver url
+username = "admin" # geoserver username
+password = "geoserver" # geoserver password
+
+service = GeoServerService(url, username, password)
+
+# 准备参数
+workspaceName = "test" # geoserver 工作空间名称
+workers = 4 # 并发发布的线程数
+jobs = [
+    {"type": "shp", "workspaceName": workspaceName, "layerName": "shp_layer", "shapePath": "", "charset": "utf-8"}, # shp文件路径不带后缀
+    {"type": "tiff", "workspaceName": workspaceName, "layerName": "tiff_layer", "tiffPath": ""} # 普通TIFF(<2GB)
+]
+
+# 检查工作空间是否存在，如果不存在，则创建
+if not service.isWorkspaceExist(workspaceName):
+    service.createWorkspace(workspaceName)
+
+# 批量发布图层，结果顺序与任务顺序一致
+results = service.batchPublish(jobs, workers)
+for job, res in zip(jobs, results):
+    print(job["layerName"], res)
@@ -0,0 +1,40 @@
+# 演示案例：使用JobQueue持久化地排队发布SHP、TIFF和金字塔TIFF，进程崩溃后重新运行即可继续
+
+from GeoServerService import GeoServerService
+from JobQueue import JobQueue
+
+# 初始化服务
+url = "http://localhost:8080/geoserver/rest" # geoserver url
+username = "admin" # geoserver username
+password = "geoserver" # geoserver password
+
+service = GeoServerService(url, username, password)
+
+# 准备参数
+workspaceName = "test" # geoserver 工作空间名称
+queuePath = "publish_queue.db" # 任务队列文件路径，多个进程可共用同一个文件
+workers = 4 # 执行任务的线程数
+workspaceLimit = 2 # 同一工作空间同时执行的最多任务数
+submit = True # 是否提交下面的任务，进程崩溃后重新运行时设为False，只继续执行队列中未完成的任务
+jobs = [
+    # (任务, 优先级)，优先级大者先执行
+    ({"type": "shp", "workspaceName": workspaceName, "layerName": "shp_layer", "shapePath": "", "charset": "utf-8"}, 10), # shp文件路径不带后缀
+    ({"type": "tiff", "workspaceName": workspaceName, "layerName": "tiff_layer", "tiffPath": ""}, 5), # 普通TIFF(<2GB)
+    ({"type": "pyramid", "workspaceName": workspaceName, "layerName": "pyramid_tiff_layer", "tiffPath": "", "tiffDir": ""}, 0) # 大型TIFF(>=2GB)
+]
+
+# 检查工作空间是否存在，如果不存在，则创建
+if not service.isWorkspaceExist(workspaceName):
+    service.createWorkspace(workspaceName)
+
+queue = JobQueue(queuePath, service, workers, workspaceLimit, progress=lambda job, res: print(job["id"], job["name"], job["status"], res["info"]))
+if submit:
+    for job, priority in jobs:
+        queue.submit(job, priority)
+
+# 执行直到队列中没有等待和执行中的任务，失败的任务会按退避时间自动重试
+with queue:
+    queue.wait()
+print(queue.counts())
+for job in queue.jobs("failed"):
+    print("失败：{0} {1} {2}".format(job["id"], job["name"], job["info"]))
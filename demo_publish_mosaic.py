@@ -0,0 +1,34 @@
+# 演示案例：使用GeoServerService将一个文件夹的TIFF发布为镶嵌数据集（ImageMosaic）服务
+
+from GeoServerService import GeoServerService
+
+# 初始化服务
+url = "http://localhost:8080/geoserver/rest" # geoserver url
+username = "admin" # geoserver username
+password = "geoserver" # geoserver password
+
+service = GeoServerService(url, username, password)
+
+# 准备参数
+workspaceName = "test" # geoserver 工作空间名称
+layerName = "mosaic_layer" # geoserver 图层名称
+mosaicDir = "" # TIFF所在的文件夹路径，geoserver需要能以相同路径访问
+pattern = "*.tif" # TIFF文件名的通配符
+timeRegex = "[0-9]{8}" # 从文件名提取日期的正则表达式，例如scene_20240101.tif，不需要时间维度时为None
+
+# 检查工作空间是否存在，如果不存在，则创建
+if not service.isWorkspaceExist(workspaceName):
+    service.createWorkspace(workspaceName)
+
+# 检查图层是否已存在，如果存在，则删除
+if service.isStoreExist(workspaceName, layerName):
+    service.deleteStore(workspaceName, layerName)
+
+# 发布图层：先在本地生成镶嵌索引，geoserver不再扫描全部影像
+res = service.createMosaicLayer(workspaceName, layerName, mosaicDir, pattern, timeRegex=timeRegex)
+print(res["status"], res["info"])
+if res["status"] == "success":
+    mosaic = res["data"]["mosaic"]
+    print("影像数：{0}，范围：{1}，时间：{2}".format(mosaic["granules"], mosaic["extent"], mosaic["time"]))
+    for error in mosaic["errors"]:
+        print("跳过：{0}，{1}".format(error["path"], error["info"]))
@@ -1,8 +1,8 @@
 # 演示案例：使用GeoServerService发布金字塔切片的TIFF(>=2GB)服务
 
 import os
-import shutil
 from GeoServerService import GeoServerService
+from PyramidPlanner import formatPlan
 
 # 初始化服务
 url = "http://localhost:8080/geoserver/rest" # geoserver url
@@ -16,14 +16,18 @@ workspaceName = "test" # geoserver 工作空间名称
 layerName = "pyramid_tiff_layer" # geoserver 图层名称
 tiffPath = "" # 用于发布的TIFF文件路径
 tiffDir = "" # 切片后生成的TIFF金字塔文件夹路径
-levels = 4 # 金字塔层级
-blockWidth = 2048 # 金字塔每个块的宽度
-blockHeight = 2048 # 金字塔每个块的高度
+levels = None # 金字塔层级，None为按影像尺寸自动规划
+blockWidth = None # 金字塔每个块的宽度，None为自动规划
+blockHeight = None # 金字塔每个块的高度，None为自动规划
+targetCrs = None # 切片前重投影到的坐标系，例如客户端主要请求"EPSG:3857"时，None为不重投影
 
-# 检查待生成的文件夹是否存在，如果存在则清空，否则创建
-if os.path.isdir(tiffDir):
-    shutil.rmtree(tiffDir) 
-os.mkdir(tiffDir)
+# 检查待生成的文件夹是否存在，如果不存在则创建
+# 已存在时不需要清空：切片会根据文件夹旁的切片清单跳过已完成且未变化的切片，中断后重新运行即可继续
+os.makedirs(tiffDir, exist_ok=True)
+
+# 切片前查看规划的层级、切块大小和估算的切片数量、磁盘占用、耗时
+plan = service.planPyramidTiff(tiffPath, tiffDir)
+print(formatPlan(plan))
 
 # 检查工作空间是否存在，如果不存在，则创建
 if not service.isWorkspaceExist(workspaceName):
@@ -34,5 +38,5 @@ if service.isStoreExist(workspaceName, layerName):
     service.deleteStore(workspaceName, layerName)
 
 # 发布图层
-res = service.createPyramidTiffLayer(workspaceName, layerName, tiffPath, tiffDir, levels, blockWidth, blockHeight)
+res = service.createPyramidTiffLayer(workspaceName, layerName, tiffPath, tiffDir, levels, blockWidth, blockHeight, targetCrs=targetCrs)
 print(res)
\ No newline at end of file
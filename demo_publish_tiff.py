@@ -13,6 +13,7 @@ service = GeoServerService(url, username, password)
 workspaceName = "test" # geoserver 工作空间名称
 layerName = "tiff_layer" # geoserver 图层名称
 tiffPath = "" # 用于发布的TIFF文件路径
+targetCrs = None # 发布前重投影到的坐标系，例如客户端主要请求"EPSG:3857"时，None为不重投影
 
 # 检查工作空间是否存在，如果不存在，则创建
 if not service.isWorkspaceExist(workspaceName):
@@ -23,5 +24,5 @@ if service.isStoreExist(workspaceName, layerName):
     service.deleteStore(workspaceName, layerName)
 
 # 发布图层  
-res = service.createTiffLayer(workspaceName, layerName, tiffPath)
+res = service.createTiffLayer(workspaceName, layerName, tiffPath, targetCrs=targetCrs)
 print(res)
\ No newline at end of file
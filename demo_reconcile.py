@@ -0,0 +1,29 @@
+# 演示案例：使用CatalogReconciler按目标状态文件同步geoserver目录，只发布发生变化的图层
+
+from GeoServerService import GeoServerService
+from CatalogReconciler import CatalogReconciler, formatPlan
+
+# 初始化服务
+url = "http://localhost:8080/geoserver/rest" # geoserver url
+username = "admin" # geoserver username
+password = "geoserver" # geoserver password
+
+service = GeoServerService(url, username, password)
+
+# 准备参数
+specPath = "catalog.json" # 目标状态文件路径，格式见CatalogReconciler的说明
+statePath = "catalog.state.json" # 指纹状态文件路径，记录已发布图层的源文件和参数
+workers = 4 # 并发执行的线程数
+dryRun = True # 为True时只打印计划，不修改geoserver
+
+reconciler = CatalogReconciler(service, statePath, workers)
+spec = reconciler.loadSpec(specPath)
+
+# 生成计划：对比目标状态与当前目录
+actions = reconciler.plan(spec)
+print(formatPlan(actions))
+
+# 执行计划，打印每个操作的结果
+if not dryRun:
+    actions = reconciler.apply(spec, actions, progress=lambda action, result: print(action["action"], action["workspace"], action["name"], result["status"], result["info"]))
+    print(formatPlan(actions))
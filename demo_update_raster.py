@@ -0,0 +1,34 @@
+# 演示案例：使用GeoServerService增量更新已发布的镶嵌数据集和金字塔图层，不删除和重新发布
+
+from GeoServerService import GeoServerService
+
+# 初始化服务
+url = "http://localhost:8080/geoserver/rest" # geoserver url
+username = "admin" # geoserver username
+password = "geoserver" # geoserver password
+
+service = GeoServerService(url, username, password)
+
+# 准备参数
+workspaceName = "test" # geoserver 工作空间名称
+mosaicLayerName = "mosaic_layer" # 已用createMosaicLayer发布的镶嵌数据集图层名称
+mosaicDir = "" # 镶嵌文件夹路径，新影像直接放入该文件夹
+retention = None # 额外删除的影像的CQL条件，例如"ingestion < 2024-01-01"只保留之后的影像，不需要时为None
+pyramidLayerName = "pyramid_tiff_layer" # 已用createPyramidTiffLayer发布的金字塔图层名称
+tiffPath = "" # 局部更新后的TIFF文件路径
+tiffDir = "" # 已发布的TIFF金字塔文件夹路径
+
+# 镶嵌数据集：只收集新增的影像，删除文件已不存在的影像
+res = service.updateMosaicLayer(workspaceName, mosaicLayerName, mosaicDir, filter=retention)
+print(res["status"], res["info"])
+if res["data"] is not None:
+    print("新增：{0}，删除：{1}".format(len(res["data"]["added"]), len(res["data"]["removed"])))
+    for error in res["data"]["errors"]:
+        print("跳过：{0}，{1}".format(error["path"], error["info"]))
+
+# 金字塔：只重新生成数据变化的切片，重建切片有增删的层级的索引
+res = service.updatePyramidTiffLayer(workspaceName, pyramidLayerName, tiffPath, tiffDir)
+print(res["status"], res["info"])
+if res["data"] is not None:
+    for level in res["data"]["levels"]:
+        print("第{0}级：重新生成{1}个切片，重建索引：{2}".format(level["level"], level["built"], level["indexed"]))
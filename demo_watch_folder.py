@@ -0,0 +1,33 @@
+# 演示案例：使用DirectoryWatcher监视投放文件夹，新增和变化的SHP、TIFF写入完成后自动发布
+
+from GeoServerService import GeoServerService
+from DirectoryWatcher import DirectoryWatcher
+
+# 初始化服务
+url = "http://localhost:8080/geoserver/rest" # geoserver url
+username = "admin" # geoserver username
+password = "geoserver" # geoserver password
+
+service = GeoServerService(url, username, password)
+
+# 准备参数
+workspaceName = "test" # geoserver 工作空间名称
+folders = [""] # 监视的文件夹路径列表，包括子文件夹
+statePath = "watch_state.json" # 已发布数据的指纹状态文件路径，重启后未变化的数据不会重新发布
+pyramidDir = "" # 金字塔文件夹的上级文件夹，不能位于监视的文件夹内，为空时使用状态文件旁的pyramids文件夹
+pyramidSize = 2 * 1024 * 1024 * 1024 # 大于等于该字节数的TIFF按金字塔发布
+settle = 5 # 文件最后一次变化后等待的秒数
+workers = 2 # 并发发布的线程数
+prune = False # 数据文件被删除时是否删除对应的图层
+
+# 检查工作空间是否存在，如果不存在，则创建
+if not service.isWorkspaceExist(workspaceName):
+    service.createWorkspace(workspaceName)
+
+watcher = DirectoryWatcher(service, folders, workspaceName, statePath, pyramidSize=pyramidSize, pyramidDir=pyramidDir or None,
+                           settle=settle, workers=workers, prune=prune,
+                           progress=lambda path, action, res: print(action, path, res["status"], res["info"]))
+print("监视方式：{0}".format("轮询" if watcher.polling else "watchdog"))
+
+# 持续监视，Ctrl+C停止
+watcher.run()
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+# 仓库的模块位于根目录，不是安装包
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from FakeGeoServer import FakeGeoServer
+
+
+@pytest.fixture
+def fakeServer():
+    """
+    本地启动的FakeGeoServer，测试结束后关闭
+    """
+
+    with FakeGeoServer() as fake:
+        yield fake
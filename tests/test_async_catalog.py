@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from geoserver.catalog import ConflictingDataError, FailedRequestError
+
+import StyleTemplates
+from AsyncGeoServerCatalog import AsyncGeoServerCatalog
+from AsyncGeoServerService import AsyncGeoServerService
+from FakeGeoServer import FakeGeoServer
+
+
+POLYGON = {"fill_color": "#AAAAAA", "outline_color": "#000000", "outline_width": 1}
+
+
+def _run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_catalogRoundTrip(fakeServer):
+    async def main():
+        async with AsyncGeoServerCatalog(fakeServer.url) as catalog:
+            workspace = await catalog.create_workspace("ws", "http://ws")
+            assert workspace["name"] == "ws"
+            assert [item["name"] for item in await catalog.get_workspaces()] == ["ws"]
+            assert await catalog.get_workspace("missing") is None
+
+            store = await catalog.create_coveragestore("dem", "ws", path="/data/dem.tif", layer_name="dem")
+            assert store["url"] == "file:/data/dem.tif"
+            with pytest.raises(ConflictingDataError):
+                await catalog.create_coveragestore("dem", "ws", path="/data/dem.tif")
+            assert [item["name"] for item in await catalog.get_stores("ws")] == ["dem"]
+            assert (await catalog.get_layer("ws:dem"))["defaultStyle"]["name"] == "raster"
+            assert await catalog.get_layer("ws:missing") is None
+
+            await catalog.delete("workspaces/ws/coveragestores/dem", recurse=True)
+            assert await catalog.get_store("dem", "ws") == (None, None)
+            with pytest.raises(FailedRequestError):
+                await catalog.delete("workspaces/ws/coveragestores/dem")
+
+    _run(main())
+    assert ("ws", "dem") not in fakeServer.layers
+
+
+def test_styles(fakeServer):
+    data = StyleTemplates.getStyleData("polygon", POLYGON)
+
+    async def main():
+        async with AsyncGeoServerCatalog(fakeServer.url) as catalog:
+            await catalog.create_workspace("ws", "http://ws")
+            assert (await catalog.create_style("grey", data, workspace="ws"))["name"] == "grey"
+            with pytest.raises(ConflictingDataError):
+                await catalog.create_style("grey", data, workspace="ws")
+            await catalog.create_style("grey", data + " ", overwrite=True, workspace="ws")
+            await catalog.create_style("global", data)
+            assert [item["name"] for item in await catalog.get_styles("ws")] == ["grey"]
+            assert "global" in [item["name"] for item in await catalog.get_styles()]
+
+    _run(main())
+    assert fakeServer.styles[("ws", "grey")]["body"] == (data + " ").encode("utf-8")
+    assert fakeServer.styles[(None, "global")]["body"] == data.encode("utf-8")
+
+
+def test_retryOnUnavailable():
+    """
+    502/503/504按退避重试，重试次数用完后返回最后的状态码
+    """
+
+    async def main(url):
+        async with AsyncGeoServerCatalog(url, retries=2, backoff_factor=0.001) as catalog:
+            with pytest.raises(FailedRequestError):
+                await catalog.get_workspaces()
+
+    with FakeGeoServer(errorRate=1, errorStatuses=(503,)) as fake:
+        _run(main(fake.url))
+        assert fake.stats()["byEndpoint"] == {"GET /geoserver/rest/workspaces": 3}
+
+
+def test_deleteStyle(fakeServer):
+    """
+    recurse为False时仍被图层使用的样式删除失败，全局样式按styles/样式名删除
+    """
+
+    data = StyleTemplates.getStyleData("polygon", POLYGON)
+
+    async def main():
+        async with AsyncGeoServerService(fakeServer.url, "admin", "geoserver") as service:
+            await service.createWorkspace("ws")
+            catalog = AsyncGeoServerCatalog(fakeServer.url)
+            async with catalog:
+                await catalog.create_coveragestore("dem", "ws", path="/data/dem.tif", layer_name="dem")
+                await catalog.create_style("grey", data, workspace="ws")
+                await catalog.create_style("shared", data)
+            fakeServer.layers[("ws", "dem")]["defaultStyle"] = ("ws", "grey")
+
+            with pytest.raises(FailedRequestError):
+                await service.deleteStyle("ws", "grey", recurse=False)
+            assert await service.isStyleExist("ws", "grey")
+            await service.deleteStyle("ws", "grey")
+            assert not await service.isStyleExist("ws", "grey")
+
+            await service.deleteStyle(None, "shared")
+            assert not await service.isStyleExist(None, "shared")
+
+    _run(main())
+    assert fakeServer.layers[("ws", "dem")]["defaultStyle"] == (None, "raster")
+    assert "DELETE /geoserver/rest/styles/{style}" in fakeServer.stats()["byEndpoint"]
@@ -0,0 +1,75 @@
+import os
+import random
+import subprocess
+import sys
+import time
+
+from GeoServerService import GeoServerService
+
+
+def _service():
+    # 发布函数被替换，不发送请求
+    return GeoServerService("http://127.0.0.1:9/geoserver/rest", "admin", "geoserver")
+
+
+def test_resultsFollowJobOrder():
+    """
+    任务完成的先后不定，结果列表仍与任务列表一一对应，失败的任务不影响其他任务
+    """
+
+    service = _service()
+    rnd = random.Random(1)
+
+    def createTiffLayer(workspaceName, layerName, tiffPath):
+        time.sleep(rnd.uniform(0, 0.02))
+        if workspaceName == "missing":
+            return {"status": "fail", "info": "工作空间不存在：{0}".format(workspaceName), "data": None}
+        return {"status": "success", "info": "", "data": layerName}
+
+    def createShapeLayer(workspaceName, layerName, shapePath, charset):
+        time.sleep(rnd.uniform(0, 0.02))
+        raise ConnectionError("reset")
+
+    service.createTiffLayer = createTiffLayer
+    service.createShapeLayer = createShapeLayer
+
+    jobs = []
+    for i in range(20):
+        name = "t{0}".format(i)
+        if i % 5 == 1:
+            jobs.append({"type": "tiff", "workspaceName": "missing", "layerName": name, "tiffPath": "/data/a.tif"})
+        elif i % 5 == 2:
+            jobs.append({"type": "shp", "workspaceName": "ws", "layerName": name, "shapePath": "/data/a.shp", "charset": "utf-8"})
+        elif i % 5 == 3:
+            jobs.append({"type": "unknown", "layerName": name})
+        else:
+            jobs.append({"type": "tiff", "workspaceName": "ws", "layerName": name, "tiffPath": "/data/a.tif"})
+
+    results = service.batchPublish(jobs, workers=6)
+
+    assert len(results) == len(jobs)
+    for i, (job, res) in enumerate(zip(jobs, results)):
+        if i % 5 == 1:
+            assert res["status"] == "fail" and res["info"].startswith("工作空间不存在")
+        elif i % 5 == 2:
+            assert res["status"] == "fail" and "ConnectionError" in res["info"]
+        elif i % 5 == 3:
+            assert res["status"] == "fail" and "unknown" in res["info"]
+        else:
+            assert res == {"status": "success", "info": "", "data": job["layerName"]}
+
+
+def test_emptyJobs():
+    assert _service().batchPublish([]) == []
+    assert _service().batchPublish(iter([])) == []
+
+
+def test_importWithoutGdal():
+    """
+    未安装GDAL时服务类仍可导入，依赖GDAL的模块在使用时才导入
+    """
+
+    code = "import sys; sys.modules['osgeo'] = None; import GeoServerService, AsyncGeoServerService; print(sorted(m for m in sys.modules if m.endswith('Builder')))"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True).stdout
+    assert out.strip() == "[]"
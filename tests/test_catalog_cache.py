@@ -0,0 +1,90 @@
+import threading
+import time
+
+from CatalogCache import CatalogCache
+
+
+def test_hitMissAndNegativeCache():
+    cache = CatalogCache(ttl=60)
+    assert cache.get(("layer", "ws", "a")) == (False, None)
+    cache.put(("layer", "ws", "a"), "A")
+    # None表示对象不存在，也是命中
+    cache.put(("layer", "ws", "b"), None)
+    assert cache.get(("layer", "ws", "a")) == (True, "A")
+    assert cache.get(("layer", "ws", "b")) == (True, None)
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_expiry():
+    cache = CatalogCache(ttl=0.05)
+    cache.put(("workspace", "ws"), "ws")
+    assert cache.get(("workspace", "ws")) == (True, "ws")
+    time.sleep(0.1)
+    assert cache.get(("workspace", "ws")) == (False, None)
+
+
+def test_zeroTtlDisablesCache():
+    cache = CatalogCache(ttl=0)
+    cache.put(("workspace", "ws"), "ws")
+    assert cache.get(("workspace", "ws")) == (False, None)
+
+
+def test_evictsLeastRecentlyUsed():
+    cache = CatalogCache(maxSize=2)
+    cache.put(("workspace", "a"), 1)
+    cache.put(("workspace", "b"), 2)
+    cache.get(("workspace", "a"))
+    cache.put(("workspace", "c"), 3)
+    assert cache.get(("workspace", "b")) == (False, None)
+    assert cache.get(("workspace", "a")) == (True, 1)
+    assert cache.get(("workspace", "c")) == (True, 3)
+
+
+def test_invalidatePrefix():
+    cache = CatalogCache()
+    cache.put(("layer", "ws", "a"), 1)
+    cache.put(("layer", "ws", "b"), 2)
+    cache.put(("layer", "other", "a"), 3)
+    cache.put(("store", "ws", "a"), 4)
+    cache.invalidatePrefix(("layer", "ws"))
+    assert cache.get(("layer", "ws", "a"))[0] is False
+    assert cache.get(("layer", "ws", "b"))[0] is False
+    assert cache.get(("layer", "other", "a")) == (True, 3)
+    assert cache.get(("store", "ws", "a")) == (True, 4)
+
+    cache.invalidate(("store", "ws", "a"))
+    assert cache.get(("store", "ws", "a"))[0] is False
+    cache.clear()
+    assert cache.get(("layer", "other", "a"))[0] is False
+
+
+def test_cachedCallsLoaderOnce():
+    cache = CatalogCache()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return "value"
+
+    assert cache.cached(("style", "ws", "s"), loader) == "value"
+    assert cache.cached(("style", "ws", "s"), loader) == "value"
+    assert len(calls) == 1
+
+
+def test_threadSafe():
+    cache = CatalogCache(maxSize=50)
+
+    def work(n):
+        for i in range(2000):
+            key = ("layer", "ws", str((n * 7 + i) % 80))
+            cache.put(key, i)
+            cache.get(key)
+            if i % 100 == 0:
+                cache.invalidatePrefix(("layer", "ws"))
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.hits + cache.misses == 4 * 2000
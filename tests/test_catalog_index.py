@@ -0,0 +1,56 @@
+from CatalogIndex import CatalogIndex
+from GeoServerCatalog import GeoServerCatalog
+from ShapefileIO import writePolygons
+from StreamingUpload import shapefileMembers
+
+
+def test_storeLinks(fakeServer, tmp_path):
+    """
+    图层按各存储的要素类型/栅格列表关联到所在的存储，有图层的存储不算空存储
+    """
+
+    shapePath = str(tmp_path / "roads.shp")
+    writePolygons(shapePath, [[(0, 0), (0, 1), (1, 1), (1, 0), (0, 0)]], [{"name": "ID", "type": "N", "length": 10}], [[1]])
+
+    catalog = GeoServerCatalog(fakeServer.url, "admin", "geoserver")
+    workspace = catalog.create_workspace("ws", "http://ws")
+    catalog.create_featurestore("roads", shapefileMembers("roads", shapePath), workspace, True, "UTF-8")
+    catalog.create_coveragestore("dem", workspace=workspace, path="/data/dem.tif", layer_name="dem")
+    store = catalog.create_datastore("empty", workspace)
+    store.connection_parameters.update(url="file:/data/empty")
+    catalog.save(store)
+
+    index = CatalogIndex.load(catalog, workers=2)
+    assert [layer["name"] for layer in index.layersOfStore("ws", "roads")] == ["roads"]
+    assert [layer["name"] for layer in index.layersOfStore("ws", "dem")] == ["dem"]
+    assert index.getLayer("ws", "roads")["kind"] == "featureType"
+    assert index.getLayer("ws", "dem")["kind"] == "coverage"
+    assert [store["name"] for store in index.emptyStores("ws")] == ["empty"]
+    assert index.getLayer("ws", "roads")["defaultStyle"] == (None, "polygon")
+    assert [layer["name"] for layer in index.layersUsingStyle("raster")] == ["dem"]
+    assert [style["name"] for style in index.unusedStyles()] == ["generic", "line", "point"]
+
+
+def test_hiddenLayerStyles(fakeServer):
+    """
+    不公开的图层不在WMS能力文档中，通过REST读取其样式并标记为hidden
+    """
+
+    catalog = GeoServerCatalog(fakeServer.url, "admin", "geoserver")
+    workspace = catalog.create_workspace("ws", "http://ws")
+    catalog.create_coveragestore("dem", workspace=workspace, path="/data/dem.tif", layer_name="dem")
+    catalog.create_coveragestore("hill", workspace=workspace, path="/data/hill.tif", layer_name="hill")
+    catalog.create_style("shade", "<StyledLayerDescriptor/>", workspace="ws", raw=True)
+    fakeServer.layers[("ws", "hill")]["defaultStyle"] = ("ws", "shade")
+    fakeServer.layers[("ws", "hill")]["advertised"] = False
+
+    index = CatalogIndex.load(catalog, workers=2)
+    assert index.getLayer("ws", "dem")["hidden"] is False
+    assert index.getLayer("ws", "hill")["hidden"] is True
+    assert index.getLayer("ws", "hill")["defaultStyle"] == ("ws", "shade")
+    assert [layer["name"] for layer in index.layersUsingStyle("shade", "ws")] == ["hill"]
+    assert "shade" not in [style["name"] for style in index.unusedStyles()]
+
+    index = CatalogIndex.load(catalog, workers=2, hidden=False)
+    assert index.getLayer("ws", "hill")["defaultStyle"] is None
+    assert "shade" in [style["name"] for style in index.unusedStyles()]
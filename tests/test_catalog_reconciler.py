@@ -0,0 +1,214 @@
+import json
+import threading
+
+import pytest
+
+from CatalogReconciler import CatalogReconciler, ReconcileError, formatPlan
+from GeoServerService import GeoServerService
+from ShapefileIO import writePolygons
+
+
+POLYGON = {"fill_color": "#AAAAAA", "outline_color": "#000000", "outline_width": 1}
+
+
+def _tiff(tmp_path, name):
+    path = tmp_path / (name + ".tif")
+    path.write_bytes(b"II*\0" + name.encode("ascii"))
+    return str(path)
+
+
+def _spec(tmp_path, prune=False):
+    return {"workspaces": {"ws": {
+        "prune": prune,
+        "styles": {"grey": {"type": "polygon", "paras": POLYGON}},
+        "layers": {
+            "a": {"type": "tiff", "tiffPath": _tiff(tmp_path, "a"), "style": "grey"},
+            "b": {"type": "tiff", "tiffPath": _tiff(tmp_path, "b")}
+        }
+    }}}
+
+
+def _plan(actions):
+    return [(a["action"], a["kind"], a["name"]) for a in actions]
+
+
+@pytest.fixture
+def service(fakeServer):
+    return GeoServerService(fakeServer.url, "admin", "geoserver", cacheTtl=0)
+
+
+def test_applyThenNothingToDo(service, fakeServer, tmp_path):
+    spec = _spec(tmp_path)
+    statePath = str(tmp_path / "state.json")
+    reconciler = CatalogReconciler(service, statePath, workers=2)
+
+    actions = reconciler.apply(spec)
+    assert _plan(actions) == [("create", "workspace", None), ("create", "style", "grey"),
+                              ("create", "layer", "a"), ("create", "layer", "b"), ("style", "layer", "a")]
+    assert all(a["result"]["status"] == "success" for a in actions), formatPlan(actions)
+    assert fakeServer.layers[("ws", "a")]["defaultStyle"] == ("ws", "grey")
+
+    with open(statePath, encoding="utf-8") as f:
+        state = json.load(f)
+    assert sorted(state["layers"]) == ["ws:a", "ws:b"]
+    assert sorted(state["styles"]) == ["ws:grey"]
+
+    # 重新加载状态文件后没有需要执行的操作
+    assert CatalogReconciler(service, statePath).plan(spec) == []
+    assert formatPlan([]) == "目录与目标状态一致，无需操作"
+
+
+def test_changedSourceIsUpdatedInPlace(service, fakeServer, tmp_path):
+    """
+    只有源文件变化时不删除图层，数据存储重新指向源文件并重置，默认样式保持不变
+    """
+
+    spec = _spec(tmp_path)
+    reconciler = CatalogReconciler(service, str(tmp_path / "state.json"))
+    reconciler.apply(spec)
+
+    path = spec["workspaces"]["ws"]["layers"]["a"]["tiffPath"]
+    with open(path, "ab") as f:
+        f.write(b"more")
+    actions = reconciler.plan(spec)
+    assert _plan(actions) == [("update", "layer", "a"), ("style", "layer", "a")]
+    assert actions[0]["inPlace"] and actions[0]["reason"] == "源文件变化，原位更新"
+
+    fakeServer.resetStats()
+    actions = reconciler.apply(spec)
+    assert [a["result"]["status"] for a in actions] == ["success", "success"]
+    assert not [key for key in fakeServer.stats()["byEndpoint"] if key.startswith("DELETE")]
+    assert fakeServer.granules[("ws", "a")]["resets"] == 1
+    assert fakeServer.layers[("ws", "a")]["defaultStyle"] == ("ws", "grey")
+    assert reconciler.plan(spec) == []
+
+
+def test_changedShapefileIsOverwritten(service, fakeServer, tmp_path):
+    shapePath = str(tmp_path / "roads.shp")
+    ring = [(0, 0), (0, 1), (1, 1), (1, 0), (0, 0)]
+    fields = [{"name": "ID", "type": "N", "length": 10}]
+    writePolygons(shapePath, [ring], fields, [[1]])
+    spec = {"workspaces": {"ws": {"layers": {"roads": {"type": "shp", "shapePath": shapePath, "charset": "UTF-8"}}}}}
+    reconciler = CatalogReconciler(service, str(tmp_path / "state.json"))
+    reconciler.apply(spec)
+
+    writePolygons(shapePath, [ring, ring], fields, [[1], [2]])
+    actions = reconciler.apply(spec)
+    assert [(a["action"], a["inPlace"], a["result"]["status"]) for a in actions] == [("update", True, "success")]
+    assert fakeServer.uploads == [("ws", "roads", None), ("ws", "roads", "overwrite")]
+    assert ("ws", "roads") in fakeServer.layers
+
+
+def test_changedParametersAreRepublished(service, fakeServer, tmp_path):
+    spec = _spec(tmp_path)
+    reconciler = CatalogReconciler(service, str(tmp_path / "state.json"))
+    reconciler.apply(spec)
+
+    layer = spec["workspaces"]["ws"]["layers"]["b"]
+    layer["tiffPath"] = _tiff(tmp_path, "b2")
+    actions = reconciler.plan(spec)
+    assert _plan(actions) == [("update", "layer", "b")]
+    assert not actions[0]["inPlace"] and actions[0]["reason"] == "发布参数变化"
+    actions = reconciler.apply(spec)
+    assert [a["result"]["status"] for a in actions] == ["success"]
+    assert fakeServer.stores[("ws", "b")]["url"] == "file:" + layer["tiffPath"]
+    assert reconciler.plan(spec) == []
+
+
+def test_concurrentSaveState(service, tmp_path):
+    """
+    多个线程同时保存状态文件时每次都写入完整的文件
+    """
+
+    statePath = str(tmp_path / "state.json")
+    reconciler = CatalogReconciler(service, statePath)
+    reconciler.state["layers"] = {"ws:{0}".format(i): "x" * 100 for i in range(200)}
+    errors = []
+
+    def save():
+        try:
+            for _ in range(20):
+                reconciler.saveState()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    with open(statePath, encoding="utf-8") as f:
+        assert len(json.load(f)["layers"]) == 200
+
+
+def test_adoptExistingLayer(service, fakeServer, tmp_path):
+    """
+    首次同步时已存在的图层只记录指纹，不重新发布
+    """
+
+    spec = _spec(tmp_path)
+    service.createWorkspace("ws")
+    service.createTiffLayer("ws", "b", "/data/old.tif")
+
+    reconciler = CatalogReconciler(service, str(tmp_path / "state.json"))
+    assert ("adopt", "layer", "b") in _plan(reconciler.plan(spec))
+    reconciler.apply(spec)
+    assert fakeServer.stores[("ws", "b")]["url"] == "file:/data/old.tif"
+
+    reconciler = CatalogReconciler(service, str(tmp_path / "other.json"), adopt=False)
+    assert ("update", "layer", "b") in _plan(reconciler.plan(spec))
+
+
+def test_prune(service, fakeServer, tmp_path):
+    spec = _spec(tmp_path, prune=True)
+    reconciler = CatalogReconciler(service, str(tmp_path / "state.json"))
+    reconciler.apply(spec)
+    service.createTiffLayer("ws", "extra", "/data/extra.tif")
+    service.createStyle("ws", "unused", "polygon", POLYGON)
+
+    assert _plan(reconciler.plan(spec)) == [("delete", "layer", "extra"), ("delete", "style", "unused")]
+    reconciler.apply(spec)
+    assert ("ws", "extra") not in fakeServer.layers
+    assert ("ws", "unused") not in fakeServer.styles
+    assert ("ws", "a") in fakeServer.layers
+
+
+def test_pruneKeepsReferencedStyles(service, fakeServer, tmp_path):
+    """
+    其他工作空间的图层以"工作空间:样式"引用的样式不删除；仍被图层使用的样式删除失败，不从图层中移除
+    """
+
+    spec = _spec(tmp_path, prune=True)
+    spec["workspaces"]["other"] = {"layers": {"c": {"type": "tiff", "tiffPath": _tiff(tmp_path, "c"), "style": "ws:shared"}}}
+    spec["workspaces"]["ws"]["layers"]["manual"] = {"type": "tiff", "tiffPath": _tiff(tmp_path, "manual")}
+    service.createWorkspace("ws")
+    service.createStyle("ws", "shared", "polygon", POLYGON)
+    service.createStyle("ws", "inUse", "polygon", POLYGON)
+    service.createTiffLayer("ws", "manual", "/data/manual.tif")
+    service.setLayerStyle("ws", "manual", "inUse", "ws")
+
+    actions = CatalogReconciler(service, str(tmp_path / "state.json")).apply(spec)
+    deletes = [(a["name"], a["result"]["status"]) for a in actions if a["action"] == "delete"]
+    assert deletes == [("inUse", "fail")]
+    assert ("ws", "shared") in fakeServer.styles
+    assert ("ws", "inUse") in fakeServer.styles
+    assert fakeServer.layers[("ws", "manual")]["defaultStyle"] == ("ws", "inUse")
+    assert fakeServer.layers[("other", "c")]["defaultStyle"] == ("ws", "shared")
+
+
+def test_missingSource(service, tmp_path):
+    spec = _spec(tmp_path)
+    spec["workspaces"]["ws"]["layers"]["c"] = {"type": "tiff", "tiffPath": str(tmp_path / "missing.tif")}
+    actions = CatalogReconciler(service, str(tmp_path / "state.json")).apply(spec)
+    failed = [a for a in actions if a["result"]["status"] != "success"]
+    assert _plan(failed) == [("error", "layer", "c")]
+
+
+def test_loadSpec(tmp_path):
+    path = tmp_path / "spec.json"
+    path.write_text(json.dumps({"workspaces": {"ws": {"layers": {"a": {"type": "wms"}}}}}), encoding="utf-8")
+    with pytest.raises(ReconcileError):
+        CatalogReconciler.loadSpec(str(path))
+    path.write_text(json.dumps(_spec(tmp_path)), encoding="utf-8")
+    assert CatalogReconciler.loadSpec(str(path))["workspaces"]["ws"]["prune"] is False
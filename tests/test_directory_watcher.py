@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import threading
+
+from DirectoryWatcher import DirectoryWatcher
+
+
+class _Service(object):
+    """
+    记录调用的GeoServerService替身
+    """
+    def __init__(self, layers=()):
+        self.layers = set(layers)
+        self.calls = []
+
+    def isLayerExist(self, workspaceName, layerName):
+        return (workspaceName, layerName) in self.layers
+
+    def publishJob(self, job):
+        self.calls.append(("publish", job["type"], job["layerName"]))
+        self.layers.add((job["workspaceName"], job["layerName"]))
+        return {"status": "success", "info": "", "data": None}
+
+    def updatePyramidTiffLayer(self, workspaceName, layerName, tiffPath, tiffDir):
+        self.calls.append(("updatePyramid", layerName))
+        return {"status": "success", "info": "", "data": None}
+
+    def deleteLayer(self, workspaceName, layerName):
+        self.calls.append(("deleteLayer", layerName))
+        self.layers.discard((workspaceName, layerName))
+
+    def deleteStore(self, workspaceName, storeName):
+        self.calls.append(("deleteStore", storeName))
+
+
+def _write(path, data=b"data"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def _watcher(tmp_path, service, **kwargs):
+    kwargs.setdefault("polling", True)
+    return DirectoryWatcher(service, [str(tmp_path / "drop")], "ws", str(tmp_path / "state.json"), **kwargs)
+
+
+def _waitFor(events, count, timeout=5):
+    deadline = time.monotonic() + timeout
+    while len(events) < count and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return events
+
+
+def test_dataPath(tmp_path):
+    watcher = _watcher(tmp_path, _Service())
+    drop = str(tmp_path / "drop")
+    assert watcher.dataPath(os.path.join(drop, "roads.dbf")) == os.path.join(drop, "roads.shp")
+    assert watcher.dataPath(os.path.join(drop, "dem.TIF")) == os.path.join(drop, "dem.TIF")
+    assert watcher.dataPath(os.path.join(drop, "dem.warped.tif")) is None
+    assert watcher.dataPath(os.path.join(drop, "notes.txt")) is None
+    assert watcher.dataPath(os.path.join(watcher.pyramidDir, "dem", "0", "a.tif")) is None
+
+
+def test_publishThenSkipUnchanged(tmp_path):
+    service = _Service()
+    key = _write(str(tmp_path / "drop" / "dem.tif"))
+    watcher = _watcher(tmp_path, service)
+
+    assert watcher.publish(key)[0] == "create"
+    assert watcher.publish(key)[0] == "skip"
+    with open(str(tmp_path / "state.json"), encoding="utf-8") as f:
+        assert key in json.load(f)["layers"]
+
+    # 重启后按状态文件跳过
+    assert _watcher(tmp_path, service).publish(key)[0] == "skip"
+    assert service.calls == [("publish", "tiff", "dem")]
+
+
+def test_changedDataIsRepublished(tmp_path):
+    service = _Service()
+    key = _write(str(tmp_path / "drop" / "dem.tif"))
+    watcher = _watcher(tmp_path, service)
+    watcher.publish(key)
+    _write(key, b"changed data")
+
+    assert watcher.publish(key)[0] == "update"
+    assert service.calls[1:] == [("deleteLayer", "dem"), ("deleteStore", "dem"), ("publish", "tiff", "dem")]
+
+
+def test_changedPyramidIsUpdated(tmp_path):
+    service = _Service()
+    key = _write(str(tmp_path / "drop" / "big.tif"))
+    watcher = _watcher(tmp_path, service, pyramidSize=1)
+    assert watcher.job(key)["tiffDir"] == os.path.join(watcher.pyramidDir, "big")
+    watcher.publish(key)
+    _write(key, b"changed data")
+
+    assert watcher.publish(key)[0] == "update"
+    assert service.calls == [("publish", "pyramid", "big"), ("updatePyramid", "big")]
+
+
+def test_adoptExistingLayer(tmp_path):
+    service = _Service(layers=[("ws", "dem")])
+    key = _write(str(tmp_path / "drop" / "dem.tif"))
+
+    assert _watcher(tmp_path, service, adopt=False).publish(key)[0] == "update"
+    os.remove(str(tmp_path / "state.json"))
+    service.calls = []
+    assert _watcher(tmp_path, service).publish(key)[0] == "adopt"
+    assert service.calls == []
+
+
+def test_prune(tmp_path):
+    service = _Service()
+    key = _write(str(tmp_path / "drop" / "dem.tif"))
+    _watcher(tmp_path, service).publish(key)
+    os.remove(key)
+
+    assert _watcher(tmp_path, service).publish(key)[0] == "skip"
+    watcher = _watcher(tmp_path, service, prune=True)
+    assert watcher.publish(key)[0] == "delete"
+    assert service.layers == set()
+    assert watcher.state["layers"] == {}
+
+
+def test_waitForSettledShapefile(tmp_path):
+    """
+    shapefile的必需文件（.prj除外）到齐且不再变化后才发布，同一数据只发布一次
+    """
+
+    service = _Service()
+    events = []
+    lock = threading.Lock()
+
+    def progress(path, action, res):
+        with lock:
+            events.append((os.path.basename(path), action))
+
+    base = str(tmp_path / "drop" / "sub" / "roads")
+    for ext in (".shp", ".dbf"):
+        _write(base + ext)
+    watcher = _watcher(tmp_path, service, settle=0.1, pollInterval=0.05, progress=progress)
+    with watcher:
+        time.sleep(0.5)
+        assert events == []
+        _write(base + ".shx")
+        _waitFor(events, 1)
+        _write(str(tmp_path / "drop" / "dem.tif"))
+        _waitFor(events, 2)
+    assert sorted(events) == [("dem.tif", "create"), ("roads.shp", "create")]
+    assert sorted(service.calls) == [("publish", "shp", "sub_roads"), ("publish", "tiff", "dem")]
+    assert watcher.idle()
+
+
+def test_incompleteShapefileIsDropped(tmp_path):
+    events = []
+    base = str(tmp_path / "drop" / "roads")
+    for ext in (".shp", ".dbf", ".prj"):
+        _write(base + ext)
+    watcher = _watcher(tmp_path, _Service(), settle=0.05, pollInterval=0.05, incompleteTimeout=0.2,
+                       progress=lambda path, action, res: events.append((action, res["info"])))
+    with watcher:
+        _waitFor(events, 1)
+        assert watcher.idle()
+    assert events == [("incomplete", "shapefile缺少必需文件：.shx")]
+
+
+def test_layerNamesAreRelative(tmp_path):
+    service = _Service()
+    first = _write(str(tmp_path / "drop" / "a" / "roads.shp"))
+    second = _write(str(tmp_path / "drop" / "b" / "roads.shp"))
+    watcher = _watcher(tmp_path, service)
+
+    assert watcher.layerNameOf(first) == "a_roads"
+    assert watcher.publish(first)[0] == "create"
+    assert watcher.publish(second)[0] == "create"
+    assert service.calls == [("publish", "shp", "a_roads"), ("publish", "shp", "b_roads")]
+    with open(str(tmp_path / "state.json"), encoding="utf-8") as f:
+        assert json.load(f)["layers"][first]["layer"] == "a_roads"
+
+
+def test_nameConflictIsNotPublished(tmp_path):
+    """
+    不同监视文件夹中的同名数据使用同一个图层名称，后发布的数据按conflict跳过，不会记录到已有的图层上
+    """
+
+    service = _Service()
+    first = _write(str(tmp_path / "drop" / "roads.tif"))
+    second = _write(str(tmp_path / "other" / "roads.tif"))
+    watcher = DirectoryWatcher(service, [str(tmp_path / "drop"), str(tmp_path / "other")], "ws", str(tmp_path / "state.json"), polling=True)
+
+    assert watcher.publish(first)[0] == "create"
+    action, res = watcher.publish(second)
+    assert action == "conflict"
+    assert res["status"] == "fail"
+    assert second not in watcher.state["layers"]
+    assert service.calls == [("publish", "tiff", "roads")]
+
+    # 删除第一个数据的文件不影响第二个数据
+    os.remove(first)
+    watcher.prune = True
+    assert watcher.publish(first)[0] == "delete"
+    assert watcher.publish(second)[0] == "create"
+
+
+def test_concurrentSaveState(tmp_path):
+    """
+    多个发布线程同时保存状态文件时每次都写入完整的文件
+    """
+
+    watcher = _watcher(tmp_path, _Service())
+    watcher.state["layers"] = {"/data/{0}.tif".format(i): {"layer": str(i), "fingerprint": [["x", 1, 1]]} for i in range(200)}
+    errors = []
+
+    def save():
+        try:
+            for _ in range(20):
+                watcher.saveState()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    with open(str(tmp_path / "state.json"), encoding="utf-8") as f:
+        assert len(json.load(f)["layers"]) == 200
@@ -0,0 +1,91 @@
+import time
+
+import requests
+
+from FakeGeoServer import FakeGeoServer
+from GeoServerCatalog import GeoServerCatalog
+
+
+def test_catalogRoundTrip(fakeServer, tmp_path):
+    """
+    gsconfig按真实geoserver的格式解析FakeGeoServer的响应
+    """
+
+    catalog = GeoServerCatalog(fakeServer.url, "admin", "geoserver")
+    assert catalog.get_version() == "2.24.0"
+    workspace = catalog.create_workspace("ws", "http://ws")
+    assert [ws.name for ws in catalog.get_workspaces()] == ["ws"]
+
+    catalog.create_coveragestore("dem", workspace=workspace, path="/data/dem.tif", layer_name="dem")
+    assert catalog.get_store("dem", "ws").type == "GeoTIFF"
+    layer = catalog.get_layer("ws:dem")
+    assert layer.default_style.name == "raster"
+    assert fakeServer.layers[("ws", "dem")]["defaultStyle"] == (None, "raster")
+
+    catalog.create_style("red", b"<StyledLayerDescriptor/>", workspace="ws")
+    assert fakeServer.styles[("ws", "red")]["body"] == b"<StyledLayerDescriptor/>"
+    layer.default_style = catalog.get_style("red", "ws")
+    catalog.save(layer)
+    assert fakeServer.layers[("ws", "dem")]["defaultStyle"] == ("ws", "red")
+
+    catalog.delete(catalog.get_layer("ws:dem"))
+    assert ("ws", "dem") not in fakeServer.layers
+
+
+def test_notFoundAndConflict(fakeServer):
+    session = requests.Session()
+    session.auth = ("admin", "geoserver")
+    assert session.get(fakeServer.url + "/workspaces/missing.json").status_code == 404
+    assert session.post(fakeServer.url + "/workspaces", data="<workspace><name>ws</name></workspace>",
+                        headers={"Content-Type": "application/xml"}).status_code == 201
+    assert session.post(fakeServer.url + "/workspaces", data="<workspace><name>ws</name></workspace>",
+                        headers={"Content-Type": "application/xml"}).status_code == 409
+    assert session.get(fakeServer.url + "/workspaces/ws/datastores/missing.json").status_code == 404
+
+
+def test_errorInjection():
+    with FakeGeoServer(errorRate=1.0, errorStatuses=(503,)) as fake:
+        resp = requests.post(fake.url + "/workspaces", data="<workspace><name>ws</name></workspace>",
+                             headers={"Content-Type": "application/xml"})
+        assert resp.status_code == 503
+        # 注入错误的请求不修改目录
+        assert fake.workspaces == {}
+        stats = fake.stats()
+        assert stats["injectedErrors"] == 1
+        assert stats["byEndpoint"] == {"POST /geoserver/rest/workspaces": 1}
+
+
+def test_rateLimit():
+    with FakeGeoServer(rateLimit=5) as fake:
+        statuses = [requests.get(fake.url + "/workspaces.json").status_code for i in range(10)]
+        assert statuses.count(429) > 0
+        assert fake.stats()["limited"] == statuses.count(429)
+
+    # 排队而不是拒绝
+    with FakeGeoServer(rateLimit=20, rateLimitStatus=None) as fake:
+        start = time.monotonic()
+        statuses = [requests.get(fake.url + "/workspaces.json").status_code for i in range(30)]
+        assert statuses == [200] * 30
+        assert time.monotonic() - start >= 0.4
+
+
+def test_latency():
+    with FakeGeoServer(latency=0.05) as fake:
+        start = time.monotonic()
+        requests.get(fake.url + "/about/version.json")
+        assert time.monotonic() - start >= 0.05
+
+
+def test_resourceListHrefs(fakeServer):
+    """
+    与geoserver一致，工作空间级的要素类型和栅格列表的链接按请求路径生成，不包含存储名称
+    """
+
+    catalog = GeoServerCatalog(fakeServer.url, "admin", "geoserver")
+    workspace = catalog.create_workspace("ws", "http://ws")
+    catalog.create_coveragestore("dem", workspace=workspace, path="/data/dem.tif", layer_name="dem")
+
+    workspaceList = requests.get(fakeServer.url + "/workspaces/ws/coverages.json").json()["coverages"]["coverage"]
+    storeList = requests.get(fakeServer.url + "/workspaces/ws/coveragestores/dem/coverages.json").json()["coverages"]["coverage"]
+    assert workspaceList == [{"name": "dem", "href": fakeServer.url + "/workspaces/ws/coverages/dem.xml"}]
+    assert storeList == [{"name": "dem", "href": fakeServer.url + "/workspaces/ws/coveragestores/dem/coverages/dem.xml"}]
@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from GeoServerCatalog import GeoServerCatalog
+from GwcSeeder import GwcSeeder, SeedError
+
+
+@pytest.fixture
+def seeder(fakeServer):
+    return GwcSeeder(GeoServerCatalog(fakeServer.url, "admin", "geoserver"))
+
+
+def test_statusParsesLongArrayArray(seeder):
+    """
+    long-array-array的每一行为[已完成, 总数, 剩余秒数, 任务编号, 状态]
+    """
+
+    seeder.seed("ws:roads", 0, 2)
+    assert seeder.status("ws:roads") == [{"id": 1, "status": "running", "done": 0, "total": 2, "remaining": 1}]
+    assert seeder.status("ws:roads") == [{"id": 1, "status": "running", "done": 1, "total": 2, "remaining": 1}]
+    # 完成的任务从列表中移除
+    assert seeder.status("ws:roads") == []
+
+
+def test_waitFinishesTasks(seeder):
+    seeder.seed("ws:roads", 0, 2)
+    polls = []
+    tasks = seeder.wait("ws:roads", interval=0, progress=polls.append)
+    assert tasks == [{"id": 1, "status": "done", "done": 2, "total": 2, "remaining": 0}]
+    assert len(polls) == 3
+
+
+def test_cancelKillsTasks(seeder, fakeServer):
+    seeder.seed("ws:roads", 0, 2)
+    seeder.cancel("ws:roads")
+    assert "ws:roads" not in fakeServer.seeds
+    assert seeder.status("ws:roads") == []
+
+
+def test_waitCancelEvent(seeder, fakeServer):
+    seeder.seed("ws:roads", 0, 2)
+    cancel = threading.Event()
+    cancel.set()
+    tasks = seeder.wait("ws:roads", interval=0, cancel=cancel)
+    assert [task["status"] for task in tasks] == ["aborted"]
+    assert "ws:roads" not in fakeServer.seeds
+
+
+def test_waitTimeoutCancelsTasks(seeder, fakeServer):
+    """
+    超时后中止任务并抛出SeedError
+    """
+
+    seeder.seed("ws:roads", 0, 2)
+    with pytest.raises(SeedError):
+        seeder.wait("ws:roads", interval=0.05, timeout=0.01)
+    assert "ws:roads" not in fakeServer.seeds
+
+
+def test_bboxNeedsSrs(seeder, fakeServer):
+    with pytest.raises(SeedError):
+        seeder.seed("ws:roads", gridSet="GoogleMapsCompatible", bbox=(0, 0, 1, 1))
+    assert "ws:roads" not in fakeServer.seeds
+    seeder.seed("ws:roads", gridSet="GoogleMapsCompatible", bbox=(0, 0, 1, 1), srs=3857)
+    assert "ws:roads" in fakeServer.seeds
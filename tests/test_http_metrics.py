@@ -0,0 +1,118 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from GeoServerCatalog import GeoServerCatalog
+from HttpMetrics import HttpMetrics, endpointOf
+from ShapefileIO import writePolygons
+from StreamingUpload import shapefileMembers
+
+
+def test_endpointOf():
+    assert endpointOf("http://h/geoserver/rest/workspaces/test/coveragestores/a.xml") == "/geoserver/rest/workspaces/{workspace}/coveragestores/{store}"
+    assert endpointOf("http://h/geoserver/rest/workspaces/test/datastores/r/featuretypes/r.json?quietOnNotFound=true") == \
+        "/geoserver/rest/workspaces/{workspace}/datastores/{store}/featuretypes/{resource}"
+    assert endpointOf("http://h/geoserver/rest/layers/test:roads") == "/geoserver/rest/layers/{layer}"
+    assert endpointOf("http://h/geoserver/rest/workspaces.json") == "/geoserver/rest/workspaces"
+
+
+def test_recordAndSnapshot():
+    metrics = HttpMetrics(buckets=(0.1, 1.0))
+    metrics.record("GET", "http://h/geoserver/rest/workspaces/a.xml", 200, 0.05, received=100)
+    metrics.record("GET", "http://h/geoserver/rest/workspaces/b.xml", 404, 0.5, received=20)
+    metrics.record("PUT", "http://h/geoserver/rest/styles/s", 200, 2.0, sent=300, retryStatuses=(503, "error"))
+
+    snapshot = metrics.snapshot()
+    latency = {(item["method"], item["endpoint"]): item for item in snapshot["latency"]}
+    get = latency[("GET", "/geoserver/rest/workspaces/{workspace}")]
+    assert get["count"] == 2
+    assert get["sum"] == pytest.approx(0.55)
+    # 直方图为累计次数
+    assert get["buckets"] == {0.1: 1, 1.0: 2}
+    assert latency[("PUT", "/geoserver/rest/styles/{style}")]["buckets"] == {0.1: 0, 1.0: 0}
+    assert [(item["status"], item["count"]) for item in snapshot["requests"] if item["method"] == "GET"] == [("200", 1), ("404", 1)]
+    assert snapshot["retries"] == {"total": 2, "byStatus": {"503": 1, "error": 1}}
+    assert snapshot["bytes"] == {"sent": 300, "received": 120}
+
+    text = metrics.prometheus()
+    assert 'geoserver_client_request_duration_seconds_bucket{method="GET",endpoint="/geoserver/rest/workspaces/{workspace}",le="+Inf"} 2' in text
+    assert 'geoserver_client_retries_total{status="503"} 1' in text
+    assert 'geoserver_client_bytes_total{direction="sent"} 300' in text
+
+    metrics.reset()
+    assert metrics.snapshot()["requests"] == []
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    failures = {}
+
+    def log_message(self, *args):
+        pass
+
+    def __reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        # 每个路径的前failures次请求返回503
+        remaining = self.failures.get(self.path, 0)
+        if remaining > 0:
+            self.failures[self.path] = remaining - 1
+            status = 503
+        else:
+            status = 200
+        body = b'{"workspaces": ""}'
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = __reply
+    do_PUT = __reply
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{0}/geoserver/rest".format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_catalogSessionIsInstrumented(server):
+    _Handler.failures = {"/geoserver/rest/workspaces/b.json": 2}
+    metrics = HttpMetrics()
+    catalog = GeoServerCatalog(server, "admin", "geoserver", backoff_factor=0.001, metrics=metrics)
+    for i in range(3):
+        catalog.http_request(server + "/workspaces/a.json")
+    catalog.http_request(server + "/workspaces/b.json")
+    catalog.http_request(server + "/styles/s", data=b"x" * 50, method="put")
+
+    snapshot = metrics.snapshot()
+    requests = {(item["method"], item["endpoint"], item["status"]): item["count"] for item in snapshot["requests"]}
+    assert requests == {("GET", "/geoserver/rest/workspaces/{workspace}", "200"): 4, ("PUT", "/geoserver/rest/styles/{style}", "200"): 1}
+    assert snapshot["retries"] == {"total": 2, "byStatus": {"503": 2}}
+    assert snapshot["bytes"]["sent"] == 50
+    assert snapshot["bytes"]["received"] == 5 * len(b'{"workspaces": ""}')
+    # 保持长连接，后续请求复用连接
+    assert snapshot["connections"]["reused"] > 0
+
+
+def test_chunkedUploadIsCounted(fakeServer, tmp_path):
+    """
+    分块传输的ZipStream没有Content-Length，发送的字节数从其上传统计中读取
+    """
+
+    shapePath = str(tmp_path / "roads.shp")
+    writePolygons(shapePath, [[(0, 0), (0, 1), (1, 1), (1, 0), (0, 0)]], [{"name": "ID", "type": "N", "length": 10}], [[1]])
+    sizes = []
+    metrics = HttpMetrics()
+    catalog = GeoServerCatalog(fakeServer.url, "admin", "geoserver", metrics=metrics)
+    workspace = catalog.create_workspace("ws", "http://ws")
+    metrics.reset()
+    catalog.create_featurestore("roads", shapefileMembers("roads", shapePath), workspace, True, "UTF-8", progress=lambda sent, total, rate: sizes.append(sent))
+
+    assert sizes and metrics.snapshot()["bytes"]["sent"] == sizes[-1]
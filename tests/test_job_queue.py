@@ -0,0 +1,180 @@
+
+
+import sqlite3
+import time
+
+from JobQueue import JobQueue
+
+
+class _Service(object):
+    """
+    记录调用的GeoServerService替身，publishJob按failures依次返回失败
+    """
+    def __init__(self, layers=(), failures=()):
+        self.layers = set(layers)
+        self.failures = list(failures)
+        self.deleted = []
+        self.calls = 0
+
+    def isLayerExist(self, workspaceName, layerName):
+        return (workspaceName, layerName) in self.layers
+
+    def isStoreExist(self, workspaceName, storeName):
+        return (workspaceName, storeName) in self.layers
+
+    def deleteLayer(self, workspaceName, layerName):
+        self.deleted.append((workspaceName, layerName))
+        self.layers.discard((workspaceName, layerName))
+
+    def deleteStore(self, workspaceName, storeName):
+        pass
+
+    def publishJob(self, job):
+        self.calls += 1
+        key = (job["workspaceName"], job["layerName"])
+        if key in self.layers:
+            return {"status": "fail", "info": "图层已存在：{0}".format(job["layerName"]), "data": None}
+        if self.failures:
+            error = self.failures.pop(0)
+            if error == "partial":
+                # 创建了数据存储后失败
+                self.layers.add(key)
+            return {"status": "fail", "info": "timeout", "data": None}
+        self.layers.add(key)
+        return {"status": "success", "info": "", "data": None}
+
+
+def _queue(tmp_path, service, **kwargs):
+    kwargs.setdefault("backoff", 0)
+    return JobQueue(str(tmp_path / "queue.db"), service, **kwargs)
+
+
+def _tiff(layerName, workspaceName="ws"):
+    return {"type": "tiff", "workspaceName": workspaceName, "layerName": layerName, "tiffPath": "/data/a.tif"}
+
+
+def test_retryDeletesOnlyWhatThisJobCreated(tmp_path):
+    service = _Service(failures=["partial"])
+    queue = _queue(tmp_path, service)
+    jobId = queue.submit(_tiff("t"))
+
+    queue.runOnce()
+    assert queue.get(jobId)["status"] == "pending"
+    assert queue.get(jobId)["created"] == 1
+    queue.runOnce()
+    assert queue.get(jobId)["status"] == "success"
+    assert service.deleted == [("ws", "t")]
+
+
+def test_retryKeepsExistingLayer(tmp_path):
+    """
+    第一次执行在检查图层前出错，重试时同名图层属于其他程序，不能删除
+    """
+
+    service = _Service(layers=[("ws", "t")])
+    checks = []
+    isLayerExist = service.isLayerExist
+
+    def flaky(workspaceName, layerName):
+        checks.append(layerName)
+        if len(checks) == 1:
+            raise ConnectionError("reset")
+        return isLayerExist(workspaceName, layerName)
+
+    service.isLayerExist = flaky
+    queue = _queue(tmp_path, service)
+    jobId = queue.submit(_tiff("t"))
+
+    queue.runOnce()
+    assert queue.get(jobId)["status"] == "pending"
+    queue.runOnce()
+    job = queue.get(jobId)
+    assert job["status"] == "failed"
+    assert job["info"].startswith("图层已存在")
+    assert job["created"] == 0
+    assert service.deleted == []
+    assert ("ws", "t") in service.layers
+
+
+def test_claimOrder(tmp_path):
+    """
+    优先级高的先领取，工作空间执行中的任务数达到上限时跳过该工作空间
+    """
+
+    queue = _queue(tmp_path, _Service(), workspaceLimit=1)
+    low = queue.submit(_tiff("low", "a"))
+    high = queue.submit(_tiff("high", "a"), priority=5)
+    other = queue.submit(_tiff("other", "b"))
+    later = queue.submit(_tiff("later", "c"), priority=9, delay=3600)
+
+    first = queue.claim()
+    assert first["id"] == high
+    assert first["attempts"] == 1
+    assert queue.claim()["id"] == other
+    assert queue.claim() is None
+    assert queue.complete(first, {"status": "success", "info": "", "data": None}) == "success"
+    assert queue.claim()["id"] == low
+    assert queue.get(later)["status"] == "pending"
+
+
+def test_expiredLeaseIsReclaimed(tmp_path):
+    """
+    领取任务的进程崩溃后租约过期，任务被其他进程重新领取，原进程不能再提交结果
+    """
+
+    crashed = _queue(tmp_path, _Service(), lease=0.1)
+    jobId = crashed.submit(_tiff("t"))
+    job = crashed.claim()
+    time.sleep(0.2)
+
+    queue = _queue(tmp_path, _Service())
+    again = queue.claim()
+    assert again["id"] == jobId
+    assert again["attempts"] == 2
+    assert again["owner"] == queue.owner
+    assert crashed.complete(job, {"status": "success", "info": "", "data": None}) is None
+    assert queue.complete(again, {"status": "success", "info": "", "data": None}) == "success"
+
+
+def test_expiredLeaseWithoutAttemptsLeftFails(tmp_path):
+    crashed = _queue(tmp_path, _Service(), lease=0.1)
+    jobId = crashed.submit(_tiff("t"), maxAttempts=1)
+    crashed.claim()
+    time.sleep(0.2)
+
+    assert _queue(tmp_path, _Service()).recover() == 0
+    assert crashed.get(jobId)["status"] == "failed"
+
+
+def test_retryBackoff(tmp_path):
+    """
+    第n次失败后等待backoff×2^(n-1)秒，不超过maxBackoff，并随机缩短到0.5~1倍
+    """
+
+    dbPath = str(tmp_path / "queue.db")
+    queue = _queue(tmp_path, _Service(), backoff=10, maxBackoff=25, maxAttempts=4)
+    jobId = queue.submit(_tiff("t"))
+    for delay in (10, 20, 25):
+        job = queue.claim()
+        start = time.time()
+        assert queue.complete(job, {"status": "fail", "info": "timeout", "data": None}) == "pending"
+        runAt = queue.get(jobId)["runAt"]
+        assert start + delay * 0.5 <= runAt <= time.time() + delay
+        assert queue.claim() is None
+        # 跳过等待时间
+        conn = sqlite3.connect(dbPath)
+        with conn:
+            conn.execute("UPDATE jobs SET runAt = 0 WHERE id = ?", (jobId,))
+        conn.close()
+
+    job = queue.claim()
+    assert job["attempts"] == 4
+    assert queue.complete(job, {"status": "fail", "info": "timeout", "data": None}) == "failed"
+
+
+def test_permanentErrorIsNotRetried(tmp_path):
+    queue = _queue(tmp_path, _Service())
+    jobId = queue.submit(_tiff("t"))
+    job = queue.claim()
+    assert queue.complete(job, {"status": "fail", "info": "工作空间不存在：ws", "data": None}) == "failed"
+    assert queue.get(jobId)["attempts"] == 1
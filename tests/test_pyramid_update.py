@@ -0,0 +1,48 @@
+import numpy
+import pytest
+
+gdal = pytest.importorskip("osgeo.gdal")
+osr = pytest.importorskip("osgeo.osr")
+
+from GeoServerService import GeoServerService
+
+
+SIZE = 2048
+BLOCK = 256
+
+
+def _writeSource(path, data):
+    ds = gdal.GetDriverByName("GTiff").Create(path, SIZE, SIZE, 1, gdal.GDT_UInt16)
+    ds.SetGeoTransform((500000.0, 1.0, 0.0, 4000000.0, 0.0, -1.0))
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(32650)
+    ds.SetProjection(srs.ExportToWkt())
+    ds.GetRasterBand(1).SetNoDataValue(0)
+    ds.GetRasterBand(1).WriteArray(data)
+    ds = None
+
+
+def test_oneBlockChangeRebuildsOnlyItsTiles(fakeServer, tmp_path):
+    """
+    非Byte的源影像按默认的百分比拉伸切片，一个块变化后只重新生成该块的切片及其上层切片
+    """
+
+    tiffPath = str(tmp_path / "src.tif")
+    tiffDir = str(tmp_path / "pyramid")
+    data = numpy.random.RandomState(1).randint(1, 4000, (SIZE, SIZE)).astype(numpy.uint16)
+    _writeSource(tiffPath, data)
+
+    service = GeoServerService(fakeServer.url, "admin", "geoserver")
+    service.createWorkspace("ws")
+    res = service.createPyramidTiffLayer("ws", "p", tiffPath, tiffDir, levels=2, blockWidth=BLOCK, blockHeight=BLOCK, workers=2)
+    assert res["status"] == "success", res["info"]
+
+    # 修改第3行第5列的块，数值超出原拉伸范围，重新统计时百分比会变化
+    data[3 * BLOCK:4 * BLOCK, 5 * BLOCK:6 * BLOCK] = 60000
+    _writeSource(tiffPath, data)
+
+    res = service.updatePyramidTiffLayer("ws", "p", tiffPath, tiffDir, workers=2)
+    assert res["status"] == "success", res["info"]
+    assert [(level["level"], level["built"]) for level in res["data"]["levels"]] == [(0, 1), (1, 1), (2, 1)]
+    assert res["data"]["reset"]
+    assert fakeServer.granules[("ws", "p")]["resets"] == 1
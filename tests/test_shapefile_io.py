@@ -0,0 +1,154 @@
+import struct
+
+import pytest
+
+from ShapefileIO import ShapefileError, ShapefileReader, buildIndex, buildIndexes
+
+
+def _writeShapefile(base, rings, names):
+    """
+    写出多边形shapefile，dbf只有一个字符字段NAME
+    """
+
+    contents = []
+    for ring in rings:
+        xs, ys = zip(*ring)
+        bbox = (min(xs), min(ys), max(xs), max(ys))
+        points = b"".join(struct.pack("<2d", x, y) for x, y in ring)
+        contents.append(struct.pack("<i4d3i", 5, *bbox, 1, len(ring), 0) + points)
+    xs = [x for ring in rings for x, y in ring]
+    ys = [y for ring in rings for x, y in ring]
+    extent = (min(xs), min(ys), max(xs), max(ys))
+
+    def header(words):
+        return struct.pack(">7i", 9994, 0, 0, 0, 0, 0, words) + struct.pack("<2i8d", 1000, 5, *extent, 0, 0, 0, 0)
+
+    with open(base + ".shp", "wb") as shp, open(base + ".shx", "wb") as shx:
+        shp.write(header(50 + sum(4 + len(content) // 2 for content in contents)))
+        shx.write(header(50 + 4 * len(contents)))
+        offset = 50
+        for i, content in enumerate(contents):
+            shp.write(struct.pack(">2i", i + 1, len(content) // 2) + content)
+            shx.write(struct.pack(">2i", offset, len(content) // 2))
+            offset += 4 + len(content) // 2
+
+    with open(base + ".dbf", "wb") as dbf:
+        dbf.write(struct.pack("<4BIHH20x", 3, 124, 1, 1, len(names), 65, 21))
+        dbf.write(struct.pack("<11sc4xBB14x", b"NAME", b"C", 20, 0))
+        dbf.write(b"\x0D")
+        for name in names:
+            dbf.write(b" " + name.encode("utf-8").ljust(20))
+        dbf.write(b"\x1A")
+    with open(base + ".cpg", "w") as f:
+        f.write("UTF-8")
+
+
+def _square(x, y, size):
+    # 顺时针的外环
+    return [(x, y), (x, y + size), (x + size, y + size), (x + size, y), (x, y)]
+
+
+def _writeGrid(tmp_path, name="grid"):
+    """
+    8×8个边长0.5的小方块，以及一个覆盖全部范围的大方块
+    """
+
+    rings = [_square(x * 0.5, y * 0.5, 0.5) for y in range(8) for x in range(8)] + [_square(0, 0, 4)]
+    base = str(tmp_path / name)
+    _writeShapefile(base, rings, ["格子{0}".format(i) for i in range(64)] + ["全部"])
+    return base + ".shp", rings
+
+
+def _readNode(data, pos):
+    """
+    按先序读取.qix的节点
+    return (节点 {rect, ids, children}, 下一个节点的位置)
+    """
+
+    offset, minx, miny, maxx, maxy, count = struct.unpack_from("<i4di", data, pos)
+    pos += 40
+    ids = list(struct.unpack_from("<{0}i".format(count), data, pos))
+    pos += 4 * count
+    numChildren, = struct.unpack_from("<i", data, pos)
+    pos += 4
+    start = pos
+    children = []
+    for i in range(numChildren):
+        child, pos = _readNode(data, pos)
+        children.append(child)
+    # 偏移量为全部子孙节点的字节数
+    assert pos - start == offset
+    return {"rect": (minx, miny, maxx, maxy), "ids": ids, "children": children}, pos
+
+
+def _walk(node, depth=1):
+    yield node, depth
+    for child in node["children"]:
+        for item in _walk(child, depth + 1):
+            yield item
+
+
+def test_reader(tmp_path):
+    shapePath, rings = _writeGrid(tmp_path)
+
+    reader = ShapefileReader(shapePath)
+    assert reader.charset == "UTF-8"
+    assert reader.geometryType == "Polygon"
+    assert reader.featureCount == 65
+    assert reader.extent == (0.0, 0.0, 4.0, 4.0)
+    assert reader.fields == [{"name": "NAME", "type": "C", "length": 20, "decimals": 0}]
+    ids, bounds = reader.recordBounds()
+    assert ids.tolist() == list(range(65))
+    assert bounds[9].tolist() == [0.5, 0.5, 1.0, 1.0]
+
+
+def test_missingFile(tmp_path):
+    with pytest.raises(ShapefileError):
+        ShapefileReader(str(tmp_path / "missing.shp"))
+
+
+def test_qixLayout(tmp_path):
+    """
+    .qix文件头、节点的偏移量，以及每个要素只出现在一个能包含它的节点中
+    """
+
+    shapePath, rings = _writeGrid(tmp_path)
+    info = buildIndex(shapePath)
+    assert info["index"] == str(tmp_path / "grid.qix")
+    with open(info["index"], "rb") as f:
+        data = f.read()
+
+    assert data[:8] == b"SQT" + bytes([1, 1, 0, 0, 0])
+    numShapes, maxDepth = struct.unpack_from("<ii", data, 8)
+    assert (numShapes, maxDepth) == (65, info["depth"])
+    # 叶节点平均约有4个要素
+    assert maxDepth == 5
+
+    root, end = _readNode(data, 16)
+    assert end == len(data)
+    assert root["rect"] == (0.0, 0.0, 4.0, 4.0)
+    # 大方块不能放入任何子节点
+    assert 64 in root["ids"]
+
+    seen = []
+    for node, depth in _walk(root):
+        assert depth <= maxDepth
+        # 空的子树已删除
+        assert node["ids"] or node["children"]
+        for shapeId in node["ids"]:
+            xs, ys = zip(*rings[shapeId])
+            minx, miny, maxx, maxy = node["rect"]
+            assert minx <= min(xs) and miny <= min(ys) and max(xs) <= maxx and max(ys) <= maxy
+        seen.extend(node["ids"])
+    assert sorted(seen) == list(range(65))
+    assert max(depth for node, depth in _walk(root) if node["ids"]) > 1
+
+
+def test_buildIndexes(tmp_path):
+    first, rings = _writeGrid(tmp_path, "a")
+    second, rings = _writeGrid(tmp_path, "b")
+    results = buildIndexes([first, str(tmp_path / "missing.shp"), second], maxDepth=3, workers=2)
+    assert [res["status"] for res in results] == ["success", "fail", "success"]
+    assert results[0]["data"]["depth"] == 3
+    assert results[1]["data"] == {"path": str(tmp_path / "missing.shp")}
+    assert (tmp_path / "b.qix").exists()
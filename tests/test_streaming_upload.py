@@ -0,0 +1,93 @@
+import io
+import os
+import zipfile
+
+import pytest
+
+from GeoServerService import GeoServerService
+from StreamingUpload import FileStream, ZipStream, shapefileMembers
+
+
+def _files(tmp_path, sizes):
+    files = {}
+    for name, size in sizes.items():
+        path = tmp_path / name
+        path.write_bytes(os.urandom(size))
+        files[name] = str(path)
+    return files
+
+
+def test_zipStreamIsValidZip(tmp_path):
+    files = _files(tmp_path, {"a.shp": 300000, "a.shx": 1000, "a.dbf": 0})
+    progress = []
+    stream = ZipStream(files, chunkSize=64 * 1024, progress=lambda sent, total, rate: progress.append((sent, total)))
+    chunks = list(stream)
+
+    # 每块只包含当前读取的数据，不缓存整个zip
+    assert max(len(chunk) for chunk in chunks) < 2 * 64 * 1024
+    data = b"".join(chunks)
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        assert sorted(zf.namelist()) == sorted(files)
+        for name, path in files.items():
+            with open(path, "rb") as f:
+                assert zf.read(name) == f.read()
+
+    assert stream.stats.sent == len(data)
+    assert progress[-1] == (len(data), None)
+
+
+def test_zipStreamCanBeResent(tmp_path):
+    """
+    请求重试时重新迭代，从头生成相同的内容
+    """
+
+    files = _files(tmp_path, {"a.shp": 10000})
+    stream = ZipStream(files, compression=zipfile.ZIP_STORED)
+    first = b"".join(stream)
+    second = b"".join(stream)
+    assert first == second
+    assert stream.stats.sent == len(second)
+
+
+def test_fileStream(tmp_path):
+    files = _files(tmp_path, {"a.tif": 100000})
+    progress = []
+    with FileStream(files["a.tif"], progress=lambda sent, total, rate: progress.append((sent, total))) as stream:
+        assert len(stream) == 100000
+        data = stream.read(40000) + stream.read(-1)
+        assert stream.read(10) == b""
+        assert progress[-1] == (100000, 100000)
+        # 重试时回到开头，重新统计进度
+        stream.seek(0)
+        assert stream.stats.sent == 0
+        assert stream.tell() == 0
+    with open(files["a.tif"], "rb") as f:
+        assert data == f.read()
+
+
+def test_shapefileMembers(tmp_path):
+    files = _files(tmp_path, {"roads.shp": 10, "roads.shx": 10, "roads.dbf": 10, "roads.prj": 10})
+    assert shapefileMembers("r", str(tmp_path / "roads.shp")) == {
+        "r.shp": files["roads.shp"], "r.shx": files["roads.shx"], "r.dbf": files["roads.dbf"], "r.prj": files["roads.prj"]}
+    assert sorted(shapefileMembers("r", str(tmp_path / "roads"))) == ["r.dbf", "r.prj", "r.shp", "r.shx"]
+    # 空间索引一并上传
+    (tmp_path / "roads.qix").write_bytes(b"SQT")
+    assert sorted(shapefileMembers("r", str(tmp_path / "roads"))) == ["r.dbf", "r.prj", "r.qix", "r.shp", "r.shx"]
+
+    os.remove(files["roads.dbf"])
+    with pytest.raises(FileNotFoundError):
+        shapefileMembers("r", files["roads.shp"])
+
+
+def test_createShapeLayerReportsError(fakeServer, tmp_path):
+    """
+    上传失败时返回的信息中包括具体的错误
+    """
+
+    files = _files(tmp_path, {"roads.shp": 10, "roads.shx": 10, "roads.prj": 10})
+    service = GeoServerService(fakeServer.url, "admin", "geoserver")
+    service.createWorkspace("ws")
+    res = service.createShapeLayer("ws", "roads", files["roads.shp"], "UTF-8")
+    assert res["status"] == "fail"
+    assert res["info"].startswith("文件解析错误：") and "roads.dbf" in res["info"]
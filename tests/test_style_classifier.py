@@ -0,0 +1,77 @@
+import pytest
+
+from ShapefileIO import writePolygons
+from StyleClassifier import ClassifyError, StyleClassifier
+
+
+FIELDS = [{"name": "VALUE", "type": "N", "length": 12, "decimals": 2}, {"name": "KIND", "type": "C", "length": 10}]
+
+
+def _write(tmp_path, values, kinds=None):
+    shapePath = str(tmp_path / "data.shp")
+    kinds = kinds or ["a"] * len(values)
+    rings = [[(i, 0), (i, 1), (i + 1, 1), (i + 1, 0), (i, 0)] for i in range(len(values))]
+    writePolygons(shapePath, rings, FIELDS, [[value, kind] for value, kind in zip(values, kinds)])
+    return shapePath
+
+
+def test_equalBreaks(tmp_path):
+    shapePath = _write(tmp_path, list(range(1, 101)) + [None])
+    with StyleClassifier(shapePath, "VALUE", chunkSize=7) as classifier:
+        # 空值不计入
+        assert classifier.range() == (1.0, 100.0, 100)
+        assert classifier.breaks("equal", 4) == [1.0, 25.75, 50.5, 75.25, 100.0]
+        counts = [item["count"] for item in classifier.classify("equal", 4)]
+        assert counts == [25, 25, 25, 25]
+
+
+def test_quantileBreaks(tmp_path):
+    """
+    分位数断点在直方图上插值，精度为值域的1/bins
+    """
+
+    values = [v * v for v in range(1, 101)]
+    shapePath = _write(tmp_path, values)
+    with StyleClassifier(shapePath, "VALUE", chunkSize=16) as classifier:
+        edges = classifier.breaks("quantile", 4)
+        assert edges[0] == 1.0 and edges[-1] == 10000.0
+        for edge, expected in zip(edges[1:-1], (25 * 25, 50 * 50, 75 * 75)):
+            assert expected - 10000.0 / 4096 <= edge <= expected + 2 * 75 + 1
+        assert [item["count"] for item in classifier.classify("quantile", 4)] == [25, 25, 25, 25]
+
+
+def test_jenksBreaks(tmp_path):
+    shapePath = _write(tmp_path, list(range(1, 11)) + list(range(1000, 1011)))
+    with StyleClassifier(shapePath, "VALUE") as classifier:
+        edges = classifier.breaks("jenks", 2)
+        assert len(edges) == 3
+        assert 10 < edges[1] < 1000
+        assert [item["count"] for item in classifier.classify("jenks", 2)] == [10, 11]
+
+
+def test_constantField(tmp_path):
+    shapePath = _write(tmp_path, [3, 3, 3])
+    with StyleClassifier(shapePath, "VALUE") as classifier:
+        assert classifier.breaks("quantile", 5) == [3.0, 3.0]
+
+
+def test_categories(tmp_path):
+    shapePath = _write(tmp_path, [1, 1, 1, 2, 2, 3], ["林地", "林地", "水体", "林地", "草地", "水体"])
+    with StyleClassifier(shapePath, "KIND", charset="UTF-8") as classifier:
+        assert classifier.categories(maxCategories=2) == ([{"value": "林地", "count": 3}, {"value": "水体", "count": 2}], 1)
+    with StyleClassifier(shapePath, "VALUE") as classifier:
+        assert classifier.categories() == ([{"value": 1, "count": 3}, {"value": 2, "count": 2}, {"value": 3, "count": 1}], 0)
+        with pytest.raises(ClassifyError):
+            classifier.categories(maxDistinct=2)
+
+
+def test_errors(tmp_path):
+    shapePath = _write(tmp_path, [1, 2])
+    with pytest.raises(ClassifyError):
+        StyleClassifier(shapePath, "MISSING")
+    with StyleClassifier(shapePath, "KIND") as classifier:
+        with pytest.raises(ClassifyError):
+            classifier.breaks()
+    with StyleClassifier(shapePath, "VALUE") as classifier:
+        with pytest.raises(ClassifyError):
+            classifier.breaks("unknown")
@@ -0,0 +1,146 @@
+import time
+
+import pytest
+from geoserver.catalog import FailedRequestError
+
+import StyleTemplates
+from GeoServerCatalog import GeoServerCatalog
+from GeoServerService import GeoServerService
+from StyleRegistry import StyleRegistry, fingerprint
+
+
+POLYGON = {"fill_color": "#AAAAAA", "outline_color": "#000000", "outline_width": 1}
+RED = dict(POLYGON, fill_color="#FF0000")
+
+
+def _styleWrites(fake):
+    return sum(count for key, count in fake.stats()["byEndpoint"].items() if key.split(" ")[0] in ("POST", "PUT") and "styles" in key)
+
+
+def test_fingerprintIgnoresNames():
+    data = StyleTemplates.getStyleData("polygon", POLYGON)
+    renamed = data.replace("<Name>", "<Name>other_")
+    assert renamed != data
+    assert fingerprint(data) == fingerprint(renamed)
+    assert fingerprint(data) == fingerprint(data.encode("utf-8"))
+    assert fingerprint(data) != fingerprint(StyleTemplates.getStyleData("polygon", RED))
+
+
+def test_digestAndLookup(fakeServer):
+    catalog = GeoServerCatalog(fakeServer.url, "admin", "geoserver")
+    catalog.create_workspace("ws", "http://ws")
+    data = StyleTemplates.getStyleData("polygon", POLYGON)
+    catalog.create_style("a", data, workspace="ws")
+    catalog.create_style("b", data, workspace="ws")
+
+    registry = StyleRegistry(catalog, workers=2)
+    assert registry.digestOf("ws", "a") == fingerprint(data)
+    assert registry.digestOf("ws", "missing") is None
+    assert registry.lookup("ws", fingerprint(data)) == "a"
+    assert registry.duplicates("ws") == {fingerprint(data): ["a", "b"]}
+
+    registry.remove("ws", "a")
+    assert registry.lookup("ws", fingerprint(data)) == "b"
+    assert registry.duplicates("ws") == {}
+    registry.put("ws", "c", fingerprint(data))
+    assert registry.duplicates("ws") == {fingerprint(data): ["b", "c"]}
+
+
+def test_downloadErrorIsNotAbsent(fakeServer):
+    """
+    只有404表示样式不存在，其他错误抛出异常，不能当作不存在而重复上传
+    """
+
+    catalog = GeoServerCatalog(fakeServer.url, "admin", "geoserver")
+    catalog.create_workspace("ws", "http://ws")
+    catalog.create_style("a", StyleTemplates.getStyleData("polygon", POLYGON), workspace="ws")
+    registry = StyleRegistry(catalog)
+    assert registry.download("ws", "missing") is None
+    assert registry.download(None, "missing") is None
+
+    fakeServer.errorRate = 1
+    fakeServer.errorStatuses = (500,)
+    with pytest.raises(FailedRequestError):
+        registry.download("ws", "a")
+    with pytest.raises(FailedRequestError):
+        registry.digestOf("ws", "a")
+
+
+def test_ttlPicksUpExternalChanges(fakeServer):
+    """
+    其他程序修改的样式在索引过期后生效
+    """
+
+    catalog = GeoServerCatalog(fakeServer.url, "admin", "geoserver")
+    catalog.create_workspace("ws", "http://ws")
+    first = StyleTemplates.getStyleData("polygon", POLYGON)
+    second = StyleTemplates.getStyleData("polygon", RED)
+    catalog.create_style("a", first, workspace="ws")
+
+    registry = StyleRegistry(catalog, ttl=0.2)
+    assert registry.digestOf("ws", "a") == fingerprint(first)
+    catalog.create_style("a", second, overwrite=True, workspace="ws")
+    assert registry.digestOf("ws", "a") == fingerprint(first)
+    time.sleep(0.3)
+    assert registry.digestOf("ws", "a") == fingerprint(second)
+
+
+def test_unchangedStyleIsNotUploaded(fakeServer):
+    """
+    内容相同的样式不重新上传，内容变化时上传
+    """
+
+    service = GeoServerService(fakeServer.url, "admin", "geoserver")
+    service.createWorkspace("ws")
+    assert service.createStyle("ws", "a", "polygon", POLYGON)["status"] == "success"
+    writes = _styleWrites(fakeServer)
+
+    assert service.createStyle("ws", "a", "polygon", POLYGON)["status"] == "success"
+    assert service.updateStyle("ws", "a", "polygon", POLYGON)["status"] == "success"
+    assert _styleWrites(fakeServer) == writes
+
+    assert service.updateStyle("ws", "a", "polygon", RED)["status"] == "success"
+    assert _styleWrites(fakeServer) == writes + 1
+
+    # 按原样上传，服务器上的内容与计算指纹的内容一致
+    assert fakeServer.styles[("ws", "a")] == {"body": StyleTemplates.getStyleData("polygon", RED).encode("utf-8"), "raw": True}
+    assert fingerprint(fakeServer.styles[("ws", "a")]["body"]) == fingerprint(StyleTemplates.getStyleData("polygon", RED))
+
+
+def test_dedupeReusesExistingStyle(fakeServer):
+    service = GeoServerService(fakeServer.url, "admin", "geoserver")
+    service.createWorkspace("ws")
+    service.createStyle("ws", "a", "polygon", POLYGON)
+
+    res = service.createStyle("ws", "b", "polygon", POLYGON, dedupe=True)
+    assert res["data"].name == "a"
+    assert ("ws", "b") not in fakeServer.styles
+    res = service.createStyle("ws", "c", "polygon", RED, dedupe=True)
+    assert res["data"].name == "c"
+
+
+def test_mergeDuplicateStyles(fakeServer):
+    """
+    不公开的图层不在WMS能力文档中，也要改为使用保留的样式
+    """
+
+    service = GeoServerService(fakeServer.url, "admin", "geoserver")
+    service.createWorkspace("ws")
+    for name in ("a", "b"):
+        service.createStyle("ws", name, "polygon", POLYGON)
+    service.createStyle("ws", "c", "polygon", RED)
+    for name in ("t1", "t2"):
+        assert service.createTiffLayer("ws", name, "/data/{0}.tif".format(name))["status"] == "success"
+        assert service.setLayerStyle("ws", name, "b", "ws")["status"] == "success"
+    fakeServer.layers[("ws", "t2")]["advertised"] = False
+
+    res = service.mergeDuplicateStyles("ws", dryRun=True)
+    assert res["data"] == {"styles": {"b": "a"}, "layers": ["ws:t1", "ws:t2"]}
+    assert ("ws", "b") in fakeServer.styles
+
+    res = service.mergeDuplicateStyles("ws")
+    assert res["status"] == "success", res["info"]
+    assert fakeServer.layers[("ws", "t1")]["defaultStyle"] == ("ws", "a")
+    assert fakeServer.layers[("ws", "t2")]["defaultStyle"] == ("ws", "a")
+    assert ("ws", "b") not in fakeServer.styles
+    assert ("ws", "c") in fakeServer.styles